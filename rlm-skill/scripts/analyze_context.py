@@ -6,10 +6,16 @@ Usage: python analyze_context.py <context_file>
 """
 
 import sys
-import re
-from collections import Counter
 from pathlib import Path
 
+from structure_scan import scan_structure
+
+try:
+    from token_estimator import estimate_tokens
+except ImportError:
+    def estimate_tokens(text: str) -> int:
+        return len(text) // 4
+
 
 def analyze_context(filepath: str) -> dict:
     """Analyze a context file and return structural information."""
@@ -17,40 +23,31 @@ def analyze_context(filepath: str) -> dict:
     with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
         content = f.read()
     
-    lines = content.split('\n')
+    # One pass over the text for all line and pattern statistics
+    scan = scan_structure(content)
     
     analysis = {
         'file_path': filepath,
-        'total_chars': len(content),
-        'total_lines': len(lines),
-        'estimated_tokens': len(content) // 4,  # Rough estimate
-        'non_empty_lines': sum(1 for l in lines if l.strip()),
+        'total_chars': scan.chars,
+        'total_lines': scan.lines,
+        'estimated_tokens': estimate_tokens(content),
+        'non_empty_lines': scan.non_empty_lines,
     }
     
     # Detect structure patterns
-    patterns = {
-        'json_objects': len(re.findall(r'^\s*\{', content, re.MULTILINE)),
-        'markdown_headers': len(re.findall(r'^#+\s+', content, re.MULTILINE)),
-        'code_blocks': len(re.findall(r'```', content)) // 2,
-        'xml_tags': len(re.findall(r'<[a-zA-Z][^>]*>', content)),
-        'document_separators': len(re.findall(r'\n---+\n|\n===+\n|\n\*\*\*+\n', content)),
-        'numbered_items': len(re.findall(r'^\s*\d+[\.\)]\s+', content, re.MULTILINE)),
-        'bullet_points': len(re.findall(r'^\s*[-*•]\s+', content, re.MULTILINE)),
-    }
+    patterns = scan.patterns()
     analysis['patterns'] = patterns
     
     # Line length statistics
-    line_lengths = [len(l) for l in lines]
-    if line_lengths:
-        analysis['line_stats'] = {
-            'avg_length': sum(line_lengths) // len(line_lengths),
-            'max_length': max(line_lengths),
-            'min_non_empty': min((l for l in line_lengths if l > 0), default=0),
-        }
+    analysis['line_stats'] = {
+        'avg_length': scan.avg_line_length,
+        'max_length': scan.max_line_length,
+        'min_non_empty': scan.min_non_empty_length,
+    }
     
     # Sample content
-    analysis['first_lines'] = lines[:20]
-    analysis['last_lines'] = lines[-10:] if len(lines) > 10 else lines
+    analysis['first_lines'] = content.split('\n', 20)[:20]
+    analysis['last_lines'] = content.rsplit('\n', 10)[-10:]
     
     # Suggest chunking strategy
     if patterns['document_separators'] > 5:
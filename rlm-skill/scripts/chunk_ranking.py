@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+chunk_ranking.py - BM25 ranking of chunks against a query.
+
+rlm_processor's keyword pre-filter keeps every chunk that contains any query
+keyword, so one common word is enough to send the whole document. Here each
+chunk is scored with BM25 (Robertson/Sparck Jones): rare query terms weigh
+more than common ones, repeated matches count with diminishing returns, and
+long chunks are not favoured just for being long. The term frequencies are
+indexed once, so a document can be ranked for several queries cheaply.
+
+Usage:
+    python chunk_ranking.py document.txt "database connection pooling" --top-k 10
+"""
+
+import re
+import sys
+import math
+import argparse
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# BM25 defaults: term-frequency saturation and length normalization
+DEFAULT_K1 = 1.5
+DEFAULT_B = 0.75
+
+_TERM = re.compile(r'\w+')
+
+
+def split_words(text: str) -> List[str]:
+    """Lowercased words of text, as they appear."""
+    return _TERM.findall(str(text).lower())
+
+
+def normalize_word(word: str) -> str:
+    """A lowercased word with a plural 's' dropped ('budgets' -> 'budget')."""
+    return word[:-1] if len(word) > 3 and word[-1] == 's' and word[-2] != 's' else word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of text, with a plural 's' dropped ('budgets' -> 'budget')."""
+    return [normalize_word(word) for word in split_words(text)]
+
+
+class BM25Index:
+    """
+    Term-frequency index over a list of chunks, scored with BM25.
+
+    Chunks may be strings or anything whose str() is the chunk text (such as
+    chunk_source.Chunk).
+    """
+
+    def __init__(self, chunks: Iterable, k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        self.k1 = k1
+        self.b = b
+        # term -> {chunk index: occurrences}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: List[int] = []
+        for i, chunk in enumerate(chunks):
+            terms = tokenize(chunk)
+            self.lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                self.postings.setdefault(term, {})[i] = count
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    @classmethod
+    def from_counts(cls, counts: Sequence[Dict[str, int]], lengths: Sequence[int],
+                    k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> 'BM25Index':
+        """
+        Index from per-chunk term counts (e.g. keyword_scanner hit counts)
+        instead of tokenizing the chunks. `lengths` may be in any unit, such
+        as characters, since only their ratio to the average is used.
+        """
+        index = cls((), k1, b)
+        for i, chunk_counts in enumerate(counts):
+            for term, count in chunk_counts.items():
+                if count:
+                    index.postings.setdefault(term, {})[i] = count
+        index.lengths = list(lengths)
+        index.avg_length = sum(index.lengths) / len(index.lengths) if index.lengths else 0.0
+        return index
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def idf(self, term: str) -> float:
+        """Inverse document frequency (never negative)."""
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def scores(self, terms: Iterable[str]) -> List[float]:
+        """BM25 score of every chunk for the query terms."""
+        scores = [0.0] * len(self)
+        avg_length = self.avg_length or 1.0
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for i, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / avg_length)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def rank(self, terms: Iterable[str]) -> List[Tuple[int, float]]:
+        """(chunk index, score) for chunks matching any term, best first."""
+        scored = [(i, s) for i, s in enumerate(self.scores(terms)) if s > 0]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored
+
+
+def select_ranked(
+    ranked: List[Tuple[int, float]],
+    sizes: List[int],
+    top_k: Optional[int] = None,
+    max_tokens: Optional[int] = None
+) -> List[Tuple[int, float]]:
+    """
+    Take ranked chunks best first, up to top_k chunks and max_tokens in total.
+
+    `sizes` holds each chunk's estimated tokens. The best chunk is always
+    taken, even if it alone is over max_tokens.
+    """
+    selected = []
+    total = 0
+    for i, score in ranked:
+        if top_k is not None and len(selected) >= top_k:
+            break
+        if max_tokens is not None and selected and total + sizes[i] > max_tokens:
+            break
+        selected.append((i, score))
+        total += sizes[i]
+    return selected
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank a file\'s chunks against a query with BM25')
+    parser.add_argument('file', help='Text file to chunk and rank')
+    parser.add_argument('query', help='Query to rank chunks for')
+    parser.add_argument('--chunk-size', '-c', type=int, default=40000,
+                        help='Target chunk size in characters (default: 40000)')
+    parser.add_argument('--top-k', '-k', type=int, default=10,
+                        help='Number of chunks to list (default: 10)')
+    args = parser.parse_args()
+
+    from rlm_processor import auto_chunk, query_keywords
+
+    try:
+        with open(args.file, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    chunks, strategy = auto_chunk(content, args.chunk_size)
+    terms = [t for kw in query_keywords(args.query) for t in tokenize(kw)]
+    ranked = BM25Index(chunks).rank(terms)
+    print(f"{len(chunks)} chunks ({strategy}); query terms: {', '.join(terms) or '(none)'}")
+    print(f"{len(ranked)} chunks match; top {min(args.top_k, len(ranked))}:")
+    for i, score in ranked[:args.top_k]:
+        preview = ' '.join(str(chunks[i]).split())[:70]
+        print(f"  #{i + 1:<5} {score:7.2f}  {preview}")
+
+
+if __name__ == "__main__":
+    main()
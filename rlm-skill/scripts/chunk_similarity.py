@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+chunk_similarity.py - TF-IDF cosine similarity between chunks and a query.
+
+The keyword pre-filter and BM25 ranking only see the query's longer words,
+so a chunk that says "configuring" is missed for a question about
+"configuration", and a phrase is no more than its separate words. Here each
+chunk becomes a sparse TF-IDF vector of its words, word bigrams and the
+character n-grams of its words, and chunks are ranked by cosine similarity
+to the whole query. Everything runs locally, with no model to download.
+
+Features are hashed into a fixed number of buckets (the hashing trick), so
+there is no vocabulary to build or store. With numpy the vectors are built
+with array operations and kept as an inverted index, and a query only
+touches the postings of its own features; without it the same scores are
+computed with dicts. The numpy index can be saved and loaded again, which
+document_index uses to keep it next to a persistent index.
+
+Usage:
+    python chunk_similarity.py document.txt "how is the connection pool configured" --top-k 10
+"""
+
+import os
+import sys
+import math
+import zlib
+import argparse
+import tempfile
+import zipfile
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from chunk_ranking import normalize_word, split_words, tokenize
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Hash buckets; collisions are rare well below this many distinct features
+DEFAULT_FEATURES = 1 << 20
+# Longest word n-gram (2: words and word pairs)
+DEFAULT_NGRAMS = 2
+# Length of the character n-grams taken from each word (0: none)
+DEFAULT_CHAR_NGRAMS = 4
+
+
+# Multiplier that folds the hashes of consecutive words into one n-gram hash
+_MIX = 0x9E3779B1
+_MASK = 0xFFFFFFFF
+
+# Arrays of the numpy index, as stored by TfidfIndex.save
+_ARRAYS = ('_keys', '_idf_values', '_offsets', '_rows', '_weights')
+
+
+def _hash(feature: str) -> int:
+    # crc32 rather than hash(), which differs between runs
+    return zlib.crc32(feature.encode('utf-8'))
+
+
+def _combine(h: int, g: int) -> int:
+    return (h * _MIX + g) & _MASK
+
+
+class TfidfIndex:
+    """
+    Hashed TF-IDF vectors of a list of chunks (strings or anything whose
+    str() is the chunk text), L2-normalized for cosine similarity. Term
+    frequencies are sublinear (1 + log tf) and idf is smoothed.
+
+    Features are the words of chunk_ranking.tokenize, runs of up to `ngrams`
+    consecutive words, and the character n-grams of each word longer than
+    `char_ngrams` letters.
+    """
+
+    def __init__(self, chunks: Iterable, n_features: int = DEFAULT_FEATURES,
+                 ngrams: int = DEFAULT_NGRAMS, char_ngrams: int = DEFAULT_CHAR_NGRAMS):
+        self.n_features = n_features
+        self.ngrams = ngrams
+        self.char_ngrams = char_ngrams
+        self._word_cache: Dict[str, Tuple[int, List[int]]] = {}
+        if NUMPY_AVAILABLE:
+            self._index_arrays(chunks)
+        else:
+            self._index_dicts(chunks)
+
+    def __len__(self) -> int:
+        return self.n_chunks
+
+    def _word(self, word: str) -> Tuple[int, List[int]]:
+        """Hash of a word and the hashes of its character n-grams."""
+        cached = self._word_cache.get(word)
+        if cached is None:
+            n = self.char_ngrams
+            grams = ([_hash('#' + word[i:i + n]) for i in range(len(word) - n + 1)]
+                     if n and len(word) > n else [])
+            cached = self._word_cache[word] = (_hash(word), grams)
+        return cached
+
+    def vectorize(self, text: str) -> Dict[int, int]:
+        """Occurrences per hash bucket of text's features."""
+        words = tokenize(text)
+        hashes = Counter()
+        for word, count in Counter(words).items():
+            h, grams = self._word(word)
+            hashes[h] += count
+            for g in grams:
+                hashes[g] += count
+        word_hashes = [self._word(word)[0] for word in words]
+        ngram_hashes = word_hashes
+        for n in range(2, self.ngrams + 1):
+            ngram_hashes = [_combine(h, g) for h, g in zip(ngram_hashes, word_hashes[n - 1:])]
+            hashes.update(ngram_hashes)
+        vector: Dict[int, int] = {}
+        for h, count in hashes.items():
+            bucket = h % self.n_features
+            vector[bucket] = vector.get(bucket, 0) + count
+        return vector
+
+    def _idf(self, df):
+        return math.log((1 + self.n_chunks) / (1 + df)) + 1
+
+    def _index_arrays(self, chunks: Iterable):
+        # Word ids of the whole corpus in one array; mapping words through a dict
+        # whose missing keys get the next id keeps the per-word work in C
+        spellings = defaultdict()
+        spellings.default_factory = spellings.__len__
+        ids = array('q')
+        lengths = array('q')
+        for chunk in chunks:
+            words = split_words(chunk)
+            ids.extend(map(spellings.__getitem__, words))
+            lengths.append(len(words))
+        self.n_chunks = len(lengths)
+        terms: Dict[str, int] = {}
+        term_ids = np.array([terms.setdefault(normalize_word(word), len(terms)) for word in spellings],
+                            dtype=np.int64)
+        ids = term_ids[np.frombuffer(ids, dtype=np.int64)] if len(ids) else np.zeros(0, dtype=np.int64)
+        rows = np.repeat(np.arange(self.n_chunks, dtype=np.uint64), np.frombuffer(lengths, dtype=np.int64))
+        words = [self._word(term) for term in terms]
+        word_hashes = np.array([h for h, _ in words], dtype=np.uint32)
+        gram_counts = np.array([len(grams) for _, grams in words], dtype=np.int64)
+        gram_buckets = np.array([g % self.n_features for _, grams in words for g in grams], dtype=np.uint64)
+        gram_starts = np.cumsum(gram_counts) - gram_counts
+
+        # One sort key per feature occurrence, bucket << row_bits | chunk, so that
+        # sorting groups each bucket's postings and runs of a key are its count
+        row_bits = np.uint64(max(self.n_chunks - 1, 1).bit_length())
+        per_token = gram_counts[ids]
+        n_grams = int(per_token.sum())
+        n_pairs = [max(len(ids) - n + 1, 0) for n in range(2, self.ngrams + 1)]
+        keys = np.empty(len(ids) + n_grams + sum(n_pairs), dtype=np.uint64)
+        end = len(ids)
+        keys[:end] = word_hashes[ids] % np.uint32(self.n_features)
+        # Character n-grams of every word occurrence: the j-th gram of token t is
+        # gram_buckets[gram_starts[ids[t]] + j]
+        first = np.cumsum(per_token) - per_token
+        positions = np.arange(n_grams, dtype=np.int64)
+        positions += np.repeat(gram_starts[ids] - first, per_token)
+        keys[end:end + n_grams] = gram_buckets[positions]
+        keys[end:end + n_grams] <<= row_bits
+        keys[end:end + n_grams] |= np.repeat(rows, per_token)
+        del positions
+        keys[:end] <<= row_bits
+        keys[:end] |= rows
+        end += n_grams
+        # Word n-grams: fold each following word's hash in (uint32 arithmetic wraps
+        # like _combine), keeping only runs within one chunk
+        token_hashes = word_hashes[ids]
+        ngram_hashes = token_hashes
+        for n, count in zip(range(2, self.ngrams + 1), n_pairs):
+            ngram_hashes = ngram_hashes[:-1] * np.uint32(_MIX) + token_hashes[n - 1:]
+            same_chunk = rows[:count] == rows[n - 1:]
+            kept = int(same_chunk.sum())
+            keys[end:end + kept] = ngram_hashes[same_chunk] % np.uint32(self.n_features)
+            keys[end:end + kept] <<= row_bits
+            keys[end:end + kept] |= rows[:count][same_chunk]
+            end += kept
+        keys = keys[:end]
+        keys.sort()
+
+        new_cell = np.empty(len(keys), dtype=bool)
+        new_cell[:1] = True
+        np.not_equal(keys[1:], keys[:-1], out=new_cell[1:])
+        cell_starts = np.flatnonzero(new_cell)
+        del new_cell
+        counts = np.diff(cell_starts, append=len(keys))
+        cells = keys[cell_starts]
+        del keys
+        buckets = (cells >> row_bits).astype(np.int64)
+        rows = (cells & ((np.uint64(1) << row_bits) - np.uint64(1))).astype(np.int64)
+        del cells
+        starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+        df = np.diff(np.append(starts, len(buckets)))
+
+        idf = np.log((1 + self.n_chunks) / (1 + df)) + 1
+        weights = (1 + np.log(counts)) * np.repeat(idf, df)
+        norms = np.sqrt(np.bincount(rows, weights * weights, minlength=self.n_chunks))
+        # Postings of bucket _keys[j] are _rows/_weights[_offsets[j]:_offsets[j + 1]]
+        self._keys = buckets[starts]
+        self._idf_values = idf
+        self._offsets = np.append(starts, len(buckets))
+        self._rows = rows.astype(np.int32)
+        self._weights = (weights / norms[rows]).astype(np.float32)
+
+    def _index_dicts(self, chunks: Iterable):
+        vectors = [self.vectorize(str(chunk)) for chunk in chunks]
+        self.n_chunks = len(vectors)
+        df = Counter(bucket for vector in vectors for bucket in vector)
+        self._idf_values = {bucket: self._idf(n) for bucket, n in df.items()}
+        self._postings: Dict[int, List[Tuple[int, float]]] = {}
+        for row, vector in enumerate(vectors):
+            weights = {b: (1 + math.log(c)) * self._idf_values[b] for b, c in vector.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values()))
+            for bucket, w in weights.items():
+                self._postings.setdefault(bucket, []).append((row, w / norm))
+
+    def save(self, path: str):
+        """Write the vectors to `path` atomically, for load() (numpy only)."""
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                np.savez(out, settings=np.array([self.n_chunks, self.n_features, self.ngrams, self.char_ngrams]),
+                         **{name: getattr(self, name) for name in _ARRAYS})
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'TfidfIndex':
+        """Vectors written by save() (numpy only); ValueError if path holds none."""
+        index = cls.__new__(cls)
+        index._word_cache = {}
+        try:
+            with np.load(path) as data:
+                index.n_chunks, index.n_features, index.ngrams, index.char_ngrams = map(int, data['settings'])
+                for name in _ARRAYS:
+                    setattr(index, name, data[name])
+        except (KeyError, zipfile.BadZipFile) as e:
+            raise ValueError(f"Not saved TF-IDF vectors: {path}") from e
+        return index
+
+    def _lookup(self, bucket: int):
+        """Key of a bucket's postings and idf (its position in _keys with numpy), or None if no chunk has it."""
+        if NUMPY_AVAILABLE:
+            j = int(np.searchsorted(self._keys, bucket))
+            return j if j < len(self._keys) and self._keys[j] == bucket else None
+        return bucket if bucket in self._idf_values else None
+
+    def _query_weights(self, query: str) -> Dict[int, float]:
+        """Postings key -> normalized TF-IDF weight, for the query features some chunk has."""
+        weights = {}
+        norm = 0.0
+        for bucket, count in self.vectorize(query).items():
+            key = self._lookup(bucket)
+            w = (1 + math.log(count)) * (self._idf(0) if key is None else float(self._idf_values[key]))
+            norm += w * w
+            if key is not None:
+                weights[key] = w
+        norm = math.sqrt(norm) or 1.0
+        return {key: w / norm for key, w in weights.items()}
+
+    def scores(self, query: str) -> List[float]:
+        """Cosine similarity of every chunk to the query."""
+        weights = self._query_weights(query)
+        if not NUMPY_AVAILABLE:
+            scores = [0.0] * self.n_chunks
+            for bucket, qw in weights.items():
+                for row, w in self._postings[bucket]:
+                    scores[row] += qw * w
+            return scores
+        if not weights:
+            return [0.0] * self.n_chunks
+        slices = [slice(self._offsets[j], self._offsets[j + 1]) for j in weights]
+        rows = np.concatenate([self._rows[s] for s in slices])
+        contributions = np.concatenate([self._weights[s] * qw for s, qw in zip(slices, weights.values())])
+        return np.bincount(rows, contributions, minlength=self.n_chunks).tolist()
+
+    def rank(self, query: str) -> List[Tuple[int, float]]:
+        """(chunk index, similarity) for chunks sharing any feature with the query, best first."""
+        scored = [(i, s) for i, s in enumerate(self.scores(query)) if s > 0]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank a file\'s chunks by TF-IDF similarity to a query')
+    parser.add_argument('file', help='Text file to chunk and rank')
+    parser.add_argument('query', help='Query to rank chunks for')
+    parser.add_argument('--chunk-size', '-c', type=int, default=40000,
+                        help='Target chunk size in characters (default: 40000)')
+    parser.add_argument('--top-k', '-k', type=int, default=10,
+                        help='Number of chunks to list (default: 10)')
+    args = parser.parse_args()
+
+    from rlm_processor import auto_chunk
+
+    try:
+        with open(args.file, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    chunks, strategy = auto_chunk(content, args.chunk_size)
+    ranked = TfidfIndex(chunks).rank(args.query)
+    backend = 'numpy' if NUMPY_AVAILABLE else 'dict'
+    print(f"{len(chunks)} chunks ({strategy}), {backend} vectors")
+    print(f"{len(ranked)} chunks share features with the query; top {min(args.top_k, len(ranked))}:")
+    for i, score in ranked[:args.top_k]:
+        preview = ' '.join(str(chunks[i]).split())[:70]
+        print(f"  #{i + 1:<5} {score:7.3f}  {preview}")
+
+
+if __name__ == "__main__":
+    main()
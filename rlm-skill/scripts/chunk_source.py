@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+chunk_source.py - Offset-based chunks over a memory-mapped file.
+
+Chunking a multi-GB file with rlm_processor.auto_chunk copies it at least
+twice: once when it is read, once more as chunk strings, and the overlap
+between character chunks a third time. Here the file is memory-mapped and
+each chunk is a small Chunk record holding byte offsets and a line range.
+Its text is decoded only when asked for, so only the chunks actually sent to
+the model are materialized, and every chunk can cite where it came from
+("server.log:1200-1740").
+
+Offsets are in bytes and always fall on UTF-8 character boundaries. For
+ASCII text the chunks are exactly those of the string chunkers.
+
+Usage:
+    python chunk_source.py big.log                  # list chunks with line ranges
+    python chunk_source.py big.log --chunk-size 20000 --show 3
+"""
+
+import re
+import sys
+import mmap
+import argparse
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+# Bytes sampled from the start of the file to pick a strategy
+SAMPLE_BYTES = 1 << 20
+
+MARKDOWN_SPLIT_BYTES = rb'\n(?=#{1,2}\s+)'
+_WHITESPACE = b' \t\n\r\x0b\x0c'
+
+
+class MappedSource:
+    """
+    A read-only memory map of a file, decoded as UTF-8 on demand.
+
+    Use as a context manager (or call close()) to release the map; chunks
+    cannot be read after that.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self.name = Path(path).name
+        self._file = open(path, 'rb')
+        size = Path(path).stat().st_size
+        # mmap cannot map an empty file
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._line_pos = 0
+        self._line_count = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    def text(self, start: int = 0, end: Optional[int] = None) -> str:
+        """Decode bytes [start, end) as UTF-8 (invalid bytes become U+FFFD)."""
+        return self.data[start:end].decode('utf-8', errors='replace')
+
+    def align(self, pos: int) -> int:
+        """Move pos back to the start of the UTF-8 character it falls in."""
+        pos = min(max(pos, 0), len(self.data))
+        floor = max(0, pos - 3)
+        while pos > floor and pos < len(self.data) and self.data[pos] & 0xC0 == 0x80:
+            pos -= 1
+        return pos
+
+    def line_number(self, pos: int) -> int:
+        """1-based line number of the byte at pos."""
+        # Chunks are generated in order, so count from the last position asked for
+        if pos >= self._line_pos:
+            self._line_count += self.data[self._line_pos:pos].count(b'\n')
+        else:
+            self._line_count -= self.data[pos:self._line_pos].count(b'\n')
+        self._line_pos = pos
+        return self._line_count + 1
+
+
+class Chunk:
+    """
+    One chunk of a MappedSource: bytes [start, end), lines line_start..line_end.
+
+    str(chunk) (or chunk.text) decodes the bytes; nothing is copied before that.
+    """
+
+    __slots__ = ('source', 'start', 'end', 'line_start', 'line_end', 'strategy')
+
+    def __init__(self, source: MappedSource, start: int, end: int,
+                 line_start: int, line_end: int, strategy: str):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.line_start = line_start
+        self.line_end = line_end
+        self.strategy = strategy
+
+    @property
+    def text(self) -> str:
+        return self.source.text(self.start, self.end)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def citation(self) -> str:
+        """Where the chunk came from, e.g. 'server.log:1200-1740'."""
+        if self.line_start == self.line_end:
+            return f"{self.source.name}:{self.line_start}"
+        return f"{self.source.name}:{self.line_start}-{self.line_end}"
+
+    def __repr__(self) -> str:
+        return f"<Chunk {self.citation()} bytes {self.start}-{self.end} ({self.strategy})>"
+
+
+def _make_chunk(source: MappedSource, start: int, end: int, strategy: str) -> Chunk:
+    line_start = source.line_number(start)
+    line_end = source.line_number(max(start, end - 1))
+    return Chunk(source, start, end, line_start, line_end, strategy)
+
+
+def _strip_span(source: MappedSource, start: int, end: int) -> Tuple[int, int]:
+    """Narrow [start, end) to exclude leading and trailing ASCII whitespace."""
+    data = source.data
+    while start < end and data[start] in _WHITESPACE:
+        start += 1
+    while end > start and data[end - 1] in _WHITESPACE:
+        end -= 1
+    return start, end
+
+
+def span_chunks_by_bytes(source: MappedSource, chunk_size: int = 40000, overlap: int = 500,
+                         strategy: str = 'character_count', start: int = 0,
+                         stop: Optional[int] = None) -> Iterator[Chunk]:
+    """
+    rlm_processor.chunk_by_chars over bytes [start, stop), with cuts moved
+    back to character boundaries.
+    """
+    stop = len(source) if stop is None else stop
+    while start < stop:
+        end = source.align(start + chunk_size) if start + chunk_size < stop else stop
+        if end <= start:
+            end = min(stop, start + chunk_size)
+        yield _make_chunk(source, start, end, strategy)
+        if overlap and end < stop:
+            start = max(source.align(end - overlap), start + 1)
+        else:
+            start = end
+
+
+def span_chunks_by_lines(source: MappedSource, lines_per_chunk: int = 500,
+                         strategy: str = 'line_count') -> Iterator[Chunk]:
+    """rlm_processor.chunk_by_lines: each chunk ends before the newline after its last line."""
+    data = source.data
+    start = 0
+    while True:
+        end = start - 1
+        for _ in range(lines_per_chunk):
+            end = data.find(b'\n', end + 1)
+            if end < 0:
+                break
+        if end < 0:
+            yield _make_chunk(source, start, len(data), strategy)
+            return
+        yield _make_chunk(source, start, end, strategy)
+        start = end + 1
+
+
+def span_chunks_by_regex(source: MappedSource, pattern: bytes,
+                         strategy: str = 'regex') -> Iterator[Chunk]:
+    """rlm_processor.chunk_by_regex: split at pattern matches, strip, drop empty parts."""
+    start = 0
+    for match in re.finditer(pattern, source.data):
+        part = _strip_span(source, start, match.start())
+        if part[1] > part[0]:
+            yield _make_chunk(source, part[0], part[1], strategy)
+        start = match.end()
+    part = _strip_span(source, start, len(source))
+    if part[1] > part[0]:
+        yield _make_chunk(source, part[0], part[1], strategy)
+
+
+def span_chunks_by_separator(source: MappedSource, separator: str = '\n---\n',
+                             strategy: str = 'document_separator') -> Iterator[Chunk]:
+    """rlm_processor.chunk_by_separator."""
+    return span_chunks_by_regex(source, re.escape(separator.encode('utf-8')), strategy)
+
+
+def auto_chunk_spans(
+    source: MappedSource,
+    target_chunk_size: int = 40000,
+    chunk_tokens: Optional[int] = None
+) -> Tuple[List[Chunk], str]:
+    """
+    rlm_processor.auto_chunk over a mapped file.
+
+    The strategy is picked from the first SAMPLE_BYTES. Sizes are in bytes;
+    with chunk_tokens the byte size is derived from the sample's bytes per
+    token. Markdown sections over twice the target are split by bytes.
+
+    Returns:
+        Tuple of (chunks, strategy_name)
+    """
+    from rlm_processor import detect_strategies, estimate_tokens, lines_per_chunk
+
+    sample = source.text(0, source.align(SAMPLE_BYTES))
+    if chunk_tokens:
+        sample_bytes = len(sample.encode('utf-8'))
+        target_chunk_size = int(chunk_tokens * sample_bytes / max(1, estimate_tokens(sample)))
+
+    for strategy in detect_strategies(sample, target_chunk_size):
+        if strategy == 'document_separator':
+            return list(span_chunks_by_separator(source, '\n---', strategy)), strategy
+        if strategy == 'markdown_headers':
+            chunks = []
+            for section in span_chunks_by_regex(source, MARKDOWN_SPLIT_BYTES, strategy):
+                if len(section) < target_chunk_size * 2:
+                    chunks.append(section)
+                    continue
+                chunks.extend(span_chunks_by_bytes(source, target_chunk_size, 500, strategy,
+                                                   section.start, section.end))
+            return chunks, strategy
+        if strategy == 'line_count':
+            return list(span_chunks_by_lines(source, lines_per_chunk(target_chunk_size))), strategy
+
+    return list(span_chunks_by_bytes(source, target_chunk_size)), 'character_count'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chunk a file in place and list the chunks')
+    parser.add_argument('file', help='Text file to chunk')
+    parser.add_argument('--chunk-size', '-c', type=int, default=40000,
+                        help='Target chunk size in bytes (default: 40000)')
+    parser.add_argument('--chunk-tokens', '-t', type=int, default=None,
+                        help='Target chunk size in estimated tokens (overrides --chunk-size)')
+    parser.add_argument('--show', type=int, default=None, metavar='N',
+                        help='Print the text of chunk N (1-based)')
+    args = parser.parse_args()
+
+    try:
+        source = MappedSource(args.file)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with source:
+        chunks, strategy = auto_chunk_spans(source, args.chunk_size, args.chunk_tokens)
+        if args.show is not None:
+            if not 1 <= args.show <= len(chunks):
+                print(f"Error: --show must be between 1 and {len(chunks)}", file=sys.stderr)
+                sys.exit(1)
+            print(chunks[args.show - 1].text)
+            return
+        print(f"{len(chunks)} chunks ({strategy}) over {len(source):,} bytes")
+        for i, chunk in enumerate(chunks, 1):
+            print(f"  {i:>5}  {chunk.citation():<40} {len(chunk):>10,} bytes")
+
+
+if __name__ == "__main__":
+    main()
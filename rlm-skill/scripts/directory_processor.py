@@ -18,6 +18,7 @@ Usage:
     python directory_processor.py ./project "Explain the architecture"
     python directory_processor.py ./src "Find security issues" --per-file --fast
     python directory_processor.py ./project "Summarize" --include "*.py,*.js"
+    python directory_processor.py ./monorepo "Find bugs" --per-file --batch
 
 Requires:
     ANTHROPIC_API_KEY (env var or ~/.claude/api_key.txt)
@@ -28,6 +29,7 @@ Reference: Zhang, Kraska, Khattab - "Recursive Language Models" (arXiv:2512.2460
 import os
 import sys
 import json
+import asyncio
 import argparse
 import fnmatch
 from pathlib import Path
@@ -76,7 +78,9 @@ except ImportError:
 # Import rlm_processor sub-functions
 try:
     from rlm_processor import (
-        auto_chunk, filter_relevant_chunks, process_chunk, aggregate_results
+        auto_chunk, filter_relevant_chunks, process_chunk, aprocess_chunk, aggregate_results, map_chunks,
+        build_chunk_prompt, interpret_chunk_result, format_findings, build_aggregation_prompt,
+        plan_budget, estimate_tokens, MAX_AGGREGATION_TOKENS
     )
     RLM_PROCESSOR_AVAILABLE = True
 except ImportError:
@@ -84,11 +88,20 @@ except ImportError:
 
 # Import rlm_query (for API key check and fallback LLM calls)
 try:
-    from rlm_query import llm_query, llm_query_fast, load_api_key
+    from rlm_query import (
+        llm_query, llm_query_fast, load_api_key, add_client_arguments, apply_client_arguments,
+        build_message_params, gather_bounded, DEFAULT_MODEL, FAST_MODEL
+    )
 except ImportError:
     import shutil
     import subprocess
 
+    def add_client_arguments(parser):
+        pass
+
+    def apply_client_arguments(args):
+        pass
+
     def load_api_key():
         api_key = os.environ.get('ANTHROPIC_API_KEY')
         if api_key:
@@ -154,6 +167,32 @@ except ImportError:
     def llm_query_fast(prompt, **kwargs):
         return llm_query(prompt, model="claude-haiku-4-5-20251001", **kwargs)
 
+# Optional Message Batches support (see rlm_batch.py)
+try:
+    from rlm_batch import BatchJob, add_batch_arguments
+    BATCH_AVAILABLE = True
+except ImportError:
+    BATCH_AVAILABLE = False
+
+    def add_batch_arguments(parser, default_job_file):
+        pass
+
+# Optional token/cost/time budgets (see rlm_budget.py)
+try:
+    from rlm_budget import BudgetExceeded, add_budget_arguments, budget_from_args
+    BUDGET_AVAILABLE = True
+except ImportError:
+    BUDGET_AVAILABLE = False
+
+    class BudgetExceeded(Exception):
+        pass
+
+    def add_budget_arguments(parser):
+        pass
+
+    def budget_from_args(args):
+        return None
+
 
 # ============================================================================
 # Constants
@@ -189,6 +228,9 @@ FILE_ORDER_PRIORITY = {
 DEFAULT_MAX_FILE_SIZE = 1_000_000  # 1MB
 DEFAULT_CHUNK_SIZE = 40000
 
+# Per-file error recorded for files not analyzed because the budget ran out
+SKIPPED_BUDGET = 'Skipped: budget exhausted'
+
 
 # ============================================================================
 # Data classes
@@ -430,14 +472,36 @@ def build_combined_content(files: List[FileEntry], manifest: str) -> str:
     return '\n'.join(parts)
 
 
+def chunk_file_context(
+    file_context: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_tokens: Optional[int] = None
+) -> List[str]:
+    """Chunk one file's context, keeping it whole if it fits in one chunk."""
+    if chunk_tokens:
+        fits = estimate_tokens(file_context) <= chunk_tokens
+    else:
+        fits = len(file_context) <= chunk_size
+    if fits:
+        return [file_context]
+    return auto_chunk(file_context, chunk_size, chunk_tokens)[0]
+
+
 def process_combined(
     combined_content: str,
     query: str,
     chunk_size: int = DEFAULT_CHUNK_SIZE,
     fast_model: bool = False,
-    verbose: bool = True
+    verbose: bool = True,
+    stream: bool = False,
+    budget=None,
+    chunk_tokens: Optional[int] = None,
+    workers: int = 1,
+    pack: bool = False,
+    top_k: Optional[int] = None,
+    top_tokens: Optional[int] = None
 ) -> str:
-    """Process combined content through the RLM pipeline."""
+    """Process combined content through the RLM pipeline (map stage shared with rlm_processor)."""
     if not RLM_PROCESSOR_AVAILABLE:
         raise RuntimeError(
             "rlm_processor.py not found. Ensure it's in the same directory as this script."
@@ -448,35 +512,43 @@ def process_combined(
             print(msg, file=sys.stderr)
 
     log(f"[DIR] Combined content: {len(combined_content):,} chars "
-        f"(~{len(combined_content) // 4:,} tokens)")
+        f"(~{estimate_tokens(combined_content):,} tokens)")
 
     # Chunk
-    chunks, strategy = auto_chunk(combined_content, chunk_size)
+    chunks, strategy = auto_chunk(combined_content, chunk_size, chunk_tokens, pack)
     log(f"[DIR] Chunking strategy: {strategy} -> {len(chunks)} chunks")
 
     # Filter
-    if len(chunks) > 3:
-        indexed_chunks = filter_relevant_chunks(chunks, query)
+    if top_k or top_tokens:
+        indexed_chunks = filter_relevant_chunks(chunks, query, top_k=top_k, max_tokens=top_tokens,
+                                                log=log, content=combined_content)
+        log(f"[DIR] Selected: {len(chunks)} -> {len(indexed_chunks)} top-ranked chunks")
+    elif len(chunks) > 3:
+        indexed_chunks = filter_relevant_chunks(chunks, query, content=combined_content)
         log(f"[DIR] Pre-filtered: {len(chunks)} -> {len(indexed_chunks)} chunks")
     else:
         indexed_chunks = [(i, c) for i, c in enumerate(chunks)]
 
+    if budget is not None:
+        fast_model = plan_budget(budget, indexed_chunks, len(chunks), query, fast_model, log)
+
     # Process chunks
-    results = []
-    for i, (orig_idx, chunk) in enumerate(indexed_chunks):
-        log(f"[DIR] Processing chunk {i + 1}/{len(indexed_chunks)}...")
-        result = process_chunk(chunk, orig_idx, len(chunks), query, fast_model)
-        if result:
-            results.append((orig_idx, result))
-            log(f"  {chr(10003)} Found relevant info")
-        else:
-            log(f"  {chr(9675)} No relevant info")
+    results, error_count, skipped = map_chunks(
+        indexed_chunks, len(chunks), query, fast_model, stream, budget, log, workers, "[DIR]"
+    )
+    results.sort(key=lambda r: r[0])
 
     log(f"[DIR] Relevant chunks: {len(results)}/{len(indexed_chunks)}")
+    if error_count:
+        log(f"[DIR] WARNING: {error_count}/{len(indexed_chunks)} chunks failed due to errors")
 
     # Aggregate
     log("[DIR] Aggregating results...")
-    return aggregate_results(results, query, fast_model)
+    final = aggregate_results(results, query, fast_model, budget, workers, log=log)
+    if skipped:
+        final += (f"\n\n[Note: budget exhausted ({budget.stop_reason}); "
+                  f"{skipped} of {len(indexed_chunks)} sections were not analyzed.]")
+    return final
 
 
 def process_per_file(
@@ -485,11 +557,23 @@ def process_per_file(
     manifest: str,
     chunk_size: int = DEFAULT_CHUNK_SIZE,
     fast_model: bool = False,
-    verbose: bool = True
+    verbose: bool = True,
+    stream: bool = False,
+    budget=None,
+    chunk_tokens: Optional[int] = None,
+    concurrency: int = 1
 ) -> Tuple[str, List[Dict]]:
     """
     Process each file independently, then aggregate.
 
+    With concurrency > 1, files are analyzed from one event loop with up to
+    `concurrency` of them in flight (aprocess_chunk through gather_bounded).
+    The chunks of one file are still sent in order, results keep the file
+    order, and `stream` does not apply.
+
+    With a budget, files left when it runs out are recorded with the error
+    'Skipped: budget exhausted' and the answer notes how many were skipped.
+
     Returns (final_answer, per_file_results_list).
     """
     if not RLM_PROCESSOR_AVAILABLE:
@@ -501,65 +585,221 @@ def process_per_file(
         if verbose:
             print(msg, file=sys.stderr)
 
-    per_file_results = []
-    file_answers = []
+    def record(entry: FileEntry, result: Optional[str] = None, error: Optional[str] = None) -> Dict:
+        return {
+            'file': entry.rel_path,
+            'type': entry.file_type,
+            'size': entry.size_bytes,
+            'result': result,
+            'error': error
+        }
 
-    loadable = [f for f in files if f.content is not None]
-    log(f"[DIR] Per-file mode: processing {len(loadable)} files...")
+    def file_chunks(entry: FileEntry) -> List[str]:
+        file_context = f"File: {entry.rel_path} ({entry.file_type}, {format_size(entry.size_bytes)})\n\n{entry.content}"
+        return chunk_file_context(file_context, chunk_size, chunk_tokens)
 
-    for i, entry in enumerate(loadable):
-        log(f"[DIR] [{i + 1}/{len(loadable)}] {entry.rel_path}...")
+    def outcome(result: Optional[str]) -> Tuple[Optional[str], Optional[str], str]:
+        if result:
+            return result, None, f"  {chr(10003)} Got result"
+        return None, 'No relevant info found', f"  {chr(9675)} No relevant info"
 
+    def analyze(entry: FileEntry) -> Tuple[Optional[str], Optional[str], str]:
+        """(result, error, status line) for one file."""
         try:
-            content = entry.content
-            file_context = f"File: {entry.rel_path} ({entry.file_type}, {format_size(entry.size_bytes)})\n\n{content}"
-
-            if len(file_context) <= chunk_size:
+            chunks = file_chunks(entry)
+            if len(chunks) == 1:
                 # Small file: single process_chunk call
-                result = process_chunk(file_context, 0, 1, query, fast_model)
-            else:
-                # Large file: chunk and aggregate
-                chunks, strategy = auto_chunk(file_context, chunk_size)
-                chunk_results = []
-                for ci, chunk in enumerate(chunks):
-                    r = process_chunk(chunk, ci, len(chunks), query, fast_model)
-                    if r:
-                        chunk_results.append((ci, r))
-                result = aggregate_results(chunk_results, query, fast_model) if chunk_results else None
-
-            if result:
-                file_answers.append((entry.rel_path, result))
-                per_file_results.append({
-                    'file': entry.rel_path,
-                    'type': entry.file_type,
-                    'size': entry.size_bytes,
-                    'result': result,
-                    'error': None
-                })
-                log(f"  {chr(10003)} Got result")
-            else:
-                per_file_results.append({
-                    'file': entry.rel_path,
-                    'type': entry.file_type,
-                    'size': entry.size_bytes,
-                    'result': None,
-                    'error': 'No relevant info found'
-                })
-                log(f"  {chr(9675)} No relevant info")
+                return outcome(process_chunk(chunks[0], 0, 1, query, fast_model, stream, budget))
+            # Large file: chunk and aggregate
+            chunk_results = []
+            for ci, chunk in enumerate(chunks):
+                r = process_chunk(chunk, ci, len(chunks), query, fast_model, stream, budget)
+                if r:
+                    chunk_results.append((ci, r))
+            return outcome(aggregate_results(chunk_results, query, fast_model, budget)
+                           if chunk_results else None)
+        except BudgetExceeded as e:
+            return None, SKIPPED_BUDGET, f"  [!] {e}; skipping the remaining files"
+        except Exception as e:
+            return None, str(e), f"  Warning: {e}"
 
+    async def analyze_async(entry: FileEntry) -> Tuple[Optional[str], Optional[str], str]:
+        """Like analyze, with the sub-LLM calls awaited on the running loop."""
+        try:
+            chunks = file_chunks(entry)
+            chunk_results = []
+            for ci, chunk in enumerate(chunks):
+                r = await aprocess_chunk(chunk, ci, len(chunks), query, fast_model, budget)
+                if r:
+                    chunk_results.append((ci, r))
+            if len(chunks) == 1 or not chunk_results:
+                return outcome(chunk_results[0][1] if chunk_results else None)
+            loop = asyncio.get_running_loop()
+            return outcome(await loop.run_in_executor(
+                None, aggregate_results, chunk_results, query, fast_model, budget))
+        except BudgetExceeded as e:
+            return None, SKIPPED_BUDGET, f"  [!] {e}; skipping the remaining files"
         except Exception as e:
-            per_file_results.append({
-                'file': entry.rel_path,
-                'type': entry.file_type,
-                'size': entry.size_bytes,
-                'result': None,
-                'error': str(e)
-            })
-            log(f"  Warning: {e}")
+            return None, str(e), f"  Warning: {e}"
+
+    loadable = [f for f in files if f.content is not None]
+    log(f"[DIR] Per-file mode: processing {len(loadable)} files...")
+
+    def budget_exhausted() -> bool:
+        return budget is not None and budget.stop_reason is not None
+
+    if concurrency > 1:
+        log(f"[DIR] Analyzing up to {concurrency} files at a time")
+        done = 0
+
+        async def run_one(entry: FileEntry) -> Dict:
+            nonlocal done
+            if budget_exhausted():
+                return record(entry, error=SKIPPED_BUDGET)
+            result, error, status = await analyze_async(entry)
+            done += 1
+            log(f"[DIR] [{done}/{len(loadable)}] {entry.rel_path}")
+            log(status)
+            return record(entry, result, error)
+
+        per_file_results = asyncio.run(gather_bounded((run_one(e) for e in loadable), limit=concurrency))
+    else:
+        per_file_results = []
+        for i, entry in enumerate(loadable):
+            if budget_exhausted():
+                per_file_results.append(record(entry, error=SKIPPED_BUDGET))
+                continue
+            log(f"[DIR] [{i + 1}/{len(loadable)}] {entry.rel_path}...")
+            result, error, status = analyze(entry)
+            log(status)
+            per_file_results.append(record(entry, result, error))
+
+    file_answers = [(r['file'], r['result']) for r in per_file_results if r['result']]
+    skipped = sum(1 for r in per_file_results if r['error'] == SKIPPED_BUDGET)
 
     log(f"[DIR] Results from {len(file_answers)}/{len(loadable)} files")
+    if skipped:
+        log(f"[DIR] WARNING: {skipped}/{len(loadable)} files skipped (budget exhausted)")
 
     # Final aggregation across all files
+    if not file_answers:
+        return "No relevant information found in any files for this query.", per_file_results
+
+    log("[DIR] Aggregating cross-file results...")
+    cross_file_results = [(i, f"[File: {path}]\n{result}")
+                          for i, (path, result) in enumerate(file_answers)]
+    final = aggregate_results(cross_file_results, query, fast_model, budget)
+    if skipped:
+        final += (f"\n\n[Note: budget exhausted ({budget.stop_reason}); "
+                  f"{skipped} of {len(loadable)} files were not analyzed.]")
+
+    return final, per_file_results
+
+
+def process_per_file_batch(
+    files: List[FileEntry],
+    query: str,
+    job: 'BatchJob',
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    fast_model: bool = False,
+    verbose: bool = True,
+    chunk_tokens: Optional[int] = None
+) -> Tuple[str, List[Dict]]:
+    """
+    Per-file mode through the Message Batches API.
+
+    Every chunk of every file is submitted as one batch stage, then the
+    per-file merges of multi-chunk files as a second stage. Only the final
+    cross-file aggregation is an interactive call. Progress is kept in the
+    job file, so an interrupted run resumes where it stopped.
+
+    Returns (final_answer, per_file_results_list) like process_per_file.
+    """
+    if not RLM_PROCESSOR_AVAILABLE:
+        raise RuntimeError(
+            "rlm_processor.py not found. Ensure it's in the same directory as this script."
+        )
+
+    def log(msg):
+        if verbose:
+            print(msg, file=sys.stderr)
+
+    model = FAST_MODEL if fast_model else DEFAULT_MODEL
+    loadable = [f for f in files if f.content is not None]
+
+    # Stage 1: every chunk of every file
+    chunk_counts = []
+    chunk_requests = {}
+    for fi, entry in enumerate(loadable):
+        file_context = f"File: {entry.rel_path} ({entry.file_type}, {format_size(entry.size_bytes)})\n\n{entry.content}"
+        chunks = chunk_file_context(file_context, chunk_size, chunk_tokens)
+        chunk_counts.append(len(chunks))
+        for ci, chunk in enumerate(chunks):
+            static_prefix, chunk_message = build_chunk_prompt(chunk, ci, len(chunks), query)
+            chunk_requests[f"f{fi}-c{ci}"] = build_message_params(
+                chunk_message, model=model, max_tokens=2048,
+                system=static_prefix, cache_system=True
+            )
+
+    log(f"[DIR] Batch mode: {len(chunk_requests)} chunk requests from {len(loadable)} files")
+    chunk_texts = job.run_stage('chunks', chunk_requests)
+    chunk_errors = job.errors('chunks')
+
+    # Stage 2: merge the findings of files that were split into several chunks
+    file_findings = []
+    merge_requests = {}
+    oversized = set()
+    for fi, count in enumerate(chunk_counts):
+        findings, errors = [], []
+        for ci in range(count):
+            text = chunk_texts[f"f{fi}-c{ci}"]
+            if text is None:
+                errors.append(chunk_errors.get(f"f{fi}-c{ci}", "request failed"))
+            elif interpret_chunk_result(text):
+                findings.append((ci, interpret_chunk_result(text)))
+        file_findings.append((findings, errors))
+        if count > 1 and findings:
+            combined = format_findings(findings)
+            if estimate_tokens(combined) > MAX_AGGREGATION_TOKENS:
+                oversized.add(fi)
+            else:
+                merge_requests[f"f{fi}"] = build_message_params(
+                    build_aggregation_prompt(combined, query), model=model, max_tokens=4096
+                )
+
+    merge_texts = job.run_stage('files', merge_requests) if merge_requests else {}
+    merge_errors = job.errors('files')
+
+    per_file_results = []
+    file_answers = []
+    for fi, entry in enumerate(loadable):
+        findings, errors = file_findings[fi]
+        result, error = None, None
+        if chunk_counts[fi] == 1:
+            result = findings[0][1] if findings else None
+        elif fi in oversized:
+            # Too many findings for one merge prompt: aggregate interactively
+            result = aggregate_results(findings, query, fast_model)
+        elif findings:
+            result = merge_texts.get(f"f{fi}")
+            if result is None:
+                error = f"Batch request failed: {merge_errors.get(f'f{fi}', 'unknown error')}"
+
+        if result:
+            file_answers.append((entry.rel_path, result))
+        elif error is None:
+            error = f"Batch request failed: {errors[0]}" if errors else 'No relevant info found'
+
+        per_file_results.append({
+            'file': entry.rel_path,
+            'type': entry.file_type,
+            'size': entry.size_bytes,
+            'result': result or None,
+            'error': None if result else error
+        })
+
+    log(f"[DIR] Results from {len(file_answers)}/{len(loadable)} files")
+
     if not file_answers:
         return "No relevant information found in any files for this query.", per_file_results
 
@@ -585,7 +825,16 @@ def process_directory(
     fast_model: bool = False,
     max_file_size: int = DEFAULT_MAX_FILE_SIZE,
     recursive: bool = True,
-    verbose: bool = True
+    verbose: bool = True,
+    batch_job: Optional['BatchJob'] = None,
+    stream: bool = False,
+    budget=None,
+    chunk_tokens: Optional[int] = None,
+    workers: int = 1,
+    pack: bool = False,
+    top_k: Optional[int] = None,
+    top_tokens: Optional[int] = None,
+    concurrency: int = 1
 ) -> str:
     """
     Process a directory through the RLM pipeline.
@@ -601,6 +850,16 @@ def process_directory(
         max_file_size: Skip files larger than this (bytes)
         recursive: Recurse into subdirectories
         verbose: Print progress to stderr
+        batch_job: Run per-file sub-calls through this Message Batches job
+        stream: Stream chunk responses and stop at NO_RELEVANT_INFO
+        budget: Optional rlm_budget.BudgetGovernor (not applied to batch runs)
+        chunk_tokens: Target chunk size in estimated tokens (overrides chunk_size)
+        workers: Chunks to process concurrently in combined mode
+        pack: Merge small sections into full-size chunks in combined mode
+        top_k: In combined mode, analyze only the top_k chunks ranked by BM25
+        top_tokens: In combined mode, analyze the best-ranked chunks up to
+            this many estimated tokens
+        concurrency: Files to analyze at once in per-file mode
 
     Returns:
         Final aggregated answer string
@@ -653,12 +912,19 @@ def process_directory(
     mode = "per-file" if per_file else "combined"
     log(f"[DIR] Processing in {mode} mode...")
 
-    if per_file:
-        final, _ = process_per_file(files, query, manifest, chunk_size, fast_model, verbose)
+    if per_file and batch_job is not None:
+        final, _ = process_per_file_batch(files, query, batch_job, chunk_size, fast_model, verbose,
+                                          chunk_tokens)
+    elif per_file:
+        final, _ = process_per_file(files, query, manifest, chunk_size, fast_model, verbose,
+                                    stream, budget, chunk_tokens, concurrency)
     else:
         combined = build_combined_content(files, manifest)
-        final = process_combined(combined, query, chunk_size, fast_model, verbose)
+        final = process_combined(combined, query, chunk_size, fast_model, verbose, stream, budget,
+                                 chunk_tokens, workers, pack, top_k, top_tokens)
 
+    if budget is not None:
+        log(f"[DIR] {budget.summary()}")
     log("[DIR] Processing complete!")
     return final
 
@@ -688,6 +954,15 @@ Examples:
     # Non-recursive with JSON results
     python directory_processor.py ./configs "Check for issues" --no-recursive --json results.json
 
+    # Per-file analysis with 16 requests in flight
+    python directory_processor.py ./src "Find bugs" --per-file --concurrency 16
+
+    # Overnight run through the Message Batches API (rerun the same command to resume)
+    python directory_processor.py ./monorepo "Find bugs" --per-file --batch --job-file bugs.json
+
+    # Cap the run at 2M input tokens and 10 minutes
+    python directory_processor.py ./src "Find bugs" --per-file --max-input-tokens 2000000 --max-time 600
+
 Reference: Zhang, Kraska, Khattab - "Recursive Language Models" (arXiv:2512.24601)
         """
     )
@@ -702,19 +977,49 @@ Reference: Zhang, Kraska, Khattab - "Recursive Language Models" (arXiv:2512.2460
                         help='Process each file independently (default: combined)')
     parser.add_argument('--chunk-size', '-c', type=int, default=DEFAULT_CHUNK_SIZE,
                         help=f'Target chunk size in characters (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--chunk-tokens', '-t', type=int, default=None,
+                        help='Target chunk size in estimated tokens (overrides --chunk-size)')
     parser.add_argument('--fast', '-f', action='store_true',
                         help='Use faster/cheaper model for chunk processing')
     parser.add_argument('--max-file-size', type=int, default=DEFAULT_MAX_FILE_SIZE,
                         help=f'Skip files larger than N bytes (default: {DEFAULT_MAX_FILE_SIZE})')
     parser.add_argument('--no-recursive', action='store_true',
                         help='Do not recurse into subdirectories')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream chunk responses and stop reading at NO_RELEVANT_INFO')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Process this many chunks concurrently in combined mode (default: 1)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Per-file mode: analyze this many files at once from one event loop '
+                             '(default: 1; --stream is not used)')
+    parser.add_argument('--pack', action='store_true',
+                        help='Merge small sections into full-size chunks in combined mode')
+    parser.add_argument('--top-k', '-k', type=int, default=None,
+                        help='Combined mode: rank chunks with BM25 and analyze only the best K')
+    parser.add_argument('--top-tokens', type=int, default=None,
+                        help='Combined mode: analyze the best-ranked chunks up to N estimated tokens')
     parser.add_argument('--quiet', '-q', action='store_true',
                         help='Suppress progress output')
     parser.add_argument('--output', '-o', help='Write final result to file')
     parser.add_argument('--json', type=str, default='',
                         help='Save per-file results as JSON (per-file mode only)')
+    add_client_arguments(parser)
+    add_batch_arguments(parser, default_job_file='directory_batch.json')
+    add_budget_arguments(parser)
 
     args = parser.parse_args()
+    apply_client_arguments(args)
+    budget = budget_from_args(args)
+
+    batch_job = None
+    if getattr(args, 'batch', False):
+        if not args.per_file:
+            print("Error: --batch requires --per-file", file=sys.stderr)
+            sys.exit(1)
+        batch_job = BatchJob(args.job_file, args.poll_interval, verbose=not args.quiet)
+        if budget is not None:
+            print("Warning: budget limits are not enforced for --batch runs", file=sys.stderr)
+            budget = None
 
     # Validate directory
     if not Path(args.directory).is_dir():
@@ -755,10 +1060,17 @@ Reference: Zhang, Kraska, Khattab - "Recursive Language Models" (arXiv:2512.2460
             total_size = load_file_contents(files, verbose)
             manifest = generate_manifest(args.directory, files, total_size)
 
-            final, per_file_results = process_per_file(
-                files, args.query, manifest,
-                args.chunk_size, args.fast, verbose
-            )
+            if batch_job is not None:
+                final, per_file_results = process_per_file_batch(
+                    files, args.query, batch_job,
+                    args.chunk_size, args.fast, verbose, args.chunk_tokens
+                )
+            else:
+                final, per_file_results = process_per_file(
+                    files, args.query, manifest,
+                    args.chunk_size, args.fast, verbose, args.stream, budget, args.chunk_tokens,
+                    args.concurrency
+                )
 
             # Write JSON results
             with open(args.json, 'w', encoding='utf-8') as f:
@@ -777,6 +1089,15 @@ Reference: Zhang, Kraska, Khattab - "Recursive Language Models" (arXiv:2512.2460
                 max_file_size=args.max_file_size,
                 recursive=not args.no_recursive,
                 verbose=not args.quiet,
+                batch_job=batch_job,
+                stream=args.stream,
+                budget=budget,
+                chunk_tokens=args.chunk_tokens,
+                workers=args.workers,
+                pack=args.pack,
+                top_k=args.top_k,
+                top_tokens=args.top_tokens,
+                concurrency=args.concurrency,
             )
 
         # Output
@@ -784,6 +1105,8 @@ Reference: Zhang, Kraska, Khattab - "Recursive Language Models" (arXiv:2512.2460
         print("FINAL ANSWER")
         print("=" * 60)
         print(final)
+        if budget is not None:
+            print("\n" + budget.summary())
 
         if args.output:
             with open(args.output, 'w', encoding='utf-8') as f:
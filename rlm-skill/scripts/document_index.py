@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+document_index.py - Persistent chunk table and inverted index per document.
+
+Asking a second question about the same file used to repeat everything
+before the first sub-LLM call: converting it, chunking it and scanning every
+chunk for keywords. An index built once stores the chunks (each compressed
+on its own) and an inverted index from terms to the chunks containing them.
+Later runs memory-map the index, look up the query terms and decompress only
+the chunks that are selected.
+
+Indexes live in ~/.claude/rlm_index, one file per document and chunking
+settings, named by a hash of the source file's bytes. Editing the file (or
+changing the settings) simply leads to a new index.
+
+Terms are the words of chunk_ranking.tokenize. A keyword matches every term
+it is a prefix of, so 'budget' also finds 'budgeting'. The TF-IDF vectors
+used by --similarity are built the first time they are needed and saved
+next to the index file.
+
+Usage:
+    python document_index.py build corpus.txt                  # build (or reuse) an index
+    python document_index.py query corpus.txt "retry policy" -k 5
+    python document_index.py stats
+    python document_index.py clear
+"""
+
+import os
+import sys
+import json
+import mmap
+import zlib
+import struct
+import hashlib
+import argparse
+import tempfile
+from array import array
+from collections import Counter, abc
+from itertools import accumulate
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from chunk_ranking import BM25Index, tokenize
+
+MAGIC = b'RLMIDX01'
+FORMAT_VERSION = 1
+INDEX_SUFFIX = '.rlmidx'
+# Saved chunk_similarity.TfidfIndex, named after its index file
+TFIDF_SUFFIX = '.tfidf.npz'
+HASH_BLOCK_BYTES = 1 << 20
+
+# Per chunk: offset and length of its compressed text, term count, estimated tokens
+_CHUNK_FIELDS = 4
+
+
+def default_index_dir() -> Path:
+    """Default index location (~/.claude/rlm_index)."""
+    from rlm_query import get_claude_config_dir
+    return get_claude_config_dir() / 'rlm_index'
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_path(source_hash: str, params: dict, index_dir: Optional[str] = None) -> Path:
+    """Where the index for this content and these chunking settings is stored."""
+    settings = hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+    return Path(index_dir or default_index_dir()) / f"{source_hash[:32]}-{settings[:12]}{INDEX_SUFFIX}"
+
+
+def _pad(out, size: int) -> int:
+    """Pad the file to a multiple of 8 bytes so arrays can be viewed in place."""
+    padding = -size % 8
+    out.write(b'\0' * padding)
+    return size + padding
+
+
+def write_index(path: Path, chunks: Sequence[str], strategy: str, source_hash: str,
+                params: dict, estimate_tokens: Callable[[str], int] = lambda text: len(text) // 4):
+    """
+    Build the index for `chunks` and write it to `path` atomically.
+
+    File layout: MAGIC, header length (8 bytes), JSON header, then the
+    sections listed in the header, each 8-byte aligned:
+    chunk_table (uint64 x 4 per chunk), chunk_blob (zlib text per chunk),
+    term_offsets / term_blob (sorted UTF-8 terms), postings_offsets /
+    postings_blob (per term: zlib of uint32 chunk-id deltas, then counts).
+    """
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    table = array('Q')
+    blobs = []
+    offset = 0
+    for i, chunk in enumerate(chunks):
+        text = str(chunk)
+        terms = tokenize(text)
+        for term, count in Counter(terms).items():
+            postings.setdefault(term, []).append((i, count))
+        blob = zlib.compress(text.encode('utf-8'), 6)
+        blobs.append(blob)
+        table.extend((offset, len(blob), len(terms), estimate_tokens(text)))
+        offset += len(blob)
+
+    encoded_terms = sorted(term.encode('utf-8') for term in postings)
+    term_offsets = array('Q', [0])
+    postings_offsets = array('Q', [0])
+    posting_blobs = []
+    for term in encoded_terms:
+        term_offsets.append(term_offsets[-1] + len(term))
+        entries = postings[term.decode('utf-8')]
+        ids = [i for i, _ in entries]
+        deltas = array('I', [ids[0]] + [b - a for a, b in zip(ids, ids[1:])])
+        counts = array('I', [count for _, count in entries])
+        blob = zlib.compress(deltas.tobytes() + counts.tobytes(), 6)
+        posting_blobs.append(blob)
+        postings_offsets.append(postings_offsets[-1] + len(blob))
+
+    sections = [
+        ('chunk_table', [table.tobytes()]),
+        ('chunk_blob', blobs),
+        ('term_offsets', [term_offsets.tobytes()]),
+        ('term_blob', encoded_terms),
+        ('postings_offsets', [postings_offsets.tobytes()]),
+        ('postings_blob', posting_blobs),
+    ]
+    header = {
+        'version': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'source_hash': source_hash,
+        'params': params,
+        'strategy': strategy,
+        'chunks': len(table) // _CHUNK_FIELDS,
+        'terms': len(encoded_terms),
+        'sections': {},
+    }
+    # Section offsets depend on the header's own length: lay out until it fits
+    sizes = {name: sum(len(p) for p in parts) for name, parts in sections}
+    header_len = 0
+    while True:
+        position = len(MAGIC) + 8 + header_len
+        position += -position % 8
+        for name, _ in sections:
+            header['sections'][name] = [position, sizes[name]]
+            position += sizes[name] + (-sizes[name] % 8)
+        header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+        if len(header_bytes) <= header_len:
+            header_bytes = header_bytes.ljust(header_len)
+            break
+        header_len = len(header_bytes) + 16
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(MAGIC)
+            out.write(struct.pack('<Q', len(header_bytes)))
+            out.write(header_bytes)
+            _pad(out, len(MAGIC) + 8 + len(header_bytes))
+            for name, parts in sections:
+                for part in parts:
+                    out.write(part)
+                _pad(out, sizes[name])
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class IndexedChunks(abc.Sequence):
+    """The chunks of a DocumentIndex, decompressed when accessed."""
+
+    def __init__(self, index: 'DocumentIndex'):
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._index.chunk_text(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._index.chunk_text(i)
+
+
+class DocumentIndex:
+    """
+    A memory-mapped index file. Use as a context manager (or call close());
+    chunks cannot be read after that.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Empty index file: {path}")
+        try:
+            if self._map[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Not an RLM index: {path}")
+            header_len = struct.unpack('<Q', self._map[len(MAGIC):len(MAGIC) + 8])[0]
+            start = len(MAGIC) + 8
+            self.header = json.loads(self._map[start:start + header_len].decode('utf-8'))
+            if self.header.get('version') != FORMAT_VERSION or self.header.get('byteorder') != sys.byteorder:
+                raise ValueError(f"Index was written by another version or platform: {path}")
+        except Exception:
+            self._map.close()
+            self._file.close()
+            raise
+        self._views = []
+        self._table = self._array('chunk_table', 'Q')
+        self._term_offsets = self._array('term_offsets', 'Q')
+        self._postings_offsets = self._array('postings_offsets', 'Q')
+        self._cache: Dict[str, Dict[int, int]] = {}
+        self._tfidf = None
+        self.chunks = IndexedChunks(self)
+        lengths = self._table[2::_CHUNK_FIELDS]
+        self.avg_length = sum(lengths) / len(lengths) if len(lengths) else 0.0
+
+    def _section(self, name: str) -> Tuple[int, int]:
+        return tuple(self.header['sections'][name])
+
+    def _array(self, name: str, fmt: str) -> memoryview:
+        offset, size = self._section(name)
+        view = memoryview(self._map)[offset:offset + size].cast(fmt)
+        self._views.append(view)
+        return view
+
+    def __len__(self) -> int:
+        return self.header['chunks']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._map.close()
+        self._file.close()
+
+    @property
+    def strategy(self) -> str:
+        return self.header['strategy']
+
+    @property
+    def source_hash(self) -> str:
+        return self.header['source_hash']
+
+    def chunk_text(self, i: int) -> str:
+        """Decompress chunk i."""
+        base = self._section('chunk_blob')[0]
+        offset, size = self._table[i * _CHUNK_FIELDS], self._table[i * _CHUNK_FIELDS + 1]
+        return zlib.decompress(self._map[base + offset:base + offset + size]).decode('utf-8')
+
+    def chunk_tokens(self, i: int) -> int:
+        """Estimated tokens of chunk i (stored at build time)."""
+        return self._table[i * _CHUNK_FIELDS + 3]
+
+    def chunk_length(self, i: int) -> int:
+        """Number of terms in chunk i."""
+        return self._table[i * _CHUNK_FIELDS + 2]
+
+    def _term(self, t: int) -> bytes:
+        base = self._section('term_blob')[0]
+        return self._map[base + self._term_offsets[t]:base + self._term_offsets[t + 1]]
+
+    def _postings(self, t: int) -> Dict[int, int]:
+        base = self._section('postings_blob')[0]
+        raw = zlib.decompress(self._map[base + self._postings_offsets[t]:
+                                        base + self._postings_offsets[t + 1]])
+        values = memoryview(raw).cast('I')
+        half = len(values) // 2
+        return dict(zip(accumulate(values[:half]), values[half:]))
+
+    def term_counts(self, prefix: str) -> Dict[int, int]:
+        """chunk index -> occurrences of terms starting with prefix."""
+        if prefix in self._cache:
+            return self._cache[prefix]
+        key = prefix.encode('utf-8')
+        lo, hi = 0, self.header['terms']
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        counts: Dict[int, int] = {}
+        while lo < self.header['terms'] and self._term(lo).startswith(key):
+            for i, count in self._postings(lo).items():
+                counts[i] = counts.get(i, 0) + count
+            lo += 1
+        self._cache[prefix] = counts
+        return counts
+
+    def keyword_counts(self, keywords: Iterable[str]) -> List[Dict[str, int]]:
+        """
+        Per chunk, occurrences of each keyword (like keyword_scanner hit
+        counts). A keyword of several words counts its rarest word, in
+        chunks that contain all of them.
+        """
+        found: List[Dict[str, int]] = [{} for _ in range(len(self))]
+        for keyword in keywords:
+            parts = [self.term_counts(term) for term in tokenize(keyword)]
+            if not parts:
+                continue
+            for i in set(parts[0]).intersection(*parts[1:]):
+                found[i][keyword.lower()] = min(p[i] for p in parts)
+        return found
+
+    def rank(self, keywords: Iterable[str]) -> List[Tuple[int, float]]:
+        """BM25 ranking of the chunks for the keywords, best first."""
+        keywords = [kw.lower() for kw in keywords]
+        counts = self.keyword_counts(keywords)
+        lengths = [self.chunk_length(i) for i in range(len(self))]
+        return BM25Index.from_counts(counts, lengths).rank(keywords)
+
+    @property
+    def tfidf_path(self) -> Path:
+        return self.path.with_name(self.path.name + TFIDF_SUFFIX)
+
+    def tfidf(self, log=lambda msg: None):
+        """
+        TF-IDF vectors of the chunks (chunk_similarity.TfidfIndex), loaded
+        from tfidf_path. The first call builds and saves them, decompressing
+        every chunk once; without numpy they cannot be saved, so every run
+        decompresses all chunks.
+        """
+        if self._tfidf is not None:
+            return self._tfidf
+        import chunk_similarity
+        from chunk_similarity import TfidfIndex
+        if not chunk_similarity.NUMPY_AVAILABLE:
+            log(f"[RLM] numpy not installed: decompressing all {len(self)} chunks for TF-IDF vectors")
+            self._tfidf = TfidfIndex(self.chunks)
+            return self._tfidf
+        if self.tfidf_path.exists():
+            settings = (len(self), chunk_similarity.DEFAULT_FEATURES,
+                        chunk_similarity.DEFAULT_NGRAMS, chunk_similarity.DEFAULT_CHAR_NGRAMS)
+            try:
+                saved = TfidfIndex.load(str(self.tfidf_path))
+                if (len(saved), saved.n_features, saved.ngrams, saved.char_ngrams) == settings:
+                    self._tfidf = saved
+                    return saved
+                log(f"[RLM] Rebuilding TF-IDF vectors {self.tfidf_path.name} for new settings")
+            except (OSError, ValueError) as e:
+                log(f"[RLM] Rebuilding unreadable TF-IDF vectors {self.tfidf_path.name}: {e}")
+        log(f"[RLM] Building TF-IDF vectors for {self.path.name} (decompresses all {len(self)} chunks once)")
+        self._tfidf = TfidfIndex(self.chunks)
+        try:
+            self._tfidf.save(str(self.tfidf_path))
+        except OSError as e:
+            log(f"[RLM] Could not save TF-IDF vectors: {e}")
+        return self._tfidf
+
+
+def open_or_build(
+    source_file: str,
+    params: dict,
+    build: Callable[[], Tuple[Sequence[str], str]],
+    index_dir: Optional[str] = None,
+    estimate_tokens: Callable[[str], int] = lambda text: len(text) // 4,
+    log=lambda msg: None
+) -> DocumentIndex:
+    """
+    Open the index of source_file for these chunking params, building it
+    with build() -> (chunks, strategy) if there is none yet.
+    """
+    source_hash = file_hash(source_file)
+    path = index_path(source_hash, params, index_dir)
+    if path.exists():
+        try:
+            index = DocumentIndex(str(path))
+            log(f"[RLM] Using index {path.name} ({len(index)} chunks)")
+            return index
+        except (OSError, ValueError) as e:
+            log(f"[RLM] Rebuilding unreadable index {path.name}: {e}")
+    chunks, strategy = build()
+    write_index(path, chunks, strategy, source_hash, params, estimate_tokens)
+    log(f"[RLM] Built index {path.name} ({len(chunks)} chunks)")
+    return DocumentIndex(str(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build, query or clear persistent document indexes')
+    parser.add_argument('command', choices=['build', 'query', 'stats', 'clear'])
+    parser.add_argument('file', nargs='?', help='Document to index or query')
+    parser.add_argument('query', nargs='?', help='Query (for the query command)')
+    parser.add_argument('--chunk-size', '-c', type=int, default=40000,
+                        help='Target chunk size in characters (default: 40000)')
+    parser.add_argument('--chunk-tokens', '-t', type=int, default=None,
+                        help='Target chunk size in estimated tokens (overrides --chunk-size)')
+    parser.add_argument('--pack', action='store_true', help='Index packed chunks (see rlm_processor --pack)')
+    parser.add_argument('--top-k', '-k', type=int, default=10, help='Chunks to list for query (default: 10)')
+    parser.add_argument('--index-dir', help='Index directory (default: ~/.claude/rlm_index)')
+    args = parser.parse_args()
+
+    index_dir = Path(args.index_dir) if args.index_dir else default_index_dir()
+    if args.command == 'stats':
+        files = sorted(index_dir.glob(f'*{INDEX_SUFFIX}')) if index_dir.exists() else []
+        vectors = sorted(index_dir.glob(f'*{INDEX_SUFFIX}{TFIDF_SUFFIX}')) if index_dir.exists() else []
+        print(f"Indexes: {index_dir}")
+        print(f"  Files: {len(files)} (+{len(vectors)} TF-IDF vector files)")
+        print(f"  Size: {sum(f.stat().st_size for f in files + vectors) / 1024 / 1024:.1f} MB")
+        return
+    if args.command == 'clear':
+        files = list(index_dir.glob(f'*{INDEX_SUFFIX}')) if index_dir.exists() else []
+        for f in files + list(index_dir.glob(f'*{INDEX_SUFFIX}{TFIDF_SUFFIX}')):
+            f.unlink()
+        print(f"Removed {len(files)} indexes from {index_dir}")
+        return
+    if not args.file or (args.command == 'query' and not args.query):
+        parser.error(f"{args.command} needs a file" + (" and a query" if args.command == 'query' else ""))
+
+    from rlm_processor import index_document, query_keywords
+    try:
+        index = index_document(args.file, args.chunk_size, args.chunk_tokens, args.pack,
+                               str(index_dir), log=lambda msg: print(msg, file=sys.stderr))
+    except (OSError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    with index:
+        if args.command == 'build':
+            print(f"{index.path}: {len(index)} chunks ({index.strategy}), {index.header['terms']:,} terms")
+            return
+        keywords = query_keywords(args.query)
+        ranked = index.rank(keywords)
+        print(f"{len(ranked)} of {len(index)} chunks match {', '.join(keywords) or '(no keywords)'}")
+        for i, score in ranked[:args.top_k]:
+            preview = ' '.join(index.chunk_text(i).split())[:70]
+            print(f"  #{i + 1:<5} {score:7.2f}  {preview}")
+
+
+if __name__ == "__main__":
+    main()
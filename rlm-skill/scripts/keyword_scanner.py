@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+keyword_scanner.py - Find many keywords in one pass and count hits per chunk.
+
+The keyword pre-filter used to run a case-insensitive regex search over each
+chunk and learn only whether anything matched. KeywordScanner finds every
+occurrence of every keyword in one pass over the text, and scan_chunks
+assigns the hits to chunks, giving each chunk its hit positions per keyword.
+The counts feed BM25 ranking (chunk_ranking.BM25Index.from_counts) and the
+positions let matched spans be highlighted without searching again.
+
+With pyahocorasick installed (pip install pyahocorasick) ASCII text is
+scanned with an Aho-Corasick automaton, whose cost does not grow with the
+number of keywords; otherwise a single alternation regex is used. Both
+report the same matches: leftmost-longest and non-overlapping, ignoring case.
+
+Usage:
+    python keyword_scanner.py document.txt timeout retry backoff
+"""
+
+import re
+import sys
+import argparse
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# keyword -> start offsets of its matches in one chunk
+ChunkHits = Dict[str, List[int]]
+
+
+class KeywordScanner:
+    """Case-insensitive matcher for a set of keywords."""
+
+    def __init__(self, keywords: Iterable[str]):
+        # Longest first, so the regex prefers the longest keyword at a position
+        self.keywords = sorted({kw.lower() for kw in keywords if kw}, key=lambda kw: (-len(kw), kw))
+        self._pattern = (re.compile('|'.join(re.escape(kw) for kw in self.keywords), re.IGNORECASE)
+                         if self.keywords else None)
+        self._keyword_set = frozenset(self.keywords)
+        self._automaton = None
+        if AHOCORASICK_AVAILABLE and self.keywords and all(kw.isascii() for kw in self.keywords):
+            self._automaton = ahocorasick.Automaton()
+            for kw in self.keywords:
+                self._automaton.add_word(kw, kw)
+            self._automaton.make_automaton()
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str]]:
+        """(start, keyword) for each match in text, in order."""
+        if not self.keywords:
+            return
+        # Lowercasing non-ASCII text can change its length, which would shift offsets
+        if self._automaton is not None and text.isascii():
+            # iter_long skips shorter matches inside a longer keyword's failed
+            # partial match, so take all matches and pick leftmost-longest here
+            found = sorted((end - len(kw) + 1, -len(kw), kw)
+                           for end, kw in self._automaton.iter(text.lower()))
+            last_end = 0
+            for start, negative_length, kw in found:
+                if start >= last_end:
+                    last_end = start - negative_length
+                    yield start, kw
+        else:
+            for match in self._pattern.finditer(text):
+                kw = match.group().lower()
+                yield match.start(), kw if kw in self._keyword_set else self._keyword_of(match.group())
+
+    def _keyword_of(self, matched: str) -> str:
+        # IGNORECASE also matches text that .lower() does not turn into the
+        # keyword (e.g. 'ſ' for 's'). The first keyword, in the pattern's
+        # order, that matches the text is the alternative the regex took.
+        return next(kw for kw in self.keywords
+                    if re.fullmatch(re.escape(kw), matched, re.IGNORECASE))
+
+    def hits(self, text: str) -> ChunkHits:
+        """Start offsets of each keyword's matches in text."""
+        found: ChunkHits = {}
+        for start, kw in self.finditer(text):
+            found.setdefault(kw, []).append(start)
+        return found
+
+
+def locate_chunks(content: str, chunks: Sequence) -> Optional[List[Tuple[int, int]]]:
+    """
+    (start, end) of each chunk within content, or None if a chunk is not a
+    substring of it (e.g. packed chunks, whose parts are rejoined).
+    """
+    spans = []
+    pos = 0
+    for chunk in chunks:
+        if not isinstance(chunk, str):
+            return None
+        start = content.find(chunk, pos)
+        if start < 0:
+            return None
+        spans.append((start, start + len(chunk)))
+        pos = start + 1
+    return spans
+
+
+def scan_chunks(scanner: KeywordScanner, chunks: Sequence,
+                content: Optional[str] = None) -> List[ChunkHits]:
+    """
+    Keyword hits for each chunk, with offsets relative to the chunk.
+
+    If `content` is the text the chunks were cut from, it is scanned once
+    and each hit goes to the chunks containing it (both, where chunks
+    overlap); a match straddling a chunk boundary counts for neither.
+    Otherwise each chunk is scanned on its own.
+    """
+    spans = locate_chunks(content, chunks) if content is not None and scanner else None
+    if spans is None:
+        return [scanner.hits(str(chunk)) for chunk in chunks]
+
+    starts = [start for start, _ in spans]
+    found: List[ChunkHits] = [{} for _ in chunks]
+    for pos, kw in scanner.finditer(content):
+        end = pos + len(kw)
+        i = bisect_right(starts, pos) - 1
+        # Walk back over every chunk that still overlaps the match
+        while i >= 0 and spans[i][1] > pos:
+            if end <= spans[i][1]:
+                found[i].setdefault(kw, []).append(pos - spans[i][0])
+            i -= 1
+    for hits in found:
+        for positions in hits.values():
+            positions.sort()
+    return found
+
+
+def hit_counts(hits: ChunkHits) -> Dict[str, int]:
+    """Number of matches per keyword."""
+    return {kw: len(positions) for kw, positions in hits.items()}
+
+
+def highlight(text: str, hits: ChunkHits, before: str = '**', after: str = '**') -> str:
+    """Wrap each matched span of text in before/after markers."""
+    spans = sorted((pos, pos + len(kw)) for kw, positions in hits.items() for pos in positions)
+    parts = []
+    last = 0
+    for start, end in spans:
+        parts.append(text[last:start])
+        parts.append(f"{before}{text[start:end]}{after}")
+        last = end
+    parts.append(text[last:])
+    return ''.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count keyword hits per chunk of a file')
+    parser.add_argument('file', help='Text file to scan')
+    parser.add_argument('keywords', nargs='+', help='Keywords to find (case-insensitive)')
+    parser.add_argument('--chunk-size', '-c', type=int, default=40000,
+                        help='Target chunk size in characters (default: 40000)')
+    parser.add_argument('--show', type=int, default=3, metavar='N',
+                        help='Highlighted lines to print per chunk (default: 3)')
+    args = parser.parse_args()
+
+    from rlm_processor import auto_chunk
+
+    try:
+        with open(args.file, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    scanner = KeywordScanner(args.keywords)
+    chunks, strategy = auto_chunk(content, args.chunk_size)
+    backend = 'aho-corasick' if scanner._automaton is not None else 'regex'
+    print(f"{len(chunks)} chunks ({strategy}), {backend} scan")
+    for i, hits in enumerate(scan_chunks(scanner, chunks, content)):
+        if not hits:
+            continue
+        counts = ', '.join(f"{kw} x{n}" for kw, n in sorted(hit_counts(hits).items()))
+        print(f"\n#{i + 1}: {counts}")
+        lines = [line for line in highlight(chunks[i], hits, '\u00bb', '\u00ab').split('\n')
+                 if '\u00bb' in line]
+        for line in lines[:args.show]:
+            print(f"    {line.strip()[:120]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,651 @@
+#!/usr/bin/env python3
+"""
+mock_server.py - Local stand-in for the Anthropic Messages API.
+
+Serves the endpoints the RLM scripts use, so pipelines can run offline:
+    POST /v1/messages                        - single message (JSON or SSE stream)
+    POST /v1/messages/count_tokens           - token count (chars/4)
+    POST /v1/messages/batches                - create a message batch
+    GET  /v1/messages/batches/<id>           - batch status
+    GET  /v1/messages/batches/<id>/results   - batch results (JSONL)
+
+Responses are generated locally and deterministically; no API key is checked
+beyond requiring the x-api-key header to be present.
+
+For benchmarking and regression runs, the server can also:
+    - delay each message by a latency distribution (--latency lognormal:0.8,0.5)
+    - inject API errors at given rates (--error-rate 529=0.05 --error-rate 429=0.02)
+    - record real API responses to a cassette file and replay them later
+      (--cassette run.json --record, then --cassette run.json)
+
+Usage:
+    python mock_server.py --port 8765
+    python rlm_processor.py doc.txt "Summarize" --base-url http://127.0.0.1:8765
+
+    # Record once against the real API, then replay offline
+    python mock_server.py --cassette docs.json --record
+    python mock_server.py --cassette docs.json --strict --latency recorded
+
+Programmatic usage:
+    with MockAnthropicServer(latency='lognormal:0.5,0.4', seed=1) as server:
+        rlm_query.set_base_url(server.url)
+        ...
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import itertools
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+DEFAULT_UPSTREAM = 'https://api.anthropic.com'
+ANTHROPIC_VERSION = "2023-06-01"
+CASSETTE_VERSION = 1
+
+# Error type the real API reports for each status code
+ERROR_TYPES = {
+    400: 'invalid_request_error',
+    401: 'authentication_error',
+    403: 'permission_error',
+    404: 'not_found_error',
+    413: 'request_too_large',
+    429: 'rate_limit_error',
+    500: 'api_error',
+    529: 'overloaded_error',
+}
+
+
+class MockAPIError(Exception):
+    """An error response the mock server should return to the client."""
+
+    def __init__(self, status: int, error_type: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+
+
+def parse_latency(spec: Optional[str]) -> Optional[Callable[[random.Random], float]]:
+    """
+    Parse a latency distribution spec into a sampler (seconds, never negative).
+
+    Specs:
+        fixed:S                 always S seconds
+        uniform:LO,HI           uniform between LO and HI
+        normal:MEAN,SD          normal distribution
+        lognormal:MEDIAN,SIGMA  lognormal (long right tail, like real APIs)
+        exponential:MEAN        exponential distribution
+        recorded                replay the latency stored in the cassette
+
+    Returns None for an empty spec or "recorded" (handled by the server).
+
+    Raises:
+        ValueError: If the spec is malformed
+    """
+    if not spec or spec == 'recorded':
+        return None
+    name, _, args = spec.partition(':')
+    try:
+        params = [float(x) for x in args.split(',')] if args else []
+    except ValueError:
+        raise ValueError(f"Invalid latency parameters: {spec!r}")
+
+    samplers = {
+        'fixed': (1, lambda rng, s: s),
+        'uniform': (2, lambda rng, lo, hi: rng.uniform(lo, hi)),
+        'normal': (2, lambda rng, mean, sd: rng.gauss(mean, sd)),
+        'lognormal': (2, lambda rng, median, sigma: median * rng.lognormvariate(0, sigma)),
+        'exponential': (1, lambda rng, mean: rng.expovariate(1 / mean) if mean > 0 else 0.0),
+    }
+    if name not in samplers:
+        raise ValueError(f"Unknown latency distribution {name!r} "
+                         f"(choose from {', '.join(samplers)} or 'recorded')")
+    arity, sampler = samplers[name]
+    if len(params) != arity:
+        raise ValueError(f"Latency distribution {name!r} takes {arity} parameter(s)")
+    return lambda rng: max(0.0, sampler(rng, *params))
+
+
+def parse_error_rates(specs) -> Dict[int, float]:
+    """Parse ["529=0.05", "429=0.02"] into {529: 0.05, 429: 0.02}."""
+    rates = {}
+    for spec in specs or []:
+        status, _, rate = spec.partition('=')
+        try:
+            rates[int(status)] = float(rate)
+        except ValueError:
+            raise ValueError(f"Invalid error rate {spec!r} (expected STATUS=RATE)")
+    if sum(rates.values()) > 1:
+        raise ValueError("Error rates add up to more than 1")
+    return rates
+
+
+class Cassette:
+    """
+    Recorded Messages API responses, keyed by a hash of the request.
+
+    The file is JSON: {"version": 1, "interactions": {key: {...}}}, where each
+    interaction holds the request, the response message and the latency
+    seen when it was recorded. The stream flag is not part of the key, so a
+    recording serves both streamed and plain requests.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.interactions: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version in {path}")
+            self.interactions = data['interactions']
+
+    @staticmethod
+    def key(payload: dict) -> str:
+        request = {k: v for k, v in payload.items() if k != 'stream'}
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, payload: dict) -> Optional[dict]:
+        with self._lock:
+            return self.interactions.get(self.key(payload))
+
+    def put(self, payload: dict, message: dict, elapsed: float):
+        """Store one interaction and rewrite the file (atomically)."""
+        request = {k: v for k, v in payload.items() if k != 'stream'}
+        with self._lock:
+            self.interactions[self.key(payload)] = {
+                'request': request, 'response': message, 'elapsed': elapsed}
+            tmp = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': CASSETTE_VERSION, 'interactions': self.interactions}, f, indent=1)
+            os.replace(tmp, self.path)
+
+    def __len__(self) -> int:
+        return len(self.interactions)
+
+
+def default_responder(payload: dict) -> str:
+    """Deterministic reply: a short echo of the last user message."""
+    content = payload['messages'][-1]['content']
+    if not isinstance(content, str):
+        content = ' '.join(block.get('text', '') for block in content)
+    preview = ' '.join(content.split())[:120]
+    return f"Mock response ({payload.get('model', 'unknown')}): {preview}"
+
+
+def _message_text(payload: dict) -> str:
+    """All prompt text in a request (system + messages), for token estimates."""
+    parts = []
+    system = payload.get('system')
+    if isinstance(system, str):
+        parts.append(system)
+    elif system:
+        parts.extend(block.get('text', '') for block in system)
+    for message in payload.get('messages', []):
+        content = message['content']
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get('text', '') for block in content)
+    return '\n'.join(parts)
+
+
+class MockAnthropicServer:
+    """
+    Threaded local HTTP server mimicking the Messages and Batches endpoints.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        responder: Function mapping a request payload to response text
+        batch_delay: Seconds a batch stays "in_progress" before it ends
+        stream_delay: Seconds between streamed text deltas
+        latency: Latency distribution spec for /v1/messages (see parse_latency)
+        error_rates: Probability of answering a message with each error status
+        seed: Seed for latency and error sampling (reproducible runs)
+        cassette: Cassette file to replay from (or record into)
+        record: Forward cassette misses to `upstream` and record the responses
+        upstream: Real API base URL used when recording
+        strict: With a cassette, fail requests that were never recorded
+            instead of falling back to the responder
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        responder: Optional[Callable[[dict], str]] = None,
+        batch_delay: float = 0.0,
+        stream_delay: float = 0.0,
+        latency: Optional[str] = None,
+        error_rates: Optional[Dict[int, float]] = None,
+        seed: Optional[int] = None,
+        cassette: Optional[str] = None,
+        record: bool = False,
+        upstream: str = DEFAULT_UPSTREAM,
+        strict: bool = False
+    ):
+        self.responder = responder or default_responder
+        self.batch_delay = batch_delay
+        self.stream_delay = stream_delay
+        self.latency = latency
+        self._sample_latency = parse_latency(latency)
+        self.error_rates = dict(error_rates or {})
+        self.retry_after = 1.0
+        self.cassette = Cassette(cassette) if cassette else None
+        self.record = record
+        self.upstream = upstream.rstrip('/')
+        self.strict = strict
+        self.streams_completed = 0
+        self.streams_aborted = 0
+        self.errors_injected = 0
+        self.replayed = 0
+        self.recorded = 0
+        self._rng = random.Random(seed)
+        self.batches: Dict[str, dict] = {}
+        self.request_log = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockAnthropicServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> 'MockAnthropicServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # Response builders
+    # ------------------------------------------------------------------
+
+    def _draw(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _latency_for(self, recorded: Optional[float]) -> float:
+        if self.latency == 'recorded':
+            return recorded or 0.0
+        if self._sample_latency is None:
+            return 0.0
+        with self._lock:
+            return self._sample_latency(self._rng)
+
+    def injected_error(self) -> Optional[MockAPIError]:
+        """Roll the configured error rates; returns the error to send, if any."""
+        if not self.error_rates:
+            return None
+        roll, cumulative = self._draw(), 0.0
+        for status, rate in sorted(self.error_rates.items()):
+            cumulative += rate
+            if roll < cumulative:
+                with self._lock:
+                    self.errors_injected += 1
+                return MockAPIError(status, ERROR_TYPES.get(status, 'api_error'),
+                                    f'injected {status} error')
+        return None
+
+    def _fetch_upstream(self, payload: dict, api_key: Optional[str]) -> dict:
+        """Send a (non-streaming) request to the real API and return the message."""
+        request = {k: v for k, v in payload.items() if k != 'stream'}
+        req = urllib.request.Request(
+            self.upstream + '/v1/messages',
+            data=json.dumps(request).encode('utf-8'),
+            headers={'x-api-key': api_key or '', 'anthropic-version': ANTHROPIC_VERSION,
+                     'content-type': 'application/json'},
+            method='POST',
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=600) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.loads(e.read()).get('error', {})
+            except ValueError:
+                error = {}
+            raise MockAPIError(e.code, error.get('type', 'api_error'),
+                               error.get('message', f'upstream returned HTTP {e.code}'))
+
+    def _cassette_message(self, payload: dict, api_key: Optional[str]):
+        """
+        Look a request up in the cassette.
+
+        Returns (message, recorded latency), or (None, None) when the
+        responder should answer. In record mode misses are fetched upstream
+        and saved.
+        """
+        if self.cassette is None:
+            return None, None
+        hit = self.cassette.get(payload)
+        if hit is not None:
+            with self._lock:
+                self.replayed += 1
+            return hit['response'], hit.get('elapsed')
+        if self.record:
+            started = time.monotonic()
+            message = self._fetch_upstream(payload, api_key)
+            elapsed = time.monotonic() - started
+            self.cassette.put(payload, message, elapsed)
+            with self._lock:
+                self.recorded += 1
+            return message, elapsed
+        if self.strict:
+            raise MockAPIError(404, 'not_found_error',
+                               'no recorded response for this request in the cassette')
+        return None, None
+
+    def resolve_message(self, payload: dict, api_key: Optional[str] = None) -> dict:
+        """
+        Produce the response message for a request, after its simulated latency.
+
+        Cassette hits are replayed; in record mode misses go upstream and are
+        saved, and no latency is simulated (the upstream call took real
+        time). Otherwise the responder generates the text.
+
+        Raises:
+            MockAPIError: For strict cassette misses and upstream errors
+        """
+        message, recorded_elapsed = self._cassette_message(payload, api_key)
+        if not self.record:
+            delay = self._latency_for(recorded_elapsed)
+            if delay:
+                time.sleep(delay)
+        return message if message is not None else self.build_message(payload)
+
+    def build_message(self, payload: dict) -> dict:
+        text = self.responder(payload)
+        return {
+            'id': f"msg_mock_{next(self._ids)}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': payload.get('model'),
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'usage': {
+                'input_tokens': max(1, len(_message_text(payload)) // 4),
+                'output_tokens': max(1, len(text) // 4),
+            },
+        }
+
+    def stream_events(self, message: dict):
+        """Yield the (event, data) pairs that stream `message`, one word per delta."""
+        text = ''.join(block.get('text', '') for block in message['content'])
+        usage = message['usage']
+        message = dict(message, content=[])
+        message['usage'] = {'input_tokens': usage['input_tokens'], 'output_tokens': 1}
+        yield 'message_start', {'type': 'message_start', 'message': message}
+        yield 'content_block_start', {'type': 'content_block_start', 'index': 0,
+                                      'content_block': {'type': 'text', 'text': ''}}
+        words = text.split(' ')
+        for i, word in enumerate(words):
+            delta = word if i == len(words) - 1 else word + ' '
+            yield 'content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                          'delta': {'type': 'text_delta', 'text': delta}}
+        yield 'content_block_stop', {'type': 'content_block_stop', 'index': 0}
+        yield 'message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                                'usage': {'output_tokens': usage['output_tokens']}}
+        yield 'message_stop', {'type': 'message_stop'}
+
+    def create_batch(self, body: dict, api_key: Optional[str] = None) -> dict:
+        batch_id = f"msgbatch_mock_{next(self._ids)}"
+        results = []
+        for request in body.get('requests', []):
+            try:
+                message, _ = self._cassette_message(request['params'], api_key)
+                if message is None:
+                    message = self.build_message(request['params'])
+                result = {'type': 'succeeded', 'message': message}
+            except Exception as e:
+                result = {'type': 'errored',
+                          'error': {'type': 'api_error', 'message': str(e)}}
+            results.append({'custom_id': request['custom_id'], 'result': result})
+        with self._lock:
+            self.batches[batch_id] = {'created': time.monotonic(), 'results': results}
+        return self.batch_status(batch_id)
+
+    def cancel_batch(self, batch_id: str) -> Optional[dict]:
+        """End a batch now; requests not yet finished are marked canceled."""
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            if time.monotonic() - batch['created'] < self.batch_delay:
+                batch['created'] -= self.batch_delay
+                for item in batch['results']:
+                    item['result'] = {'type': 'canceled'}
+        return self.batch_status(batch_id)
+
+    def batch_status(self, batch_id: str) -> Optional[dict]:
+        with self._lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        ended = time.monotonic() - batch['created'] >= self.batch_delay
+        counts = {'processing': 0 if ended else len(batch['results']),
+                  'succeeded': 0, 'errored': 0, 'canceled': 0, 'expired': 0}
+        if ended:
+            for item in batch['results']:
+                counts[item['result']['type']] += 1
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': counts,
+            'results_url': f"{self.url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    # ------------------------------------------------------------------
+    # HTTP plumbing
+    # ------------------------------------------------------------------
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, obj, content_type='application/json'):
+                body = obj if isinstance(obj, bytes) else json.dumps(obj).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, message: dict):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for event, data in server.stream_events(message):
+                        chunk = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+                        self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                        self.wfile.flush()
+                        if event == 'content_block_delta' and server.stream_delay:
+                            time.sleep(server.stream_delay)
+                    self.wfile.write(b'0\r\n\r\n')
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                    with server._lock:
+                        server.streams_aborted += 1
+                    return
+                with server._lock:
+                    server.streams_completed += 1
+
+            def _error(self, status: int, error_type: str, message: str):
+                self._send_json(status, {'type': 'error',
+                                         'error': {'type': error_type, 'message': message}})
+
+            def _send_api_error(self, error: MockAPIError):
+                body = json.dumps({'type': 'error', 'error': {
+                    'type': error.error_type, 'message': str(error)}}).encode('utf-8')
+                self.send_response(error.status)
+                if error.status in (429, 529):
+                    self.send_header('retry-after', f"{server.retry_after:g}")
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_message(self, body: dict):
+                try:
+                    error = server.injected_error()
+                    if error is not None:
+                        raise error
+                    message = server.resolve_message(body, self.headers.get('x-api-key'))
+                except MockAPIError as e:
+                    self._send_api_error(e)
+                    return
+                if body.get('stream'):
+                    self._send_stream(message)
+                else:
+                    self._send_json(200, message)
+
+            def _authorized(self) -> bool:
+                if self.headers.get('x-api-key'):
+                    return True
+                self._error(401, 'authentication_error', 'missing x-api-key header')
+                return False
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                raw = self.rfile.read(length)
+                if not self._authorized():
+                    return
+                try:
+                    body = json.loads(raw or b'{}')
+                except json.JSONDecodeError:
+                    self._error(400, 'invalid_request_error', 'body is not valid JSON')
+                    return
+                with server._lock:
+                    server.request_log.append(('POST', self.path, body))
+
+                parts = self.path.strip('/').split('/')
+                if self.path == '/v1/messages':
+                    self._send_message(body)
+                elif self.path == '/v1/messages/count_tokens':
+                    self._send_json(200, {'input_tokens': max(1, len(_message_text(body)) // 4)})
+                elif self.path == '/v1/messages/batches':
+                    self._send_json(200, server.create_batch(body, self.headers.get('x-api-key')))
+                elif parts[:3] == ['v1', 'messages', 'batches'] and parts[4:] == ['cancel']:
+                    status = server.cancel_batch(parts[3])
+                    if status is None:
+                        self._error(404, 'not_found_error', f'no batch {parts[3]}')
+                    else:
+                        self._send_json(200, status)
+                else:
+                    self._error(404, 'not_found_error', f'unknown path {self.path}')
+
+            def do_GET(self):
+                if not self._authorized():
+                    return
+                with server._lock:
+                    server.request_log.append(('GET', self.path, None))
+
+                parts = self.path.strip('/').split('/')
+                if parts[:3] != ['v1', 'messages', 'batches'] or len(parts) not in (4, 5):
+                    self._error(404, 'not_found_error', f'unknown path {self.path}')
+                    return
+                status = server.batch_status(parts[3])
+                if status is None:
+                    self._error(404, 'not_found_error', f'no batch {parts[3]}')
+                elif len(parts) == 4:
+                    self._send_json(200, status)
+                elif status['processing_status'] != 'ended':
+                    self._error(400, 'invalid_request_error', 'batch has not ended')
+                else:
+                    with server._lock:
+                        results = server.batches[parts[3]]['results']
+                    lines = '\n'.join(json.dumps(r) for r in results) + '\n'
+                    self._send_json(200, lines.encode('utf-8'), 'application/x-jsonl')
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the Anthropic API')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', '-p', type=int, default=8765, help='Port (default: 8765)')
+    parser.add_argument('--batch-delay', type=float, default=0.0,
+                        help='Seconds before a submitted batch ends (default: 0)')
+    parser.add_argument('--stream-delay', type=float, default=0.0,
+                        help='Seconds between streamed text deltas (default: 0)')
+    parser.add_argument('--latency', default=None, metavar='SPEC',
+                        help='Per-message latency: fixed:S, uniform:LO,HI, normal:MEAN,SD, '
+                             'lognormal:MEDIAN,SIGMA, exponential:MEAN or recorded')
+    parser.add_argument('--error-rate', action='append', default=[], metavar='STATUS=RATE',
+                        help='Answer this fraction of messages with an error status '
+                             '(repeatable, e.g. --error-rate 529=0.05)')
+    parser.add_argument('--retry-after', type=float, default=1.0,
+                        help='retry-after header sent with injected 429/529 errors (default: 1)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed for latency and error injection')
+    parser.add_argument('--cassette', default=None, metavar='PATH',
+                        help='Replay responses recorded in this cassette file')
+    parser.add_argument('--record', action='store_true',
+                        help='Forward requests missing from the cassette to --upstream and record them')
+    parser.add_argument('--upstream', default=DEFAULT_UPSTREAM,
+                        help=f'Real API used when recording (default: {DEFAULT_UPSTREAM})')
+    parser.add_argument('--strict', action='store_true',
+                        help='Fail requests missing from the cassette instead of generating a reply')
+    args = parser.parse_args()
+
+    if args.record and not args.cassette:
+        parser.error('--record requires --cassette')
+    try:
+        server = MockAnthropicServer(
+            args.host, args.port, batch_delay=args.batch_delay, stream_delay=args.stream_delay,
+            latency=args.latency, error_rates=parse_error_rates(args.error_rate), seed=args.seed,
+            cassette=args.cassette, record=args.record, upstream=args.upstream, strict=args.strict,
+        )
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    server.retry_after = args.retry_after
+
+    print(f"Mock Anthropic API listening on {server.url}", file=sys.stderr)
+    if server.cassette is not None:
+        mode = 'recording into' if args.record else 'replaying'
+        print(f"  {mode} {args.cassette} ({len(server.cassette)} interactions)", file=sys.stderr)
+    print(f"  pass --base-url {server.url} (or export ANTHROPIC_BASE_URL={server.url})",
+          file=sys.stderr)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n[Stopped] errors injected: {server.errors_injected}, "
+              f"replayed: {server.replayed}, recorded: {server.recorded}", file=sys.stderr)
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ Usage:
     python paper_organizer.py "C:\Papers\ML" --output report.md
     python paper_organizer.py "C:\Papers" --organize  # Creates subdirectories
     python paper_organizer.py "C:\Papers" --fast      # Uses cheaper model
+    python paper_organizer.py "C:\Papers" --batch     # Message Batches API, resumable
 
 Output:
     - Markdown report with categorized papers
@@ -27,6 +28,7 @@ import os
 import sys
 import json
 import shutil
+import asyncio
 import argparse
 from pathlib import Path
 from datetime import datetime
@@ -38,7 +40,11 @@ SCRIPT_DIR = Path(__file__).parent
 sys.path.insert(0, str(SCRIPT_DIR))
 
 try:
-    from rlm_query import llm_query, llm_query_fast, load_api_key
+    from rlm_query import (
+        llm_query, llm_query_fast, allm_query, allm_query_fast, gather_bounded, load_api_key,
+        add_client_arguments, apply_client_arguments, build_message_params, DEFAULT_MODEL, FAST_MODEL
+    )
+    from rlm_batch import BatchJob, add_batch_arguments
 except ImportError as e:
     print(f"Error: Required modules not found. Run from the scripts directory.")
     print(f"Details: {e}")
@@ -148,46 +154,64 @@ def extract_paper_text(pdf_path: str, max_pages: int = 15) -> Tuple[str, str]:
         return "", f"Error extracting PDF: {e}"
 
 
-def analyze_paper(
+def _failed_analysis(
     pdf_path: str,
-    user_context: str = "",
-    fast_model: bool = False,
-    verbose: bool = True
+    title: str,
+    category: str,
+    summary: str,
+    reasoning: str,
+    tags: List[str],
+    error: str
 ) -> PaperAnalysis:
-    """
-    Analyze a single paper and categorize it.
-    """
-    filename = Path(pdf_path).name
-    
-    if verbose:
-        print(f"  📄 Extracting text...")
-    
-    # Extract text
-    full_text, first_pages = extract_paper_text(pdf_path)
-    
-    if not full_text or full_text.startswith("Error"):
-        return PaperAnalysis(
-            filename=filename,
-            filepath=str(pdf_path),
-            title="[Extraction Failed]",
-            authors="Unknown",
-            year="Unknown",
-            category="UNKNOWN",
-            confidence="LOW",
-            summary="Could not extract text from PDF",
-            key_contributions=[],
-            practical_applications=[],
-            limitations=[],
-            relevance_reasoning=first_pages if first_pages.startswith("Error") else "PDF extraction failed",
-            estimated_time_to_value="Unknown",
-            tags=["extraction-error"],
-            error=first_pages if first_pages.startswith("Error") else "Empty PDF"
-        )
-    
-    if verbose:
-        print(f"  🤖 Analyzing with LLM...")
-    
-    # Build analysis prompt
+    """Build a placeholder PaperAnalysis for a paper that could not be analyzed."""
+    return PaperAnalysis(
+        filename=Path(pdf_path).name,
+        filepath=str(pdf_path),
+        title=title,
+        authors="Unknown",
+        year="Unknown",
+        category=category,
+        confidence="LOW",
+        summary=summary,
+        key_contributions=[],
+        practical_applications=[],
+        limitations=[],
+        relevance_reasoning=reasoning,
+        estimated_time_to_value="Unknown",
+        tags=tags,
+        error=error
+    )
+
+
+def _extraction_failed(pdf_path: str, first_pages: str) -> PaperAnalysis:
+    """PaperAnalysis for a PDF whose text could not be extracted."""
+    error = first_pages if first_pages.startswith("Error") else None
+    return _failed_analysis(
+        pdf_path,
+        title="[Extraction Failed]",
+        category="UNKNOWN",
+        summary="Could not extract text from PDF",
+        reasoning=error or "PDF extraction failed",
+        tags=["extraction-error"],
+        error=error or "Empty PDF"
+    )
+
+
+def _query_failed(pdf_path: str, e: Exception) -> PaperAnalysis:
+    """PaperAnalysis for a paper whose LLM call failed."""
+    return _failed_analysis(
+        pdf_path,
+        title=Path(pdf_path).name,
+        category="UNKNOWN",
+        summary="Analysis failed",
+        reasoning=str(e),
+        tags=["error"],
+        error=str(e)
+    )
+
+
+def build_analysis_prompt(full_text: str, first_pages: str, user_context: str = "") -> str:
+    """Build the categorization prompt for one paper."""
     categories_desc = "\n".join([
         f"- {cat}: {info['description']}"
         for cat, info in CATEGORIES.items()
@@ -200,7 +224,7 @@ USER CONTEXT (consider this when determining relevance):
 {user_context}
 """
     
-    analysis_prompt = f"""Analyze this ML/AI research paper and categorize it.
+    return f"""Analyze this ML/AI research paper and categorize it.
 
 PAPER TEXT (first pages for metadata):
 ---
@@ -239,11 +263,12 @@ Be practical and realistic. Consider:
 
 JSON response:"""
 
-    query_fn = llm_query_fast if fast_model else llm_query
+
+def parse_analysis_response(pdf_path: str, response: str) -> PaperAnalysis:
+    """Parse the model's JSON answer into a PaperAnalysis."""
+    filename = Path(pdf_path).name
     
     try:
-        response = query_fn(analysis_prompt, max_tokens=2000)
-        
         # Parse JSON response
         response = response.strip()
         if response.startswith("```"):
@@ -272,41 +297,156 @@ JSON response:"""
         )
         
     except json.JSONDecodeError as e:
-        return PaperAnalysis(
-            filename=filename,
-            filepath=str(pdf_path),
+        return _failed_analysis(
+            pdf_path,
             title=filename,
-            authors="Unknown",
-            year="Unknown",
             category="MEANINGFUL",
-            confidence="LOW",
             summary="Analysis completed but response parsing failed",
-            key_contributions=[],
-            practical_applications=[],
-            limitations=[],
-            relevance_reasoning=f"JSON parsing error: {str(e)[:100]}",
-            estimated_time_to_value="Unknown",
+            reasoning=f"JSON parsing error: {str(e)[:100]}",
             tags=["parse-error"],
             error=f"JSON parse error: {e}"
         )
     except Exception as e:
-        return PaperAnalysis(
-            filename=filename,
-            filepath=str(pdf_path),
-            title=filename,
-            authors="Unknown",
-            year="Unknown",
-            category="UNKNOWN",
-            confidence="LOW",
-            summary="Analysis failed",
-            key_contributions=[],
-            practical_applications=[],
-            limitations=[],
-            relevance_reasoning=str(e),
-            estimated_time_to_value="Unknown",
-            tags=["error"],
-            error=str(e)
-        )
+        return _query_failed(pdf_path, e)
+
+
+def analyze_paper(
+    pdf_path: str,
+    user_context: str = "",
+    fast_model: bool = False,
+    verbose: bool = True
+) -> PaperAnalysis:
+    """
+    Analyze a single paper and categorize it.
+    """
+    if verbose:
+        print(f"  📄 Extracting text...")
+    
+    # Extract text
+    full_text, first_pages = extract_paper_text(pdf_path)
+    
+    if not full_text or full_text.startswith("Error"):
+        return _extraction_failed(pdf_path, first_pages)
+    
+    if verbose:
+        print(f"  🤖 Analyzing with LLM...")
+    
+    analysis_prompt = build_analysis_prompt(full_text, first_pages, user_context)
+
+    query_fn = llm_query_fast if fast_model else llm_query
+    
+    try:
+        response = query_fn(analysis_prompt, max_tokens=2000)
+    except Exception as e:
+        return _query_failed(pdf_path, e)
+
+    return parse_analysis_response(pdf_path, response)
+
+
+async def analyze_paper_async(
+    pdf_path: str,
+    user_context: str = "",
+    fast_model: bool = False
+) -> PaperAnalysis:
+    """
+    Async variant of analyze_paper.
+
+    PDF extraction runs in the default thread pool so it does not block the
+    event loop while other papers' LLM calls are in flight.
+    """
+    loop = asyncio.get_running_loop()
+    full_text, first_pages = await loop.run_in_executor(None, extract_paper_text, pdf_path)
+    
+    if not full_text or full_text.startswith("Error"):
+        return _extraction_failed(pdf_path, first_pages)
+    
+    analysis_prompt = build_analysis_prompt(full_text, first_pages, user_context)
+
+    query_fn = allm_query_fast if fast_model else allm_query
+    
+    try:
+        response = await query_fn(analysis_prompt, max_tokens=2000)
+    except Exception as e:
+        return _query_failed(pdf_path, e)
+
+    return parse_analysis_response(pdf_path, response)
+
+
+def analyze_papers_concurrently(
+    pdfs: List[str],
+    user_context: str = "",
+    fast_model: bool = False,
+    concurrency: int = 8,
+    verbose: bool = True
+) -> List[PaperAnalysis]:
+    """
+    Analyze many papers with up to `concurrency` LLM calls in flight.
+
+    Returns analyses in the same order as `pdfs`.
+    """
+    done = 0
+
+    async def run_one(pdf_path: str) -> PaperAnalysis:
+        nonlocal done
+        analysis = await analyze_paper_async(pdf_path, user_context, fast_model)
+        done += 1
+        if verbose:
+            name = Path(pdf_path).name[:50]
+            if analysis.error:
+                print(f"[{done}/{len(pdfs)}] {name} [!] Error: {analysis.error[:50]}")
+            else:
+                print(f"[{done}/{len(pdfs)}] {name} [{analysis.category}] ({analysis.confidence})")
+        return analysis
+
+    return asyncio.run(gather_bounded((run_one(p) for p in pdfs), limit=concurrency))
+
+
+def analyze_papers_batch(
+    pdfs: List[str],
+    job: BatchJob,
+    user_context: str = "",
+    fast_model: bool = False,
+    verbose: bool = True
+) -> List[PaperAnalysis]:
+    """
+    Analyze many papers through the Message Batches API.
+
+    All analysis prompts go out as one batch stage (half price, results
+    within 24 hours). The job file records submitted batches and finished
+    results, so rerunning with the same papers resumes instead of resubmitting.
+
+    Returns analyses in the same order as `pdfs`.
+    """
+    model = FAST_MODEL if fast_model else DEFAULT_MODEL
+    analyses: Dict[int, PaperAnalysis] = {}
+    requests = {}
+
+    for i, pdf_path in enumerate(pdfs):
+        if verbose:
+            print(f"[{i + 1}/{len(pdfs)}] 📄 Extracting {Path(pdf_path).name[:50]}...")
+        full_text, first_pages = extract_paper_text(pdf_path)
+        if not full_text or full_text.startswith("Error"):
+            analyses[i] = _extraction_failed(pdf_path, first_pages)
+            continue
+        prompt = build_analysis_prompt(full_text, first_pages, user_context)
+        requests[f"paper-{i}"] = build_message_params(prompt, model=model, max_tokens=2000)
+
+    if verbose:
+        print(f"\n📦 Submitting {len(requests)} papers as a message batch (job file: {job.path})")
+
+    texts = job.run_stage('analyze', requests) if requests else {}
+    errors = job.errors('analyze')
+
+    for i, pdf_path in enumerate(pdfs):
+        if i in analyses:
+            continue
+        text = texts[f"paper-{i}"]
+        if text is None:
+            analyses[i] = _query_failed(pdf_path, Exception(errors.get(f"paper-{i}", "batch request failed")))
+        else:
+            analyses[i] = parse_analysis_response(pdf_path, text)
+
+    return [analyses[i] for i in range(len(pdfs))]
 
 
 def find_pdfs(directory: str, recursive: bool = True) -> List[str]:
@@ -505,6 +645,12 @@ Examples:
     
     # Limit number of papers (for testing)
     python paper_organizer.py "C:\\Papers\\ML" --limit 5
+    
+    # Analyze 8 papers at a time
+    python paper_organizer.py "C:\\Papers\\ML" --concurrency 8
+    
+    # Overnight run at half price via the Message Batches API (rerun to resume)
+    python paper_organizer.py "C:\\Papers\\ML" --batch --job-file ml_papers.json
 
 Categories:
     🟢 USEFUL:      Practical, applicable now (has code, solves real problems)
@@ -526,14 +672,19 @@ Categories:
                         help='Use faster/cheaper model')
     parser.add_argument('--context', '-c', type=str, default='',
                         help='Your work context for relevance (e.g., "I work on computer vision")')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Number of papers to analyze in parallel (default: 1)')
     parser.add_argument('--limit', '-l', type=int, default=0,
                         help='Limit number of papers to process (0 = all)')
     parser.add_argument('--no-recursive', action='store_true',
                         help='Do not search subdirectories')
     parser.add_argument('--quiet', '-q', action='store_true',
                         help='Minimal output')
+    add_client_arguments(parser)
+    add_batch_arguments(parser, default_job_file='papers_batch.json')
     
     args = parser.parse_args()
+    apply_client_arguments(args)
     
     # Validate directory
     if not Path(args.directory).is_dir():
@@ -566,31 +717,49 @@ Categories:
         print(f"📚 Found {len(pdfs)} PDF files\n")
     
     # Analyze papers
-    analyses = []
-    errors = 0
-    
-    for i, pdf_path in enumerate(pdfs, 1):
-        if verbose:
-            print(f"[{i}/{len(pdfs)}] {Path(pdf_path).name[:50]}...")
-        
-        analysis = analyze_paper(
-            pdf_path,
+    if args.batch:
+        job = BatchJob(args.job_file, args.poll_interval, verbose=verbose)
+        analyses = analyze_papers_batch(
+            pdfs,
+            job,
             user_context=args.context,
             fast_model=args.fast,
             verbose=verbose
         )
-        analyses.append(analysis)
-        
-        if analysis.error:
-            errors += 1
-        
+        print()
+    elif args.concurrency > 1:
         if verbose:
-            if analysis.error:
-                print(f"  [!] Error: {analysis.error[:50]}")
-            else:
-                print(f"  [{analysis.category}] ({analysis.confidence}) - {analysis.title[:40]}...")
+            print(f"⚡ Analyzing with {args.concurrency} concurrent requests\n")
+        analyses = analyze_papers_concurrently(
+            pdfs,
+            user_context=args.context,
+            fast_model=args.fast,
+            concurrency=args.concurrency,
+            verbose=verbose
+        )
+        print()
+    else:
+        analyses = []
         
-        print()  # Blank line between papers
+        for i, pdf_path in enumerate(pdfs, 1):
+            if verbose:
+                print(f"[{i}/{len(pdfs)}] {Path(pdf_path).name[:50]}...")
+            
+            analysis = analyze_paper(
+                pdf_path,
+                user_context=args.context,
+                fast_model=args.fast,
+                verbose=verbose
+            )
+            analyses.append(analysis)
+            
+            if verbose:
+                if analysis.error:
+                    print(f"  [!] Error: {analysis.error[:50]}")
+                else:
+                    print(f"  [{analysis.category}] ({analysis.confidence}) - {analysis.title[:40]}...")
+            
+            print()  # Blank line between papers
     
     # Generate report
     if verbose:
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+response_cache.py - On-disk cache for sub-LLM responses.
+
+Stores responses in a SQLite database keyed by a hash of the request
+(model, system prompt, prompt, temperature, max_tokens). The cache is bounded
+in size with least-recently-used eviction, and entries expire after a TTL.
+Used by rlm_query.py so reruns over the same documents skip the API.
+
+Usage:
+    python response_cache.py --stats
+    python response_cache.py --clear
+    python response_cache.py --stats --cache-dir ./my_cache
+"""
+
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+DEFAULT_TTL = 30 * 24 * 3600           # 30 days
+DB_NAME = 'responses.sqlite3'
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of model responses backed by SQLite.
+
+    Safe to share between threads. Several processes may also use the same
+    directory at once; SQLite serializes their writes.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: Optional[float] = DEFAULT_TTL
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.cache_dir / DB_NAME
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY,'
+            ' response TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' accessed REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed)')
+        self._total_bytes = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def make_key(
+        model: str,
+        system,
+        prompt: str,
+        temperature: float,
+        max_tokens: int
+    ) -> str:
+        """Hash the request fields that determine a response."""
+        material = json.dumps([model, system, prompt, temperature, max_tokens],
+                              sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._delete(key)
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str):
+        """Store a response, evicting least-recently-used entries if over size."""
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, response, size, created, accessed) '
+                'VALUES (?, ?, ?, ?, ?)', (key, response, size, now, now))
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _delete(self, key: str):
+        row = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        if row:
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._total_bytes -= row[0]
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used, until under budget."""
+        if self.ttl is not None:
+            self._conn.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+        # Other processes may share the database: recount before evicting
+        self._total_bytes = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                'SELECT key, size FROM responses ORDER BY accessed LIMIT 64').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and the current cache size."""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'path': str(self.path),
+            }
+
+    def clear(self):
+        """Delete every cached response."""
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the RLM response cache')
+    parser.add_argument('--cache-dir', help='Cache directory (default: ~/.claude/rlm_cache)')
+    parser.add_argument('--stats', action='store_true', help='Show cache statistics')
+    parser.add_argument('--clear', action='store_true', help='Delete all cached responses')
+    args = parser.parse_args()
+
+    if args.cache_dir:
+        cache_dir = Path(args.cache_dir)
+    else:
+        from rlm_query import default_cache_dir
+        cache_dir = default_cache_dir()
+
+    cache = ResponseCache(cache_dir)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {cache.path}")
+    if args.stats or not args.clear:
+        stats = cache.stats()
+        print(f"Cache: {stats['path']}")
+        print(f"  Entries: {stats['entries']:,}")
+        print(f"  Size: {stats['bytes'] / 1024 / 1024:.1f} MB "
+              f"(limit {stats['max_bytes'] / 1024 / 1024:.0f} MB)")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+rlm_batch.py - Run bulk sub-LLM calls through the Message Batches API.
+
+Batched requests are processed asynchronously (usually within an hour, at
+most 24 hours) at half the price of interactive calls, and they do not count
+against the interactive rate limits. That suits overnight jobs such as
+paper_organizer.py over thousands of PDFs.
+
+Progress is saved to a JSON job file after every step. Re-running the same
+command with the same job file resumes: finished stages are read back from
+the file, submitted batches are polled rather than resubmitted, and only
+requests that were never sent (or that failed last time) are submitted.
+
+Usage (library):
+    job = BatchJob('papers.batch.json')
+    texts = job.run_stage('analyze', {
+        'paper-0': build_message_params(prompt0, model=FAST_MODEL),
+        'paper-1': build_message_params(prompt1, model=FAST_MODEL),
+    })
+
+Usage (CLI):
+    python rlm_batch.py status papers.batch.json
+    python rlm_batch.py cancel papers.batch.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from rlm_query import api_request, cache_response, cached_response, record_usage
+
+
+BATCHES_PATH = '/v1/messages/batches'
+MAX_BATCH_REQUESTS = 10000      # the API allows 100,000 / 256 MB per batch
+DEFAULT_POLL_INTERVAL = 30.0    # seconds
+JOB_FILE_VERSION = 1
+CUSTOM_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class BatchError(Exception):
+    """A batch could not be submitted, polled or resumed."""
+
+
+def _fingerprint(requests: Dict[str, dict]) -> str:
+    """Hash a stage's requests so a job file is never resumed for other inputs."""
+    material = json.dumps(requests, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def _check_response(status: int, data: bytes, action: str) -> bytes:
+    if status != 200:
+        raise BatchError(f"{action} failed (HTTP {status}): "
+                         f"{data.decode('utf-8', errors='replace')[:500]}")
+    return data
+
+
+class BatchJob:
+    """
+    A resumable multi-stage batch job persisted to a JSON file.
+
+    Each stage is one set of independent requests (custom_id -> request
+    body). Stages run one after another, so a later stage can be built from
+    an earlier stage's results (e.g. per-chunk calls, then per-file merges).
+
+    Args:
+        job_file: Path of the JSON job file (created if missing)
+        poll_interval: Seconds between status checks while a batch runs
+        verbose: Print progress to stderr
+    """
+
+    def __init__(
+        self,
+        job_file: Union[str, Path],
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        verbose: bool = True
+    ):
+        self.path = Path(job_file)
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+        if self.path.exists():
+            self.state = json.loads(self.path.read_text(encoding='utf-8'))
+            if self.state.get('version') != JOB_FILE_VERSION:
+                raise BatchError(f"Unsupported job file version in {self.path}")
+        else:
+            self.state = {'version': JOB_FILE_VERSION, 'stages': {}}
+
+    def log(self, msg: str):
+        if self.verbose:
+            print(msg, file=sys.stderr)
+
+    def save(self):
+        """Write the job state atomically (a crash never leaves a torn file)."""
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(json.dumps(self.state, indent=1, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.path)
+
+    def errors(self, stage: str) -> Dict[str, str]:
+        """Error messages for the failed requests of a stage, by custom_id."""
+        return dict(self.state['stages'].get(stage, {}).get('errors', {}))
+
+    def run_stage(self, name: str, requests: Dict[str, dict]) -> Dict[str, Optional[str]]:
+        """
+        Run one stage to completion and return its response texts.
+
+        Requests already in the response cache are answered locally. The rest
+        are submitted in batches of up to MAX_BATCH_REQUESTS and polled until
+        they end.
+
+        Args:
+            name: Stage name, unique within the job file
+            requests: custom_id -> Messages API request body
+                (see rlm_query.build_message_params)
+
+        Returns:
+            custom_id -> response text, or None for requests that failed
+            (see errors())
+        """
+        for custom_id in requests:
+            if not CUSTOM_ID_PATTERN.match(custom_id):
+                raise ValueError(f"Invalid batch custom_id: {custom_id!r}")
+
+        fingerprint = _fingerprint(requests)
+        stage = self.state['stages'].get(name)
+        if stage is None:
+            stage = {'fingerprint': fingerprint, 'batches': [], 'results': {}, 'errors': {}}
+            self.state['stages'][name] = stage
+        elif stage['fingerprint'] != fingerprint:
+            raise BatchError(
+                f"Stage '{name}' in {self.path} was created for different requests. "
+                f"Delete the job file or choose another one to start over."
+            )
+
+        submitted = {cid for batch in stage['batches'] for cid in batch['custom_ids']}
+        # Requests that failed in an earlier run are sent again
+        unsent = [cid for cid in requests
+                  if cid not in stage['results']
+                  and (cid not in submitted or cid in stage['errors'])]
+
+        cached = 0
+        for cid in unsent:
+            text = cached_response(requests[cid])
+            if text is not None:
+                stage['results'][cid] = text
+                cached += 1
+        if cached:
+            self.log(f"[BATCH] {name}: {cached} requests answered from the response cache")
+        unsent = [cid for cid in unsent if cid not in stage['results']]
+
+        for start in range(0, len(unsent), MAX_BATCH_REQUESTS):
+            self._submit(name, stage, unsent[start:start + MAX_BATCH_REQUESTS], requests)
+
+        for batch in stage['batches']:
+            if batch['status'] != 'ended':
+                self._wait(name, stage, batch, requests)
+
+        return {cid: stage['results'].get(cid) for cid in requests}
+
+    def _submit(self, name: str, stage: dict, custom_ids: List[str], requests: Dict[str, dict]):
+        body = {'requests': [{'custom_id': cid, 'params': requests[cid]} for cid in custom_ids]}
+        status, _, data = api_request('POST', BATCHES_PATH, body)
+        batch = json.loads(_check_response(status, data, 'Batch submission'))
+        # 'ended' is only recorded once the results have been downloaded
+        stage['batches'].append({'id': batch['id'], 'status': 'submitted',
+                                 'custom_ids': custom_ids})
+        # A resubmitted request is no longer failed: a restart must poll this
+        # batch for it, not send it a third time
+        for cid in custom_ids:
+            stage['errors'].pop(cid, None)
+        # Record the batch id before anything else can fail, so a restart
+        # polls this batch instead of paying for it twice
+        self.save()
+        self.log(f"[BATCH] {name}: submitted {len(custom_ids)} requests as {batch['id']}")
+
+    def _wait(self, name: str, stage: dict, batch: dict, requests: Dict[str, dict]):
+        while True:
+            status, _, data = api_request('GET', f"{BATCHES_PATH}/{batch['id']}")
+            info = json.loads(_check_response(status, data, 'Batch status check'))
+            if info['processing_status'] == 'ended':
+                break
+            counts = info.get('request_counts', {})
+            self.log(f"[BATCH] {name}: {batch['id']} {info['processing_status']} "
+                     f"({counts.get('processing', '?')} processing, "
+                     f"{counts.get('succeeded', 0)} succeeded, {counts.get('errored', 0)} errored)")
+            time.sleep(self.poll_interval)
+
+        status, _, data = api_request('GET', info['results_url'])
+        for line in _check_response(status, data, 'Batch results download').splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            cid, result = item['custom_id'], item['result']
+            if result['type'] == 'succeeded':
+                message = result['message']
+                text = message['content'][0]['text'] if message.get('content') else ''
+                stage['results'][cid] = text
+                stage['errors'].pop(cid, None)
+                record_usage(message.get('usage', {}), message.get('model'))
+                if cid in requests:
+                    cache_response(requests[cid], text)
+            else:
+                error = result.get('error') or {}
+                stage['errors'][cid] = error.get('message') or f"request {result['type']}"
+
+        batch['status'] = 'ended'
+        self.save()
+        self.log(f"[BATCH] {name}: {batch['id']} ended "
+                 f"({len(stage['results'])} results, {len(stage['errors'])} errors so far)")
+
+    def cancel(self):
+        """Ask the API to cancel every batch of this job that has not ended."""
+        for stage in self.state['stages'].values():
+            for batch in stage['batches']:
+                if batch['status'] != 'ended':
+                    status, _, data = api_request('POST', f"{BATCHES_PATH}/{batch['id']}/cancel")
+                    _check_response(status, data, f"Cancelling {batch['id']}")
+                    self.log(f"[BATCH] Cancel requested for {batch['id']}")
+
+
+# ============================================================================
+# Shared CLI options
+# ============================================================================
+
+def add_batch_arguments(parser: argparse.ArgumentParser, default_job_file: str):
+    """Add the --batch options shared by the bulk command-line tools."""
+    group = parser.add_argument_group('Message Batches options')
+    group.add_argument('--batch', action='store_true',
+                       help='Submit sub-calls through the Message Batches API '
+                            '(half price, results within 24h; resumable)')
+    group.add_argument('--job-file', default=default_job_file,
+                       help=f'Batch job file used to resume (default: {default_job_file})')
+    group.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                       help=f'Seconds between batch status checks (default: {DEFAULT_POLL_INTERVAL:g})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or cancel a Message Batches job file')
+    parser.add_argument('command', choices=['status', 'cancel'], help='Action to perform')
+    parser.add_argument('job_file', help='Job file written by a --batch run')
+    args = parser.parse_args()
+
+    if not Path(args.job_file).exists():
+        print(f"Error: Job file not found: {args.job_file}", file=sys.stderr)
+        sys.exit(1)
+
+    job = BatchJob(args.job_file)
+    if args.command == 'cancel':
+        try:
+            job.cancel()
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    for name, stage in job.state['stages'].items():
+        print(f"Stage '{name}': {len(stage['results'])} results, {len(stage['errors'])} errors")
+        for batch in stage['batches']:
+            print(f"  {batch['id']}: {batch['status']} ({len(batch['custom_ids'])} requests)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+rlm_budget.py - Token, cost and wall-clock budgets for RLM runs.
+
+A BudgetGovernor caps what one run may spend: input tokens, output tokens,
+dollars, and seconds. The chunk scheduler in rlm_processor.py asks it
+before every sub-LLM call. Each call is admitted with its pre-flight
+estimate reserved, downgraded to FAST_MODEL when the primary model would
+no longer fit, or refused with BudgetExceeded so processing stops early.
+Part of every limit is held back for the final aggregation, so a run that
+runs out of budget still produces an answer from what it has analyzed.
+
+Spend is measured from rlm_query's per-model metrics, so retries, hedges
+and prompt-cache tokens are all counted.
+
+Usage:
+    python rlm_budget.py document.txt                 # pre-flight cost estimate
+    python rlm_budget.py document.txt --chunk-size 20000 --fast
+    python rlm_processor.py document.txt "Summarize" --max-cost 0.50 --max-time 300
+"""
+
+import sys
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+from rlm_query import DEFAULT_MODEL, FAST_MODEL, get_metrics
+
+
+# USD per million tokens (input, output), matched by longest model-name prefix.
+# Prompt-cache writes cost 1.25x input and reads 0.1x input.
+PRICING = {
+    'claude-opus-4-5': (5.00, 25.00),
+    'claude-opus-4': (15.00, 75.00),
+    'claude-sonnet-4': (3.00, 15.00),
+    'claude-3-7-sonnet': (3.00, 15.00),
+    'claude-haiku-4-5': (1.00, 5.00),
+    'claude-3-5-haiku': (0.80, 4.00),
+}
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.10
+
+# Share of each limit kept back for the final aggregation calls
+AGGREGATION_RESERVE = 0.10
+
+# Expected output before any call has completed, as a share of max_tokens
+DEFAULT_OUTPUT_FRACTION = 0.25
+
+LIMITS = ('input_tokens', 'output_tokens', 'dollars', 'seconds')
+
+
+class BudgetExceeded(Exception):
+    """Raised when a call does not fit in what is left of the budget."""
+
+
+def model_pricing(model: str):
+    """(input, output) USD per million tokens; unknown models are priced as Sonnet."""
+    matches = [prefix for prefix in PRICING if model.startswith(prefix)]
+    if not matches:
+        return PRICING['claude-sonnet-4']
+    return PRICING[max(matches, key=len)]
+
+
+def usage_cost(model: str, usage: dict) -> float:
+    """Dollar cost of a usage dict (input/output/cache token counts) for a model."""
+    input_price, output_price = model_pricing(model)
+    return (
+        (usage.get('input_tokens') or 0) * input_price
+        + (usage.get('cache_creation_input_tokens') or 0) * input_price * CACHE_WRITE_MULTIPLIER
+        + (usage.get('cache_read_input_tokens') or 0) * input_price * CACHE_READ_MULTIPLIER
+        + (usage.get('output_tokens') or 0) * output_price
+    ) / 1_000_000
+
+
+def _all_input_tokens(usage: dict) -> int:
+    return ((usage.get('input_tokens') or 0) + (usage.get('cache_creation_input_tokens') or 0)
+            + (usage.get('cache_read_input_tokens') or 0))
+
+
+class BudgetGovernor:
+    """
+    Enforce spending limits across all sub-LLM calls of one run.
+
+    Thread-safe: concurrent callers each reserve their estimate, so parallel
+    chunk workers cannot jointly overshoot what is left.
+
+    Args:
+        max_input_tokens: Cap on input tokens (including prompt-cache reads/writes)
+        max_output_tokens: Cap on output tokens
+        max_dollars: Cap on estimated spend in USD (see PRICING)
+        max_seconds: Cap on wall-clock time since the governor was created
+        downgrade: Switch calls to `fallback_model` instead of stopping when
+            the requested model no longer fits
+        fallback_model: Cheaper model used for downgrades
+        reserve: Share of each limit only final (aggregation) calls may use
+    """
+
+    def __init__(
+        self,
+        max_input_tokens: Optional[int] = None,
+        max_output_tokens: Optional[int] = None,
+        max_dollars: Optional[float] = None,
+        max_seconds: Optional[float] = None,
+        downgrade: bool = True,
+        fallback_model: str = FAST_MODEL,
+        reserve: float = AGGREGATION_RESERVE
+    ):
+        self.limits = {'input_tokens': max_input_tokens, 'output_tokens': max_output_tokens,
+                       'dollars': max_dollars, 'seconds': max_seconds}
+        self.downgrade = downgrade
+        self.fallback_model = fallback_model
+        self.reserve = reserve
+        self.admitted = 0
+        self.downgraded = 0
+        self.refused = 0
+        self.stop_reason: Optional[str] = None
+        self._pending = dict.fromkeys(LIMITS, 0.0)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._baseline = self._model_usage()
+
+    @property
+    def enabled(self) -> bool:
+        return any(limit is not None for limit in self.limits.values())
+
+    @staticmethod
+    def _model_usage() -> Dict[str, dict]:
+        return {model: dict(entry) for model, entry in get_metrics()['models'].items()}
+
+    def spent(self) -> Dict[str, float]:
+        """What the run has used so far (calls that have completed)."""
+        totals = dict.fromkeys(LIMITS, 0.0)
+        for model, entry in self._model_usage().items():
+            base = self._baseline.get(model, {})
+            delta = {field: (entry.get(field) or 0) - (base.get(field) or 0)
+                     for field in ('input_tokens', 'output_tokens',
+                                   'cache_creation_input_tokens', 'cache_read_input_tokens')}
+            totals['input_tokens'] += _all_input_tokens(delta)
+            totals['output_tokens'] += delta['output_tokens']
+            totals['dollars'] += usage_cost(model, delta)
+        totals['seconds'] = time.monotonic() - self._started
+        return totals
+
+    def estimate(self, model: str, prompt_tokens: int, max_tokens: int) -> Dict[str, float]:
+        """
+        Pre-flight estimate for one call.
+
+        Output is the mean observed for the model so far, or a quarter of
+        max_tokens before any call has finished; time is the observed median
+        latency.
+        """
+        entry = get_metrics()['models'].get(model, {})
+        requests = entry.get('requests') or 0
+        if requests:
+            output_tokens = min(max_tokens, entry['output_tokens'] / requests)
+        else:
+            output_tokens = max_tokens * DEFAULT_OUTPUT_FRACTION
+        input_tokens = prompt_tokens
+        return {
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'dollars': usage_cost(model, {'input_tokens': input_tokens,
+                                          'output_tokens': output_tokens}),
+            'seconds': entry.get('latency', {}).get('p50') or 0.0,
+        }
+
+    def preflight(self, model: str, prompt_sizes: Iterable[int], max_tokens: int) -> Dict[str, float]:
+        """Estimated totals for calls with these prompt sizes in tokens (seconds assume they run in turn)."""
+        totals = dict.fromkeys(LIMITS, 0.0)
+        totals['calls'] = 0
+        for size in prompt_sizes:
+            for key, value in self.estimate(model, size, max_tokens).items():
+                totals[key] += value
+            totals['calls'] += 1
+        return totals
+
+    def fits(self, estimate: Dict[str, float], final: bool = False) -> Optional[str]:
+        """Return None if `estimate` fits in what is left, else the limit it would break."""
+        spent = self.spent()
+        share = 1.0 if final else 1.0 - self.reserve
+        for name in LIMITS:
+            limit = self.limits[name]
+            if limit is None:
+                continue
+            pending = 0.0 if name == 'seconds' else self._pending[name]
+            if spent[name] + pending + estimate[name] > limit * share:
+                return f"{name.replace('_', ' ')} limit ({_format_amount(name, limit)})"
+        return None
+
+    def plan_model(self, model: str, prompt_sizes: Iterable[int], max_tokens: int) -> str:
+        """
+        Model to run a whole stage with: `model` if its pre-flight estimate fits,
+        else the fallback model if that fits (and downgrades are allowed).
+        """
+        sizes = list(prompt_sizes)
+        if self.fits(self.preflight(model, sizes, max_tokens)) is None:
+            return model
+        if (self.downgrade and model != self.fallback_model
+                and self.fits(self.preflight(self.fallback_model, sizes, max_tokens)) is None):
+            return self.fallback_model
+        return model
+
+    @contextmanager
+    def call(self, model: str, prompt_tokens: int, max_tokens: int, final: bool = False) -> Iterator[str]:
+        """
+        Admit one call; yields the model to use.
+
+        The call's estimate is reserved until the block exits, by which time
+        its real usage has been recorded.
+
+        Raises:
+            BudgetExceeded: If neither the model nor the fallback fits
+        """
+        with self._lock:
+            estimate = self.estimate(model, prompt_tokens, max_tokens)
+            reason = self.fits(estimate, final)
+            if reason is not None and self.downgrade and model != self.fallback_model:
+                fallback = self.estimate(self.fallback_model, prompt_tokens, max_tokens)
+                if self.fits(fallback, final) is None:
+                    model, estimate, reason = self.fallback_model, fallback, None
+                    self.downgraded += 1
+            if reason is not None:
+                self.refused += 1
+                if self.stop_reason is None:
+                    self.stop_reason = reason
+                raise BudgetExceeded(f"Budget exhausted: {reason}")
+            self.admitted += 1
+            for name in LIMITS:
+                self._pending[name] += estimate[name]
+        try:
+            yield model
+        finally:
+            with self._lock:
+                for name in LIMITS:
+                    self._pending[name] -= estimate[name]
+
+    def report(self) -> dict:
+        """Limits, spend and call counts as a JSON-serializable dict."""
+        return {
+            'limits': dict(self.limits),
+            'spent': self.spent(),
+            'calls_admitted': self.admitted,
+            'calls_downgraded': self.downgraded,
+            'calls_refused': self.refused,
+            'stop_reason': self.stop_reason,
+        }
+
+    def summary(self) -> str:
+        """One line per limit: spent / limit."""
+        spent = self.spent()
+        parts = []
+        for name in LIMITS:
+            limit = self.limits[name]
+            used = _format_amount(name, spent[name])
+            parts.append(f"{name.replace('_', ' ')}: {used}"
+                         + (f" / {_format_amount(name, limit)}" if limit is not None else ""))
+        line = "Budget: " + ", ".join(parts)
+        line += f" ({self.admitted} calls, {self.downgraded} downgraded, {self.refused} refused)"
+        if self.stop_reason:
+            line += f"\nBudget stopped processing: {self.stop_reason}"
+        return line
+
+
+def _format_amount(name: str, value: float) -> str:
+    if name == 'dollars':
+        return f"${value:,.4f}"
+    if name == 'seconds':
+        return f"{value:,.1f}s"
+    return f"{int(value):,}"
+
+
+def add_budget_arguments(parser: argparse.ArgumentParser):
+    """Add the budget options shared by the RLM pipeline CLIs."""
+    group = parser.add_argument_group('Budget options')
+    group.add_argument('--max-input-tokens', type=int, default=None, metavar='N',
+                       help='Stop sending sub-calls once this many input tokens are used')
+    group.add_argument('--max-output-tokens', type=int, default=None, metavar='N',
+                       help='Stop sending sub-calls once this many output tokens are used')
+    group.add_argument('--max-cost', type=float, default=None, metavar='DOLLARS',
+                       help='Stop sending sub-calls once this much is spent (estimated from list prices)')
+    group.add_argument('--max-time', type=float, default=None, metavar='SECONDS',
+                       help='Stop sending sub-calls after this much wall-clock time')
+    group.add_argument('--no-downgrade', action='store_true',
+                       help=f'Stop instead of switching to {FAST_MODEL} when the budget runs low')
+
+
+def budget_from_args(args: argparse.Namespace) -> Optional[BudgetGovernor]:
+    """Build a governor from add_budget_arguments options (None if no limit was given)."""
+    governor = BudgetGovernor(
+        max_input_tokens=args.max_input_tokens,
+        max_output_tokens=args.max_output_tokens,
+        max_dollars=args.max_cost,
+        max_seconds=args.max_time,
+        downgrade=not args.no_downgrade,
+    )
+    return governor if governor.enabled else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate what an rlm_processor run will cost')
+    parser.add_argument('context_file', help='File that would be processed')
+    parser.add_argument('--chunk-size', '-c', type=int, default=40000,
+                        help='Target chunk size in characters (default: 40000)')
+    parser.add_argument('--chunk-tokens', '-t', type=int, default=None,
+                        help='Target chunk size in estimated tokens (overrides --chunk-size)')
+    parser.add_argument('--fast', '-f', action='store_true',
+                        help=f'Estimate for {FAST_MODEL} chunk calls')
+    args = parser.parse_args()
+
+    from rlm_processor import auto_chunk, build_chunk_prompt, estimate_tokens
+
+    try:
+        with open(args.context_file, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    chunks, strategy = auto_chunk(content, args.chunk_size, args.chunk_tokens)
+    sizes = [sum(map(estimate_tokens, build_chunk_prompt(chunk, i, len(chunks), '')))
+             for i, chunk in enumerate(chunks)]
+    governor = BudgetGovernor()
+    print(f"{len(chunks)} chunks ({strategy}), ~{sum(sizes):,} input tokens")
+    for model in ([FAST_MODEL] if args.fast else [DEFAULT_MODEL, FAST_MODEL]):
+        estimate = governor.preflight(model, sizes, 2048)
+        print(f"  {model}: ~${estimate['dollars']:.2f} for chunk calls "
+              f"(assuming ~{int(estimate['output_tokens'] / max(1, estimate['calls'])):,} "
+              f"output tokens each), plus aggregation")
+
+
+if __name__ == "__main__":
+    main()
@@ -33,7 +33,11 @@ import sys
 import json
 import argparse
 import re
-from typing import List, Optional, Tuple
+import itertools
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import IO, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 from pathlib import Path
 
 # Import file converter for auto-detection
@@ -45,12 +49,23 @@ except ImportError:
 
 # Import from sibling module
 try:
-    from rlm_query import llm_query, llm_query_fast, DEFAULT_MODEL, FAST_MODEL, load_api_key, get_usage, reset_usage
+    from rlm_query import (
+        llm_query, llm_query_fast, llm_query_stream, collect_stream, allm_query, DEFAULT_MODEL, FAST_MODEL,
+        load_api_key, get_usage, reset_usage, get_cache_stats, add_client_arguments,
+        apply_client_arguments
+    )
 except ImportError:
     def get_usage():
-        return {"input_tokens": 0, "output_tokens": 0, "requests": 0}
+        return {"input_tokens": 0, "output_tokens": 0, "requests": 0,
+                "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
     def reset_usage():
         pass
+    def get_cache_stats():
+        return {}
+    def add_client_arguments(parser):
+        pass
+    def apply_client_arguments(args):
+        pass
     # If running directly, define inline with Windows/.claude support
     import shutil
     import subprocess
@@ -88,7 +103,8 @@ except ImportError:
 
         return None
 
-    def llm_query(prompt: str, model: str = DEFAULT_MODEL, max_tokens: int = 4096) -> str:
+    def llm_query(prompt: str, model: str = DEFAULT_MODEL, max_tokens: int = 4096,
+                  system: Optional[str] = None, **kwargs) -> str:
         api_key = load_api_key()
         if not api_key:
             if sys.platform == 'win32':
@@ -105,6 +121,8 @@ except ImportError:
             "max_tokens": max_tokens,
             "messages": [{"role": "user", "content": prompt}]
         }
+        if system:
+            payload["system"] = system
 
         import tempfile
         payload_json = json.dumps(payload)
@@ -142,7 +160,95 @@ except ImportError:
         return response['content'][0]['text']
 
     def llm_query_fast(prompt: str, **kwargs) -> str:
-        return llm_query(prompt, model=FAST_MODEL, **kwargs)
+        kwargs['model'] = kwargs.get('model', FAST_MODEL)
+        return llm_query(prompt, **kwargs)
+
+    def llm_query_stream(prompt: str, **kwargs):
+        yield llm_query(prompt, **kwargs)
+
+    def collect_stream(deltas, stop_at=None) -> str:
+        return ''.join(deltas)
+
+
+# Import token estimator (optional; falls back to chars/4)
+try:
+    from token_estimator import estimate_tokens, get_estimator
+    TOKEN_ESTIMATOR_AVAILABLE = True
+except ImportError:
+    TOKEN_ESTIMATOR_AVAILABLE = False
+
+    def estimate_tokens(text: str) -> int:
+        return len(text) // 4
+
+# Import budget governor (optional)
+try:
+    from rlm_budget import BudgetExceeded, add_budget_arguments, budget_from_args
+    BUDGET_AVAILABLE = True
+except ImportError:
+    BUDGET_AVAILABLE = False
+
+    class BudgetExceeded(Exception):
+        pass
+
+    def add_budget_arguments(parser):
+        pass
+
+    def budget_from_args(args):
+        return None
+
+from structure_scan import StructureScan, scan_structure
+from keyword_scanner import KeywordScanner, hit_counts, scan_chunks
+
+# BM25 chunk ranking (used by --top-k / --top-tokens)
+try:
+    from chunk_ranking import BM25Index, select_ranked
+    RANKING_AVAILABLE = True
+except ImportError:
+    RANKING_AVAILABLE = False
+
+# TF-IDF similarity ranking (used by --similarity)
+try:
+    from chunk_similarity import TfidfIndex
+    SIMILARITY_AVAILABLE = True
+except ImportError:
+    SIMILARITY_AVAILABLE = False
+
+# Persistent per-document indexes (used by --index)
+try:
+    import document_index
+    DOCUMENT_INDEX_AVAILABLE = True
+except ImportError:
+    DOCUMENT_INDEX_AVAILABLE = False
+
+# Offset-based chunks over memory-mapped files (used by --mmap)
+try:
+    from chunk_source import MappedSource, auto_chunk_spans
+    CHUNK_SOURCE_AVAILABLE = True
+except ImportError:
+    CHUNK_SOURCE_AVAILABLE = False
+
+
+# Without --top-k/--top-tokens, --similarity keeps chunks scoring at least
+# this fraction of the best chunk's similarity
+SIMILARITY_KEEP_RATIO = 0.25
+
+# --first-match: confidence (0-100) a chunk's answer needs to end the run
+DEFAULT_CONFIDENCE_THRESHOLD = 80
+
+# The last line of a chunk response asked to rate its confidence
+CONFIDENCE_LINE = re.compile(r'^[ \t*_]*CONFIDENCE[ \t*_]*:[ \t*_]*(\d{1,3})[ \t]*%?[ \t*_]*$',
+                             re.IGNORECASE | re.MULTILINE)
+
+# Findings over this many estimated tokens are aggregated as a reduce tree,
+# merging at most AGGREGATION_FAN_IN findings (and this many tokens) per call
+MAX_AGGREGATION_TOKENS = 12500
+AGGREGATION_FAN_IN = 8
+
+# Text a streaming chunker can read: a string, a text file handle or an iterable of strings
+TextSource = Union[str, IO[str], Iterable[str]]
+
+# Overlap between consecutive token-sized chunks (about 500 characters of prose)
+CHUNK_OVERLAP_TOKENS = 125
 
 
 # ============================================================================
@@ -181,73 +287,525 @@ def chunk_by_regex(content: str, pattern: str) -> List[str]:
     return [p.strip() for p in parts if p.strip()]
 
 
-def auto_chunk(content: str, target_chunk_size: int = 40000) -> Tuple[List[str], str]:
+def chunk_at_lines(content: str, line_starts: List[int], marker_len: int = 0) -> List[str]:
+    """
+    Split before each line start (dropping the newline and the first
+    marker_len characters of the line), strip, and drop empty parts.
+
+    With the cut points from scan_structure this equals chunk_by_separator /
+    chunk_by_regex without searching the text again.
+    """
+    parts = []
+    start = 0
+    for line_start in line_starts:
+        if line_start == 0:
+            continue
+        parts.append(content[start:line_start - 1])
+        start = line_start + marker_len
+    parts.append(content[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def chunk_by_tokens(content: str, max_tokens: int = 10000,
+                    overlap_tokens: int = 0) -> List[str]:
+    """
+    Chunk at line boundaries so each chunk has at most max_tokens (estimated).
+
+    Lines longer than max_tokens are split evenly by characters. Each chunk
+    after the first repeats up to overlap_tokens of the previous chunk's
+    trailing lines.
+    """
+    return list(iter_chunks_by_tokens(content, max_tokens, overlap_tokens))
+
+
+def fit_chunks_to_tokens(chunks: List[str], max_tokens: int) -> List[str]:
+    """Re-split any chunk whose estimated size exceeds max_tokens."""
+    fitted = []
+    for chunk in chunks:
+        if estimate_tokens(chunk) > max_tokens:
+            fitted.extend(chunk_by_tokens(chunk, max_tokens))
+        else:
+            fitted.append(chunk)
+    return fitted
+
+
+# Boundaries tried, in order, when a unit is too big for one chunk. The
+# separator is kept at the end of the text before it.
+PARAGRAPH_BREAK = re.compile(r'(\n[^\S\n]*\n\s*)')
+SENTENCE_BREAK = re.compile(r'((?<=[.!?])\s+)')
+
+# How packed structural units are rejoined within a chunk
+PACK_JOINERS = {
+    'document_separator': '\n\n---\n\n',
+    'markdown_headers': '\n\n',
+    'line_count': '\n',
+}
+
+
+def pack_units(units: Iterable[str], max_size: int, size=len,
+               joiner: str = '\n\n', split=None) -> List[str]:
+    """
+    Greedily merge adjacent units into chunks of at most max_size.
+
+    `size` measures text (len for characters, estimate_tokens for tokens).
+    Units are joined with `joiner`; a unit bigger than max_size on its own
+    is split by `split` (default: split_at_boundaries).
+    """
+    chunks = []
+    current: List[str] = []
+    current_size = 0
+    joiner_size = size(joiner)
+    for unit in units:
+        unit_size = size(unit)
+        if unit_size > max_size:
+            if current:
+                chunks.append(joiner.join(current))
+                current, current_size = [], 0
+            chunks.extend(split(unit) if split else split_at_boundaries(unit, max_size, size))
+            continue
+        if current and current_size + joiner_size + unit_size > max_size:
+            chunks.append(joiner.join(current))
+            current, current_size = [], 0
+        current_size += unit_size + (joiner_size if current else 0)
+        current.append(unit)
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+
+def split_at_boundaries(text: str, max_size: int, size=len,
+                        patterns: Tuple = (PARAGRAPH_BREAK, SENTENCE_BREAK)) -> List[str]:
+    """
+    Split text into chunks of at most max_size at paragraph breaks, then at
+    sentence ends, packing the pieces back together.
+
+    A piece still too big is split at the next boundary in `patterns` only,
+    never again at the one that produced it (its kept separator would match
+    again). Text with none is cut by characters (with overlap) or, when sized
+    by tokens, by lines.
+    """
+    for k, pattern in enumerate(patterns):
+        parts = pattern.split(text)
+        if len(parts) > 1:
+            # Keep each separator with the text before it, so joining with '' restores the text
+            pieces = [''.join(parts[i:i + 2]) for i in range(0, len(parts), 2)]
+            rest = patterns[k + 1:]
+            chunks = pack_units(pieces, max_size, size, joiner='',
+                                split=lambda piece: split_at_boundaries(piece, max_size, size, rest))
+            return [c.strip() for c in chunks if c.strip()]
+    if size is len:
+        return chunk_by_chars(text, max_size, 500 if max_size > 2000 else 0)
+    return chunk_by_tokens(text, max_size)
+
+
+def pack_chunk(
+    content: str,
+    target_chunk_size: int = 40000,
+    chunk_tokens: Optional[int] = None
+) -> Tuple[List[str], str]:
+    """
+    Chunk by structure, then pack adjacent units up to the target size.
+
+    The structural strategy is picked as in auto_chunk, but its units
+    (documents, H1/H2 sections or lines) are merged into as few chunks as
+    fit the target instead of one chunk per unit. Units that are too big are
+    split at paragraph or sentence boundaries. Without structure the text is
+    split at paragraph and sentence boundaries rather than mid-sentence.
+
+    Returns:
+        Tuple of (chunks, strategy_name)
+    """
+    size = len
+    max_size = target_chunk_size
+    if chunk_tokens:
+        chars_per_token = get_estimator().chars_per_token(content) if TOKEN_ESTIMATOR_AVAILABLE else 4.0
+        target_chunk_size = int(chunk_tokens * chars_per_token)
+        size, max_size = estimate_tokens, chunk_tokens
+
+    scan = scan_structure(content)
+    strategy = detect_strategies(scan, target_chunk_size)[0]
+    if strategy == 'document_separator':
+        units = chunk_at_lines(content, scan.separator_starts, 3)
+    elif strategy == 'markdown_headers':
+        units = chunk_at_lines(content, scan.header_starts)
+    elif strategy == 'line_count':
+        units = content.split('\n')
+    else:
+        return split_at_boundaries(content, max_size, size), 'packed_paragraphs'
+    return pack_units(units, max_size, size, PACK_JOINERS[strategy]), f"packed_{strategy}"
+
+
+def auto_chunk(
+    content: str,
+    target_chunk_size: int = 40000,
+    chunk_tokens: Optional[int] = None,
+    pack: bool = False
+) -> Tuple[List[str], str]:
     """
     Automatically detect the best chunking strategy.
+
+    With chunk_tokens, chunks are sized by estimated tokens instead of
+    characters: structural strategies are tried with the equivalent
+    character size for this content, oversized chunks are re-split, and the
+    fallback packs whole lines up to the token target.
+
+    With pack, adjacent structural units are merged up to the target size
+    (see pack_chunk), so fewer sub-LLM calls are needed.
     
     Returns:
         Tuple of (chunks, strategy_name)
     """
-    # Detect structure
-    doc_seps = len(re.findall(r'\n---+\n|\n===+\n', content))
-    json_objs = len(re.findall(r'^\s*\{', content, re.MULTILINE))
-    md_headers = len(re.findall(r'^#+\s+', content, re.MULTILINE))
-    
-    total_chars = len(content)
-    total_lines = content.count('\n')
-    
-    # Choose strategy
+    if pack:
+        return pack_chunk(content, target_chunk_size, chunk_tokens)
+
+    if chunk_tokens:
+        chars_per_token = get_estimator().chars_per_token(content) if TOKEN_ESTIMATOR_AVAILABLE else 4.0
+        chunks, strategy = auto_chunk(content, int(chunk_tokens * chars_per_token))
+        if strategy == 'character_count':
+            return chunk_by_tokens(content, chunk_tokens, CHUNK_OVERLAP_TOKENS), 'token_count'
+        if strategy == 'line_count':
+            # Pack whole lines by their own token counts rather than a fixed line count
+            return chunk_by_tokens(content, chunk_tokens), 'token_line_count'
+        return fit_chunks_to_tokens(chunks, chunk_tokens), strategy
+
+    scan = scan_structure(content)
+    for strategy in detect_strategies(scan, target_chunk_size):
+        if strategy == 'document_separator':
+            # chunk_by_separator(content, '\n---') at the scanned cut points
+            return chunk_at_lines(content, scan.separator_starts, 3), strategy
+        if strategy == 'markdown_headers':
+            # Chunk at H1/H2 headers
+            chunks = chunk_at_lines(content, scan.header_starts)
+            if all(len(c) < target_chunk_size * 2 for c in chunks):
+                return chunks, strategy
+        if strategy == 'line_count':
+            # Short lines = structured data, chunk by lines
+            return chunk_by_lines(content, lines_per_chunk(target_chunk_size)), strategy
+
+    # Default: character-based chunking
+    return chunk_by_chars(content, target_chunk_size), 'character_count'
+
+
+def detect_strategies(sample: Union[str, StructureScan], target_chunk_size: int = 40000) -> List[str]:
+    """
+    Chunking strategies that suit `sample`'s structure, most preferred first.
+
+    `sample` is the text or its scan_structure result. Always ends with
+    'character_count', the fallback.
+    """
+    scan = sample if isinstance(sample, StructureScan) else scan_structure(sample)
+    doc_seps = scan.separators
+    md_headers = scan.markdown_headers
+
+    total_chars = scan.chars
+    total_lines = scan.newlines
+
+    strategies = []
     if doc_seps > 5 and total_chars / doc_seps < target_chunk_size * 2:
-        return chunk_by_separator(content, '\n---'), 'document_separator'
-    
+        strategies.append('document_separator')
     if md_headers > 10:
-        # Chunk at H1/H2 headers
-        chunks = chunk_by_regex(content, r'\n(?=#{1,2}\s+)')
-        if all(len(c) < target_chunk_size * 2 for c in chunks):
-            return chunks, 'markdown_headers'
-    
+        strategies.append('markdown_headers')
     if total_lines > 100 and total_chars / total_lines < 200:
-        # Short lines = structured data, chunk by lines
-        lines_per_chunk = max(100, target_chunk_size // 100)
-        return chunk_by_lines(content, lines_per_chunk), 'line_count'
-    
-    # Default: character-based chunking
-    return chunk_by_chars(content, target_chunk_size), 'character_count'
+        strategies.append('line_count')
+    strategies.append('character_count')
+    return strategies
+
+
+def lines_per_chunk(target_chunk_size: int) -> int:
+    """Lines per chunk for the line_count strategy."""
+    return max(100, target_chunk_size // 100)
+
+
+# ============================================================================
+# Incremental chunking (file handles and text iterators)
+# ============================================================================
+
+# Block size for reading sources, and how much is read to pick a strategy
+READ_BLOCK_CHARS = 1 << 20
+SNIFF_CHARS = 1 << 20
+
+# file_converter types that are read as-is, so can be streamed from disk
+STREAMABLE_FILE_TYPES = ('text', 'code', 'xml', 'csv', 'yaml')
+
+MARKDOWN_SPLIT = r'\n(?=#{1,2}\s+)'
+_MARKDOWN_HEADER = re.compile(r'#{1,2}\s')
+
+
+def iter_text(source: TextSource, block_chars: Optional[int] = None) -> Iterator[str]:
+    """Yield a string, a text file handle (read in blocks) or an iterable of strings piece by piece."""
+    block_chars = block_chars or READ_BLOCK_CHARS
+    if isinstance(source, str):
+        for start in range(0, len(source), block_chars):
+            yield source[start:start + block_chars]
+    elif hasattr(source, 'read'):
+        while True:
+            block = source.read(block_chars)
+            if not block:
+                break
+            yield block
+    else:
+        for piece in source:
+            if piece:
+                yield piece
+
+
+def iter_line_blocks(source: TextSource) -> Iterator[str]:
+    """Yield the text in blocks that end just after a newline (except possibly the last)."""
+    pending = ''
+    for block in iter_text(source):
+        cut = block.rfind('\n') + 1
+        if not cut:
+            pending += block
+            continue
+        yield pending + block[:cut]
+        pending = block[cut:]
+    if pending:
+        yield pending
+
+
+def iter_split_lines(source: TextSource) -> Iterator[str]:
+    """Yield the lines of the text without newlines, exactly like str.split('\\n')."""
+    pending = ''
+    for block in iter_line_blocks(source):
+        lines = (pending + block).split('\n')
+        pending = lines.pop()
+        yield from lines
+    yield pending
+
+
+def iter_chunks_by_chars(source: TextSource, chunk_size: int = 40000,
+                         overlap: int = 500) -> Iterator[str]:
+    """Streaming chunk_by_chars: yields the same chunks without holding the whole text."""
+    buffer, pos = '', 0
+    for block in iter_text(source):
+        buffer = buffer[pos:] + block
+        pos = 0
+        # Only cut while more text follows the chunk, so overlap matches chunk_by_chars
+        while len(buffer) - pos > chunk_size:
+            yield buffer[pos:pos + chunk_size]
+            pos += chunk_size - overlap if overlap else chunk_size
+    buffer = buffer[pos:]
+    while buffer:
+        yield buffer[:chunk_size]
+        if len(buffer) <= chunk_size:
+            break
+        buffer = buffer[chunk_size - overlap if overlap else chunk_size:]
+
+
+def iter_chunks_by_lines(source: TextSource, lines_per_chunk: int = 500) -> Iterator[str]:
+    """Streaming chunk_by_lines."""
+    group = []
+    for line in iter_split_lines(source):
+        group.append(line)
+        if len(group) == lines_per_chunk:
+            yield '\n'.join(group)
+            group = []
+    if group:
+        yield '\n'.join(group)
+
+
+def iter_chunks_by_separator(source: TextSource, separator: str = '\n---\n') -> Iterator[str]:
+    """Streaming chunk_by_separator."""
+    buffer = ''
+    for block in iter_text(source):
+        search_from = max(0, len(buffer) - len(separator) + 1)
+        buffer += block
+        while True:
+            found = buffer.find(separator, search_from)
+            if found < 0:
+                break
+            part = buffer[:found].strip()
+            if part:
+                yield part
+            buffer = buffer[found + len(separator):]
+            search_from = 0
+    part = buffer.strip()
+    if part:
+        yield part
+
+
+def iter_chunks_by_headers(source: TextSource) -> Iterator[str]:
+    """Streaming chunk_by_regex(content, MARKDOWN_SPLIT): a new chunk at each H1/H2 line."""
+    section: List[str] = []
+    lines = iter_split_lines(source)
+    line = next(lines)
+    for following in lines:
+        # A header needs whitespace after its #s, and the newline counts as whitespace
+        if section and _MARKDOWN_HEADER.match(line + '\n'):
+            part = '\n'.join(section).strip()
+            if part:
+                yield part
+            section = []
+        section.append(line)
+        line = following
+    if section and _MARKDOWN_HEADER.match(line):
+        part = '\n'.join(section).strip()
+        if part:
+            yield part
+        section = []
+    section.append(line)
+    part = '\n'.join(section).strip()
+    if part:
+        yield part
+
+
+def iter_chunks_by_tokens(source: TextSource, max_tokens: int = 10000,
+                          overlap_tokens: int = 0) -> Iterator[str]:
+    """Streaming chunk_by_tokens."""
+    if not TOKEN_ESTIMATOR_AVAILABLE:
+        yield from iter_chunks_by_chars(source, max_tokens * 4, overlap_tokens * 4)
+        return
+
+    estimator = get_estimator()
+    current: List[Tuple[str, float]] = []
+    current_tokens = 0.0
+    for block in iter_line_blocks(source):
+        lines = block.split('\n')
+        pieces = [line + '\n' for line in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+        for piece, tokens in zip(pieces, estimator.line_counts(block)):
+            if tokens > max_tokens:
+                if current:
+                    yield ''.join(p for p, _ in current)
+                    current, current_tokens = [], 0.0
+                parts = int(tokens // max_tokens) + 1
+                size = -(-len(piece) // parts)
+                for i in range(0, len(piece), size):
+                    yield piece[i:i + size]
+                continue
+            if current and current_tokens + tokens > max_tokens:
+                yield ''.join(p for p, _ in current)
+                kept, kept_tokens = [], 0.0
+                for p, t in reversed(current):
+                    if kept_tokens + t > overlap_tokens:
+                        break
+                    kept.insert(0, (p, t))
+                    kept_tokens += t
+                if kept_tokens + tokens > max_tokens:
+                    kept, kept_tokens = [], 0.0
+                current, current_tokens = kept, kept_tokens
+            current.append((piece, tokens))
+            current_tokens += tokens
+    if current:
+        yield ''.join(p for p, _ in current)
+
+
+def iter_auto_chunk(
+    source: TextSource,
+    target_chunk_size: int = 40000,
+    chunk_tokens: Optional[int] = None
+) -> Tuple[Iterator[str], str]:
+    """
+    Streaming auto_chunk.
+
+    The strategy is picked from the first SNIFF_CHARS of the text; the rest
+    is read only as the returned iterator is consumed. Text that fits in the
+    sample is chunked exactly like auto_chunk. For longer text, markdown
+    sections over twice the target size are split by characters instead of
+    switching the whole document to another strategy.
+
+    Returns:
+        Tuple of (chunk iterator, strategy_name)
+    """
+    blocks = iter_text(source)
+    sample_blocks = []
+    sampled = 0
+    for block in blocks:
+        sample_blocks.append(block)
+        sampled += len(block)
+        if sampled >= SNIFF_CHARS:
+            break
+    else:
+        chunks, strategy = auto_chunk(''.join(sample_blocks), target_chunk_size, chunk_tokens)
+        return iter(chunks), strategy
+
+    sample = ''.join(sample_blocks)
+    text = itertools.chain([sample], blocks)
+    if chunk_tokens:
+        chars_per_token = get_estimator().chars_per_token(sample) if TOKEN_ESTIMATOR_AVAILABLE else 4.0
+        target_chunk_size = int(chunk_tokens * chars_per_token)
+
+    strategy = detect_strategies(sample, target_chunk_size)[0]
+    if strategy == 'document_separator':
+        chunks = iter_chunks_by_separator(text, '\n---')
+    elif strategy == 'markdown_headers':
+        chunks = (piece for section in iter_chunks_by_headers(text)
+                  for piece in (chunk_by_chars(section, target_chunk_size)
+                                if len(section) >= target_chunk_size * 2 else [section]))
+    elif chunk_tokens:
+        overlap = CHUNK_OVERLAP_TOKENS if strategy == 'character_count' else 0
+        name = 'token_count' if strategy == 'character_count' else 'token_line_count'
+        return iter_chunks_by_tokens(text, chunk_tokens, overlap), name
+    elif strategy == 'line_count':
+        chunks = iter_chunks_by_lines(text, lines_per_chunk(target_chunk_size))
+    else:
+        chunks = iter_chunks_by_chars(text, target_chunk_size)
+
+    if chunk_tokens:
+        chunks = (piece for chunk in chunks
+                  for piece in (chunk_by_tokens(chunk, chunk_tokens)
+                                if estimate_tokens(chunk) > chunk_tokens else [chunk]))
+    return chunks, strategy
 
 
 # ============================================================================
 # RLM Processing Pipeline
 # ============================================================================
 
+def query_keywords(query: str) -> List[str]:
+    """Potential keywords of a query: words of 4+ letters that are not common words."""
+    query_words = re.findall(r'\b\w{4,}\b', query.lower())
+    # Remove common words
+    stopwords = {'what', 'when', 'where', 'which', 'about', 'this', 'that', 
+                'with', 'from', 'have', 'does', 'find', 'list', 'show'}
+    return [w for w in query_words if w not in stopwords]
+
+
+def query_keyword_scanner(query: str, keywords: Optional[List[str]] = None) -> Optional[KeywordScanner]:
+    """Case-insensitive scanner for the keywords (by default, from the query); None if there are none."""
+    scanner = KeywordScanner(keywords or query_keywords(query))
+    return scanner if scanner else None
+
+
 def filter_relevant_chunks(
     chunks: List[str], 
     query: str, 
-    keywords: Optional[List[str]] = None
+    keywords: Optional[List[str]] = None,
+    top_k: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    log=lambda msg: None,
+    content: Optional[str] = None,
+    index=None,
+    similarity: bool = False
 ) -> List[Tuple[int, str]]:
     """
     Pre-filter chunks using keyword matching (RLM Pattern 1: Filter First).
+
+    With top_k or max_tokens, chunks are instead ranked with BM25
+    (rank_relevant_chunks) and the best are kept, best first. If `content`
+    is the text the chunks were cut from, keywords are found in one scan of
+    it (keyword_scanner.scan_chunks) rather than chunk by chunk. With a
+    document_index.DocumentIndex (whose .chunks are `chunks`), they are
+    looked up in its inverted index instead, and only the chunks returned
+    are decompressed. With similarity=True, chunks are ranked by TF-IDF
+    similarity to the whole query rather than by keywords, even without
+    top_k or max_tokens (see rank_relevant_chunks).
     
     Returns list of (original_index, chunk) tuples for relevant chunks.
     """
-    if not keywords:
-        # Extract potential keywords from query
-        query_words = re.findall(r'\b\w{4,}\b', query.lower())
-        # Remove common words
-        stopwords = {'what', 'when', 'where', 'which', 'about', 'this', 'that', 
-                    'with', 'from', 'have', 'does', 'find', 'list', 'show'}
-        keywords = [w for w in query_words if w not in stopwords]
-    
-    if not keywords:
+    if (top_k or max_tokens or similarity) and RANKING_AVAILABLE:
+        return rank_relevant_chunks(chunks, query, keywords, top_k, max_tokens, log, content, index,
+                                    similarity)
+
+    scanner = query_keyword_scanner(query, keywords)
+
+    if scanner is None:
         # No filtering possible, return all
         return [(i, c) for i, c in enumerate(chunks)]
     
-    # Build regex pattern
-    pattern = '|'.join(re.escape(kw) for kw in keywords)
-    
     relevant = []
-    for i, chunk in enumerate(chunks):
-        if re.search(pattern, chunk, re.IGNORECASE):
-            relevant.append((i, chunk))
+    for i, counts in enumerate(_keyword_counts(scanner, chunks, content, index)):
+        if counts:
+            relevant.append((i, chunks[i]))
     
     # If filtering removed too much, return all
     if len(relevant) < len(chunks) * 0.1:
@@ -256,83 +814,269 @@ def filter_relevant_chunks(
     return relevant
 
 
-def process_chunk(
-    chunk: str, 
-    chunk_index: int, 
-    total_chunks: int, 
+def rank_relevant_chunks(
+    chunks: List[str],
     query: str,
-    fast_model: bool = False
-) -> Optional[str]:
+    keywords: Optional[List[str]] = None,
+    top_k: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    log=lambda msg: None,
+    content: Optional[str] = None,
+    index=None,
+    similarity: bool = False
+) -> List[Tuple[int, str]]:
     """
-    Process a single chunk with sub-LLM call.
-    
-    Returns None if no relevant info found.
+    Rank chunks against the query keywords with BM25 and keep the best.
+
+    Term frequencies are the keyword hit counts from one keyword scan (so a
+    keyword also matches longer words containing it, as in the keyword
+    filter), or from the inverted index of a DocumentIndex. Chunks are
+    taken best first until top_k chunks or max_tokens estimated tokens are
+    reached; chunks without any keyword are dropped. If no chunk matches
+    (or the query has no keywords), chunks are taken in document order under
+    the same limits.
+
+    With similarity=True, chunks are instead ranked by the cosine similarity
+    of their TF-IDF vectors to the whole query (chunk_similarity.TfidfIndex),
+    which also credits word pairs and shared word parts; a DocumentIndex
+    supplies vectors saved on an earlier run. Without top_k or max_tokens,
+    chunks scoring at least SIMILARITY_KEEP_RATIO of the best are kept.
+
+    Returns list of (original_index, chunk) tuples, best first.
+    """
+    scanner = query_keyword_scanner(query, keywords)
+    ranked = []
+    counts = None
+    method = "BM25"
+    if similarity and SIMILARITY_AVAILABLE:
+        method = "TF-IDF"
+        ranked = (index.tfidf(log) if index is not None else TfidfIndex(chunks)).rank(query)
+        if ranked and not (top_k or max_tokens):
+            cutoff = ranked[0][1] * SIMILARITY_KEEP_RATIO
+            ranked = [(i, score) for i, score in ranked if score >= cutoff]
+    elif scanner is not None:
+        counts = _keyword_counts(scanner, chunks, content, index)
+        if index is not None:
+            lengths = [index.chunk_length(i) for i in range(len(index))]
+        else:
+            lengths = [len(c) for c in chunks]
+        ranked = BM25Index.from_counts(counts, lengths).rank(scanner.keywords)
+    if not ranked:
+        log(f"[RLM] No chunk matches the query {'text' if counts is None else 'keywords'}; "
+            "taking chunks in document order")
+        ranked = [(i, 0.0) for i in range(len(chunks))]
+
+    if not max_tokens:
+        sizes = [0] * len(chunks)
+    elif index is not None:
+        sizes = [index.chunk_tokens(i) for i in range(len(index))]
+    else:
+        sizes = [estimate_tokens(str(c)) for c in chunks]
+    selected = select_ranked(ranked, sizes, top_k, max_tokens)
+    if selected and selected[0][1] > 0:
+        if counts is None:
+            shown = ', '.join(f"#{i + 1} ({score:.2f})" for i, score in selected[:10])
+        else:
+            shown = ', '.join(f"#{i + 1} ({score:.2f}: "
+                              + ' '.join(f"{kw}x{n}" for kw, n in sorted(counts[i].items())) + ")"
+                              for i, score in selected[:10])
+        more = f" +{len(selected) - 10} more" if len(selected) > 10 else ""
+        log(f"[RLM] {method} top chunks: {shown}{more}")
+        if len(selected) < len(ranked):
+            log(f"[RLM] Cut-off score {selected[-1][1]:.2f}; "
+                f"{len(ranked) - len(selected)} lower-ranked matching chunks skipped")
+    return [(i, chunks[i]) for i, _ in selected]
+
+
+def order_by_relevance(
+    indexed_chunks: List[Tuple[int, str]],
+    chunks: List[str],
+    query: str,
+    log=lambda msg: None,
+    content: Optional[str] = None,
+    index=None
+) -> List[Tuple[int, str]]:
+    """
+    Reorder (original_index, chunk) pairs best first by BM25 against the
+    query keywords (rank_relevant_chunks over all of `chunks`); chunks
+    matching no keyword follow in document order.
     """
-    chunk_prompt = f"""You are analyzing section {chunk_index + 1} of {total_chunks} of a large document.
+    if not RANKING_AVAILABLE:
+        return indexed_chunks
+    ranked = rank_relevant_chunks(chunks, query, log=log, content=content, index=index)
+    position = {i: rank for rank, (i, _) in enumerate(ranked)}
+    return sorted(indexed_chunks, key=lambda item: (position.get(item[0], len(position)), item[0]))
 
-ORIGINAL QUERY: {query}
 
-DOCUMENT SECTION:
----
-{chunk}
----
+def _keyword_counts(scanner: KeywordScanner, chunks, content: Optional[str], index) -> List[dict]:
+    """Per chunk, hits per keyword: from the index if there is one, else by scanning."""
+    if index is not None:
+        return index.keyword_counts(scanner.keywords)
+    return [hit_counts(hits) for hits in scan_chunks(scanner, chunks, content)]
+
+
+def build_chunk_prompt(
+    chunk: str,
+    chunk_index: int,
+    total_chunks: Optional[int],
+    query: str,
+    confidence: bool = False
+) -> Tuple[str, str]:
+    """
+    Build the prompt for one chunk as (static_prefix, chunk_message).
+
+    `chunk` may also be a chunk_source.Chunk, whose line range is added to
+    the section heading. With confidence=True the model is also asked to end
+    with a CONFIDENCE line (see split_confidence).
+
+    The prefix (role, query and instructions) is identical for every chunk of
+    a run, so it is sent as a cacheable system prompt; only the section text
+    and its position vary per call.
+    """
+    static_prefix = f"""You are analyzing one section of a large document that has been split into sections.
+
+ORIGINAL QUERY: {query}
 
 INSTRUCTIONS:
 1. Extract any information from this section relevant to answering the query
 2. If nothing relevant is found, respond with exactly: NO_RELEVANT_INFO
 3. Be concise but preserve important details
-4. Note any partial information that might be useful combined with other sections
+4. Note any partial information that might be useful combined with other sections"""
+    if confidence:
+        static_prefix += """
+5. If you found relevant information, end with a line "CONFIDENCE: N", where N (0-100) is how
+   certain you are that this section alone fully and correctly answers the query"""
+
+    position = f"{chunk_index + 1} of {total_chunks}" if total_chunks else f"{chunk_index + 1}"
+    if hasattr(chunk, 'citation'):
+        # chunk_source.Chunk: cite the file and lines, then decode the text
+        position += f" ({chunk.citation()})"
+    chunk_message = f"""DOCUMENT SECTION {position}:
+---
+{chunk}
+---
 
 YOUR ANALYSIS:"""
 
-    query_fn = llm_query_fast if fast_model else llm_query
+    return static_prefix, chunk_message
+
+
+def split_confidence(result: str) -> Tuple[str, Optional[int]]:
+    """Split a chunk's findings into the text and its CONFIDENCE rating (None if missing)."""
+    matches = list(CONFIDENCE_LINE.finditer(result))
+    if not matches:
+        return result, None
+    last = matches[-1]
+    text = (result[:last.start()] + result[last.end():]).strip()
+    return text, min(int(last.group(1)), 100)
+
+
+def interpret_chunk_result(result: str) -> Optional[str]:
+    """Return a chunk's findings, or None if the model found nothing relevant."""
+    if "NO_RELEVANT_INFO" in result:
+        return None
+    return result.strip()
+
+
+def process_chunk(
+    chunk: str, 
+    chunk_index: int, 
+    total_chunks: int, 
+    query: str,
+    fast_model: bool = False,
+    stream: bool = False,
+    budget=None,
+    confidence: bool = False
+) -> Optional[str]:
+    """
+    Process a single chunk with sub-LLM call.
     
-    try:
-        result = query_fn(chunk_prompt, max_tokens=2048)
+    With stream=True the response is streamed and the stream is closed as
+    soon as NO_RELEVANT_INFO appears, so irrelevant chunks stop generating
+    (and billing) output tokens early.
 
-        if "NO_RELEVANT_INFO" in result:
-            return None
+    With a budget (rlm_budget.BudgetGovernor) the call is admitted by the
+    governor first, which may switch it to FAST_MODEL; BudgetExceeded is
+    raised instead of being reported as a chunk error.
+
+    With confidence=True the findings end with a CONFIDENCE line
+    (build_chunk_prompt); split_confidence separates it.
+
+    Returns None if no relevant info found.
+    """
+    static_prefix, chunk_message = build_chunk_prompt(chunk, chunk_index, total_chunks, query, confidence)
+    model = FAST_MODEL if fast_model else DEFAULT_MODEL
+
+    def run(model):
+        if stream:
+            deltas = llm_query_stream(
+                chunk_message, model=model,
+                max_tokens=2048, system=static_prefix, cache_system=True
+            )
+            return collect_stream(deltas, stop_at="NO_RELEVANT_INFO")
+        query_fn = llm_query_fast if model == FAST_MODEL else llm_query
+        return query_fn(chunk_message, max_tokens=2048, system=static_prefix, cache_system=True)
 
-        return result.strip()
+    try:
+        if budget is None:
+            result = run(model)
+        else:
+            prompt_tokens = estimate_tokens(static_prefix) + estimate_tokens(chunk_message)
+            with budget.call(model, prompt_tokens, 2048) as model:
+                result = run(model)
+        return interpret_chunk_result(result)
 
+    except BudgetExceeded:
+        raise
     except Exception as e:
         print(f"  Warning: Error processing chunk {chunk_index + 1}: {e}", file=sys.stderr)
         return f"__CHUNK_ERROR__: {e}"
 
 
-def aggregate_results(
-    results: List[Tuple[int, str]], 
+async def aprocess_chunk(
+    chunk: str,
+    chunk_index: int,
+    total_chunks: int,
     query: str,
-    fast_model: bool = False
-) -> str:
+    fast_model: bool = False,
+    budget=None,
+    confidence: bool = False
+) -> Optional[str]:
     """
-    Aggregate chunk results into final answer.
-    
-    Uses hierarchical aggregation for large result sets.
+    Async variant of process_chunk (without streaming), so many chunks can
+    be in flight from one event loop (see rlm_query.gather_bounded).
     """
-    if not results:
-        return "No relevant information found in the provided context for this query."
-    
-    # Format results with section references
-    formatted = []
-    for chunk_idx, result in results:
-        formatted.append(f"[Section {chunk_idx + 1}]\n{result}")
-    
-    combined = "\n\n".join(formatted)
-    
-    # Check if we need hierarchical aggregation
-    if len(combined) > 50000:
-        print("  📊 Large result set - using hierarchical aggregation...")
-        
-        # Split results in half and aggregate recursively
-        mid = len(results) // 2
-        
-        left_agg = aggregate_results(results[:mid], "Summarize these findings", fast_model)
-        right_agg = aggregate_results(results[mid:], "Summarize these findings", fast_model)
-        
-        combined = f"Summary Part 1:\n{left_agg}\n\nSummary Part 2:\n{right_agg}"
-    
-    aggregation_prompt = f"""You analyzed a large document in sections. Here are the relevant findings:
+    static_prefix, chunk_message = build_chunk_prompt(chunk, chunk_index, total_chunks, query, confidence)
+    model = FAST_MODEL if fast_model else DEFAULT_MODEL
+
+    async def run(model):
+        return await allm_query(chunk_message, model=model, max_tokens=2048,
+                                system=static_prefix, cache_system=True)
+
+    try:
+        if budget is None:
+            result = await run(model)
+        else:
+            prompt_tokens = estimate_tokens(static_prefix) + estimate_tokens(chunk_message)
+            with budget.call(model, prompt_tokens, 2048) as model:
+                result = await run(model)
+        return interpret_chunk_result(result)
+
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        print(f"  Warning: Error processing chunk {chunk_index + 1}: {e}", file=sys.stderr)
+        return f"__CHUNK_ERROR__: {e}"
+
+
+def format_findings(results: List[Tuple[int, str]]) -> str:
+    """Join chunk results with [Section N] references."""
+    return "\n\n".join(f"[Section {chunk_idx + 1}]\n{result}" for chunk_idx, result in results)
+
+
+def build_aggregation_prompt(combined: str, query: str) -> str:
+    """Build the prompt that synthesizes formatted findings into a final answer."""
+    return f"""You analyzed a large document in sections. Here are the relevant findings:
 
 {combined}
 
@@ -348,45 +1092,473 @@ INSTRUCTIONS:
 
 YOUR FINAL ANSWER:"""
 
-    query_fn = llm_query_fast if fast_model else llm_query
-    
-    return query_fn(aggregation_prompt, max_tokens=4096)
 
+def build_merge_prompt(combined: str, query: str) -> str:
+    """Build the prompt that merges one group of findings in the aggregation tree."""
+    return f"""You analyzed a large document in sections. Here are the findings from some of them:
 
-def rlm_process(
-    context_file: str,
+{combined}
+
+---
+
+ORIGINAL QUERY: {query}
+
+INSTRUCTIONS:
+1. Merge these findings into one summary; it will be combined with summaries of other sections
+2. Keep every detail relevant to the query, including exact names, numbers and quotes
+3. Keep the section references for each point (e.g., "Section 3")
+4. Note contradictions between sections rather than resolving them
+5. Leave out anything irrelevant to the query
+
+MERGED FINDINGS:"""
+
+
+def group_findings(
+    sizes: List[int],
+    max_tokens: int = MAX_AGGREGATION_TOKENS,
+    fan_in: int = AGGREGATION_FAN_IN
+) -> List[Tuple[int, int]]:
+    """
+    Split consecutive findings (given their estimated tokens) into groups
+    (start, end) of at most fan_in findings and max_tokens tokens. A group
+    takes at least two findings even if that exceeds max_tokens, so every
+    level of the tree at least halves their number.
+    """
+    fan_in = max(fan_in, 2)
+    groups = []
+    start = 0
+    total = 0
+    for i, size in enumerate(sizes):
+        members = i - start
+        if members >= fan_in or (members >= 2 and total + size > max_tokens):
+            groups.append((start, i))
+            start, total = i, 0
+        total += size
+    if start < len(sizes):
+        groups.append((start, len(sizes)))
+    return groups
+
+
+def _aggregation_call(prompt: str, fast_model: bool, budget, final: bool = True) -> str:
+    """One aggregation call; with a budget and final=True it may draw on the governor's reserve."""
+    if budget is None:
+        query_fn = llm_query_fast if fast_model else llm_query
+        return query_fn(prompt, max_tokens=4096)
+    model = FAST_MODEL if fast_model else DEFAULT_MODEL
+    with budget.call(model, estimate_tokens(prompt), 4096, final=final) as model:
+        query_fn = llm_query_fast if model == FAST_MODEL else llm_query
+        return query_fn(prompt, max_tokens=4096)
+
+
+# Findings being aggregated: the (sorted) section numbers they cover and their text
+Findings = Tuple[Tuple[int, ...], str]
+
+
+def section_label(sections: Sequence[int]) -> str:
+    """'Section 3', or 'Sections 1-4, 7' for several sections."""
+    runs = []
+    for n in sections:
+        if runs and n == runs[-1][1] + 1:
+            runs[-1][1] = n
+        else:
+            runs.append([n, n])
+    label = ', '.join(str(a) if a == b else f"{a}-{b}" for a, b in runs)
+    return f"Section {label}" if len(sections) == 1 else f"Sections {label}"
+
+
+def _format_merged(findings: List[Findings]) -> str:
+    """Like format_findings, for findings that may cover several sections."""
+    return "\n\n".join(f"[{section_label(sections)}]\n{text}" for sections, text in findings)
+
+
+def _merge_group(group: List[Findings], query: str, fast_model: bool, budget) -> Findings:
+    """
+    Merge findings into one summary covering all their sections. Merges are
+    never the final call, so they leave the budget's aggregation reserve to
+    the final synthesis.
+    """
+    sections = tuple(sorted(n for covered, _ in group for n in covered))
+    combined = _format_merged(group)
+    try:
+        return sections, _aggregation_call(build_merge_prompt(combined, query), fast_model, budget,
+                                           final=False)
+    except BudgetExceeded:
+        # The final call reports the exhausted budget; pass these findings up as they are
+        return sections, combined
+
+
+def aggregate_results(
+    results: List[Tuple[int, str]], 
     query: str,
-    chunk_size: int = 40000,
     fast_model: bool = False,
-    filter_chunks: bool = True,
-    verbose: bool = True
+    budget=None,
+    workers: int = 1,
+    fan_in: int = AGGREGATION_FAN_IN,
+    log=lambda msg: None
 ) -> str:
     """
-    Main RLM processing pipeline.
+    Aggregate chunk results into final answer.
     
-    Args:
-        context_file: Path to file containing long context (any supported format)
-        query: User's query about the context
-        chunk_size: Target chunk size in characters
-        fast_model: Use faster/cheaper model for chunk processing
-        filter_chunks: Pre-filter chunks by keywords
-        verbose: Print progress information
-        
+    Findings too large for one prompt (MAX_AGGREGATION_TOKENS) are reduced
+    as a tree: consecutive findings are merged in groups of up to fan_in
+    (group_findings), all groups of a level at once on `workers` threads,
+    and the merged summaries are grouped again until they fit. Every merge
+    is given the original query. With a budget the aggregation calls may
+    use the governor's reserve; if even that is exhausted, the raw findings
+    are returned instead of a synthesis.
+    """
+    if not results:
+        return "No relevant information found in the provided context for this query."
+    level = [((chunk_idx + 1,), result) for chunk_idx, result in results]
+    return _reduce_findings(level, query, fast_model, budget, workers, fan_in, log)
+
+
+def _reduce_findings(
+    level: List[Findings],
+    query: str,
+    fast_model: bool,
+    budget,
+    workers: int,
+    fan_in: int,
+    log
+) -> str:
+    """aggregate_results over findings in document order."""
+    sizes = [estimate_tokens(text) for _, text in level]
+    depth = 0
+    while len(level) > 1 and sum(sizes) > MAX_AGGREGATION_TOKENS:
+        groups = group_findings(sizes, MAX_AGGREGATION_TOKENS, fan_in)
+        depth += 1
+        log(f"[RLM] Aggregation level {depth}: merging {len(level)} findings in {len(groups)} groups...")
+        merges = [level[start:end] for start, end in groups]
+        pending = [group for group in merges if len(group) > 1]
+        if workers > 1 and len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                merged = list(pool.map(lambda group: _merge_group(group, query, fast_model, budget), pending))
+        else:
+            merged = [_merge_group(group, query, fast_model, budget) for group in pending]
+        summaries = iter(merged)
+        level = [group[0] if len(group) == 1 else next(summaries) for group in merges]
+        sizes = [estimate_tokens(text) for _, text in level]
+
+    combined = _format_merged(level)
+    try:
+        return _aggregation_call(build_aggregation_prompt(combined, query), fast_model, budget)
+    except BudgetExceeded as e:
+        print(f"  Warning: {e}; returning unsynthesized findings", file=sys.stderr)
+        return f"[{e}; findings were not synthesized]\n\n{combined}"
+
+
+class OnlineAggregator:
+    """
+    Aggregates findings while chunks are still being processed.
+
+    Pass add() as map_chunks' on_result. As long as all findings so far
+    would fit in one final prompt nothing happens, so small runs aggregate
+    exactly as aggregate_results. Beyond that, every fan_in findings (or
+    MAX_AGGREGATION_TOKENS of them) are merged into a partial summary in the
+    background as they arrive, and partial summaries are merged the same way
+    one level up. finish() then only has to wait for the merges in flight and
+    combine what is left. Findings are grouped in the order they arrive;
+    merged summaries list the sections they cover.
+
+    on_partial, if given, is called with each partial summary (its sections
+    and text) as it completes, as a provisional answer.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        fast_model: bool = False,
+        budget=None,
+        workers: int = 1,
+        fan_in: int = AGGREGATION_FAN_IN,
+        on_partial: Optional[Callable[[Tuple[int, ...], str], None]] = None,
+        log=lambda msg: None
+    ):
+        self.query = query
+        self.fast_model = fast_model
+        self.budget = budget
+        self.workers = max(workers, 1)
+        self.fan_in = max(fan_in, 2)
+        self.on_partial = on_partial
+        self.log = log
+        self.merges = 0
+        # Per tree level: findings waiting to be merged, with their estimated tokens
+        self._levels: List[List[Tuple[Findings, int]]] = []
+        self._seen_tokens = 0
+        self._in_flight = 0
+        self._lock = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def add(self, chunk_idx: int, result: str):
+        """Take the finding of one chunk."""
+        size = estimate_tokens(result)
+        with self._lock:
+            self._seen_tokens += size
+            self._push(0, (((chunk_idx + 1,), result), size))
+
+    def _push(self, depth: int, entry: Tuple[Findings, int]):
+        # Called with the lock held
+        while len(self._levels) <= depth:
+            self._levels.append([])
+        waiting = self._levels[depth]
+        waiting.append(entry)
+        if self._seen_tokens <= MAX_AGGREGATION_TOKENS:
+            return
+        groups = group_findings([size for _, size in waiting], MAX_AGGREGATION_TOKENS, self.fan_in)
+        # Groups before the last are closed; the last one may still take the next finding
+        start, end = groups[-1]
+        closed = len(waiting) if end - start >= self.fan_in else start
+        for start, end in groups:
+            if end <= closed:
+                self._submit(depth, [findings for findings, _ in waiting[start:end]])
+        del waiting[:closed]
+
+    def _submit(self, depth: int, group: List[Findings]):
+        self._in_flight += 1
+        self._pool.submit(self._merge, depth, sorted(group))
+
+    def _merge(self, depth: int, group: List[Findings]):
+        try:
+            merged = _merge_group(group, self.query, self.fast_model, self.budget)
+        except Exception as e:
+            # Keep the findings unmerged; finish() aggregates them as they are
+            self.log(f"  [!] Partial aggregation failed ({e}); keeping {len(group)} findings unmerged")
+            merged = (tuple(sorted(n for covered, _ in group for n in covered)), _format_merged(group))
+        sections, text = merged
+        self.log(f"[RLM] Partial summary of {section_label(sections)}")
+        if self.on_partial is not None:
+            try:
+                self.on_partial(sections, text)
+            except Exception as e:
+                self.log(f"  [!] on_partial callback failed: {e}")
+        with self._lock:
+            self.merges += 1
+            self._push(depth + 1, (merged, estimate_tokens(text)))
+            self._in_flight -= 1
+            self._lock.notify_all()
+
+    def finish(self) -> str:
+        """Wait for the merges in flight and produce the final answer."""
+        with self._lock:
+            while self._in_flight:
+                self._lock.wait()
+            findings = [entry for waiting in self._levels for entry, _ in waiting]
+        self._pool.shutdown()
+        if not findings:
+            return "No relevant information found in the provided context for this query."
+        findings.sort(key=lambda entry: entry[0])
+        if self.merges:
+            self.log(f"[RLM] {self.merges} partial summaries merged while chunks were processed")
+        return _reduce_findings(findings, self.query, self.fast_model, self.budget,
+                                self.workers, self.fan_in, self.log)
+
+
+def map_chunks(
+    indexed_chunks: Iterable[Tuple[int, str]],
+    total_chunks: Optional[int],
+    query: str,
+    fast_model: bool = False,
+    stream: bool = False,
+    budget=None,
+    log=lambda msg: None,
+    workers: int = 1,
+    label: str = "[RLM]",
+    on_result: Optional[Callable[[int, str], None]] = None,
+    min_confidence: Optional[int] = None
+) -> Tuple[List[Tuple[int, str]], int, int]:
+    """
+    Run process_chunk over (original_index, chunk) pairs.
+
+    `indexed_chunks` may be a lazy iterator (see iter_auto_chunk): chunks
+    are pulled only as workers free up, so the first ones are processed
+    while later ones are still being read. With workers > 1 the chunks are
+    processed by a thread pool; progress is logged as each chunk finishes
+    and results come back in chunk order. A chunk that fails is counted as
+    an error without affecting the others. Stops early (cancelling chunks
+    not yet started) when the budget refuses a call. on_result, if given,
+    is called with each chunk's findings as soon as that chunk finishes
+    (e.g. OnlineAggregator.add).
+
+    With min_confidence, each chunk rates its findings (process_chunk with
+    confidence=True; the rating is removed from the returned text) and the
+    first rating of at least min_confidence ends the run: no further chunks
+    are started, queued ones are cancelled and the answer is returned
+    without waiting for chunks still running (their results are dropped).
+    Chunks not run for this reason are not counted as skipped.
+
+    Chunks of a lazy iterator are never read just to be counted: once the
+    budget stops the run, skipped_count only covers the chunks already read
+    and the rest of the input is left unread.
+
     Returns:
-        Final aggregated answer
+        Tuple of (results, error_count, skipped_count)
     """
-    def log(msg):
-        if verbose:
-            print(msg, file=sys.stderr)
-    
-    # Step 1: Load context with auto-detection
-    log(f"[RLM] Loading context from {context_file}...")
-    
+    total = len(indexed_chunks) if hasattr(indexed_chunks, '__len__') else None
+    of_total = f"/{total}" if total is not None else ""
+    items = iter(indexed_chunks)
+    outcomes: List[Tuple[int, Optional[str]]] = []
+    skipped = 0
+    rate = min_confidence is not None
+
+    def confident(orig_idx: int, result: Optional[str]) -> Tuple[Optional[str], bool]:
+        # Strip the rating; True if it ends the run
+        if not rate or not result or result.startswith("__CHUNK_ERROR__"):
+            return result, False
+        result, rating = split_confidence(result)
+        if rating is None or rating < min_confidence:
+            return result, False
+        log(f"{label} Chunk #{orig_idx+1} answered with confidence {rating} (threshold {min_confidence}); "
+            "stopping early")
+        return result, True
+
+    if workers <= 1:
+        for i, (orig_idx, chunk) in enumerate(items):
+            log(f"{label} Processing chunk {i+1}{of_total} (original #{orig_idx+1})...")
+            try:
+                result = process_chunk(
+                    chunk, orig_idx, total_chunks, query, fast_model, stream, budget, rate
+                )
+            except BudgetExceeded as e:
+                if total is None:
+                    skipped = 1
+                    log(f"  [!] {e}; the remaining chunks are not analyzed")
+                else:
+                    skipped = total - i
+                    log(f"  [!] {e}; skipping the remaining {skipped} chunks")
+                break
+            result, done = confident(orig_idx, result)
+            outcomes.append((orig_idx, result))
+            log(_describe_outcome(result))
+            _report_finding(on_result, orig_idx, result)
+            if done:
+                break
+    else:
+        log(f"{label} Running chunks on {workers} workers...")
+        slots: dict = {}
+        pending: dict = {}
+        exhausted = False
+        answered = False
+        read = 0
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+        def submit_more():
+            # Keep a few chunks queued per worker, reading ahead no further
+            nonlocal read
+            while not exhausted and len(pending) < workers * 2:
+                try:
+                    orig_idx, chunk = next(items)
+                except StopIteration:
+                    return
+                read += 1
+                future = pool.submit(process_chunk, chunk, orig_idx, total_chunks, query,
+                                     fast_model, stream, budget, rate)
+                pending[future] = len(slots)
+                slots[len(slots)] = (orig_idx, None)
+
+        try:
+            submit_more()
+            finished = 0
+            while pending and not answered:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    slot = pending.pop(future)
+                    if future.cancelled():
+                        continue
+                    orig_idx = slots[slot][0]
+                    finished += 1
+                    try:
+                        result = future.result()
+                    except BudgetExceeded as e:
+                        skipped += 1
+                        del slots[slot]
+                        if not exhausted:
+                            exhausted = True
+                            for queued in list(pending):
+                                if queued.cancel():
+                                    del slots[pending.pop(queued)]
+                                    skipped += 1
+                            if total is None:
+                                log(f"  [!] {e}; cancelling chunks not yet started, "
+                                    "the remaining chunks are not analyzed")
+                            else:
+                                skipped += total - read
+                                log(f"  [!] {e}; cancelling chunks not yet started")
+                        continue
+                    except Exception as e:
+                        result = f"__CHUNK_ERROR__: {e}"
+                    result, stop = confident(orig_idx, result)
+                    slots[slot] = (orig_idx, result)
+                    log(f"{label} [{finished}{of_total}] chunk #{orig_idx+1}: "
+                        f"{_describe_outcome(result).strip()}")
+                    _report_finding(on_result, orig_idx, result)
+                    answered = answered or stop
+                if not answered:
+                    submit_more()
+            if answered and pending:
+                # Do not wait for the slowest chunk: queued ones are cancelled
+                # and the calls still running are abandoned, their results unused
+                for slot in pending.values():
+                    del slots[slot]
+                log(f"{label} Dropped {len(pending)} chunks still queued or running")
+        finally:
+            pool.shutdown(wait=not answered, cancel_futures=answered)
+        outcomes = [slots[slot] for slot in sorted(slots)]
+
+    results = []
+    error_count = 0
+    for orig_idx, result in outcomes:
+        if result and result.startswith("__CHUNK_ERROR__"):
+            error_count += 1
+        elif result:
+            results.append((orig_idx, result))
+    return results, error_count, skipped
+
+
+def _report_finding(on_result, orig_idx: int, result: Optional[str]):
+    if on_result is not None and result and not result.startswith("__CHUNK_ERROR__"):
+        on_result(orig_idx, result)
+
+
+def _describe_outcome(result: Optional[str]) -> str:
+    if result and result.startswith("__CHUNK_ERROR__"):
+        return f"  [!] Error: {result[16:]}"
+    if result:
+        return "  [+] Found relevant info"
+    return "  [-] No relevant info"
+
+
+def plan_budget(budget, indexed_chunks: List[Tuple[int, str]], total_chunks: int,
+                query: str, fast_model: bool, log=lambda msg: None) -> bool:
+    """
+    Log the pre-flight estimate for the chunk calls and pick the chunk model.
+
+    Returns the fast_model flag to run with: True if the budget only fits
+    the run on FAST_MODEL.
+    """
+    model = FAST_MODEL if fast_model else DEFAULT_MODEL
+    sizes = []
+    for orig_idx, chunk in indexed_chunks:
+        static_prefix, chunk_message = build_chunk_prompt(chunk, orig_idx, total_chunks, query)
+        sizes.append(estimate_tokens(static_prefix) + estimate_tokens(chunk_message))
+    estimate = budget.preflight(model, sizes, 2048)
+    log(f"[RLM] Pre-flight estimate: ~{int(estimate['input_tokens']):,} input tokens, "
+        f"~{int(estimate['output_tokens']):,} output tokens, ~${estimate['dollars']:.4f}")
+
+    planned = budget.plan_model(model, sizes, 2048)
+    if planned != model:
+        log(f"[RLM] Budget too small for {model}; using {planned} for chunk calls")
+        return True
+    return fast_model
+
+
+def load_context(context_file: str, log=lambda msg: None) -> str:
+    """Read a context file as text, converting PDF/DOCX/HTML/archives when possible."""
     # Detect file type and convert if needed
     if FILE_CONVERTER_AVAILABLE:
         file_type = detect_file_type(context_file)
         log(f"[RLM] Detected file type: {file_type}")
-        
+
         if file_type in ('pdf', 'docx', 'html', 'archive'):
             log(f"[RLM] Converting {file_type} to text...")
             try:
@@ -417,65 +1589,326 @@ def rlm_process(
         else:
             with open(context_file, 'r', encoding='utf-8', errors='replace') as f:
                 content = f.read()
-    
-    total_chars = len(content)
-    total_lines = content.count('\n')
-    est_tokens = total_chars // 4
-    
-    log(f"[RLM] Context: {total_chars:,} chars, {total_lines:,} lines (~{est_tokens:,} tokens)")
-    
-    # Step 2: Auto-chunk
-    log("[RLM] Analyzing structure and chunking...")
-    chunks, strategy = auto_chunk(content, chunk_size)
-    log(f"[RLM] Strategy: {strategy} -> {len(chunks)} chunks")
-    
-    # Step 3: Filter (optional)
-    if filter_chunks and len(chunks) > 3:
-        log("[RLM] Pre-filtering chunks by relevance...")
-        indexed_chunks = filter_relevant_chunks(chunks, query)
-        log(f"[RLM] Filtered: {len(chunks)} -> {len(indexed_chunks)} potentially relevant chunks")
+    return content
+
+
+def index_document(
+    context_file: str,
+    chunk_size: int = 40000,
+    chunk_tokens: Optional[int] = None,
+    pack: bool = False,
+    index_dir: Optional[str] = None,
+    log=lambda msg: None
+):
+    """
+    Open the persistent index (document_index.DocumentIndex) of a context
+    file, loading and chunking the file to build it if the file or the
+    chunking settings have changed since it was last indexed.
+    """
+    params = {'chunk_size': chunk_size, 'chunk_tokens': chunk_tokens, 'pack': pack}
+    build = lambda: auto_chunk(load_context(context_file, log), chunk_size, chunk_tokens, pack)
+    return document_index.open_or_build(context_file, params, build, index_dir, estimate_tokens, log)
+
+
+def is_streamable(context_file: str) -> bool:
+    """True if the file is plain text that can be read incrementally without conversion."""
+    if FILE_CONVERTER_AVAILABLE:
+        return detect_file_type(context_file) in STREAMABLE_FILE_TYPES
+    return Path(context_file).suffix.lower() not in ('.pdf', '.docx')
+
+
+def _indexed_relevant(chunks: Iterable[str], scanner: Optional[KeywordScanner],
+                      filtered_out: List[int]) -> Iterator[Tuple[int, str]]:
+    """Number chunks, dropping (and recording) those without any scanner keyword."""
+    for i, chunk in enumerate(chunks):
+        if scanner is None or next(scanner.finditer(chunk), None):
+            yield i, chunk
+        else:
+            filtered_out.append(i)
+
+
+def _rlm_process_incremental(
+    context_file: str,
+    query: str,
+    chunk_size: int,
+    fast_model: bool,
+    filter_chunks: bool,
+    stream: bool,
+    budget,
+    chunk_tokens: Optional[int],
+    workers: int,
+    log,
+    fan_in: int = AGGREGATION_FAN_IN,
+    online: bool = False,
+    on_partial=None
+) -> str:
+    """
+    rlm_process steps 1-5 over a file read incrementally.
+
+    Chunks are filtered and dispatched as they are read, so the keyword
+    pre-filter decides chunk by chunk. If it turns out to have kept under
+    10% of the chunks (or the document had 3 or fewer), the dropped chunks
+    are re-read and processed too, as filter_relevant_chunks would have.
+    """
+    def open_source():
+        if is_streamable(context_file):
+            return open(context_file, 'r', encoding='utf-8', errors='replace')
+        return nullcontext(load_context(context_file, log))
+
+    scanner = query_keyword_scanner(query) if filter_chunks else None
+    filtered_out: List[int] = []
+    aggregator = (OnlineAggregator(query, fast_model, budget, workers, fan_in, on_partial, log)
+                  if online else None)
+    on_result = aggregator.add if aggregator is not None else None
+    with open_source() as source:
+        chunks, strategy = iter_auto_chunk(source, chunk_size, chunk_tokens)
+        log(f"[RLM] Strategy: {strategy} (incremental)")
+        results, error_count, skipped = map_chunks(
+            _indexed_relevant(chunks, scanner, filtered_out), None,
+            query, fast_model, stream, budget, log, workers, on_result=on_result
+        )
+    processed = len(results) + error_count
+    total_chunks = processed + skipped + len(filtered_out)
+
+    if filtered_out and not skipped and (total_chunks <= 3 or
+                                         total_chunks - len(filtered_out) < total_chunks * 0.1):
+        log(f"[RLM] Filter kept too few chunks; processing the other {len(filtered_out)}...")
+        wanted = set(filtered_out)
+        with open_source() as source:
+            chunks, _ = iter_auto_chunk(source, chunk_size, chunk_tokens)
+            rest = ((i, c) for i, c in enumerate(chunks) if i in wanted)
+            more, more_errors, skipped = map_chunks(
+                rest, len(wanted), query, fast_model, stream, budget, log, workers, on_result=on_result
+            )
+        results = sorted(results + more)
+        error_count += more_errors
+        filtered_out = []
+
+    analyzed = total_chunks - len(filtered_out)
+    # The input is not read past the point where the budget ran out, so
+    # with skipped chunks the counts only cover the chunks read until then
+    log(f"[RLM] {total_chunks} chunks{' read' if skipped else ''}, {analyzed} analyzed; "
+        f"found relevant info in {len(results)}")
+    if error_count > 0:
+        log(f"[RLM] WARNING: {error_count}/{analyzed} chunks failed due to errors")
+    if skipped:
+        log(f"[RLM] WARNING: {skipped} chunks read and the rest of the document skipped "
+            "(budget exhausted)")
+
+    log("[RLM] Aggregating results...")
+    if aggregator is not None:
+        final_answer = aggregator.finish()
     else:
-        indexed_chunks = [(i, c) for i, c in enumerate(chunks)]
+        final_answer = aggregate_results(results, query, fast_model, budget, workers, fan_in, log)
+    if skipped:
+        final_answer += (f"\n\n[Note: budget exhausted ({budget.stop_reason}); "
+                         f"{skipped} sections and the rest of the document were not analyzed.]")
+    return final_answer
+
+
+def rlm_process(
+    context_file: str,
+    query: str,
+    chunk_size: int = 40000,
+    fast_model: bool = False,
+    filter_chunks: bool = True,
+    verbose: bool = True,
+    stream: bool = False,
+    budget=None,
+    chunk_tokens: Optional[int] = None,
+    workers: int = 1,
+    incremental: bool = False,
+    mapped: bool = False,
+    pack: bool = False,
+    top_k: Optional[int] = None,
+    top_tokens: Optional[int] = None,
+    use_index: bool = False,
+    index_dir: Optional[str] = None,
+    similarity: bool = False,
+    fan_in: int = AGGREGATION_FAN_IN,
+    online: bool = False,
+    on_partial: Optional[Callable[[Tuple[int, ...], str], None]] = None,
+    min_confidence: Optional[int] = None
+) -> str:
+    """
+    Main RLM processing pipeline.
     
-    # Step 4: Process chunks
-    log(f"[RLM] Processing {len(indexed_chunks)} chunks...")
+    Args:
+        context_file: Path to file containing long context (any supported format)
+        query: User's query about the context
+        chunk_size: Target chunk size in characters
+        fast_model: Use faster/cheaper model for chunk processing
+        filter_chunks: Pre-filter chunks by keywords
+        verbose: Print progress information
+        stream: Stream chunk responses and stop at NO_RELEVANT_INFO
+        budget: Optional rlm_budget.BudgetGovernor enforcing token/cost/time limits
+        chunk_tokens: Target chunk size in estimated tokens (overrides chunk_size)
+        workers: Number of chunks to process concurrently (also the number
+            of concurrent merges when aggregating)
+        incremental: Read and chunk the file as it is processed instead of
+            loading it whole (plain-text files; others are converted first)
+        mapped: Memory-map a plain-text file and chunk it by offsets
+            (chunk_source.py), so only chunks sent to the model are decoded
+        pack: Merge adjacent sections up to the chunk size and split long
+            ones at paragraph/sentence boundaries (auto_chunk(pack=True));
+            not used with incremental or mapped
+        top_k: Rank chunks with BM25 and analyze only the best top_k
+            (not used with incremental)
+        top_tokens: Rank chunks with BM25 and analyze the best ones up to
+            this many estimated tokens (not used with incremental)
+        use_index: Chunk and filter through a persistent index of the file
+            (document_index.py), built on first use; later queries skip
+            loading and chunking, and only selected chunks are decompressed.
+            Takes precedence over incremental and mapped
+        index_dir: Where indexes are kept (default: ~/.claude/rlm_index)
+        similarity: Rank chunks by TF-IDF similarity to the query
+            (chunk_similarity.py) instead of keywords; with top_k or
+            top_tokens it picks the chunks they keep (not used with
+            incremental)
+        fan_in: Most findings merged per call when they are too large to
+            aggregate at once (see aggregate_results)
+        online: Merge findings into partial summaries while chunks are
+            still being processed (OnlineAggregator), leaving only a small
+            final merge once the last chunk is done
+        on_partial: With online, called with each partial summary's
+            sections and text as a provisional answer
+        min_confidence: For lookup queries: chunks rate their answers and
+            the run stops at the first rating of at least this (0-100), see
+            map_chunks. Chunks are processed best first by relevance.
+            Not used with incremental
+        
+    Returns:
+        Final aggregated answer
+    """
+    def log(msg):
+        if verbose:
+            print(msg, file=sys.stderr)
     
-    results = []
-    error_count = 0
-    for i, (orig_idx, chunk) in enumerate(indexed_chunks):
-        log(f"[RLM] Processing chunk {i+1}/{len(indexed_chunks)} (original #{orig_idx+1})...")
+    # Step 1: Load context with auto-detection
+    log(f"[RLM] Loading context from {context_file}...")
 
-        result = process_chunk(
-            chunk, orig_idx, len(chunks), query, fast_model
+    index = None
+    if use_index and DOCUMENT_INDEX_AVAILABLE:
+        index = index_document(context_file, chunk_size, chunk_tokens, pack, index_dir, log)
+    elif incremental:
+        if top_k or top_tokens or similarity or min_confidence is not None:
+            log("[RLM] Note: --top-k/--top-tokens/--similarity/--first-match need all chunks up front; "
+                "not used with --incremental")
+        final_answer = _rlm_process_incremental(
+            context_file, query, chunk_size, fast_model, filter_chunks,
+            stream, budget, chunk_tokens, workers, log, fan_in, online, on_partial
         )
+        _log_run_summary(budget, log)
+        return final_answer
 
-        if result and result.startswith("__CHUNK_ERROR__"):
-            error_count += 1
-            log(f"  [!] Error: {result[16:]}")
-        elif result:
-            results.append((orig_idx, result))
-            log(f"  [+] Found relevant info")
+    mapped_source = None
+    try:
+        if index is not None:
+            # Chunks are decompressed from the index only when selected
+            content = None
+            chunks, strategy = index.chunks, index.strategy
+        elif mapped and CHUNK_SOURCE_AVAILABLE and is_streamable(context_file):
+            # Chunks are offsets into the mapped file; only processed chunks are decoded
+            mapped_source = MappedSource(context_file)
+            content = None
+            log(f"[RLM] Context: {len(mapped_source):,} bytes (memory-mapped)")
+            log("[RLM] Analyzing structure and chunking...")
+            chunks, strategy = auto_chunk_spans(mapped_source, chunk_size, chunk_tokens)
+        else:
+            content = load_context(context_file, log)
+
+            total_chars = len(content)
+            total_lines = content.count('\n')
+            est_tokens = estimate_tokens(content)
+
+            log(f"[RLM] Context: {total_chars:,} chars, {total_lines:,} lines (~{est_tokens:,} tokens)")
+
+            # Step 2: Auto-chunk
+            log("[RLM] Analyzing structure and chunking...")
+            chunks, strategy = auto_chunk(content, chunk_size, chunk_tokens, pack)
+        log(f"[RLM] Strategy: {strategy} -> {len(chunks)} chunks")
+
+        # Step 3: Filter (optional)
+        if top_k or top_tokens or similarity:
+            log(f"[RLM] Ranking chunks by relevance ({'TF-IDF similarity' if similarity else 'BM25'})...")
+            indexed_chunks = filter_relevant_chunks(chunks, query, top_k=top_k,
+                                                    max_tokens=top_tokens, log=log, content=content,
+                                                    index=index, similarity=similarity)
+            log(f"[RLM] Selected: {len(chunks)} -> {len(indexed_chunks)} top-ranked chunks")
+        elif filter_chunks and len(chunks) > 3:
+            log("[RLM] Pre-filtering chunks by relevance...")
+            indexed_chunks = filter_relevant_chunks(chunks, query, content=content, index=index)
+            log(f"[RLM] Filtered: {len(chunks)} -> {len(indexed_chunks)} potentially relevant chunks")
         else:
-            log(f"  [-] No relevant info")
+            indexed_chunks = [(i, c) for i, c in enumerate(chunks)]
+        if min_confidence is not None and not (top_k or top_tokens or similarity):
+            # Lookups stop at the first confident answer, so try the likeliest chunks first
+            log("[RLM] Ordering chunks by relevance (BM25)...")
+            indexed_chunks = order_by_relevance(indexed_chunks, chunks, query, log, content, index)
+
+        # Step 4: Process chunks
+        if budget is not None:
+            fast_model = plan_budget(budget, indexed_chunks, len(chunks), query, fast_model, log)
+
+        log(f"[RLM] Processing {len(indexed_chunks)} chunks...")
+
+        aggregator = (OnlineAggregator(query, fast_model, budget, workers, fan_in, on_partial, log)
+                      if online else None)
+        results, error_count, skipped = map_chunks(
+            indexed_chunks, len(chunks), query, fast_model, stream, budget, log, workers,
+            on_result=aggregator.add if aggregator is not None else None,
+            min_confidence=min_confidence
+        )
+        # Ranked chunks are processed best first; findings are aggregated in document order
+        results.sort(key=lambda r: r[0])
+    finally:
+        if mapped_source is not None:
+            mapped_source.close()
+        if index is not None:
+            index.close()
 
     log(f"[RLM] Found relevant info in {len(results)}/{len(indexed_chunks)} chunks")
     if error_count > 0:
         log(f"[RLM] WARNING: {error_count}/{len(indexed_chunks)} chunks failed due to errors")
+    if skipped:
+        log(f"[RLM] WARNING: {skipped}/{len(indexed_chunks)} chunks skipped (budget exhausted)")
     
     # Step 5: Aggregate
     log("[RLM] Aggregating results...")
-    final_answer = aggregate_results(results, query, fast_model)
+    if aggregator is not None:
+        final_answer = aggregator.finish()
+    else:
+        final_answer = aggregate_results(results, query, fast_model, budget, workers, fan_in, log)
+    if skipped:
+        final_answer += (f"\n\n[Note: budget exhausted ({budget.stop_reason}); "
+                         f"{skipped} of {len(indexed_chunks)} sections were not analyzed.]")
     
-    # Log token usage summary
+    _log_run_summary(budget, log)
+
+    return final_answer
+
+
+def _log_run_summary(budget, log):
+    """Log API usage, response-cache and budget totals at the end of a run."""
     usage = get_usage()
     if usage["requests"] > 0:
         log(f"[RLM] API usage: {usage['requests']} requests, "
             f"{usage['input_tokens']:,} input tokens, "
             f"{usage['output_tokens']:,} output tokens")
-
+        if usage["cache_read_input_tokens"] or usage["cache_creation_input_tokens"]:
+            log(f"[RLM] Prompt cache: {usage['cache_read_input_tokens']:,} tokens read, "
+                f"{usage['cache_creation_input_tokens']:,} tokens written")
+    cache_stats = get_cache_stats()
+    if cache_stats.get("hits"):
+        log(f"[RLM] Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    if budget is not None:
+        log(f"[RLM] {budget.summary()}")
     log("[RLM] Processing complete!")
 
-    return final_answer
+
+def print_provisional(sections: Tuple[int, ...], text: str):
+    """on_partial callback that prints each partial summary to stdout."""
+    print(f"\n--- PROVISIONAL ({section_label(sections)}) ---\n{text}", flush=True)
 
 
 # ============================================================================
@@ -496,9 +1929,27 @@ Examples:
     
     # Smaller chunks for denser content
     python rlm_processor.py data.txt "Count entries by category" --chunk-size 20000
+
+    # Size chunks by tokens (accurate for code, JSON and non-English text)
+    python rlm_processor.py dump.json "Which records failed?" --chunk-tokens 8000
     
     # Skip pre-filtering for comprehensive analysis
     python rlm_processor.py report.txt "Summarize everything" --no-filter
+    
+    # Stream chunk answers and cut irrelevant ones off early
+    python rlm_processor.py logs.txt "Find the first crash" --stream
+
+    # Process 8 chunks at a time
+    python rlm_processor.py book.txt "Summarize each chapter" --workers 8
+
+    # Index the file once, then ask several questions without re-chunking it
+    python rlm_processor.py corpus.txt "How are retries configured?" --index --top-k 5
+
+    # Find one fact and stop as soon as a section answers it confidently
+    python rlm_processor.py config_dump.txt "What is the value of MAX_POOL_SIZE?" --first-match
+
+    # Stop (or fall back to the fast model) before spending more than $0.50
+    python rlm_processor.py book.txt "List every character" --max-cost 0.50
 
 Reference: Zhang, Kraska, Khattab - "Recursive Language Models" (arXiv:2512.24601)
         """
@@ -508,15 +1959,54 @@ Reference: Zhang, Kraska, Khattab - "Recursive Language Models" (arXiv:2512.2460
     parser.add_argument('query', help='Query about the context')
     parser.add_argument('--chunk-size', '-c', type=int, default=40000,
                         help='Target chunk size in characters (default: 40000)')
+    parser.add_argument('--chunk-tokens', '-t', type=int, default=None,
+                        help='Target chunk size in estimated tokens (overrides --chunk-size)')
     parser.add_argument('--fast', '-f', action='store_true',
                         help='Use faster/cheaper model for chunk processing')
     parser.add_argument('--no-filter', action='store_true',
                         help='Disable keyword-based chunk pre-filtering')
+    parser.add_argument('--top-k', '-k', type=int, default=None,
+                        help='Rank chunks with BM25 and analyze only the best K')
+    parser.add_argument('--top-tokens', type=int, default=None,
+                        help='Rank chunks with BM25 and analyze the best ones up to N estimated tokens')
+    parser.add_argument('--similarity', action='store_true',
+                        help='Rank chunks by TF-IDF similarity to the whole query instead of keywords')
+    parser.add_argument('--pack', action='store_true',
+                        help='Merge small sections into full-size chunks (fewer sub-LLM calls)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream chunk responses and stop reading at NO_RELEVANT_INFO')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Process this many chunks concurrently (default: 1)')
+    parser.add_argument('--fan-in', type=int, default=AGGREGATION_FAN_IN,
+                        help=f'Most findings merged per aggregation call (default: {AGGREGATION_FAN_IN})')
+    parser.add_argument('--online-aggregation', action='store_true',
+                        help='Merge findings into partial summaries while chunks are still processing')
+    parser.add_argument('--provisional', action='store_true',
+                        help='Print each partial summary as a provisional answer (implies --online-aggregation)')
+    parser.add_argument('--first-match', dest='min_confidence', action='store_const',
+                        const=DEFAULT_CONFIDENCE_THRESHOLD,
+                        help='For lookups: stop at the first chunk that answers with confidence '
+                             f'>= {DEFAULT_CONFIDENCE_THRESHOLD}, trying the most relevant chunks first')
+    parser.add_argument('--stop-when-confident', dest='min_confidence', type=int, nargs='?',
+                        const=DEFAULT_CONFIDENCE_THRESHOLD, metavar='N',
+                        help='Like --first-match with a confidence threshold of N (0-100)')
+    parser.add_argument('--incremental', '-i', action='store_true',
+                        help='Read and chunk the file while processing instead of loading it whole')
+    parser.add_argument('--mmap', action='store_true',
+                        help='Memory-map the file and chunk it in place (for very large text files)')
+    parser.add_argument('--index', action='store_true',
+                        help='Reuse (or build) a persistent chunk and keyword index of the file')
+    parser.add_argument('--index-dir', default=None,
+                        help='Index directory for --index (default: ~/.claude/rlm_index)')
     parser.add_argument('--quiet', '-q', action='store_true',
                         help='Suppress progress output')
     parser.add_argument('--output', '-o', help='Write result to file')
+    add_client_arguments(parser)
+    add_budget_arguments(parser)
     
     args = parser.parse_args()
+    apply_client_arguments(args)
+    budget = budget_from_args(args)
     
     # Validate input
     if not Path(args.context_file).exists():
@@ -537,7 +2027,23 @@ Reference: Zhang, Kraska, Khattab - "Recursive Language Models" (arXiv:2512.2460
             chunk_size=args.chunk_size,
             fast_model=args.fast,
             filter_chunks=not args.no_filter,
-            verbose=not args.quiet
+            verbose=not args.quiet,
+            stream=args.stream,
+            budget=budget,
+            chunk_tokens=args.chunk_tokens,
+            workers=args.workers,
+            incremental=args.incremental,
+            mapped=args.mmap,
+            pack=args.pack,
+            top_k=args.top_k,
+            top_tokens=args.top_tokens,
+            use_index=args.index,
+            index_dir=args.index_dir,
+            similarity=args.similarity,
+            fan_in=args.fan_in,
+            online=args.online_aggregation or args.provisional,
+            on_partial=print_provisional if args.provisional else None,
+            min_confidence=args.min_confidence
         )
         
         # Output
@@ -545,6 +2051,8 @@ Reference: Zhang, Kraska, Khattab - "Recursive Language Models" (arXiv:2512.2460
         print("FINAL ANSWER")
         print("=" * 60)
         print(result)
+        if budget is not None:
+            print("\n" + budget.summary())
         
         if args.output:
             with open(args.output, 'w', encoding='utf-8') as f:
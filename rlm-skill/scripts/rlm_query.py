@@ -15,38 +15,99 @@ API Key locations (checked in order):
     2. ~/.claude/api_key.txt (Linux/Mac) or %USERPROFILE%\\.claude\\api_key.txt (Windows)
     3. ~/.claude/config.json with {"api_key": "sk-ant-..."} format
 
+Transport:
+    Requests go through a shared pool of keep-alive HTTPS connections.
+    Set RLM_HTTP_TRANSPORT=curl to force the curl subprocess fallback.
+    --base-url (or ANTHROPIC_BASE_URL) points the client at another server,
+    such as the offline stand-in in mock_server.py.
+
 Based on: arXiv:2512.24601 - Recursive Language Models
 """
 
 import os
 import sys
 import json
+import random
 import argparse
+import asyncio
+import atexit
+import hashlib
 import shutil
+import socket
+import ssl
 import subprocess
 import tempfile
-from typing import Optional
+import threading
+import time
+import weakref
+import http.client
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
+from urllib.parse import urlsplit
+from urllib.request import getproxies
+
+from usage_metrics import Metrics, USAGE_FIELDS
+
+# Optional on-disk response cache (sibling module)
+try:
+    from response_cache import ResponseCache, DEFAULT_MAX_BYTES, DEFAULT_TTL
+    RESPONSE_CACHE_AVAILABLE = True
+except ImportError:
+    RESPONSE_CACHE_AVAILABLE = False
+    DEFAULT_MAX_BYTES = DEFAULT_TTL = None
+
+# Optional token estimator (sibling module); chars/4 without it
+try:
+    from token_estimator import get_estimator
+    TOKEN_ESTIMATOR_AVAILABLE = True
+except ImportError:
+    TOKEN_ESTIMATOR_AVAILABLE = False
 
 
 # Default models - use cheaper models for sub-calls
 DEFAULT_MODEL = "claude-sonnet-4-5-20250929"
 FAST_MODEL = "claude-haiku-4-5-20251001"  # For high-volume chunk processing
 
-# Cumulative token usage tracking
-_usage = {"input_tokens": 0, "output_tokens": 0, "requests": 0}
+# API endpoint (ANTHROPIC_BASE_URL overrides, e.g. for a local test server)
+API_BASE_URL = os.environ.get('ANTHROPIC_BASE_URL', 'https://api.anthropic.com').rstrip('/')
+ANTHROPIC_VERSION = "2023-06-01"
+REQUEST_TIMEOUT = 600  # seconds
+
+# HTTP transport: "pool" (in-process keep-alive connections) or "curl"
+# (one subprocess per call). Defaults to curl when an HTTPS proxy is
+# configured, since curl honours proxy settings that http.client does not.
+HTTP_TRANSPORT = os.environ.get('RLM_HTTP_TRANSPORT', '').strip().lower()
+
+# Per-model usage, latency, retry and transfer metrics (see usage_metrics.py)
+# (prompt-cache reads and writes are billed separately from input_tokens)
+_metrics = Metrics()
 
 
 def get_usage() -> dict:
-    """Return cumulative API token usage for this session."""
-    return dict(_usage)
+    """Return cumulative API token usage for this session (all models)."""
+    totals = _metrics.totals()
+    return {field: totals[field] for field in ("requests",) + USAGE_FIELDS}
 
 
 def reset_usage():
-    """Reset the usage counters."""
-    _usage["input_tokens"] = 0
-    _usage["output_tokens"] = 0
-    _usage["requests"] = 0
+    """Reset the usage counters and every other call metric."""
+    _metrics.reset()
+
+
+def record_usage(usage: dict, model: Optional[str] = None):
+    """Add one response's token usage to the session totals."""
+    _metrics.record_usage(model, usage)
+
+
+def get_metrics() -> dict:
+    """Return all call metrics (per-model counters and latency histograms)."""
+    return _metrics.snapshot()
+
+
+def write_metrics(path: str):
+    """Export get_metrics() as JSON."""
+    _metrics.write_json(path)
 
 
 def get_claude_config_dir() -> Path:
@@ -105,30 +166,1041 @@ def load_api_key() -> Optional[str]:
     return None
 
 
-def llm_query(
-    prompt: str,
-    model: str = DEFAULT_MODEL,
-    max_tokens: int = 4096,
-    temperature: float = 0.0,
-    system: Optional[str] = None
-) -> str:
+# ============================================================================
+# HTTP transport
+# ============================================================================
+
+class ReadTimeout(socket.timeout):
+    """The server took a request but did not answer within the timeout."""
+
+
+class ConnectionPool:
     """
-    Execute a sub-LLM query via Anthropic API.
-    
-    Args:
-        prompt: The user prompt to send
-        model: Model to use (default: claude-sonnet-4)
-        max_tokens: Maximum response tokens
-        temperature: Sampling temperature (0.0 = deterministic)
-        system: Optional system prompt
-        
+    Thread-safe pool of persistent HTTP(S) connections to a single host.
+
+    Each request checks a connection out for its duration, so concurrent
+    callers never share a socket. Idle connections are kept alive and reused,
+    which skips the TCP and TLS handshakes on every call after the first.
+    """
+
+    def __init__(self, base_url: str, max_idle: int = 16, timeout: float = REQUEST_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context() if self.scheme == 'https' else None
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        with self._lock:
+            self.connections_opened += 1
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout, context=self._ssl_context
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _checkout(self) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _checkin(self, conn: http.client.HTTPConnection):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def open(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        """
+        Send one request and return the connection with its unread response.
+
+        Used for streaming; pass both to release() when done with the response.
+        """
+        url = self.base_path + path
+        conn, reused = self._checkout()
+        try:
+            try:
+                response = self._send(conn, method, url, body, headers)
+            except (ConnectionResetError, BrokenPipeError):
+                # The server dropped an idle keep-alive socket; retry once fresh
+                conn.close()
+                if not reused:
+                    raise
+                conn = self._new_connection()
+                response = self._send(conn, method, url, body, headers)
+        except BaseException:
+            conn.close()
+            raise
+        return conn, response
+
+    def _send(
+        self,
+        conn: http.client.HTTPConnection,
+        method: str,
+        url: str,
+        body: Optional[bytes],
+        headers: Optional[Dict[str, str]]
+    ) -> http.client.HTTPResponse:
+        if conn.sock is None:
+            # Connect first: a connect timeout stays a plain socket.timeout
+            conn.connect()
+        try:
+            conn.request(method, url, body=body, headers=headers or {})
+            return conn.getresponse()
+        except socket.timeout as e:
+            raise ReadTimeout(f"No response within {self.timeout:g}s") from e
+
+    def release(self, conn: http.client.HTTPConnection, response: http.client.HTTPResponse):
+        """Return a connection from open() to the pool (closed if its response is unfinished)."""
+        if response.will_close or not response.isclosed():
+            conn.close()
+        else:
+            self._checkin(conn)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Send one request and read the full response.
+
+        If `timings` is given, its 'ttfb' entry is set to the seconds until
+        the response headers arrived.
+
+        Returns:
+            Tuple of (status code, lower-cased response headers, body bytes)
+        """
+        started = time.monotonic()
+        conn, response = self.open(method, path, body, headers)
+        if timings is not None:
+            timings['ttfb'] = time.monotonic() - started
+        try:
+            data = response.read()
+        except socket.timeout as e:
+            conn.close()
+            raise ReadTimeout(f"Response not received within {self.timeout:g}s") from e
+        except BaseException:
+            conn.close()
+            raise
+        self.release(conn, response)
+
+        resp_headers = {k.lower(): v for k, v in response.getheaders()}
+        return response.status, resp_headers, data
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+_curl_fallback_warned = False
+
+
+def get_connection_pool(base_url: Optional[str] = None) -> ConnectionPool:
+    """Return the shared connection pool for a base URL (created on first use)."""
+    base_url = base_url or API_BASE_URL
+    with _pools_lock:
+        pool = _pools.get(base_url)
+        if pool is None:
+            pool = _pools[base_url] = ConnectionPool(base_url)
+        return pool
+
+
+def set_base_url(base_url: str):
+    """
+    Point every later API call at another base URL (e.g. mock_server.py).
+
+    Idle connections to the previous host are closed.
+    """
+    global API_BASE_URL
+    API_BASE_URL = base_url.rstrip('/')
+    close_connection_pools()
+
+
+def close_connection_pools():
+    """Close every idle pooled connection (safe to call at any time)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def _use_curl() -> bool:
+    """Decide whether to use the curl subprocess transport."""
+    if HTTP_TRANSPORT:
+        return HTTP_TRANSPORT == 'curl'
+    return API_BASE_URL.startswith('https') and 'https' in getproxies()
+
+
+def _api_headers(api_key: str) -> Dict[str, str]:
+    return {
+        'Content-Type': 'application/json',
+        'x-api-key': api_key,
+        'anthropic-version': ANTHROPIC_VERSION,
+    }
+
+
+def _parse_header_dump(text: str) -> Tuple[int, Dict[str, str]]:
+    """Parse a `curl -D` header dump, keeping only the final response block."""
+    status, headers = 0, {}
+    for line in text.splitlines():
+        if line.startswith('HTTP/'):
+            # A new block (e.g. after "100 Continue" or a redirect) starts over
+            parts = line.split()
+            status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+            headers = {}
+        elif ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+    return status, headers
+
+
+def _curl_request(
+    method: str,
+    path: str,
+    api_key: str,
+    body: Optional[bytes] = None
+) -> Tuple[int, Dict[str, str], bytes]:
+    """Send a request through a curl subprocess (fallback transport)."""
+    # Always write the payload to a temp file to avoid command-line length
+    # limits and to avoid passing sensitive data via command-line arguments
+    tmp_files = []
+    try:
+        header_file = tempfile.NamedTemporaryFile(suffix='.headers', delete=False)
+        header_file.close()
+        tmp_files.append(header_file.name)
+
+        # Resolve curl to full path to avoid shell=True on Windows
+        curl_path = shutil.which('curl') or 'curl'
+
+        cmd = [curl_path, '-s', '-X', method, API_BASE_URL + path, '-D', header_file.name]
+        for key, value in _api_headers(api_key).items():
+            cmd += ['-H', f'{key}: {value}']
+
+        if body is not None:
+            payload_file = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+            payload_file.write(body)
+            payload_file.close()
+            tmp_files.append(payload_file.name)
+            cmd += ['--data-binary', f'@{payload_file.name}']
+
+        result = subprocess.run(cmd, capture_output=True)
+
+        if result.returncode != 0:
+            raise ConnectionError(f"curl failed: {result.stderr.decode('utf-8', errors='replace')}")
+
+        with open(header_file.name, 'r', encoding='latin-1') as f:
+            status, headers = _parse_header_dump(f.read())
+    finally:
+        for name in tmp_files:
+            if os.path.exists(name):
+                os.unlink(name)
+
+    return status, headers, result.stdout
+
+
+def _send_request(
+    method: str,
+    path: str,
+    api_key: str,
+    payload: Optional[dict] = None
+) -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Send an API request over the pooled transport, falling back to curl.
+
     Returns:
-        The model's text response
-        
-    Raises:
-        ValueError: If API key not set
-        Exception: If API call fails
+        Tuple of (status code, lower-cased response headers, body bytes)
+    """
+    global _curl_fallback_warned
+
+    body = json.dumps(payload).encode('utf-8') if payload is not None else None
+    model = payload.get('model') if payload else None
+
+    if not _use_curl():
+        timings: Dict[str, float] = {}
+        try:
+            result = get_connection_pool().request(
+                method, path, body, _api_headers(api_key), timings=timings)
+        except socket.timeout:
+            raise
+        except (OSError, http.client.HTTPException) as e:
+            if not _curl_fallback_warned:
+                _curl_fallback_warned = True
+                print(f"Warning: in-process HTTP transport failed ({e}); "
+                      f"falling back to curl", file=sys.stderr)
+        else:
+            _record_transfer(model, body, result[2], timings.get('ttfb'))
+            return result
+
+    result = _curl_request(method, path, api_key, body)
+    _record_transfer(model, body, result[2])
+    return result
+
+
+def _record_transfer(
+    model: Optional[str],
+    body: Optional[bytes],
+    data: bytes,
+    ttfb: Optional[float] = None
+):
+    """Count one attempt's request/response body bytes and time-to-first-byte."""
+    _metrics.record_bytes(model, len(body or b''), len(data))
+    if ttfb is not None:
+        _metrics.record_ttfb(model, ttfb)
+
+
+def _decode_response(data: bytes) -> dict:
+    """Parse a Messages API response body, raising on API errors."""
+    text = data.decode('utf-8', errors='replace')
+    try:
+        response = json.loads(text)
+    except json.JSONDecodeError:
+        raise Exception(f"Invalid JSON response: {text[:500]}")
+
+    if 'error' in response:
+        raise Exception(f"API error: {response['error']}")
+
+    return response
+
+
+# ============================================================================
+# Async transport
+# ============================================================================
+
+class AsyncConnectionPool:
+    """
+    Pool of persistent HTTP(S) connections bound to one asyncio event loop.
+
+    A minimal HTTP/1.1 client on top of asyncio streams, so hundreds of
+    requests can be in flight from a single thread. Like ConnectionPool, each
+    request checks out its own connection and returns it when done.
+    """
+
+    def __init__(self, base_url: str, max_idle: int = 64, timeout: float = REQUEST_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == 'https' else 80)
+        self.base_path = parts.path.rstrip('/')
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle = []
+        self._ssl_context = ssl.create_default_context() if self.scheme == 'https' else None
+        default_port = 443 if self.scheme == 'https' else 80
+        self._host_header = self.host if self.port == default_port else f"{self.host}:{self.port}"
+
+    async def _open(self):
+        self.connections_opened += 1
+        try:
+            return await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=self._ssl_context), self.timeout)
+        except asyncio.TimeoutError:
+            # Before Python 3.11 asyncio.TimeoutError is not an OSError
+            raise socket.timeout(f"Connecting to {self.host} timed out") from None
+
+    async def _exchange(self, conn, method: str, url: str, body: bytes, headers: Dict[str, str],
+                        timings: Optional[Dict[str, float]]) -> Tuple[int, Dict[str, str], bytes, bool]:
+        try:
+            return await asyncio.wait_for(
+                self._roundtrip(conn, method, url, body, headers, timings), self.timeout)
+        except asyncio.TimeoutError:
+            raise ReadTimeout(f"No response within {self.timeout:g}s") from None
+
+    async def _roundtrip(self, conn, method: str, url: str, body: bytes, headers: Dict[str, str],
+                         timings: Optional[Dict[str, float]]) -> Tuple[int, Dict[str, str], bytes, bool]:
+        reader, writer = conn
+        started = time.monotonic()
+        lines = [f"{method} {url} HTTP/1.1", f"Host: {self._host_header}",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before response")
+        if timings is not None:
+            timings['ttfb'] = time.monotonic() - started
+        parts = status_line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise http.client.BadStatusLine(status_line.decode('latin-1', errors='replace'))
+        version, status = parts[0], int(parts[1])
+
+        resp_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            resp_headers[key.strip().lower()] = value.strip()
+
+        if resp_headers.get('transfer-encoding', '').lower() == 'chunked':
+            pieces = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # Skip trailers up to the terminating blank line
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                pieces.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b''.join(pieces)
+            keep_alive = True
+        elif 'content-length' in resp_headers:
+            data = await reader.readexactly(int(resp_headers['content-length']))
+            keep_alive = True
+        else:
+            data = await reader.read()
+            keep_alive = False
+
+        if resp_headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0':
+            keep_alive = False
+        return status, resp_headers, data, keep_alive
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """Send one request; returns (status, lower-cased headers, body bytes).
+
+        Fills in timings['ttfb'] like ConnectionPool.request.
+        """
+        url = self.base_path + path
+        body = body or b''
+        headers = headers or {}
+        reused = bool(self._idle)
+        conn = self._idle.pop() if reused else await self._open()
+        try:
+            try:
+                result = await self._exchange(conn, method, url, body, headers, timings)
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                # The server dropped an idle keep-alive socket; retry once fresh
+                conn[1].close()
+                if not reused:
+                    raise
+                conn = await self._open()
+                result = await self._exchange(conn, method, url, body, headers, timings)
+        except BaseException:
+            conn[1].close()
+            raise
+
+        status, resp_headers, data, keep_alive = result
+        if keep_alive and len(self._idle) < self.max_idle:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+        return status, resp_headers, data
+
+    def close(self):
+        """Close all idle connections."""
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+
+# One set of async pools per event loop: asyncio streams cannot be shared
+# across loops, and a loop that is garbage collected takes its pools with it
+_async_pools = weakref.WeakKeyDictionary()
+
+
+def get_async_connection_pool(base_url: Optional[str] = None) -> AsyncConnectionPool:
+    """Return the async connection pool for the running event loop."""
+    base_url = base_url or API_BASE_URL
+    loop = asyncio.get_running_loop()
+    with _pools_lock:
+        pools = _async_pools.setdefault(loop, {})
+        pool = pools.get(base_url)
+        if pool is None:
+            pool = pools[base_url] = AsyncConnectionPool(base_url)
+        return pool
+
+
+async def _send_request_async(
+    method: str,
+    path: str,
+    api_key: str,
+    payload: Optional[dict] = None
+) -> Tuple[int, Dict[str, str], bytes]:
+    """Async counterpart of _send_request (curl fallback runs in a worker thread)."""
+    global _curl_fallback_warned
+
+    body = json.dumps(payload).encode('utf-8') if payload is not None else None
+    model = payload.get('model') if payload else None
+
+    if not _use_curl():
+        timings: Dict[str, float] = {}
+        try:
+            result = await get_async_connection_pool().request(
+                method, path, body, _api_headers(api_key), timings=timings)
+        except socket.timeout:
+            raise
+        except (OSError, http.client.HTTPException, asyncio.IncompleteReadError) as e:
+            if not _curl_fallback_warned:
+                _curl_fallback_warned = True
+                print(f"Warning: in-process HTTP transport failed ({e}); "
+                      f"falling back to curl", file=sys.stderr)
+        else:
+            _record_transfer(model, body, result[2], timings.get('ttfb'))
+            return result
+
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, _curl_request, method, path, api_key, body)
+    _record_transfer(model, body, result[2])
+    return result
+
+
+# ============================================================================
+# Rate limiting
+# ============================================================================
+
+MAX_RATE_LIMIT_RETRIES = 6
+
+
+class _TokenBucket:
+    """
+    Continuously refilling token bucket.
+
+    The level may go negative: each reservation is deducted immediately and
+    the caller waits until the deficit has refilled, so concurrent callers
+    queue up fairly instead of racing for the next free token.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def set_limit(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = min(self.level, self.capacity)
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Deduct `amount` and return how long the caller must wait."""
+        self.refill(now)
+        self.level -= amount
+        return -self.level / self.rate if self.level < 0 and self.rate > 0 else 0.0
+
+
+class RateLimiter:
+    """
+    Process-wide limiter for requests, input tokens and output tokens per minute.
+
+    Limits start unset (unlimited) unless configured, and are learned from the
+    API's anthropic-ratelimit-* response headers. A 429 with retry-after
+    pauses every caller until the server says it is safe to continue.
+    """
+
+    # bucket name -> response header prefixes, in order of preference
+    HEADER_PREFIXES = {
+        'requests': ('anthropic-ratelimit-requests',),
+        'input_tokens': ('anthropic-ratelimit-input-tokens', 'anthropic-ratelimit-tokens'),
+        'output_tokens': ('anthropic-ratelimit-output-tokens',),
+    }
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        input_tokens_per_minute: Optional[float] = None,
+        output_tokens_per_minute: Optional[float] = None
+    ):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._blocked_until = 0.0
+        self.configure(requests_per_minute, input_tokens_per_minute, output_tokens_per_minute)
+
+    def configure(
+        self,
+        requests_per_minute: Optional[float] = None,
+        input_tokens_per_minute: Optional[float] = None,
+        output_tokens_per_minute: Optional[float] = None
+    ):
+        """Set explicit per-minute limits (None leaves a limit unchanged)."""
+        limits = {
+            'requests': requests_per_minute,
+            'input_tokens': input_tokens_per_minute,
+            'output_tokens': output_tokens_per_minute,
+        }
+        with self._lock:
+            for name, limit in limits.items():
+                if limit:
+                    self._set_limit(name, limit)
+
+    def _set_limit(self, name: str, limit: float):
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            self._buckets[name] = _TokenBucket(limit)
+        elif bucket.capacity != limit:
+            bucket.set_limit(limit)
+
+    def reserve(self, input_tokens: int = 0) -> float:
+        """Reserve capacity for one request; returns seconds to wait before sending."""
+        now = time.monotonic()
+        with self._lock:
+            delay = max(0.0, self._blocked_until - now)
+            for name, amount in (('requests', 1), ('input_tokens', input_tokens)):
+                bucket = self._buckets.get(name)
+                if bucket is not None:
+                    delay = max(delay, bucket.reserve(amount, now))
+            output = self._buckets.get('output_tokens')
+            if output is not None:
+                output.refill(now)
+                if output.level < 0:
+                    delay = max(delay, -output.level / output.rate)
+        return delay
+
+    def acquire(self, input_tokens: int = 0):
+        """Block until a request with this many input tokens may be sent."""
+        delay = self.reserve(input_tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, input_tokens: int = 0):
+        """Async counterpart of acquire."""
+        delay = self.reserve(input_tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def settle(self, estimated_input: int, usage: dict):
+        """Correct a reservation with the token counts the API actually billed."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get('input_tokens')
+            if bucket is not None:
+                bucket.refill(now)
+                bucket.level -= usage.get('input_tokens', estimated_input) - estimated_input
+            bucket = self._buckets.get('output_tokens')
+            if bucket is not None:
+                bucket.refill(now)
+                bucket.level -= usage.get('output_tokens', 0)
+
+    def update_from_headers(self, headers: Dict[str, str]):
+        """Adopt the limits and remaining capacity reported by the API."""
+        now = time.monotonic()
+        with self._lock:
+            for name, prefixes in self.HEADER_PREFIXES.items():
+                for prefix in prefixes:
+                    limit = _header_number(headers, f'{prefix}-limit')
+                    if limit is None:
+                        continue
+                    self._set_limit(name, limit)
+                    remaining = _header_number(headers, f'{prefix}-remaining')
+                    if remaining is not None:
+                        bucket = self._buckets[name]
+                        bucket.refill(now)
+                        bucket.level = min(bucket.level, remaining)
+                    break
+
+            retry_after = _header_number(headers, 'retry-after')
+            if retry_after is not None:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def pause(self, seconds: float):
+        """Hold back every caller for `seconds` (used after a 429)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def limits(self) -> Dict[str, float]:
+        """Return the current per-minute limits that are in force."""
+        with self._lock:
+            return {name: bucket.capacity for name, bucket in self._buckets.items()}
+
+
+def _header_number(headers: Dict[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+_rate_limiter = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the rate limiter shared by every caller in this process."""
+    return _rate_limiter
+
+
+def configure_rate_limit(
+    requests_per_minute: Optional[float] = None,
+    input_tokens_per_minute: Optional[float] = None,
+    output_tokens_per_minute: Optional[float] = None
+):
+    """Set explicit limits on the shared rate limiter (headers may refine them)."""
+    _rate_limiter.configure(requests_per_minute, input_tokens_per_minute, output_tokens_per_minute)
+
+
+def _estimate_input_tokens(payload: dict) -> int:
+    """Rough input token count of a request, for rate-limit reservations."""
+    if TOKEN_ESTIMATOR_AVAILABLE:
+        return get_estimator().count_request(payload)
+    text_len = sum(len(m['content']) if isinstance(m['content'], str) else len(json.dumps(m['content']))
+                   for m in payload['messages'])
+    system = payload.get('system')
+    if system:
+        text_len += len(system) if isinstance(system, str) else len(json.dumps(system))
+    return text_len // 4
+
+
+def _rate_limit_delay(headers: Dict[str, str], attempt: int) -> float:
+    """Seconds to wait after a 429: retry-after if given, else exponential."""
+    retry_after = _header_number(headers, 'retry-after')
+    if retry_after is not None:
+        return retry_after
+    return min(60.0, 2.0 ** attempt)
+
+
+# ============================================================================
+# Retries, hedging and call statistics
+# ============================================================================
+
+MAX_RETRIES = 4           # retries for transient failures other than 429
+RETRY_BASE_DELAY = 1.0    # seconds; doubled per attempt before jitter
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUS = {408, 409, 500, 502, 503, 504, 529}
+# Connect timeouts are OSErrors and retried. A ReadTimeout is not: the server
+# had the request, and every retry could hang as long again, stalling the
+# caller for MAX_RETRIES times REQUEST_TIMEOUT
+TRANSIENT_ERRORS = (OSError, http.client.HTTPException, asyncio.IncompleteReadError)
+
+# Hedging is off by default: a hedge doubles the cost of the calls it fires on
+_hedging = {"enabled": False, "percentile": 95.0, "min_samples": 20, "delay": None}
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _backoff_delay(attempt: int, headers: Optional[Dict[str, str]] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than a retry-after header."""
+    ceiling = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    retry_after = _header_number(headers or {}, 'retry-after')
+    return max(delay, retry_after) if retry_after is not None else delay
+
+
+def get_call_stats() -> dict:
+    """Return retry/hedge counters and latency percentiles per model (see get_metrics)."""
+    snapshot = _metrics.snapshot()
+    stats = {name: snapshot["totals"][name] for name in ("retries", "hedges", "hedge_wins")}
+    stats["models"] = {model: entry["latency"] for model, entry in snapshot["models"].items()
+                       if entry["latency"]["count"]}
+    return stats
+
+
+def configure_retries(
+    max_retries: Optional[int] = None,
+    base_delay: Optional[float] = None,
+    max_delay: Optional[float] = None
+):
+    """Adjust retry behaviour for transient (non-429) failures."""
+    global MAX_RETRIES, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+    if max_retries is not None:
+        MAX_RETRIES = max_retries
+    if base_delay is not None:
+        RETRY_BASE_DELAY = base_delay
+    if max_delay is not None:
+        RETRY_MAX_DELAY = max_delay
+
+
+def configure_hedging(
+    enabled: bool = True,
+    percentile: float = 95.0,
+    min_samples: int = 20,
+    delay: Optional[float] = None
+):
+    """
+    Enable or disable hedged requests.
+
+    Args:
+        enabled: Turn hedging on or off
+        percentile: Hedge once a call exceeds this latency percentile
+        min_samples: Calls per model needed before the percentile is trusted
+        delay: Fixed hedge delay in seconds (overrides the percentile)
+    """
+    _hedging.update(enabled=enabled, percentile=percentile,
+                    min_samples=min_samples, delay=delay)
+
+
+def _hedge_delay(model: str) -> Optional[float]:
+    """Seconds to wait before hedging a call to `model`, or None to not hedge."""
+    if not _hedging["enabled"]:
+        return None
+    if _hedging["delay"] is not None:
+        return _hedging["delay"]
+    if _metrics.sample_count(model) < _hedging["min_samples"]:
+        return None
+    return _metrics.percentile(model, _hedging["percentile"])
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _pools_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix='rlm-hedge')
+        return _hedge_executor
+
+
+# ============================================================================
+# Response cache
+# ============================================================================
+
+_response_cache = None
+_cache_nondeterministic = False
+
+
+def default_cache_dir() -> Path:
+    """Default on-disk cache location (~/.claude/rlm_cache)."""
+    return get_claude_config_dir() / 'rlm_cache'
+
+
+def configure_cache(
+    cache_dir: Optional[str] = None,
+    enabled: bool = True,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+    ttl: Optional[float] = DEFAULT_TTL,
+    cache_nondeterministic: bool = False
+):
+    """
+    Enable or disable the on-disk response cache.
+
+    Args:
+        cache_dir: Cache directory (default: ~/.claude/rlm_cache)
+        enabled: False disables caching for the rest of the session
+        max_bytes: Size limit; least recently used entries are evicted beyond it
+        ttl: Seconds before an entry expires (None = never)
+        cache_nondeterministic: Also cache calls with temperature > 0
+    """
+    global _response_cache, _cache_nondeterministic
+    if _response_cache is not None:
+        _response_cache.close()
+        _response_cache = None
+    _cache_nondeterministic = cache_nondeterministic
+    if not enabled:
+        return
+    if not RESPONSE_CACHE_AVAILABLE:
+        print("Warning: response_cache.py not found; caching disabled", file=sys.stderr)
+        return
+    _response_cache = ResponseCache(cache_dir or default_cache_dir(), max_bytes=max_bytes, ttl=ttl)
+
+
+def get_cache_stats() -> dict:
+    """Return response cache counters (empty dict when caching is off)."""
+    return _response_cache.stats() if _response_cache is not None else {}
+
+
+def _cache_key(payload: dict) -> Optional[str]:
+    """Cache key for a request, or None if it should not be cached."""
+    if _response_cache is None:
+        return None
+    if payload.get('temperature', 1.0) != 0 and not _cache_nondeterministic:
+        return None
+    return ResponseCache.make_key(
+        payload['model'], payload.get('system'), payload['messages'][0]['content'],
+        payload.get('temperature'), payload['max_tokens']
+    )
+
+
+def _cache_get(key: Optional[str]) -> Optional[str]:
+    """Look up a cache key (None = uncacheable), counting the hit or miss."""
+    if key is None:
+        return None
+    text = _response_cache.get(key)
+    _metrics.record_cache(text is not None)
+    return text
+
+
+# ============================================================================
+# Request coalescing
+# ============================================================================
+
+class _FlightAbandoned(Exception):
+    """The leading call was cancelled or interrupted; followers start over."""
+
+
+class SingleFlight:
+    """
+    Share one in-flight call among concurrent callers with the same key.
+
+    The first caller for a key (the leader) runs the call; callers that
+    arrive while it is running wait for its result, or its exception,
+    instead of sending a duplicate request. Flights are plain
+    concurrent.futures.Future objects, so threads and asyncio tasks (on any
+    event loop) can wait on the same flight.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Future] = {}
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Future()
+            return flight, True
+
+    def _land(self, key: str, flight: Future, result: Any = None,
+              error: Optional[BaseException] = None):
+        with self._lock:
+            del self._flights[key]
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() unless an identical call is already in flight.
+
+        Returns:
+            Tuple of (result, True if it was shared from another caller)
+        """
+        while True:
+            flight, leader = self._join(key)
+            if leader:
+                break
+            if _in_event_loop_thread():
+                # Blocking here could deadlock an async leader on this loop
+                return fn(), False
+            try:
+                return flight.result(), True
+            except _FlightAbandoned:
+                continue
+
+        try:
+            result = fn()
+        except Exception as e:
+            self._land(key, flight, error=e)
+            raise
+        except BaseException:
+            self._land(key, flight, error=_FlightAbandoned())
+            raise
+        self._land(key, flight, result)
+        return result, False
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async counterpart of do(); fn is a coroutine function."""
+        while True:
+            flight, leader = self._join(key)
+            if leader:
+                break
+            try:
+                # shield: a cancelled follower must not cancel the shared flight
+                return await asyncio.shield(asyncio.wrap_future(flight)), True
+            except _FlightAbandoned:
+                continue
+
+        try:
+            result = await fn()
+        except Exception as e:
+            self._land(key, flight, error=e)
+            raise
+        except BaseException:
+            self._land(key, flight, error=_FlightAbandoned())
+            raise
+        self._land(key, flight, result)
+        return result, False
+
+
+def _in_event_loop_thread() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+_flights = SingleFlight()
+_coalescing = {"enabled": True, "nondeterministic": False}
+
+
+def configure_coalescing(enabled: bool = True, nondeterministic: bool = False):
     """
+    Enable or disable sharing of identical in-flight requests.
+
+    Args:
+        enabled: Coalesce identical concurrent calls (default: on)
+        nondeterministic: Also coalesce calls with temperature > 0, which
+            then share one sample instead of drawing independent ones
+    """
+    _coalescing.update(enabled=enabled, nondeterministic=nondeterministic)
+
+
+def _flight_key(payload: dict) -> Optional[str]:
+    """Coalescing key for a request, or None if it must run on its own."""
+    if not _coalescing["enabled"]:
+        return None
+    if payload.get('temperature', 1.0) != 0 and not _coalescing["nondeterministic"]:
+        return None
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _coalesce(payload: dict, fn: Callable[[], str]) -> str:
+    key = _flight_key(payload)
+    if key is None:
+        return fn()
+    text, shared = _flights.do(key, fn)
+    if shared:
+        _metrics.increment(payload['model'], 'coalesced')
+    return text
+
+
+async def _coalesce_async(payload: dict, fn: Callable[[], Awaitable[str]]) -> str:
+    key = _flight_key(payload)
+    if key is None:
+        return await fn()
+    text, shared = await _flights.do_async(key, fn)
+    if shared:
+        _metrics.increment(payload['model'], 'coalesced')
+    return text
+
+
+# ============================================================================
+# Queries
+# ============================================================================
+
+def _require_api_key() -> str:
+    """Load the API key or raise ValueError with setup instructions."""
     api_key = load_api_key()
     if not api_key:
         claude_dir = get_claude_config_dir()
@@ -146,80 +1218,613 @@ def llm_query(
             f"  Create: {claude_dir / 'config.json'}\n"
             f'  Contents: {{"api_key": "sk-ant-api03-your-key-here"}}'
         )
-    
-    # Build the request payload
+    return api_key
+
+
+def _build_payload(
+    prompt: str,
+    model: str,
+    max_tokens: int,
+    temperature: float,
+    system: Optional[str],
+    cache_system: bool = False
+) -> dict:
+    """Build a Messages API request payload."""
     payload = {
         "model": model,
         "max_tokens": max_tokens,
         "messages": [{"role": "user", "content": prompt}]
     }
-    
-    if system:
+
+    if system and cache_system:
+        # Mark the system prompt as a cacheable prefix: later calls that share
+        # it exactly are billed at the cache-read rate for that part
+        payload["system"] = [{"type": "text", "text": system,
+                              "cache_control": {"type": "ephemeral"}}]
+    elif system:
         payload["system"] = system
-    
+
     payload["temperature"] = temperature
-    
-    # Use curl for maximum compatibility (available on Windows 10+)
-    payload_json = json.dumps(payload)
+    return payload
+
+
+class _RetryPolicy:
+    """
+    Retry decisions for one call, shared by the sync and async request loops.
+
+    Each method returns how long to wait before the next attempt, or None
+    when the attempt is final: the caller then returns the response or
+    re-raises the error. 429s pause the shared rate limiter, so the caller
+    waits for it in its next acquire() and the delay returned is 0.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.rate_limited = 0
+        self.failures = 0
 
-    # Always write payload to temp file to avoid command-line length limits
-    # and to avoid passing sensitive data via command-line arguments
-    tmp_file = None
+    def after_error(self, error: BaseException) -> Optional[float]:
+        if isinstance(error, ReadTimeout) or self.failures >= MAX_RETRIES:
+            _metrics.increment(self.model, 'errors')
+            return None
+        return self._retry(_backoff_delay(self.failures))
+
+    def after_response(self, status: int, headers: Dict[str, str]) -> Optional[float]:
+        _rate_limiter.update_from_headers(headers)
+        if status == 429 and self.rate_limited < MAX_RATE_LIMIT_RETRIES:
+            _rate_limiter.pause(_rate_limit_delay(headers, self.rate_limited))
+            self.rate_limited += 1
+            _metrics.increment(self.model, 'retries')
+            return 0.0
+        if status in RETRYABLE_STATUS and self.failures < MAX_RETRIES:
+            return self._retry(_backoff_delay(self.failures, headers))
+        return None
+
+    def _retry(self, delay: float) -> float:
+        self.failures += 1
+        _metrics.increment(self.model, 'retries')
+        return delay
+
+
+def _request_with_retries(model: str, estimated: int, send) -> Tuple[int, Dict[str, str], object, float]:
+    """
+    Call send() under the shared rate limiter until it succeeds or retries run out.
+
+    send() returns (status, headers, body). 429s wait out the limiter's
+    retry-after; other transient failures (5xx, overloaded, dropped
+    connections, connect timeouts) back off with full jitter. A ReadTimeout
+    is raised at once.
+
+    Returns:
+        Tuple of (status, headers, body, seconds taken by the final attempt)
+    """
+    retry = _RetryPolicy(model)
+    while True:
+        _rate_limiter.acquire(estimated)
+        started = time.monotonic()
+        try:
+            status, headers, body = send()
+        except TRANSIENT_ERRORS as e:
+            delay = retry.after_error(e)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+
+        delay = retry.after_response(status, headers)
+        if delay is None:
+            return status, headers, body, time.monotonic() - started
+        time.sleep(delay)
+
+
+def _post_message(api_key: str, payload: dict) -> dict:
+    """POST to the Messages API with rate limiting and retries."""
+    estimated = _estimate_input_tokens(payload)
+    _, _, data, elapsed = _request_with_retries(
+        payload['model'], estimated, lambda: _send_request('POST', '/v1/messages', api_key, payload))
+    return _finish_response(payload, estimated, data, elapsed)
+
+
+async def _post_message_async(api_key: str, payload: dict) -> dict:
+    """Async counterpart of _post_message."""
+    estimated = _estimate_input_tokens(payload)
+    retry = _RetryPolicy(payload['model'])
+    while True:
+        await _rate_limiter.acquire_async(estimated)
+        started = time.monotonic()
+        try:
+            status, headers, data = await _send_request_async('POST', '/v1/messages', api_key, payload)
+        except TRANSIENT_ERRORS as e:
+            delay = retry.after_error(e)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+
+        delay = retry.after_response(status, headers)
+        if delay is None:
+            return _finish_response(payload, estimated, data, time.monotonic() - started)
+        await asyncio.sleep(delay)
+
+
+def _finish_response(payload: dict, estimated: int, data: bytes, elapsed: float) -> dict:
+    """Decode a final response and account for it (usage, limiter, latency)."""
     try:
-        tmp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8')
-        tmp_file.write(payload_json)
-        tmp_file.close()
-        data_arg = f'@{tmp_file.name}'
+        response = _decode_response(data)
+    except Exception:
+        _metrics.increment(payload['model'], 'errors')
+        raise
+    usage = response.get('usage', {})
+    _rate_limiter.settle(estimated, usage)
+    record_usage(usage, payload['model'])
+    _metrics.record_latency(payload['model'], elapsed)
+    return response
 
-        # Resolve curl to full path to avoid shell=True on Windows
-        curl_path = shutil.which('curl') or 'curl'
 
-        cmd = [
-            curl_path, '-s',
-            'https://api.anthropic.com/v1/messages',
-            '-H', 'Content-Type: application/json',
-            '-H', f'x-api-key: {api_key}',
-            '-H', 'anthropic-version: 2023-06-01',
-            '-d', data_arg
-        ]
-
-        result = subprocess.run(
-            cmd, capture_output=True, text=True,
-            encoding='utf-8', errors='replace'
-        )
-    finally:
-        if tmp_file and os.path.exists(tmp_file.name):
-            os.unlink(tmp_file.name)
-    
-    if result.returncode != 0:
-        raise Exception(f"curl failed: {result.stderr}")
-    
+def _post_message_hedged(api_key: str, payload: dict) -> dict:
+    """
+    _post_message with optional hedging for tail latency.
+
+    If the call has not finished within the hedge delay (by default the
+    observed p95 for this model), an identical request is sent and whichever
+    succeeds first wins. The slower request is left to finish in the
+    background; its tokens are still counted because they are still billed.
+    """
+    delay = _hedge_delay(payload['model'])
+    if delay is None:
+        return _post_message(api_key, payload)
+
+    executor = _get_hedge_executor()
+    primary = executor.submit(_post_message, api_key, payload)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    _metrics.increment(payload['model'], 'hedges')
+    hedge = executor.submit(_post_message, api_key, payload)
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    _metrics.increment(payload['model'], 'hedge_wins')
+                return future.result()
+    return primary.result()  # both failed: raise the primary's error
+
+
+async def _post_message_hedged_async(api_key: str, payload: dict) -> dict:
+    """Async counterpart of _post_message_hedged (the losing request is cancelled)."""
+    delay = _hedge_delay(payload['model'])
+    if delay is None:
+        return await _post_message_async(api_key, payload)
+
+    primary = asyncio.ensure_future(_post_message_async(api_key, payload))
+    done, _ = await asyncio.wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    _metrics.increment(payload['model'], 'hedges')
+    hedge = asyncio.ensure_future(_post_message_async(api_key, payload))
+    pending = {primary, hedge}
     try:
-        response = json.loads(result.stdout)
-    except json.JSONDecodeError as e:
-        raise Exception(f"Invalid JSON response: {result.stdout[:500]}")
-    
-    if 'error' in response:
-        raise Exception(f"API error: {response['error']}")
-    
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        _metrics.increment(payload['model'], 'hedge_wins')
+                    return future.result()
+        return primary.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _extract_text(response: dict) -> str:
+    """Return the text of a decoded Messages API response."""
     if 'content' not in response or not response['content']:
         raise Exception(f"Unexpected response format: {response}")
 
-    # Track token usage
-    usage = response.get('usage', {})
-    _usage["input_tokens"] += usage.get("input_tokens", 0)
-    _usage["output_tokens"] += usage.get("output_tokens", 0)
-    _usage["requests"] += 1
-
     return response['content'][0]['text']
 
 
+def llm_query(
+    prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4096,
+    temperature: float = 0.0,
+    system: Optional[str] = None,
+    cache_system: bool = False
+) -> str:
+    """
+    Execute a sub-LLM query via Anthropic API.
+    
+    Args:
+        prompt: The user prompt to send
+        model: Model to use (default: claude-sonnet-4)
+        max_tokens: Maximum response tokens
+        temperature: Sampling temperature (0.0 = deterministic)
+        system: Optional system prompt
+        cache_system: Send the system prompt as a prompt-cache prefix (use when
+            many calls share the same system prompt)
+        
+    Returns:
+        The model's text response
+        
+    Raises:
+        ValueError: If API key not set
+        Exception: If API call fails
+    """
+    api_key = _require_api_key()
+    payload = _build_payload(prompt, model, max_tokens, temperature, system, cache_system)
+
+    key = _cache_key(payload)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    def call() -> str:
+        text = _extract_text(_post_message_hedged(api_key, payload))
+        if key is not None:
+            _response_cache.put(key, text)
+        return text
+
+    return _coalesce(payload, call)
+
+
 def llm_query_fast(prompt: str, **kwargs) -> str:
     """Execute a fast sub-query using the cheaper/faster model."""
     kwargs['model'] = kwargs.get('model', FAST_MODEL)
     return llm_query(prompt, **kwargs)
 
 
+async def allm_query(
+    prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4096,
+    temperature: float = 0.0,
+    system: Optional[str] = None,
+    cache_system: bool = False
+) -> str:
+    """
+    Async variant of llm_query for use inside an asyncio event loop.
+
+    Requests share a per-loop pool of keep-alive connections, so many calls
+    can be awaited concurrently from one thread (see gather_bounded).
+    """
+    api_key = _require_api_key()
+    payload = _build_payload(prompt, model, max_tokens, temperature, system, cache_system)
+
+    key = _cache_key(payload)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    async def call() -> str:
+        text = _extract_text(await _post_message_hedged_async(api_key, payload))
+        if key is not None:
+            _response_cache.put(key, text)
+        return text
+
+    return await _coalesce_async(payload, call)
+
+
+async def allm_query_fast(prompt: str, **kwargs) -> str:
+    """Async variant of llm_query_fast."""
+    kwargs['model'] = kwargs.get('model', FAST_MODEL)
+    return await allm_query(prompt, **kwargs)
+
+
+async def gather_bounded(
+    aws: Iterable[Awaitable],
+    limit: int = 16,
+    return_exceptions: bool = False
+) -> list:
+    """
+    Await many coroutines with at most `limit` running at once.
+
+    Results are returned in input order, like asyncio.gather. Pass coroutine
+    objects (not already-started tasks) so the bound actually applies.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws), return_exceptions=return_exceptions)
+
+
+def llm_query_concurrent(
+    prompts: List[str],
+    concurrency: int = 16,
+    fast: bool = False,
+    return_exceptions: bool = True,
+    **kwargs
+) -> list:
+    """
+    Run many prompts concurrently from synchronous code.
+
+    Returns responses in prompt order; with return_exceptions=True a failed
+    prompt yields its exception instead of aborting the whole batch. Must not
+    be called from inside a running event loop (use gather_bounded there).
+    """
+    query_fn = allm_query_fast if fast else allm_query
+    return asyncio.run(gather_bounded(
+        (query_fn(p, **kwargs) for p in prompts),
+        limit=concurrency,
+        return_exceptions=return_exceptions,
+    ))
+
+
+# ============================================================================
+# Streaming
+# ============================================================================
+
+def _iter_sse_events(
+    response: http.client.HTTPResponse,
+    received: Optional[List[int]] = None
+) -> Iterator[Tuple[Optional[str], dict]]:
+    """
+    Parse a server-sent events body into (event name, JSON data) pairs.
+
+    Bytes read are added to received[0] when a counter is given.
+    """
+    event, data_lines = None, []
+    for raw in response:
+        if received is not None:
+            received[0] += len(raw)
+        line = raw.decode('utf-8').rstrip('\r\n')
+        if not line:
+            if data_lines:
+                yield event, json.loads('\n'.join(data_lines))
+            event, data_lines = None, []
+        elif line.startswith(':'):
+            continue  # comment / keep-alive
+        elif line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data_lines.append(line[5:].lstrip())
+    if data_lines:
+        yield event, json.loads('\n'.join(data_lines))
+
+
+def llm_query_stream(
+    prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4096,
+    temperature: float = 0.0,
+    system: Optional[str] = None,
+    cache_system: bool = False
+) -> Iterator[str]:
+    """
+    Streaming variant of llm_query: yields the response text as it arrives.
+
+    Stopping early (breaking out of the loop, or calling .close() on the
+    generator) drops the connection, which ends generation on the server, so
+    output tokens that were never generated are never billed. Cached
+    responses are yielded in one piece. With the curl transport the full
+    response is fetched first and then yielded whole.
+
+    Raises:
+        ValueError: If API key not set
+        Exception: If the API call fails or the stream is cut off
+    """
+    api_key = _require_api_key()
+    payload = _build_payload(prompt, model, max_tokens, temperature, system, cache_system)
+
+    key = _cache_key(payload)
+    cached = _cache_get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    if _use_curl():
+        text = _extract_text(_post_message(api_key, payload))
+        if key is not None:
+            _response_cache.put(key, text)
+        yield text
+        return
+
+    payload["stream"] = True
+    pool = get_connection_pool()
+    body = json.dumps(payload).encode('utf-8')
+    estimated = _estimate_input_tokens(payload)
+
+    def send():
+        conn, response = pool.open('POST', '/v1/messages', body, _api_headers(api_key))
+        headers = {k.lower(): v for k, v in response.getheaders()}
+        if response.status == 200:
+            _metrics.record_bytes(model, len(body), 0)
+            return response.status, headers, (conn, response)
+        try:
+            data = response.read()
+        finally:
+            pool.release(conn, response)
+        _metrics.record_bytes(model, len(body), len(data))
+        return response.status, headers, data
+
+    status, _, opened, elapsed = _request_with_retries(model, estimated, send)
+    if status != 200:
+        _metrics.increment(model, 'errors')
+        _decode_response(opened)  # raises with the API's error message
+        raise Exception(f"API error: HTTP {status}")
+
+    # Time-to-first-byte of a stream is measured to the first text delta
+    started = time.monotonic() - elapsed
+    conn, response = opened
+    usage: Dict[str, int] = {}
+    received = [0]
+    parts = []
+    finished = False
+    try:
+        for event, data in _iter_sse_events(response, received):
+            kind = data.get('type', event)
+            if kind == 'message_start':
+                usage.update(data.get('message', {}).get('usage', {}))
+            elif kind == 'content_block_delta' and data['delta'].get('type') == 'text_delta':
+                if not parts:
+                    _metrics.record_ttfb(model, time.monotonic() - started)
+                parts.append(data['delta']['text'])
+                yield data['delta']['text']
+            elif kind == 'message_delta':
+                usage.update(data.get('usage', {}))
+            elif kind == 'message_stop':
+                finished = True
+            elif kind == 'error':
+                raise Exception(f"API error: {data.get('error')}")
+        if not finished:
+            raise http.client.IncompleteRead(''.join(parts).encode('utf-8'))
+    except Exception:
+        _metrics.increment(model, 'errors')
+        raise
+    finally:
+        pool.release(conn, response)
+        _rate_limiter.settle(estimated, usage)
+        record_usage(usage, model)
+        _metrics.record_bytes(model, 0, received[0])
+
+    _metrics.record_latency(model, time.monotonic() - started)
+    if key is not None:
+        _response_cache.put(key, ''.join(parts))
+
+
+def collect_stream(deltas: Iterator[str], stop_at: Optional[str] = None) -> str:
+    """
+    Join streamed text, optionally closing the stream early.
+
+    Args:
+        deltas: Generator from llm_query_stream
+        stop_at: Stop reading (and close the stream) once this marker appears
+
+    Returns:
+        The text received up to the point reading stopped
+    """
+    text = ''
+    try:
+        for delta in deltas:
+            text += delta
+            if stop_at is not None and stop_at in text:
+                break
+    finally:
+        deltas.close()
+    return text
+
+
+# ============================================================================
+# Building blocks for other endpoints (see rlm_batch.py)
+# ============================================================================
+
+def build_message_params(
+    prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4096,
+    temperature: float = 0.0,
+    system: Optional[str] = None,
+    cache_system: bool = False
+) -> dict:
+    """Return the Messages API request body llm_query would send for `prompt`."""
+    return _build_payload(prompt, model, max_tokens, temperature, system, cache_system)
+
+
+def cached_response(params: dict) -> Optional[str]:
+    """Look up a request body (from build_message_params) in the response cache."""
+    return _cache_get(_cache_key(params))
+
+
+def cache_response(params: dict, text: str):
+    """Store the response text for a request body in the response cache."""
+    key = _cache_key(params)
+    if key is not None:
+        _response_cache.put(key, text)
+
+
+def count_tokens(prompt: str, model: str = DEFAULT_MODEL, system: Optional[str] = None) -> int:
+    """Count a prompt's input tokens with the API's count_tokens endpoint (not billed)."""
+    payload = {"model": model, "messages": [{"role": "user", "content": prompt}]}
+    if system:
+        payload["system"] = system
+    _, _, data = api_request('POST', '/v1/messages/count_tokens', payload)
+    return _decode_response(data)['input_tokens']
+
+
+def api_request(
+    method: str,
+    path: str,
+    payload: Optional[dict] = None
+) -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Send a request to an arbitrary API path, retrying transient failures.
+
+    `path` may also be an absolute URL on the API host, such as the
+    results_url of a message batch.
+
+    Returns:
+        Tuple of (status code, lower-cased response headers, body bytes)
+    """
+    api_key = _require_api_key()
+    if '://' in path:
+        parts = urlsplit(path)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+
+    failures = 0
+    while True:
+        try:
+            status, headers, data = _send_request(method, path, api_key, payload)
+        except ReadTimeout:
+            raise
+        except TRANSIENT_ERRORS:
+            if failures >= MAX_RETRIES:
+                raise
+            time.sleep(_backoff_delay(failures))
+            failures += 1
+            continue
+
+        if (status == 429 or status in RETRYABLE_STATUS) and failures < MAX_RETRIES:
+            time.sleep(_backoff_delay(failures, headers))
+            failures += 1
+            continue
+        return status, headers, data
+
+
+# ============================================================================
+# Shared CLI options
+# ============================================================================
+
+def add_client_arguments(parser: argparse.ArgumentParser):
+    """Add the API client options shared by every RLM command-line tool."""
+    group = parser.add_argument_group('API client options')
+    group.add_argument('--base-url', default=None,
+                       help=f'API base URL, e.g. a local mock_server.py (default: {API_BASE_URL})')
+    group.add_argument('--max-retries', type=int, default=None,
+                       help=f'Retries for transient API failures (default: {MAX_RETRIES})')
+    group.add_argument('--hedge', action='store_true',
+                       help='Send a duplicate request when a call exceeds the p95 latency')
+    group.add_argument('--hedge-after', type=float, default=None, metavar='SECONDS',
+                       help='Hedge after a fixed delay instead of the observed p95')
+    group.add_argument('--no-cache', action='store_true',
+                       help='Disable the on-disk response cache')
+    group.add_argument('--cache-dir', default=None,
+                       help=f'Response cache directory (default: {default_cache_dir()})')
+    group.add_argument('--metrics-json', default=None, metavar='PATH',
+                       help='Write per-model call metrics (tokens, latency, retries, bytes) '
+                            'to PATH as JSON when the run ends')
+
+
+def apply_client_arguments(args: argparse.Namespace):
+    """Apply the options added by add_client_arguments."""
+    if args.base_url:
+        set_base_url(args.base_url)
+    configure_retries(max_retries=args.max_retries)
+    configure_cache(cache_dir=args.cache_dir, enabled=not args.no_cache)
+    if args.hedge or args.hedge_after is not None:
+        configure_hedging(enabled=True, delay=args.hedge_after)
+    if args.metrics_json:
+        # atexit also covers runs that end through sys.exit() or an error
+        atexit.register(write_metrics, args.metrics_json)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Execute a sub-LLM query for RLM processing',
@@ -256,8 +1861,10 @@ Examples:
     parser.add_argument('--system', '-s', help='System prompt')
     parser.add_argument('--json', action='store_true', help='Output raw JSON response')
     parser.add_argument('--check-key', action='store_true', help='Check if API key is configured')
+    add_client_arguments(parser)
     
     args = parser.parse_args()
+    apply_client_arguments(args)
     
     # Check API key configuration
     if args.check_key:
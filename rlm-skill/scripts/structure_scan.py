@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+structure_scan.py - One-pass structural statistics for long context files.
+
+auto_chunk and analyze_context used to walk a document once per feature (a
+regex per pattern, plus counting or splitting lines). scan_structure walks it
+once: a single line-anchored regex classifies every line by how it starts
+(separator rule, header, code fence, JSON object, numbered item, bullet,
+blank) while line lengths are tallied. It also records where the
+boundaries the chunkers split at begin, so chunking does not search again.
+
+Line features (headers, items, JSON objects) are counted per line. XML tags
+and ``` marks can occur anywhere in a line, so they are counted per
+occurrence as analyze_context always counted them, with one C-level search
+each. Separator rules are counted as re.findall(r'\n---+\n|...') counted
+them: of two adjacent rule lines only the first counts.
+
+Usage:
+    python structure_scan.py document.md
+"""
+
+import re
+import sys
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+# One match per line. The named group that matched (if any) says what the
+# line starts with; everything after it up to the newline is consumed.
+_LINE = re.compile(r"""
+    ^(?:
+        (?P<rule>(?:---+|===+|\*\*\*+)$)        # horizontal rule / document separator
+      | (?P<dashes>---)                         # other line starting with ---
+      | (?P<header>\#+)(?=\s)                   # markdown header
+      | [ \t]*(?:
+            (?P<fence>```)
+          | (?P<json>\{)
+          | (?P<numbered>\d+[.)])(?=\s)
+          | (?P<bullet>[-*•])(?=\s)
+          | (?P<blank>[^\S\n]*$)
+        )
+    )?[^\n]*
+""", re.MULTILINE | re.VERBOSE)
+
+_XML_TAG = re.compile(r'<[a-zA-Z][^>]*>')
+
+
+@dataclass
+class StructureScan:
+    """Structural statistics of a text, and the line starts chunkers split at."""
+    chars: int = 0
+    lines: int = 0
+    non_empty_lines: int = 0
+    max_line_length: int = 0
+    min_non_empty_length: int = 0
+    # Lines consisting only of --- or === (not the first or last line, nor
+    # right after another counted one)
+    separators: int = 0
+    # The same for lines of ---, === or *** (analyze_context's separators)
+    rules: int = 0
+    markdown_headers: int = 0
+    # ``` marks anywhere in the text
+    code_fences: int = 0
+    json_objects: int = 0
+    numbered_items: int = 0
+    bullet_points: int = 0
+    # Opening or self-closing tags anywhere in the text
+    xml_tags: int = 0
+    # Starts of lines beginning with '---' (chunk_by_separator(text, '\n---') cut points)
+    separator_starts: List[int] = field(default_factory=list)
+    # Starts of H1/H2 lines (MARKDOWN_SPLIT cut points)
+    header_starts: List[int] = field(default_factory=list)
+    # Starts of ``` fence lines
+    fence_starts: List[int] = field(default_factory=list)
+
+    @property
+    def newlines(self) -> int:
+        return max(0, self.lines - 1)
+
+    @property
+    def avg_line_length(self) -> int:
+        return (self.chars - self.newlines) // self.lines if self.lines else 0
+
+    def patterns(self) -> Dict[str, int]:
+        """Pattern counts as reported by analyze_context."""
+        return {
+            'json_objects': self.json_objects,
+            'markdown_headers': self.markdown_headers,
+            'code_blocks': self.code_fences // 2,
+            'xml_tags': self.xml_tags,
+            'document_separators': self.rules,
+            'numbered_items': self.numbered_items,
+            'bullet_points': self.bullet_points,
+        }
+
+
+def scan_structure(text: str) -> StructureScan:
+    """Scan text once and return its StructureScan."""
+    scan = StructureScan(chars=len(text))
+    counts = dict.fromkeys(('rule', 'dashes', 'header', 'fence', 'json',
+                            'numbered', 'bullet', 'blank'), 0)
+    max_length = 0
+    min_length = 0
+    lines = 0
+    # Ends of the last counted rules: the newline after one is not the start of another
+    last_rule = last_separator = -2
+
+    for match in _LINE.finditer(text):
+        start, end = match.span()
+        length = end - start
+        lines += 1
+        if length > max_length:
+            max_length = length
+        if length and (length < min_length or not min_length):
+            min_length = length
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        counts[kind] += 1
+        if kind == 'rule':
+            # A separator sits between two lines, and its newlines are its own
+            if start and end < len(text):
+                if start != last_rule + 1:
+                    scan.rules += 1
+                    last_rule = end
+                if text[start] != '*' and start != last_separator + 1:
+                    scan.separators += 1
+                    last_separator = end
+            if start and text[start] == '-':
+                scan.separator_starts.append(start)
+        elif kind == 'dashes':
+            if start:
+                scan.separator_starts.append(start)
+        elif kind == 'header':
+            if match.end('header') - start <= 2:
+                scan.header_starts.append(start)
+        elif kind == 'fence':
+            scan.fence_starts.append(start)
+
+    scan.lines = lines
+    scan.non_empty_lines = lines - counts['blank']
+    scan.max_line_length = max_length
+    scan.min_non_empty_length = min_length
+    scan.markdown_headers = counts['header']
+    scan.code_fences = text.count('```')
+    scan.json_objects = counts['json']
+    scan.numbered_items = counts['numbered']
+    scan.bullet_points = counts['bullet']
+    if '<' in text:
+        scan.xml_tags = len(_XML_TAG.findall(text))
+    return scan
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python structure_scan.py <file>", file=sys.stderr)
+        sys.exit(1)
+    try:
+        with open(sys.argv[1], 'r', encoding='utf-8', errors='replace') as f:
+            scan = scan_structure(f.read())
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    summary = {
+        'chars': scan.chars,
+        'lines': scan.lines,
+        'non_empty_lines': scan.non_empty_lines,
+        'avg_line_length': scan.avg_line_length,
+        'max_line_length': scan.max_line_length,
+        'patterns': scan.patterns(),
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
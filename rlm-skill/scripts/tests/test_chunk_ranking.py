@@ -0,0 +1,77 @@
+"""Tests for chunk_ranking.py (BM25 chunk ranking)."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chunk_ranking import BM25Index, select_ranked, tokenize
+from rlm_processor import filter_relevant_chunks
+
+
+CHUNKS = [
+    "The database connection pool is configured in settings.",
+    "Logging setup and handlers.",
+    "Database database database: pooling, connection limits and pool sizing for the database.",
+    "The settings module loads environment variables.",
+    "Unrelated notes about the office party.",
+]
+
+
+class TestBM25Index:
+    def test_tokenize_lowercases_words(self):
+        assert tokenize("Hello, World_2!") == ["hello", "world_2"]
+
+    def test_tokenize_folds_plurals(self):
+        assert tokenize("Budgets class is") == ["budget", "class", "is"]
+
+    def test_rank_orders_by_relevance(self):
+        ranked = BM25Index(CHUNKS).rank(["database", "pool"])
+        assert [i for i, _ in ranked] == [2, 0]
+        assert ranked[0][1] > ranked[1][1] > 0
+
+    def test_rare_terms_weigh_more(self):
+        index = BM25Index(CHUNKS)
+        assert index.idf("office") > index.idf("setting")
+        assert index.idf("missing") > 0
+
+    def test_chunks_without_terms_are_not_ranked(self):
+        assert BM25Index(CHUNKS).rank(["xylophone"]) == []
+
+    def test_length_normalization(self):
+        short = "alpha beta"
+        long = "alpha " + "filler " * 200
+        scores = BM25Index([short, long, "gamma"]).scores(["alpha"])
+        assert scores[0] > scores[1]
+
+
+class TestSelectRanked:
+    RANKED = [(3, 9.0), (0, 5.0), (7, 2.0), (1, 1.0)]
+    SIZES = [100, 100, 0, 300, 0, 0, 0, 100]
+
+    def test_top_k(self):
+        assert select_ranked(self.RANKED, self.SIZES, top_k=2) == self.RANKED[:2]
+
+    def test_token_budget(self):
+        assert select_ranked(self.RANKED, self.SIZES, max_tokens=450) == self.RANKED[:2]
+
+    def test_best_chunk_always_taken(self):
+        assert select_ranked(self.RANKED, self.SIZES, max_tokens=10) == self.RANKED[:1]
+
+
+class TestRankedFilter:
+    def test_common_keyword_no_longer_selects_everything(self):
+        chunks = [f"Section {i}: the system handles requests." for i in range(50)]
+        chunks[17] += " Requests time out when the system cache evicts sessions."
+        result = filter_relevant_chunks(chunks, "Why do system requests time out?", top_k=3)
+        assert len(result) == 3
+        assert result[0][0] == 17
+
+    def test_scores_are_logged(self):
+        messages = []
+        filter_relevant_chunks(CHUNKS, "database pool", top_k=1, log=messages.append)
+        assert any("#3 (" in m for m in messages)
+
+    def test_no_match_takes_document_order(self):
+        result = filter_relevant_chunks(CHUNKS, "xylophone quantum", top_k=2)
+        assert [i for i, _ in result] == [0, 1]
@@ -0,0 +1,99 @@
+"""Tests for chunk_similarity.py (TF-IDF cosine similarity ranking)."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import chunk_similarity
+from chunk_similarity import TfidfIndex
+from rlm_processor import filter_relevant_chunks
+
+
+CHUNKS = [
+    "The database connection pool is configured in settings.",
+    "Logging setup and handlers.",
+    "Configuring limits: pool sizing and the connection timeout.",
+    "The settings module loads environment variables.",
+    "Unrelated notes about the office party.",
+    "",
+]
+QUERY = "How is the connection pool configuration done?"
+
+
+@pytest.fixture
+def no_numpy(monkeypatch):
+    monkeypatch.setattr(chunk_similarity, "NUMPY_AVAILABLE", False)
+
+
+class TestTfidfIndex:
+    def test_rank_orders_by_similarity(self):
+        ranked = TfidfIndex(CHUNKS).rank(QUERY)
+        assert [i for i, _ in ranked[:2]] == [0, 2]
+        assert all(0 < score <= 1 for _, score in ranked)
+
+    def test_identical_text_scores_one(self):
+        assert TfidfIndex(CHUNKS).scores(CHUNKS[1])[1] == pytest.approx(1.0)
+
+    def test_word_parts_match(self):
+        # 'configuring' and 'configuration' share character n-grams
+        index = TfidfIndex(["configuring it", "nothing here"], char_ngrams=4)
+        assert index.scores("configuration")[0] > 0
+        index = TfidfIndex(["configuring it", "nothing here"], char_ngrams=0)
+        assert index.scores("configuration")[0] == 0
+
+    def test_word_order_counts(self):
+        index = TfidfIndex(["pool connection", "connection pool"])
+        scores = index.scores("connection pool")
+        assert scores[1] > scores[0] > 0
+
+    def test_empty_inputs(self):
+        assert TfidfIndex([]).rank("anything") == []
+        assert TfidfIndex(["", ""]).rank("anything") == []
+        assert TfidfIndex(CHUNKS).rank("") == []
+
+    @pytest.mark.skipif(not chunk_similarity.NUMPY_AVAILABLE, reason="numpy not installed")
+    def test_numpy_and_dict_paths_agree(self, monkeypatch):
+        expected = TfidfIndex(CHUNKS).scores(QUERY)
+        monkeypatch.setattr(chunk_similarity, "NUMPY_AVAILABLE", False)
+        assert TfidfIndex(CHUNKS).scores(QUERY) == pytest.approx(expected)
+
+    @pytest.mark.skipif(not chunk_similarity.NUMPY_AVAILABLE, reason="numpy not installed")
+    def test_paths_agree_with_repeated_words(self, monkeypatch):
+        words = "pool pools pooling connection configure configured timeout limit".split()
+        chunks = [" ".join(words[(i * j) % len(words)] for j in range(i % 13 + 1)) for i in range(60)]
+        expected = TfidfIndex(chunks).scores("configured pool timeout")
+        monkeypatch.setattr(chunk_similarity, "NUMPY_AVAILABLE", False)
+        assert TfidfIndex(chunks).scores("configured pool timeout") == pytest.approx(expected)
+
+    @pytest.mark.skipif(not chunk_similarity.NUMPY_AVAILABLE, reason="numpy not installed")
+    def test_save_and_load(self, tmp_path):
+        index = TfidfIndex(CHUNKS)
+        index.save(str(tmp_path / "v.npz"))
+        loaded = TfidfIndex.load(str(tmp_path / "v.npz"))
+        assert len(loaded) == len(CHUNKS)
+        assert loaded.rank(QUERY) == index.rank(QUERY)
+        (tmp_path / "bad.npz").write_bytes(b"not vectors")
+        with pytest.raises(ValueError):
+            TfidfIndex.load(str(tmp_path / "bad.npz"))
+
+    def test_dict_path_ranks(self, no_numpy):
+        assert [i for i, _ in TfidfIndex(CHUNKS).rank(QUERY)[:2]] == [0, 2]
+
+
+class TestSimilarityFilter:
+    def test_top_k(self):
+        selected = filter_relevant_chunks(CHUNKS, QUERY, top_k=2, similarity=True)
+        assert [i for i, _ in selected] == [0, 2]
+
+    def test_weak_matches_dropped_without_limits(self):
+        selected = [i for i, _ in filter_relevant_chunks(CHUNKS, QUERY, similarity=True)]
+        assert selected[:2] == [0, 2]
+        assert 1 not in selected and 5 not in selected
+
+    def test_scores_are_logged(self):
+        messages = []
+        filter_relevant_chunks(CHUNKS, QUERY, top_k=1, similarity=True, log=messages.append)
+        assert any(m.startswith("[RLM] TF-IDF top chunks: #1 (") for m in messages)
@@ -0,0 +1,156 @@
+"""Tests for chunk_source.py (offset-based chunks over a mapped file)."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add parent dir to path so we can import the scripts
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chunk_source import (
+    Chunk,
+    MappedSource,
+    auto_chunk_spans,
+    span_chunks_by_bytes,
+    span_chunks_by_lines,
+    span_chunks_by_separator,
+)
+from rlm_processor import (
+    auto_chunk,
+    build_chunk_prompt,
+    chunk_by_chars,
+    chunk_by_lines,
+    chunk_by_separator,
+    filter_relevant_chunks,
+)
+
+
+@pytest.fixture
+def mapped(tmp_path):
+    """Write text to a file and return an open MappedSource over it."""
+    sources = []
+
+    def make(text, name="doc.txt"):
+        path = tmp_path / name
+        path.write_bytes(text.encode("utf-8"))
+        source = MappedSource(path)
+        sources.append(source)
+        return source
+
+    yield make
+    for source in sources:
+        source.close()
+
+
+class TestSpanChunkers:
+    TEXT = "\n".join(f"line {i} " + "word " * (i % 13) for i in range(800))
+
+    def test_bytes_match_chunk_by_chars(self, mapped):
+        source = mapped(self.TEXT)
+        for overlap in (0, 50):
+            chunks = [c.text for c in span_chunks_by_bytes(source, 1000, overlap)]
+            assert chunks == chunk_by_chars(self.TEXT, 1000, overlap)
+
+    def test_lines_match_chunk_by_lines(self, mapped):
+        for text in (self.TEXT, self.TEXT + "\n"):
+            source = mapped(text)
+            assert [c.text for c in span_chunks_by_lines(source, 70)] == chunk_by_lines(text, 70)
+
+    def test_separator_matches_chunk_by_separator(self, mapped):
+        text = "\n---\n".join(f"Document {i}\n" + "body " * i for i in range(40)) + "\n---\n"
+        source = mapped(text)
+        chunks = [c.text for c in span_chunks_by_separator(source, "\n---\n")]
+        assert chunks == chunk_by_separator(text, "\n---\n")
+
+    def test_cuts_fall_on_character_boundaries(self, mapped):
+        text = "héllo wörld ✓ " * 500
+        source = mapped(text)
+        chunks = list(span_chunks_by_bytes(source, 97, 0))
+        assert "".join(c.text for c in chunks) == text
+        assert all("�" not in c.text for c in chunks)
+
+    def test_auto_chunk_matches_for_ascii(self, mapped):
+        texts = [
+            self.TEXT,
+            "\n".join(f"## Section {i}\n" + "text " * 20 for i in range(30)),
+            "x" * 5000,
+        ]
+        for text in texts:
+            chunks, strategy = auto_chunk_spans(mapped(text), 2000)
+            assert ([c.text for c in chunks], strategy) == auto_chunk(text, 2000)
+
+    def test_empty_file(self, mapped):
+        chunks, strategy = auto_chunk_spans(mapped(""), 2000)
+        assert chunks == []
+
+
+class TestChunk:
+    def test_line_ranges_and_citation(self, mapped):
+        text = "".join(f"row {i}\n" for i in range(1, 301))
+        chunks = list(span_chunks_by_lines(mapped(text, "data.csv"), 100))
+        assert [(c.line_start, c.line_end) for c in chunks[:3]] == [(1, 100), (101, 200), (201, 300)]
+        assert chunks[1].citation() == "data.csv:101-200"
+        assert chunks[1].text.splitlines()[0] == "row 101"
+
+    def test_chunk_holds_offsets_not_text(self, mapped):
+        chunk = next(span_chunks_by_bytes(mapped("abc" * 1000), 100, 0))
+        assert isinstance(chunk, Chunk)
+        assert not hasattr(chunk, "__dict__")
+        assert (chunk.start, chunk.end, len(chunk)) == (0, 100, 100)
+
+    def test_pipeline_accepts_chunks(self, mapped):
+        text = "\n---\n".join(f"Doc {i}: " + ("revenue grew" if i == 3 else "nothing") for i in range(10))
+        chunks = list(span_chunks_by_separator(mapped(text, "notes.md"), "\n---\n"))
+        kept = filter_relevant_chunks(chunks, "How much revenue?")
+        assert [i for i, _ in kept] == [3]
+        _, message = build_chunk_prompt(kept[0][1], 3, len(chunks), "How much revenue?")
+        assert "SECTION 4 of 10 (notes.md:7)" in message
+        assert "Doc 3: revenue grew" in message
+
+
+class TestCleanup:
+    def test_rlm_process_closes_map_when_chunking_fails(self, tmp_path, monkeypatch):
+        import rlm_processor
+
+        opened = []
+
+        class TrackedSource(MappedSource):
+            def __init__(self, path):
+                super().__init__(path)
+                opened.append(self)
+
+        def broken(*args, **kwargs):
+            raise RuntimeError("chunking failed")
+
+        monkeypatch.setattr(rlm_processor, "MappedSource", TrackedSource)
+        monkeypatch.setattr(rlm_processor, "auto_chunk_spans", broken)
+        path = tmp_path / "doc.txt"
+        path.write_text("text\n" * 100)
+        with pytest.raises(RuntimeError, match="chunking failed"):
+            rlm_processor.rlm_process(str(path), "q", mapped=True, verbose=False)
+        assert len(opened) == 1
+        assert opened[0]._file.closed and opened[0].data.closed
+
+
+class TestMain:
+    def _run(self, monkeypatch, *args):
+        import chunk_source
+
+        monkeypatch.setattr(sys, "argv", ["chunk_source.py", *args])
+        chunk_source.main()
+
+    def test_show_prints_chunk(self, tmp_path, monkeypatch, capsys):
+        path = tmp_path / "doc.txt"
+        path.write_text("only chunk\n")
+        self._run(monkeypatch, str(path), "--show", "1")
+        assert capsys.readouterr().out == "only chunk\n\n"
+
+    @pytest.mark.parametrize("n", ["0", "2", "-1"])
+    def test_show_rejects_out_of_range(self, tmp_path, monkeypatch, capsys, n):
+        path = tmp_path / "doc.txt"
+        path.write_text("only chunk\n")
+        with pytest.raises(SystemExit) as exit_info:
+            self._run(monkeypatch, str(path), "--show", n)
+        assert exit_info.value.code == 1
+        assert "between 1 and 1" in capsys.readouterr().err
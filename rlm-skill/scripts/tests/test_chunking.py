@@ -1,8 +1,11 @@
 """Tests for chunking strategies in rlm_processor.py."""
 
+import io
 import sys
 from pathlib import Path
 
+import pytest
+
 # Add parent dir to path so we can import the scripts
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -12,7 +15,24 @@ from rlm_processor import (
     chunk_by_separator,
     chunk_by_regex,
     auto_chunk,
+    chunk_by_tokens,
+    estimate_tokens,
+    iter_auto_chunk,
+    iter_chunks_by_chars,
+    iter_chunks_by_headers,
+    iter_chunks_by_lines,
+    iter_chunks_by_separator,
+    iter_chunks_by_tokens,
+    MARKDOWN_SPLIT,
+    pack_units,
+    split_at_boundaries,
 )
+import rlm_processor
+
+
+def pieces(text, size=37):
+    """Split text into small pieces, so chunk and block boundaries never line up."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
 
 
 class TestChunkByChars:
@@ -124,3 +144,150 @@ class TestAutoChunk:
         chunks, strategy = auto_chunk(content, target_chunk_size=40000)
         assert strategy == "character_count"
         assert len(chunks) >= 2
+
+
+class TestChunkByTokens:
+    def test_chunks_fit_target_and_rejoin(self):
+        content = "\n".join(f"line {i}: " + "word " * (i % 17) for i in range(2000))
+        chunks = chunk_by_tokens(content, max_tokens=500)
+        assert "".join(chunks) == content
+        sizes = [estimate_tokens(c) for c in chunks]
+        assert max(sizes) <= 500
+        assert min(sizes[:-1]) >= 400
+
+    def test_long_line_is_split(self):
+        chunks = chunk_by_tokens("x" * 10000 + "\nend", max_tokens=300)
+        assert len(chunks) > 2
+        assert all(estimate_tokens(c) <= 300 for c in chunks)
+
+    def test_overlap_repeats_trailing_lines(self):
+        content = "\n".join(f"sentence number {i}" for i in range(300))
+        chunks = chunk_by_tokens(content, max_tokens=200, overlap_tokens=20)
+        first_tail = chunks[0].rstrip("\n").split("\n")[-1]
+        assert first_tail + "\n" in chunks[1]
+        assert chunks[1].split("\n")[0] in chunks[0]
+
+
+class TestAutoChunkTokens:
+    def test_dense_json_hits_token_target(self):
+        content = "\n".join('{"id": %d, "values": [%d, %d, %d], "ok": true}' % (i, i, i * 2, i * 3)
+                            for i in range(5000))
+        chunks, strategy = auto_chunk(content, chunk_tokens=4000)
+        sizes = [estimate_tokens(c) for c in chunks]
+        assert max(sizes) <= 4000
+        assert sum(sizes[:-1]) / len(sizes[:-1]) >= 3600
+
+    def test_structural_chunks_are_resplit(self):
+        sections = "\n".join(f"## Section {i}\n" + "text " * (50 if i else 1500) for i in range(15))
+        chunks, strategy = auto_chunk(sections, chunk_tokens=1000)
+        assert strategy == "markdown_headers"
+        assert all(estimate_tokens(c) <= 1000 for c in chunks)
+
+
+class TestIncrementalChunking:
+    TEXT = "\n".join(f"line {i} " + "word " * (i % 13) for i in range(800))
+
+    def test_chars_match_list_version(self):
+        for overlap in (0, 50):
+            expected = chunk_by_chars(self.TEXT, chunk_size=1000, overlap=overlap)
+            assert list(iter_chunks_by_chars(pieces(self.TEXT), 1000, overlap)) == expected
+
+    def test_lines_match_list_version(self):
+        for text in (self.TEXT, self.TEXT + "\n", "\n\nx\n"):
+            assert list(iter_chunks_by_lines(pieces(text), 70)) == chunk_by_lines(text, 70)
+
+    def test_separator_matches_list_version(self):
+        text = "\n---\n".join(f"Document {i}\n" + "body " * i for i in range(40)) + "\n---\n"
+        assert list(iter_chunks_by_separator(pieces(text, 3), "\n---\n")) == \
+            chunk_by_separator(text, "\n---\n")
+
+    def test_headers_match_list_version(self):
+        text = "intro\n" + "\n".join(f"{'#' * (1 + i % 3)} Heading {i}\ntext {i}\n#not a header"
+                                     for i in range(30)) + "\n##"
+        assert list(iter_chunks_by_headers(pieces(text, 5))) == chunk_by_regex(text, MARKDOWN_SPLIT)
+
+    def test_tokens_match_list_version(self):
+        expected = chunk_by_tokens(self.TEXT, max_tokens=300, overlap_tokens=30)
+        assert list(iter_chunks_by_tokens(io.StringIO(self.TEXT), 300, 30)) == expected
+
+    def test_small_source_matches_auto_chunk(self):
+        chunks, strategy = iter_auto_chunk(io.StringIO(self.TEXT), 2000)
+        assert (list(chunks), strategy) == auto_chunk(self.TEXT, 2000)
+
+    def test_large_source_is_read_lazily(self, monkeypatch):
+        monkeypatch.setattr(rlm_processor, "SNIFF_CHARS", 1000)
+        text = "\n".join(f"## Section {i}\n" + "text " * 5 for i in range(500))
+        read = []
+
+        def source():
+            for piece in pieces(text, 100):
+                read.append(piece)
+                yield piece
+
+        chunks, strategy = iter_auto_chunk(source(), 200)
+        assert strategy == "markdown_headers"
+        first = next(chunks)
+        assert first.startswith("## Section 0")
+        assert len(read) < len(text) // 100
+        assert [first] + list(chunks) == chunk_by_regex(text, MARKDOWN_SPLIT)
+
+
+class TestPackedChunking:
+    def test_pack_units_merges_up_to_size(self):
+        units = ["a" * 30] * 10
+        chunks = pack_units(units, 100, joiner="\n\n")
+        assert chunks == ["\n\n".join(["a" * 30] * 3)] * 3 + ["a" * 30]
+        assert all(len(c) <= 100 for c in chunks)
+
+    def test_split_at_boundaries_keeps_sentences_whole(self):
+        text = ("First sentence here. " * 10 + "\n\n") * 20
+        chunks = split_at_boundaries(text, 500)
+        assert all(len(c) <= 500 for c in chunks)
+        assert all(c.endswith(".") for c in chunks)
+        assert " ".join(chunks).split() == text.split()
+
+    def test_unbreakable_text_falls_back_to_chars(self):
+        chunks = split_at_boundaries("x" * 5000, 1000)
+        assert all(len(c) <= 1000 for c in chunks)
+        assert len(chunks) >= 5
+
+    def test_oversized_paragraph_before_another(self):
+        chunks = split_at_boundaries("x" * 5000 + "\n\n" + "y" * 100, 1000)
+        assert all(len(c) <= 1000 for c in chunks)
+        assert chunks[-1] == "y" * 100
+
+    def test_oversized_paragraphs_split_at_sentences(self):
+        paragraph = "A sentence of ordinary prose, long enough. " * 68
+        text = "\n\n".join([paragraph.strip()] * 5)
+        chunks, _ = auto_chunk(text, 2000, pack=True)
+        assert all(len(c) <= 2000 for c in chunks)
+        assert all(c.endswith(".") for c in chunks)
+        assert " ".join(chunks).split() == text.split()
+        chunks, _ = auto_chunk(text, chunk_tokens=300, pack=True)
+        assert all(estimate_tokens(c) <= 300 for c in chunks)
+
+    def test_separator_documents_need_fewer_chunks(self):
+        text = "\n---\n".join(f"Document {i}. " + "Body text. " * (i % 5) for i in range(300))
+        plain, _ = auto_chunk(text, 2000)
+        packed, strategy = auto_chunk(text, 2000, pack=True)
+        assert strategy == "packed_document_separator"
+        assert len(packed) < len(plain) // 10
+        assert all(len(c) <= 2000 for c in packed)
+        # Every document survives, with the separator between them
+        assert sum(c.count("Document ") for c in packed) == 300
+        assert "\n---\n" in packed[0]
+
+    def test_oversized_sections_split_at_paragraphs(self):
+        text = "\n".join(f"## Section {i}\n" + ("Some words here. " * 20 + "\n\n") * (30 if i == 3 else 1)
+                         for i in range(20))
+        chunks, strategy = auto_chunk(text, 3000, pack=True)
+        assert strategy == "packed_markdown_headers"
+        assert all(len(c) <= 3000 for c in chunks)
+        assert sum(c.count("## Section") for c in chunks) == 20
+
+    def test_packs_by_tokens(self):
+        text = "\n".join(f"## Section {i}\n" + "text " * 40 for i in range(100))
+        chunks, strategy = auto_chunk(text, chunk_tokens=1000, pack=True)
+        assert strategy == "packed_markdown_headers"
+        assert all(estimate_tokens(c) <= 1000 for c in chunks)
+        assert len(chunks) < 20
@@ -0,0 +1,123 @@
+"""Tests for document_index.py (persistent chunk table and inverted index)."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import chunk_similarity
+from chunk_ranking import BM25Index
+from document_index import DocumentIndex, index_path, file_hash, write_index
+from rlm_processor import filter_relevant_chunks, index_document
+
+
+CHUNKS = [
+    "The database connection pool is configured in settings.",
+    "Logging setup and handlers.",
+    "Database database database: pooling, connection limits and pool sizing for the database.",
+    "The settings module loads environment variables.",
+    "Unrelated notes about the office party, café included.",
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = tmp_path / "doc.rlmidx"
+    write_index(path, CHUNKS, "test", "abc", {}, lambda text: len(text) // 4)
+    with DocumentIndex(str(path)) as index:
+        yield index
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "corpus.md"
+    path.write_text("\n".join(f"## Section {i}\n" + ("retry backoff " if i % 7 == 0 else "filler text ") * 50
+                              for i in range(30)), encoding="utf-8")
+    return path
+
+
+class TestDocumentIndex:
+    def test_chunks_round_trip(self, index):
+        assert len(index) == len(CHUNKS)
+        assert list(index.chunks) == CHUNKS
+        assert index.chunks[-1] == CHUNKS[-1]
+        assert index.strategy == "test"
+        assert index.chunk_tokens(0) == len(CHUNKS[0]) // 4
+
+    def test_keyword_is_a_prefix(self, index):
+        assert index.term_counts("pool") == {0: 1, 2: 2}
+        assert index.term_counts("databas") == {0: 1, 2: 4}
+        assert index.term_counts("xylophone") == {}
+
+    def test_multi_word_keyword_needs_every_word(self, index):
+        counts = index.keyword_counts(["connection pool", "café"])
+        assert [sorted(c) for c in counts] == [["connection pool"], [], ["connection pool"], [], ["café"]]
+
+    def test_rank_matches_bm25(self, index):
+        assert [i for i, _ in index.rank(["database", "pool"])] == [2, 0]
+        assert [i for i, _ in index.rank(["Settings"])] == [i for i, _ in BM25Index(CHUNKS).rank(["setting"])]
+
+    def test_empty_index(self, tmp_path):
+        path = tmp_path / "empty.rlmidx"
+        write_index(path, [], "none", "abc", {}, len)
+        with DocumentIndex(str(path)) as index:
+            assert len(index) == 0
+            assert index.rank(["anything"]) == []
+
+    @pytest.mark.skipif(not chunk_similarity.NUMPY_AVAILABLE, reason="numpy not installed")
+    def test_tfidf_vectors_saved_once(self, index, monkeypatch):
+        query = "database connection pool"
+        messages = []
+        expected = index.tfidf(messages.append).rank(query)
+        assert index.tfidf_path.exists()
+        assert len(messages) == 1 and "Building TF-IDF" in messages[0]
+        with DocumentIndex(str(index.path)) as reopened:
+            monkeypatch.setattr(DocumentIndex, "chunk_text", lambda self, i: pytest.fail("chunk decompressed"))
+            assert reopened.tfidf(messages.append).rank(query) == expected
+        assert len(messages) == 1
+
+    def test_tfidf_without_numpy_says_so(self, index, monkeypatch):
+        monkeypatch.setattr(chunk_similarity, "NUMPY_AVAILABLE", False)
+        messages = []
+        assert index.tfidf(messages.append).rank("database pool")[0][0] in (0, 2)
+        assert messages == [f"[RLM] numpy not installed: decompressing all {len(CHUNKS)} chunks for TF-IDF vectors"]
+        assert not index.tfidf_path.exists()
+
+    def test_rejects_other_files(self, tmp_path):
+        path = tmp_path / "bogus.rlmidx"
+        path.write_bytes(b"not an index at all")
+        with pytest.raises(ValueError):
+            DocumentIndex(str(path))
+
+
+class TestIndexDocument:
+    def test_built_once_then_reused(self, corpus, tmp_path):
+        messages = []
+        with index_document(str(corpus), 2000, index_dir=str(tmp_path / "idx"), log=messages.append) as index:
+            assert index.strategy == "markdown_headers"
+        with index_document(str(corpus), 2000, index_dir=str(tmp_path / "idx"), log=messages.append) as index:
+            assert len(index) > 3
+        assert [m.split()[1] for m in messages if "index" in m] == ["Built", "Using"]
+
+    def test_rebuilt_when_file_changes(self, corpus, tmp_path):
+        idx = str(tmp_path / "idx")
+        index_document(str(corpus), 2000, index_dir=idx).close()
+        old = index_path(file_hash(str(corpus)), {'chunk_size': 2000, 'chunk_tokens': None, 'pack': False}, idx)
+        corpus.write_text(corpus.read_text(encoding="utf-8") + "\n## New\nretry\n", encoding="utf-8")
+        with index_document(str(corpus), 2000, index_dir=idx) as index:
+            assert index.path != old
+            assert "## New" in index.chunks[-1]
+
+    def test_filter_with_index_matches_scan(self, corpus, tmp_path):
+        with index_document(str(corpus), 2000, index_dir=str(tmp_path / "idx")) as index:
+            chunks = list(index.chunks)
+            query = "How does the retry backoff work?"
+            assert (filter_relevant_chunks(index.chunks, query, index=index)
+                    == filter_relevant_chunks(chunks, query))
+            ranked = filter_relevant_chunks(index.chunks, query, top_k=2, index=index)
+            assert len(ranked) == 2
+            assert all("retry" in chunk for _, chunk in ranked)
+            similar = filter_relevant_chunks(index.chunks, query, top_k=2, index=index, similarity=True)
+            assert similar == filter_relevant_chunks(chunks, query, top_k=2, similarity=True)
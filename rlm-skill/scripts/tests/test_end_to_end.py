@@ -0,0 +1,152 @@
+"""End-to-end CLI runs of the pipelines against the local mock server (--base-url)."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import directory_processor
+import paper_organizer
+import rlm_processor
+import rlm_query
+from mock_server import MockAnthropicServer
+from rlm_query import RateLimiter
+
+
+def _responder(payload):
+    content = payload["messages"][-1]["content"]
+    if "DOCUMENT SECTION" in content:
+        return "Relevant: the secret value is 42" if "secret" in content else "NO_RELEVANT_INFO"
+    return "Final answer: 42"
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    server = MockAnthropicServer(responder=_responder, seed=7).start()
+    server.retry_after = 0
+    monkeypatch.setattr(rlm_query, "API_BASE_URL", rlm_query.API_BASE_URL)
+    monkeypatch.setattr(rlm_query, "HTTP_TRANSPORT", "pool")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+    monkeypatch.setattr(rlm_query, "_rate_limiter", RateLimiter())
+    monkeypatch.setattr(rlm_query, "_response_cache", None)
+    monkeypatch.setattr(rlm_query, "RETRY_BASE_DELAY", 0.01)
+    rlm_query.reset_usage()
+    yield server
+    rlm_query.close_connection_pools()
+    server.stop()
+
+
+def _run(main, monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["prog", *argv])
+    main()
+
+
+def _messages(server):
+    return [entry for entry in server.request_log if entry[1] == "/v1/messages"]
+
+
+def _document(tmp_path):
+    path = tmp_path / "doc.txt"
+    filler = "\n".join(f"ordinary line {i}" for i in range(3000))
+    path.write_text(filler + "\nthe secret value is 42\n" + filler)
+    return path
+
+
+class TestRlmProcessor:
+    def test_cli_runs_against_mock(self, mock_api, tmp_path, monkeypatch):
+        out = tmp_path / "answer.txt"
+        _run(rlm_processor.main, monkeypatch, str(_document(tmp_path)), "What is the secret?",
+             "--chunk-size", "20000", "--no-filter", "--quiet", "--no-cache",
+             "--base-url", mock_api.url, "--output", str(out))
+        assert out.read_text() == "Final answer: 42"
+        assert len(_messages(mock_api)) > 2
+        assert rlm_query.get_usage()["requests"] == len(_messages(mock_api))
+
+    def test_survives_injected_errors(self, mock_api, tmp_path, monkeypatch):
+        mock_api.error_rates = {529: 0.2, 429: 0.05}
+        rlm_query.set_base_url(mock_api.url)
+        result = rlm_processor.rlm_process(str(_document(tmp_path)), "What is the secret?",
+                                           chunk_size=20000, filter_chunks=False, verbose=False)
+        assert result == "Final answer: 42"
+        assert mock_api.errors_injected > 0
+
+
+class TestDirectoryProcessor:
+    def test_cli_runs_against_mock(self, mock_api, tmp_path, monkeypatch):
+        src = tmp_path / "src"
+        src.mkdir()
+        (src / "config.py").write_text("SECRET = 42  # the secret value\n")
+        (src / "util.py").write_text("def helper():\n    return None\n")
+        out = tmp_path / "answer.txt"
+        _run(directory_processor.main, monkeypatch, str(src), "What is the secret?",
+             "--per-file", "--quiet", "--no-cache", "--base-url", mock_api.url,
+             "--output", str(out))
+        assert out.read_text() == "Final answer: 42"
+        assert len(_messages(mock_api)) == 3  # two files plus the final synthesis
+
+    def test_per_file_concurrency_matches_serial(self, mock_api, tmp_path, monkeypatch):
+        src = tmp_path / "src"
+        src.mkdir()
+        for i in range(5):
+            (src / f"mod{i}.py").write_text(f"VALUE_{i} = {i}\n")
+        (src / "config.py").write_text("SECRET = 42  # the secret value\n")
+        (src / "big.txt").write_text("\n".join(f"line {i}" for i in range(3000)) + "\nthe secret is 42\n")
+        runs = []
+        for concurrency in ("1", "4"):
+            results = tmp_path / f"results{concurrency}.json"
+            before = len(_messages(mock_api))
+            _run(directory_processor.main, monkeypatch, str(src), "What is the secret?",
+                 "--per-file", "--quiet", "--no-cache", "--concurrency", concurrency, "--chunk-size", "20000",
+                 "--base-url", mock_api.url, "--json", str(results))
+            runs.append((json.loads(results.read_text()), len(_messages(mock_api)) - before))
+        (serial, serial_calls), (concurrent, concurrent_calls) = runs
+        assert concurrent == serial
+        assert {entry["file"] for entry in concurrent if entry["result"]} == {"config.py", "big.txt"}
+        assert concurrent_calls == serial_calls > 8
+        assert rlm_query.get_usage()["requests"] == len(_messages(mock_api))
+
+    @pytest.mark.parametrize("concurrency", ["1", "3"])
+    def test_budget_skips_remaining_files(self, mock_api, tmp_path, monkeypatch, capsys, concurrency):
+        src = tmp_path / "src"
+        src.mkdir()
+        for i in range(4):
+            (src / f"mod{i}.py").write_text(f"VALUE_{i} = {i}  # the secret\n" + "x = 1\n" * 200)
+        results = tmp_path / "results.json"
+        _run(directory_processor.main, monkeypatch, str(src), "What is the secret?",
+             "--per-file", "--quiet", "--no-cache", "--base-url", mock_api.url,
+             "--max-input-tokens", "1200", "--concurrency", concurrency, "--json", str(results))
+        errors = [entry["error"] for entry in json.loads(results.read_text())]
+        assert "Skipped: budget exhausted" in errors
+        out = capsys.readouterr().out
+        assert "files were not analyzed" in out
+        assert "Budget: input tokens:" in out
+
+
+class TestPaperOrganizer:
+    def test_cli_runs_against_mock(self, mock_api, tmp_path, monkeypatch):
+        reply = {"title": "Mock Paper", "category": "USEFUL", "confidence": "HIGH",
+                 "summary": "s", "tags": ["t"]}
+        mock_api.responder = lambda payload: json.dumps(reply)
+        monkeypatch.setattr(paper_organizer, "extract_paper_text",
+                            lambda path, max_pages=15: ("full text " * 20, f"first pages of {path}"))
+        papers = tmp_path / "papers"
+        papers.mkdir()
+        for name in ("a.pdf", "b.pdf"):
+            (papers / name).write_bytes(b"%PDF-1.4")
+        report, results = tmp_path / "report.md", tmp_path / "results.json"
+        _run(paper_organizer.main, monkeypatch, str(papers), "--quiet", "--no-cache",
+             "--concurrency", "2", "--base-url", mock_api.url,
+             "--output", str(report), "--json", str(results))
+        analyses = json.loads(results.read_text())
+        assert [a["title"] for a in analyses] == ["Mock Paper", "Mock Paper"]
+        assert "Mock Paper" in report.read_text()
+        assert len(_messages(mock_api)) == 2
+
+    @pytest.mark.parametrize("reply", ['["a"]', '"text"', '{"tags": 1}x'])
+    def test_unusable_replies_become_failed_analyses(self, reply):
+        analysis = paper_organizer.parse_analysis_response("papers/x.pdf", reply)
+        assert analysis.filename == "x.pdf"
+        assert analysis.error
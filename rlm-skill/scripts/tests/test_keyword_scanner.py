@@ -0,0 +1,102 @@
+"""Tests for keyword_scanner.py (single-pass multi-keyword matching)."""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import keyword_scanner
+from keyword_scanner import KeywordScanner, highlight, hit_counts, locate_chunks, scan_chunks
+from rlm_processor import chunk_by_chars, chunk_by_separator, filter_relevant_chunks
+
+
+TEXT = ("The Database failed. Retry the database connection with backoff.\n"
+        "A data pipeline retries; DATA is cached.\n") * 3
+
+
+class TestKeywordScanner:
+    def test_finds_all_keywords_ignoring_case(self):
+        hits = KeywordScanner(["database", "retry"]).hits(TEXT)
+        assert hit_counts(hits) == {"database": 6, "retry": 3}
+        assert TEXT[hits["database"][0]:hits["database"][0] + 8] == "Database"
+
+    def test_prefers_longest_keyword(self):
+        hits = KeywordScanner(["data", "database"]).hits("database data")
+        assert hits == {"database": [0], "data": [9]}
+
+    def test_no_keywords(self):
+        scanner = KeywordScanner([])
+        assert not scanner
+        assert scanner.hits(TEXT) == {}
+
+    def test_case_variants_map_to_their_keyword(self):
+        # 'ſ' (long s) matches 's' when ignoring case but .lower() keeps it
+        assert KeywordScanner(["status"]).hits("ſtatus STATUS") == {"status": [0, 7]}
+
+    def test_regex_backend_matches_automaton(self, monkeypatch):
+        pytest.importorskip("ahocorasick")
+        keywords = ["data", "database", "retr", "cache", "the"]
+        fast = KeywordScanner(keywords).hits(TEXT)
+        monkeypatch.setattr(keyword_scanner, "AHOCORASICK_AVAILABLE", False)
+        assert KeywordScanner(keywords).hits(TEXT) == fast
+
+    def test_backends_agree_on_random_text(self, monkeypatch):
+        pytest.importorskip("ahocorasick")
+        rng = random.Random(7)
+        cases = [(["a", "bbab", "ab"], "ccb .  bBa"), (["cb", "b", " .b.c"], "bAba\n .BA.")]
+        for _ in range(2000):
+            keywords = ["".join(rng.choice("abc .") for _ in range(rng.randint(1, 5)))
+                        for _ in range(rng.randint(1, 6))]
+            cases.append((keywords, "".join(rng.choice("abcAB .\n") for _ in range(rng.randint(0, 60)))))
+        automaton = [list(KeywordScanner(keywords).finditer(text)) for keywords, text in cases]
+        monkeypatch.setattr(keyword_scanner, "AHOCORASICK_AVAILABLE", False)
+        assert [list(KeywordScanner(keywords).finditer(text)) for keywords, text in cases] == automaton
+
+
+class TestScanChunks:
+    def test_document_scan_matches_per_chunk_scan(self):
+        scanner = KeywordScanner(["database", "retr", "data"])
+        chunks = chunk_by_chars(TEXT, chunk_size=50, overlap=10)
+        assert locate_chunks(TEXT, chunks) is not None
+        whole = scan_chunks(scanner, chunks, TEXT)
+        each = scan_chunks(scanner, chunks)
+        for chunk, a, b in zip(chunks, whole, each):
+            # Matches cut by a chunk boundary can only be found per chunk
+            for kw, positions in a.items():
+                assert set(positions) <= set(b[kw])
+                assert all(chunk[p:p + len(kw)].lower() == kw for p in positions)
+
+    def test_overlapping_chunks_both_get_the_hit(self):
+        text = "aaaa needle bbbb"
+        chunks = ["aaaa needle", "needle bbbb"]
+        hits = scan_chunks(KeywordScanner(["needle"]), chunks, text)
+        assert hits == [{"needle": [5]}, {"needle": [0]}]
+
+    def test_unlocatable_chunks_are_scanned_individually(self):
+        chunks = ["one needle", "two\n\n---\n\nneedle"]
+        assert locate_chunks("one needle two needle", chunks) is None
+        hits = scan_chunks(KeywordScanner(["needle"]), chunks, "one needle two needle")
+        assert hits == [{"needle": [4]}, {"needle": [10]}]
+
+    def test_highlight(self):
+        hits = KeywordScanner(["retry", "backoff"]).hits("Retry with backoff.")
+        assert highlight("Retry with backoff.", hits) == "**Retry** with **backoff**."
+
+
+class TestFilterUsesScan:
+    def test_filter_with_content_matches_without(self):
+        text = "\n---\n".join(f"Doc {i}: " + ("the database is slow" if i % 3 == 0 else "nothing here")
+                             for i in range(30))
+        chunks = chunk_by_separator(text, "\n---\n")
+        assert filter_relevant_chunks(chunks, "database slowness", content=text) == \
+            filter_relevant_chunks(chunks, "database slowness")
+
+    def test_ranking_logs_hit_counts(self):
+        chunks = ["database " * 3, "nothing", "database and cache", "other", "cache"]
+        messages = []
+        result = filter_relevant_chunks(chunks, "database cache", top_k=2, log=messages.append)
+        assert [i for i, _ in result][0] == 2
+        assert any("databasex1" in m.replace(" ", "") for m in messages)
@@ -0,0 +1,133 @@
+"""Tests for latency, error injection and cassettes in mock_server.py."""
+
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import rlm_query
+from mock_server import Cassette, MockAnthropicServer, parse_error_rates, parse_latency
+from rlm_query import RateLimiter
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Point rlm_query at whichever mock server the test starts."""
+    monkeypatch.setattr(rlm_query, "API_BASE_URL", rlm_query.API_BASE_URL)
+    monkeypatch.setattr(rlm_query, "HTTP_TRANSPORT", "pool")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+    monkeypatch.setattr(rlm_query, "_rate_limiter", RateLimiter())
+    monkeypatch.setattr(rlm_query, "_response_cache", None)
+    monkeypatch.setattr(rlm_query, "RETRY_BASE_DELAY", 0.01)
+    rlm_query.reset_usage()
+    servers = []
+
+    def start(**kwargs):
+        server = MockAnthropicServer(**kwargs).start()
+        server.retry_after = 0
+        servers.append(server)
+        rlm_query.set_base_url(server.url)
+        return server
+
+    yield start
+    rlm_query.close_connection_pools()
+    for server in servers:
+        server.stop()
+
+
+class TestParsing:
+    def test_latency_distributions(self):
+        rng = random.Random(0)
+        assert parse_latency("fixed:0.25")(rng) == 0.25
+        assert all(0.1 <= parse_latency("uniform:0.1,0.2")(rng) <= 0.2 for _ in range(50))
+        assert all(parse_latency("normal:0,1")(rng) >= 0 for _ in range(50))
+        samples = sorted(parse_latency("lognormal:0.5,0.5")(rng) for _ in range(2001))
+        assert samples[1000] == pytest.approx(0.5, rel=0.15)
+        assert parse_latency(None) is None and parse_latency("recorded") is None
+
+    @pytest.mark.parametrize("spec", ["gamma:1", "fixed", "uniform:1", "fixed:x"])
+    def test_bad_latency_specs(self, spec):
+        with pytest.raises(ValueError):
+            parse_latency(spec)
+
+    def test_error_rates(self):
+        assert parse_error_rates(["529=0.05", "429=0.1"]) == {529: 0.05, 429: 0.1}
+        with pytest.raises(ValueError):
+            parse_error_rates(["529"])
+        with pytest.raises(ValueError):
+            parse_error_rates(["500=0.7", "529=0.7"])
+
+
+class TestLatencyAndErrors:
+    def test_fixed_latency_delays_messages(self, client):
+        client(latency="fixed:0.2")
+        started = time.monotonic()
+        rlm_query.llm_query("slow")
+        assert time.monotonic() - started >= 0.2
+
+    def test_injected_errors_are_retried(self, client):
+        server = client(error_rates={529: 0.5}, seed=3)
+        answers = [rlm_query.llm_query(f"q{i}") for i in range(10)]
+        assert all(a.startswith("Mock response") for a in answers)
+        assert server.errors_injected > 0
+        assert rlm_query.get_call_stats()["retries"] == server.errors_injected
+
+    def test_same_seed_injects_same_errors(self, client):
+        outcomes = []
+        for _ in range(2):
+            server = client(error_rates={500: 0.3}, seed=42)
+            outcomes.append([server.injected_error() is None for _ in range(30)])
+        assert outcomes[0] == outcomes[1]
+        assert not all(outcomes[0])
+
+    def test_non_retryable_error_reaches_caller(self, client):
+        client(error_rates={400: 1.0})
+        with pytest.raises(Exception, match="invalid_request_error"):
+            rlm_query.llm_query("rejected")
+
+
+class TestCassette:
+    def test_records_through_proxy_and_replays_offline(self, client, tmp_path):
+        cassette = tmp_path / "run.json"
+        upstream = client(responder=lambda p: "real answer")
+        client(cassette=str(cassette), record=True, upstream=upstream.url)
+        assert rlm_query.llm_query("question") == "real answer"
+        assert len(Cassette(str(cassette))) == 1
+
+        replay = client(cassette=str(cassette), strict=True, responder=lambda p: "wrong")
+        assert rlm_query.llm_query("question") == "real answer"
+        assert "".join(rlm_query.llm_query_stream("question")) == "real answer"
+        assert replay.replayed == 2
+
+    def test_strict_replay_rejects_unrecorded_requests(self, client, tmp_path):
+        client(cassette=str(tmp_path / "empty.json"), strict=True)
+        with pytest.raises(Exception, match="not_found_error"):
+            rlm_query.llm_query("never recorded")
+
+    def test_lenient_replay_falls_back_to_responder(self, client, tmp_path):
+        client(cassette=str(tmp_path / "empty.json"), responder=lambda p: "generated")
+        assert rlm_query.llm_query("never recorded") == "generated"
+
+    def test_recorded_latency_is_replayed(self, client, tmp_path):
+        cassette = tmp_path / "run.json"
+        payload = rlm_query.build_message_params("timed")
+        message = {"type": "message", "content": [{"type": "text", "text": "ok"}],
+                   "usage": {"input_tokens": 1, "output_tokens": 1}}
+        Cassette(str(cassette)).put(payload, message, elapsed=0.3)
+        client(cassette=str(cassette), latency="recorded")
+        started = time.monotonic()
+        assert rlm_query.llm_query("timed") == "ok"
+        assert time.monotonic() - started >= 0.3
+
+    def test_cassette_file_is_plain_json(self, tmp_path):
+        cassette = Cassette(str(tmp_path / "c.json"))
+        cassette.put({"model": "m", "messages": [], "stream": True}, {"content": []}, 0.1)
+        data = json.loads((tmp_path / "c.json").read_text())
+        (entry,) = data["interactions"].values()
+        assert "stream" not in entry["request"]
+        assert Cassette.key({"model": "m", "messages": []}) in data["interactions"]
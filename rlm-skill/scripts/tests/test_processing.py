@@ -0,0 +1,443 @@
+"""Tests for chunk processing in rlm_processor.py (LLM calls are stubbed)."""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import rlm_processor
+from rlm_processor import (
+    OnlineAggregator,
+    aggregate_results,
+    build_chunk_prompt,
+    group_findings,
+    map_chunks,
+    order_by_relevance,
+    process_chunk,
+    section_label,
+    split_confidence,
+)
+
+
+class _RecordingQuery:
+    """Stands in for llm_query and records each call's arguments."""
+
+    def __init__(self, reply="Relevant finding"):
+        self.reply = reply
+        self.calls = []
+
+    def __call__(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        return self.reply
+
+
+class TestBuildChunkPrompt:
+    def test_prefix_is_shared_across_chunks(self):
+        first = build_chunk_prompt("alpha text", 0, 10, "What is alpha?")
+        second = build_chunk_prompt("beta text", 7, 10, "What is alpha?")
+        assert first[0] == second[0]
+        assert "What is alpha?" in first[0]
+        assert "NO_RELEVANT_INFO" in first[0]
+
+    def test_chunk_message_carries_text_and_position(self):
+        _, message = build_chunk_prompt("beta text", 7, 10, "q")
+        assert "beta text" in message
+        assert "SECTION 8 of 10" in message
+        assert "beta text" not in build_chunk_prompt("beta text", 7, 10, "q")[0]
+
+
+class TestProcessChunk:
+    def test_sends_prefix_as_cached_system_prompt(self, monkeypatch):
+        fake = _RecordingQuery()
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        process_chunk("chunk one", 0, 2, "query")
+        process_chunk("chunk two", 1, 2, "query")
+        (p1, kw1), (p2, kw2) = fake.calls
+        assert kw1["system"] == kw2["system"]
+        assert kw1["cache_system"] is True
+        assert "chunk one" in p1 and "chunk two" in p2
+
+    def test_no_relevant_info_returns_none(self, monkeypatch):
+        monkeypatch.setattr(rlm_processor, "llm_query", _RecordingQuery("NO_RELEVANT_INFO"))
+        assert process_chunk("text", 0, 1, "query") is None
+
+    def test_errors_are_reported_not_raised(self, monkeypatch):
+        def boom(prompt, **kwargs):
+            raise RuntimeError("api down")
+        monkeypatch.setattr(rlm_processor, "llm_query", boom)
+        assert process_chunk("text", 0, 1, "query").startswith("__CHUNK_ERROR__")
+
+    def test_stream_stops_reading_at_sentinel(self, monkeypatch):
+        state = {"sent": 0, "closed": False}
+
+        def fake_stream(prompt, **kwargs):
+            try:
+                for delta in ["NO_RELEVANT", "_INFO", " and", " then", " more"]:
+                    state["sent"] += 1
+                    yield delta
+            finally:
+                state["closed"] = True
+
+        monkeypatch.setattr(rlm_processor, "llm_query_stream", fake_stream)
+        assert process_chunk("text", 0, 1, "query", stream=True) is None
+        assert state == {"sent": 2, "closed": True}
+
+    def test_stream_returns_full_findings(self, monkeypatch):
+        def fake_stream(prompt, **kwargs):
+            yield from ["Found ", "the ", "answer "]
+
+        monkeypatch.setattr(rlm_processor, "llm_query_stream", fake_stream)
+        assert process_chunk("text", 0, 1, "query", stream=True) == "Found the answer"
+
+
+class TestMapChunks:
+    @staticmethod
+    def _chunks(n):
+        return [(i * 2, f"chunk {i}") for i in range(n)]
+
+    def test_parallel_results_keep_chunk_order(self, monkeypatch):
+        active = {"now": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def fake(prompt, **kwargs):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            n = int(prompt.split("chunk ")[1].split()[0])
+            time.sleep(0.02 * (8 - n))  # later chunks finish first
+            with lock:
+                active["now"] -= 1
+            return f"finding {n}"
+
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        results, errors, skipped = map_chunks(self._chunks(8), 16, "q", workers=4)
+        assert results == [(i * 2, f"finding {i}") for i in range(8)]
+        assert (errors, skipped) == (0, 0)
+        assert active["peak"] == 4
+
+    def test_failures_are_isolated(self, monkeypatch):
+        def fake(prompt, **kwargs):
+            if "chunk 3" in prompt:
+                raise RuntimeError("boom")
+            return "NO_RELEVANT_INFO" if "chunk 1" in prompt else "finding"
+
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        for workers in (1, 3):
+            results, errors, skipped = map_chunks(self._chunks(5), 10, "q", workers=workers)
+            assert [idx for idx, _ in results] == [0, 4, 8]
+            assert (errors, skipped) == (1, 0)
+
+    def test_progress_is_logged_per_chunk(self, monkeypatch):
+        monkeypatch.setattr(rlm_processor, "llm_query", _RecordingQuery())
+        lines = []
+        map_chunks(self._chunks(3), 6, "q", log=lines.append, workers=2, label="[DIR]")
+        progress = [line for line in lines if line.startswith("[DIR] [")]
+        assert sorted(line.split("]")[1] for line in progress) == [" [1/3", " [2/3", " [3/3"]
+
+    def test_budget_exhaustion_cancels_pending_chunks(self, monkeypatch):
+        from rlm_budget import BudgetExceeded
+
+        class TwoCallBudget:
+            stop_reason = None
+
+            def __init__(self):
+                self.calls = 0
+                self.lock = threading.Lock()
+
+            def call(self, model, prompt_tokens, max_tokens, final=False):
+                with self.lock:
+                    self.calls += 1
+                    if self.calls > 2:
+                        raise BudgetExceeded("Budget exhausted: test")
+                return _Admit(model)
+
+        monkeypatch.setattr(rlm_processor, "llm_query", _RecordingQuery())
+        results, errors, skipped = map_chunks(self._chunks(40), 40, "q",
+                                              budget=TwoCallBudget(), workers=2)
+        assert len(results) == 2
+        assert len(results) + skipped == 40
+
+    def test_budget_exhaustion_stops_reading_lazy_input(self, monkeypatch):
+        from rlm_budget import BudgetExceeded
+
+        class NoBudget:
+            stop_reason = "test"
+
+            def call(self, model, prompt_tokens, max_tokens, final=False):
+                raise BudgetExceeded("Budget exhausted: test")
+
+        def lazy(read):
+            for i, chunk in self._chunks(1000):
+                read.append(i)
+                yield i, chunk
+
+        monkeypatch.setattr(rlm_processor, "llm_query", _RecordingQuery())
+        for workers in (1, 2):
+            read, lines = [], []
+            results, errors, skipped = map_chunks(lazy(read), None, "q", budget=NoBudget(),
+                                                  log=lines.append, workers=workers)
+            assert results == []
+            assert 1 <= skipped == len(read) <= 2 * workers
+            assert any("remaining chunks are not analyzed" in line for line in lines)
+
+
+class TestAggregateResults:
+    def _findings(self, n, size=4000):
+        return [(i, f"finding {i} " + "x" * size) for i in range(n)]
+
+    def test_small_results_use_one_call(self, monkeypatch):
+        fake = _RecordingQuery("answer")
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        assert aggregate_results(self._findings(3, 10), "the question") == "answer"
+        assert len(fake.calls) == 1
+
+    def test_groups_respect_fan_in_and_tokens(self):
+        assert group_findings([1] * 10, max_tokens=100, fan_in=4) == [(0, 4), (4, 8), (8, 10)]
+        assert group_findings([60, 60, 60, 10, 10], max_tokens=100, fan_in=8) == [(0, 2), (2, 5)]
+        # Oversized findings still pair up, so every level shrinks
+        assert group_findings([500] * 5, max_tokens=100) == [(0, 2), (2, 4), (4, 5)]
+
+    def test_tree_carries_query_and_section_ranges(self, monkeypatch):
+        fake = _RecordingQuery("merged " + "y" * 4000)
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        monkeypatch.setattr(rlm_processor, "MAX_AGGREGATION_TOKENS", 2500)
+        monkeypatch.setattr(rlm_processor, "estimate_tokens", lambda text: len(text) // 4)
+        lines = []
+        aggregate_results(self._findings(16), "the question", fan_in=4, log=lines.append)
+        merges, final = fake.calls[:-1], fake.calls[-1][0]
+        # ~1000-token findings pair up under 2500 tokens: 16 -> 8 -> 4 -> 2, then the final call
+        assert len(merges) == 8 + 4 + 2
+        assert len([line for line in lines if "Aggregation level" in line]) == 3
+        assert all("ORIGINAL QUERY: the question" in prompt for prompt, _ in fake.calls)
+        assert "[Sections 1-8]" in final and "[Sections 9-16]" in final
+
+    def test_levels_merge_in_parallel(self, monkeypatch):
+        lock = threading.Lock()
+        active = {"now": 0, "peak": 0}
+
+        def fake(prompt, **kwargs):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.02)
+            with lock:
+                active["now"] -= 1
+            return "merged"
+
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        monkeypatch.setattr(rlm_processor, "MAX_AGGREGATION_TOKENS", 2500)
+        monkeypatch.setattr(rlm_processor, "estimate_tokens", lambda text: len(text) // 4)
+        assert aggregate_results(self._findings(16), "q", workers=4) == "merged"
+        assert active["peak"] == 4
+
+    def test_only_the_final_call_uses_the_reserve(self, monkeypatch):
+        class RecordingBudget:
+            stop_reason = None
+
+            def __init__(self):
+                self.finals = []
+
+            def call(self, model, prompt_tokens, max_tokens, final=False):
+                self.finals.append(final)
+                return _Admit(model)
+
+        monkeypatch.setattr(rlm_processor, "llm_query", _RecordingQuery("merged"))
+        monkeypatch.setattr(rlm_processor, "MAX_AGGREGATION_TOKENS", 2500)
+        monkeypatch.setattr(rlm_processor, "estimate_tokens", lambda text: len(text) // 4)
+        budget = RecordingBudget()
+        aggregate_results(self._findings(16), "q", budget=budget, fan_in=4)
+        assert budget.finals == [False] * (len(budget.finals) - 1) + [True]
+        assert len(budget.finals) > 1
+
+
+class TestOnlineAggregator:
+    def _large(self, monkeypatch, reply="merged"):
+        fake = _RecordingQuery(reply)
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        monkeypatch.setattr(rlm_processor, "MAX_AGGREGATION_TOKENS", 2500)
+        monkeypatch.setattr(rlm_processor, "estimate_tokens", lambda text: len(text) // 4)
+        return fake
+
+    def test_section_label(self):
+        assert section_label((3,)) == "Section 3"
+        assert section_label((1, 2, 3, 4, 7, 9, 10)) == "Sections 1-4, 7, 9-10"
+
+    def test_small_runs_match_aggregate_results(self, monkeypatch):
+        fake = _RecordingQuery("answer")
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        aggregator = OnlineAggregator("q")
+        for i in (2, 0, 1):
+            aggregator.add(i, f"finding {i}")
+        assert aggregator.finish() == "answer"
+        aggregate_results([(i, f"finding {i}") for i in range(3)], "q")
+        assert len(fake.calls) == 2
+        assert fake.calls[0][0] == fake.calls[1][0]
+
+    def test_merges_while_findings_arrive(self, monkeypatch):
+        fake = self._large(monkeypatch)
+        partials = []
+        aggregator = OnlineAggregator("the question", on_partial=lambda sections, text: partials.append(sections))
+        for i in [5, 1, 7, 3, 0, 6, 2, 4]:
+            aggregator.add(i, f"finding {i} " + "x" * 4000)
+        deadline = time.time() + 5
+        while aggregator.merges < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        # Pairs under 2500 tokens were merged in arrival order before finish() was called
+        assert sorted(partials) == [(1, 7), (2, 6), (4, 8)]
+        assert len(fake.calls) == 3
+        answer = aggregator.finish()
+        assert answer == "merged"
+        assert all("ORIGINAL QUERY: the question" in prompt for prompt, _ in fake.calls)
+        assert "[Sections " in fake.calls[-1][0] and "YOUR FINAL ANSWER" in fake.calls[-1][0]
+
+    def test_map_chunks_reports_findings_as_they_finish(self, monkeypatch):
+        def fake(prompt, **kwargs):
+            return "NO_RELEVANT_INFO" if "chunk 1" in prompt else "finding"
+
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        seen = []
+        chunks = [(i, f"chunk {i} text") for i in range(4)]
+        for workers in (1, 2):
+            seen.clear()
+            map_chunks(chunks, 4, "q", workers=workers, on_result=lambda i, r: seen.append(i))
+            assert sorted(seen) == [0, 2, 3]
+
+
+class TestEarlyTermination:
+    def _chunks(self, n):
+        return [(i, f"chunk {i} text") for i in range(n)]
+
+    def test_split_confidence(self):
+        assert split_confidence("X is 42.\nCONFIDENCE: 95") == ("X is 42.", 95)
+        assert split_confidence("X is 42.\n**Confidence:** 70%\n") == ("X is 42.", 70)
+        assert split_confidence("No rating here") == ("No rating here", None)
+
+    def test_prompt_asks_for_confidence_only_when_rating(self):
+        assert "CONFIDENCE" not in build_chunk_prompt("text", 0, 1, "q")[0]
+        assert "CONFIDENCE: N" in build_chunk_prompt("text", 0, 1, "q", confidence=True)[0]
+
+    def test_stops_at_first_confident_chunk(self, monkeypatch):
+        def fake(prompt, **kwargs):
+            assert "CONFIDENCE" in kwargs["system"]
+            if "chunk 2" in prompt:
+                return "The value is 42.\nCONFIDENCE: 90"
+            return "A hint.\nCONFIDENCE: 30"
+
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        results, errors, skipped = map_chunks(self._chunks(6), 6, "q", min_confidence=80)
+        assert results == [(0, "A hint."), (1, "A hint."), (2, "The value is 42.")]
+        assert (errors, skipped) == (0, 0)
+
+    def test_cancels_queued_chunks(self, monkeypatch):
+        def fake(prompt, **kwargs):
+            if "chunk 0" in prompt:
+                return "Found it.\nCONFIDENCE: 100"
+            time.sleep(0.05)
+            return "Maybe.\nCONFIDENCE: 10"
+
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        results, _, skipped = map_chunks(self._chunks(40), 40, "q", workers=2, min_confidence=80)
+        assert results[0] == (0, "Found it.")
+        # Only the chunk already running on the other worker finishes
+        assert len(results) <= 3
+        assert skipped == 0
+
+    def test_does_not_wait_for_running_chunks(self, monkeypatch):
+        release = threading.Event()
+
+        def fake(prompt, **kwargs):
+            if "chunk 0" in prompt:
+                return "Found it.\nCONFIDENCE: 100"
+            release.wait(5)
+            return "Late.\nCONFIDENCE: 10"
+
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        started = time.monotonic()
+        try:
+            results, _, _ = map_chunks(self._chunks(6), 6, "q", workers=3, min_confidence=80)
+        finally:
+            release.set()
+        assert time.monotonic() - started < 2
+        assert results == [(0, "Found it.")]
+
+    def test_relevant_chunks_go_first(self):
+        chunks = ["intro text", "nothing here", "MAX_POOL_SIZE is set to 20", "more filler"]
+        ordered = order_by_relevance(list(enumerate(chunks)), chunks, "What is MAX_POOL_SIZE?")
+        assert [i for i, _ in ordered] == [2, 0, 1, 3]
+
+
+class _Admit:
+    def __init__(self, model):
+        self.model = model
+
+    def __enter__(self):
+        return self.model
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _CountingReader:
+    """Wraps a text file handle and records how many characters were read."""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.consumed = 0
+
+    def read(self, size=-1):
+        block = self.handle.read(size)
+        self.consumed += len(block)
+        return block
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.handle.close()
+        return False
+
+
+class TestIncrementalProcess:
+    def _run(self, monkeypatch, tmp_path, text, query, reply):
+        readers = []
+
+        def counting_open(*args, **kwargs):
+            readers.append(_CountingReader(open(*args, **kwargs)))
+            return readers[-1]
+
+        seen = []
+
+        def fake(prompt, **kwargs):
+            if "SECTION" in prompt:
+                seen.append((prompt, readers[-1].consumed))
+                return reply(prompt)
+            return "Final answer"
+
+        monkeypatch.setattr(rlm_processor, "open", counting_open, raising=False)
+        monkeypatch.setattr(rlm_processor, "READ_BLOCK_CHARS", 1000)
+        monkeypatch.setattr(rlm_processor, "SNIFF_CHARS", 2000)
+        monkeypatch.setattr(rlm_processor, "llm_query", fake)
+        doc = tmp_path / "doc.md"
+        doc.write_text(text)
+        answer = rlm_processor.rlm_process(str(doc), query, chunk_size=500, verbose=False,
+                                           incremental=True)
+        return answer, seen, readers
+
+    def test_first_chunk_is_processed_before_file_is_read(self, monkeypatch, tmp_path):
+        text = "\n".join(f"## Section {i}\nalpha notes " + "text " * 20 for i in range(200))
+        answer, seen, readers = self._run(monkeypatch, tmp_path, text, "alpha", lambda p: "found")
+        assert answer == "Final answer"
+        assert len(seen) == 200
+        assert "DOCUMENT SECTION 1:" in seen[0][0]
+        assert seen[0][1] < len(text) // 2
+        assert len(readers) == 1
+
+    def test_sparse_filter_matches_fall_back_to_all_chunks(self, monkeypatch, tmp_path):
+        text = "\n".join(f"## Section {i}\n" + ("rare topic " if i == 7 else "") + "text " * 20
+                         for i in range(100))
+        answer, seen, readers = self._run(monkeypatch, tmp_path, text, "rare topic",
+                                          lambda p: "NO_RELEVANT_INFO")
+        assert len(seen) == 100
+        assert len(readers) == 2
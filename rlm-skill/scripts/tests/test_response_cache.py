@@ -0,0 +1,92 @@
+"""Tests for the on-disk response cache in response_cache.py."""
+
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import response_cache
+from response_cache import ResponseCache
+
+
+class TestMakeKey:
+    def test_same_request_same_key(self):
+        a = ResponseCache.make_key("m", "sys", "prompt", 0.0, 100)
+        b = ResponseCache.make_key("m", "sys", "prompt", 0.0, 100)
+        assert a == b
+
+    def test_every_field_changes_key(self):
+        base = ("m", "sys", "prompt", 0.0, 100)
+        keys = {ResponseCache.make_key(*base)}
+        for i, changed in enumerate(["m2", "sys2", "prompt2", 0.5, 200]):
+            fields = list(base)
+            fields[i] = changed
+            keys.add(ResponseCache.make_key(*fields))
+        assert len(keys) == 6
+
+
+class TestResponseCache:
+    def test_roundtrip_and_counters(self):
+        with tempfile.TemporaryDirectory() as d:
+            cache = ResponseCache(d)
+            assert cache.get("k") is None
+            cache.put("k", "answer")
+            assert cache.get("k") == "answer"
+            stats = cache.stats()
+            assert stats["hits"] == 1
+            assert stats["misses"] == 1
+            assert stats["entries"] == 1
+            cache.close()
+
+    def test_persists_across_instances(self):
+        with tempfile.TemporaryDirectory() as d:
+            cache = ResponseCache(d)
+            cache.put("k", "answer")
+            cache.close()
+            reopened = ResponseCache(d)
+            assert reopened.get("k") == "answer"
+            assert reopened.stats()["bytes"] == len("answer")
+            reopened.close()
+
+    def test_expired_entries_miss(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as d:
+            cache = ResponseCache(d, ttl=60)
+            now = [1000.0]
+            monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+            cache.put("k", "answer")
+            now[0] += 30
+            assert cache.get("k") == "answer"
+            now[0] += 61
+            assert cache.get("k") is None
+            assert cache.stats()["entries"] == 0
+            cache.close()
+
+    def test_evicts_least_recently_used(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as d:
+            cache = ResponseCache(d, max_bytes=30)
+            now = [1000.0]
+            monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+            for key in ("a", "b", "c"):
+                now[0] += 1
+                cache.put(key, "x" * 10)
+            now[0] += 1
+            assert cache.get("a") == "x" * 10  # "b" is now the least recently used
+            now[0] += 1
+            cache.put("d", "x" * 10)
+            assert cache.get("b") is None
+            assert cache.get("a") is not None
+            assert cache.get("d") is not None
+            stats = cache.stats()
+            assert stats["evictions"] == 1
+            assert stats["bytes"] <= 30
+            cache.close()
+
+    def test_clear(self):
+        with tempfile.TemporaryDirectory() as d:
+            cache = ResponseCache(d)
+            cache.put("k", "answer")
+            cache.clear()
+            assert cache.get("k") is None
+            assert cache.stats()["bytes"] == 0
+            cache.close()
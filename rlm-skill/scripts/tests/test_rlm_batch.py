@@ -0,0 +1,240 @@
+"""Tests for Message Batches mode (rlm_batch.py) against the local mock server."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import directory_processor
+import paper_organizer
+import rlm_batch
+import rlm_query
+from mock_server import MockAnthropicServer
+from rlm_batch import BatchError, BatchJob
+from rlm_query import build_message_params
+
+
+def _prompt_of(payload):
+    return payload["messages"][-1]["content"]
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    server = MockAnthropicServer(responder=lambda p: f"answer to {_prompt_of(p)}")
+    server.start()
+    monkeypatch.setattr(rlm_query, "API_BASE_URL", server.url)
+    monkeypatch.setattr(rlm_query, "HTTP_TRANSPORT", "pool")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+    monkeypatch.setattr(rlm_query, "_response_cache", None)
+    rlm_query.close_connection_pools()
+    rlm_query.reset_usage()
+    yield server
+    rlm_query.close_connection_pools()
+    server.stop()
+
+
+def _batch_posts(server):
+    return [entry for entry in server.request_log
+            if entry[0] == "POST" and entry[1] == "/v1/messages/batches"]
+
+
+def _requests(*prompts):
+    return {f"r{i}": build_message_params(p, max_tokens=50) for i, p in enumerate(prompts)}
+
+
+class TestBatchJob:
+    def test_returns_texts_by_custom_id(self, mock_api, tmp_path):
+        job = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False)
+        texts = job.run_stage("stage", _requests("alpha", "beta"))
+        assert texts == {"r0": "answer to alpha", "r1": "answer to beta"}
+        assert rlm_query.get_usage()["requests"] == 2
+
+    def test_polls_until_batch_ends(self, mock_api, tmp_path):
+        mock_api.batch_delay = 0.1
+        job = BatchJob(tmp_path / "job.json", poll_interval=0.02, verbose=False)
+        texts = job.run_stage("stage", _requests("alpha"))
+        assert texts == {"r0": "answer to alpha"}
+        status_checks = [e for e in mock_api.request_log
+                         if e[0] == "GET" and not e[1].endswith("/results")]
+        assert len(status_checks) > 1
+
+    def test_finished_stage_is_read_from_job_file(self, mock_api, tmp_path):
+        requests = _requests("alpha", "beta")
+        BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False).run_stage("s", requests)
+        mock_api.request_log.clear()
+
+        texts = BatchJob(tmp_path / "job.json", verbose=False).run_stage("s", requests)
+        assert texts["r1"] == "answer to beta"
+        assert mock_api.request_log == []
+
+    def test_interrupted_run_resumes_without_resubmitting(self, mock_api, tmp_path, monkeypatch):
+        mock_api.batch_delay = 60
+
+        def interrupt(seconds):
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr(rlm_batch.time, "sleep", interrupt)
+        job = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False)
+        with pytest.raises(KeyboardInterrupt):
+            job.run_stage("s", _requests("alpha"))
+        assert len(_batch_posts(mock_api)) == 1
+
+        monkeypatch.undo()
+        monkeypatch.setattr(rlm_query, "API_BASE_URL", mock_api.url)
+        monkeypatch.setattr(rlm_query, "HTTP_TRANSPORT", "pool")
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+        monkeypatch.setattr(rlm_query, "_response_cache", None)
+        mock_api.batch_delay = 0
+        texts = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False).run_stage(
+            "s", _requests("alpha"))
+        assert texts == {"r0": "answer to alpha"}
+        assert len(_batch_posts(mock_api)) == 1
+
+    def test_refuses_to_resume_with_different_requests(self, mock_api, tmp_path):
+        BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False).run_stage(
+            "s", _requests("alpha"))
+        with pytest.raises(BatchError, match="different requests"):
+            BatchJob(tmp_path / "job.json", verbose=False).run_stage("s", _requests("gamma"))
+
+    def test_splits_large_stages_into_several_batches(self, mock_api, tmp_path, monkeypatch):
+        monkeypatch.setattr(rlm_batch, "MAX_BATCH_REQUESTS", 2)
+        job = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False)
+        texts = job.run_stage("s", _requests("a", "b", "c", "d", "e"))
+        assert len(_batch_posts(mock_api)) == 3
+        assert texts["r4"] == "answer to e"
+
+    def test_failed_requests_are_reported_and_retried_on_rerun(self, mock_api, tmp_path):
+        def responder(payload):
+            if _prompt_of(payload) == "bad":
+                raise RuntimeError("model exploded")
+            return "fine"
+
+        mock_api.responder = responder
+        requests = _requests("good", "bad")
+        job = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False)
+        assert job.run_stage("s", requests) == {"r0": "fine", "r1": None}
+        assert "model exploded" in job.errors("s")["r1"]
+
+        mock_api.responder = lambda payload: "recovered"
+        job = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False)
+        assert job.run_stage("s", requests) == {"r0": "fine", "r1": "recovered"}
+        assert job.errors("s") == {}
+        submitted = [r["custom_id"] for r in _batch_posts(mock_api)[-1][2]["requests"]]
+        assert submitted == ["r1"]
+
+    def test_interrupted_retry_is_not_resubmitted(self, mock_api, tmp_path, monkeypatch):
+        def responder(payload):
+            if _prompt_of(payload) == "bad":
+                raise RuntimeError("model exploded")
+            return "fine"
+
+        mock_api.responder = responder
+        requests = _requests("good", "bad")
+        BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False).run_stage("s", requests)
+
+        # The retry batch is submitted, then the run dies before its results arrive
+        mock_api.responder = lambda payload: "recovered"
+        mock_api.batch_delay = 60
+
+        def interrupt(seconds):
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr(rlm_batch.time, "sleep", interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False).run_stage("s", requests)
+        assert len(_batch_posts(mock_api)) == 2
+
+        monkeypatch.setattr(rlm_batch.time, "sleep", lambda seconds: None)
+        mock_api.batch_delay = 0
+        job = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False)
+        assert job.run_stage("s", requests) == {"r0": "fine", "r1": "recovered"}
+        assert len(_batch_posts(mock_api)) == 2
+        assert job.errors("s") == {}
+
+    def test_cached_responses_are_not_submitted(self, mock_api, tmp_path):
+        rlm_query.configure_cache(cache_dir=str(tmp_path / "cache"))
+        try:
+            requests = _requests("alpha", "beta")
+            rlm_query.cache_response(requests["r0"], "from cache")
+            job = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False)
+            assert job.run_stage("s", requests) == {"r0": "from cache", "r1": "answer to beta"}
+            submitted = [r["custom_id"] for r in _batch_posts(mock_api)[0][2]["requests"]]
+            assert submitted == ["r1"]
+            # Batch results are written back to the cache for later runs
+            assert rlm_query.cached_response(requests["r1"]) == "answer to beta"
+        finally:
+            rlm_query.configure_cache(enabled=False)
+
+    def test_rejects_invalid_custom_ids(self, mock_api, tmp_path):
+        job = BatchJob(tmp_path / "job.json", verbose=False)
+        with pytest.raises(ValueError):
+            job.run_stage("s", {"has space": build_message_params("x")})
+
+
+class TestBatchPipelines:
+    def test_directory_per_file_batch(self, mock_api, tmp_path):
+        def responder(payload):
+            prompt = _prompt_of(payload)
+            if "DOCUMENT SECTION" not in prompt:
+                return "final synthesis"
+            if "keep.txt" in prompt:
+                return "keep.txt defines the answer"
+            return "NO_RELEVANT_INFO"
+
+        mock_api.responder = responder
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "keep.txt").write_text("the answer is 42")
+        (tmp_path / "src" / "skip.txt").write_text("nothing to see")
+        files, _ = directory_processor.discover_files(str(tmp_path / "src"), verbose=False)
+        directory_processor.load_file_contents(files, verbose=False)
+
+        job = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False)
+        final, per_file = directory_processor.process_per_file_batch(
+            files, "What is the answer?", job, verbose=False)
+
+        assert final == "final synthesis"
+        by_name = {r["file"]: r for r in per_file}
+        assert by_name["keep.txt"]["result"] == "keep.txt defines the answer"
+        assert by_name["skip.txt"]["error"] == "No relevant info found"
+        assert len(_batch_posts(mock_api)) == 1
+
+    def test_paper_organizer_batch(self, mock_api, tmp_path, monkeypatch):
+        reply = {"title": "A Paper", "category": "USEFUL", "confidence": "HIGH", "tags": ["x"]}
+        mock_api.responder = lambda payload: json.dumps(reply)
+
+        def fake_extract(pdf_path, max_pages=15):
+            if "broken" in pdf_path:
+                return "", "Error: unreadable"
+            return "full text " * 10, "first pages"
+
+        monkeypatch.setattr(paper_organizer, "extract_paper_text", fake_extract)
+        job = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False)
+        analyses = paper_organizer.analyze_papers_batch(
+            ["a.pdf", "broken.pdf", "c.pdf"], job, verbose=False)
+
+        assert [a.title for a in analyses] == ["A Paper", "[Extraction Failed]", "A Paper"]
+        assert analyses[0].category == "USEFUL"
+        requests = _batch_posts(mock_api)[0][2]["requests"]
+        assert [r["custom_id"] for r in requests] == ["paper-0", "paper-2"]
+
+    def test_multi_chunk_files_are_merged_in_a_second_stage(self, mock_api, tmp_path):
+        def responder(payload):
+            return "finding" if "DOCUMENT SECTION" in _prompt_of(payload) else "merged"
+
+        mock_api.responder = responder
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "big.txt").write_text("\n".join(f"line {i}" for i in range(400)))
+        files, _ = directory_processor.discover_files(str(tmp_path / "src"), verbose=False)
+        directory_processor.load_file_contents(files, verbose=False)
+
+        job = BatchJob(tmp_path / "job.json", poll_interval=0.01, verbose=False)
+        final, per_file = directory_processor.process_per_file_batch(
+            files, "q", job, chunk_size=500, verbose=False)
+
+        assert per_file[0]["result"] == "merged"
+        assert final == "merged"
+        assert len(_batch_posts(mock_api)) == 2
+        assert len(_batch_posts(mock_api)[0][2]["requests"]) > 1
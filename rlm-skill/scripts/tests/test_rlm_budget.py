@@ -0,0 +1,150 @@
+"""Tests for the token/cost/time budget governor in rlm_budget.py."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import rlm_processor
+import rlm_query
+from rlm_budget import BudgetExceeded, BudgetGovernor, model_pricing, usage_cost
+from rlm_query import DEFAULT_MODEL, FAST_MODEL
+from usage_metrics import Metrics
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    fresh = Metrics()
+    monkeypatch.setattr(rlm_query, "_metrics", fresh)
+    return fresh
+
+
+class TestPricing:
+    def test_longest_prefix_wins(self):
+        assert model_pricing("claude-opus-4-5-20251101") == (5.00, 25.00)
+        assert model_pricing("claude-opus-4-1-20250805") == (15.00, 75.00)
+        assert model_pricing("some-future-model") == model_pricing(DEFAULT_MODEL)
+
+    def test_cache_tokens_are_discounted(self):
+        plain = usage_cost(DEFAULT_MODEL, {"input_tokens": 1_000_000})
+        assert plain == pytest.approx(3.00)
+        assert usage_cost(DEFAULT_MODEL, {"cache_read_input_tokens": 1_000_000}) == pytest.approx(0.30)
+        assert usage_cost(DEFAULT_MODEL, {"cache_creation_input_tokens": 1_000_000}) == pytest.approx(3.75)
+
+
+class TestGovernor:
+    def test_spend_is_measured_from_creation(self, metrics):
+        metrics.record_usage(DEFAULT_MODEL, {"input_tokens": 500, "output_tokens": 50})
+        governor = BudgetGovernor(max_input_tokens=1000)
+        metrics.record_usage(DEFAULT_MODEL, {"input_tokens": 100, "cache_read_input_tokens": 20,
+                                             "output_tokens": 10})
+        spent = governor.spent()
+        assert spent["input_tokens"] == 120
+        assert spent["output_tokens"] == 10
+        assert spent["dollars"] == pytest.approx(usage_cost(
+            DEFAULT_MODEL, {"input_tokens": 100, "cache_read_input_tokens": 20, "output_tokens": 10}))
+
+    def test_estimate_learns_output_size(self, metrics):
+        governor = BudgetGovernor()
+        assert governor.estimate(DEFAULT_MODEL, 1000, 2048)["output_tokens"] == 512
+        metrics.record_usage(DEFAULT_MODEL, {"output_tokens": 100})
+        metrics.record_usage(DEFAULT_MODEL, {"output_tokens": 300})
+        estimate = governor.estimate(DEFAULT_MODEL, 1000, 2048)
+        assert estimate["input_tokens"] == 1000
+        assert estimate["output_tokens"] == 200
+
+    def test_refuses_once_limit_would_be_crossed(self, metrics):
+        governor = BudgetGovernor(max_input_tokens=2000, downgrade=False)
+        with governor.call(DEFAULT_MODEL, 1000, 100) as model:
+            assert model == DEFAULT_MODEL
+            metrics.record_usage(model, {"input_tokens": 1000})
+        with pytest.raises(BudgetExceeded, match="input tokens"):
+            with governor.call(DEFAULT_MODEL, 1000, 100):
+                pass
+        assert governor.stop_reason.startswith("input tokens limit")
+        assert (governor.admitted, governor.refused) == (1, 1)
+
+    def test_pending_calls_are_reserved(self, metrics):
+        governor = BudgetGovernor(max_input_tokens=1500)
+        with governor.call(DEFAULT_MODEL, 1000, 100):
+            with pytest.raises(BudgetExceeded):
+                with governor.call(DEFAULT_MODEL, 1000, 100):
+                    pass
+
+    def test_downgrades_to_fast_model_when_only_it_fits(self, metrics):
+        primary = usage_cost(DEFAULT_MODEL, {"input_tokens": 1000, "output_tokens": 25})
+        governor = BudgetGovernor(max_dollars=primary * 0.8)
+        with governor.call(DEFAULT_MODEL, 1000, 100) as model:
+            assert model == FAST_MODEL
+        assert governor.downgraded == 1
+
+    def test_final_calls_may_use_the_reserve(self, metrics):
+        governor = BudgetGovernor(max_input_tokens=1050)
+        with pytest.raises(BudgetExceeded):
+            with governor.call(DEFAULT_MODEL, 1000, 100):
+                pass
+        with governor.call(DEFAULT_MODEL, 1000, 100, final=True):
+            pass
+
+    def test_plan_model_prefers_primary(self, metrics):
+        assert BudgetGovernor(max_dollars=10).plan_model(DEFAULT_MODEL, [1000] * 3, 100) == DEFAULT_MODEL
+        cost = 3 * usage_cost(DEFAULT_MODEL, {"input_tokens": 1000, "output_tokens": 25})
+        tight = BudgetGovernor(max_dollars=cost * 0.8)
+        assert tight.plan_model(DEFAULT_MODEL, [1000] * 3, 100) == FAST_MODEL
+
+    def test_report_and_summary(self, metrics):
+        governor = BudgetGovernor(max_dollars=1.0)
+        report = governor.report()
+        assert report["limits"]["dollars"] == 1.0
+        assert report["stop_reason"] is None
+        assert "$0.0000 / $1.0000" in governor.summary()
+
+
+class TestPipeline:
+    def test_rlm_process_stops_and_notes_skipped_sections(self, metrics, tmp_path, monkeypatch):
+        def fake_query(prompt, **kwargs):
+            metrics.record_usage(kwargs.get("model", DEFAULT_MODEL),
+                                 {"input_tokens": len(prompt) // 4, "output_tokens": 20})
+            return "Relevant finding" if "SECTION" in prompt else "Final answer"
+
+        monkeypatch.setattr(rlm_processor, "llm_query", fake_query)
+        monkeypatch.setattr(rlm_processor, "llm_query_fast", fake_query)
+        doc = tmp_path / "doc.txt"
+        doc.write_text("word " * 20000)
+        governor = BudgetGovernor(max_input_tokens=12000, downgrade=False)
+        answer = rlm_processor.rlm_process(str(doc), "query", chunk_size=10000,
+                                           filter_chunks=False, verbose=False, budget=governor)
+        assert answer.startswith("Final answer")
+        assert "sections were not analyzed" in answer
+        assert governor.refused == 1
+        assert governor.spent()["input_tokens"] <= 12000
+
+    def test_incremental_run_stops_reading_when_budget_runs_out(self, metrics, tmp_path, monkeypatch):
+        def fake_query(prompt, **kwargs):
+            metrics.record_usage(kwargs.get("model", DEFAULT_MODEL),
+                                 {"input_tokens": len(prompt) // 4, "output_tokens": 20})
+            return "Relevant finding" if "SECTION" in prompt else "Final answer"
+
+        monkeypatch.setattr(rlm_processor, "llm_query", fake_query)
+        monkeypatch.setattr(rlm_processor, "llm_query_fast", fake_query)
+        doc = tmp_path / "doc.txt"
+        doc.write_text("word " * 20000)
+        governor = BudgetGovernor(max_input_tokens=12000, downgrade=False)
+        answer = rlm_processor.rlm_process(str(doc), "query", chunk_size=10000, filter_chunks=False,
+                                           verbose=False, budget=governor, incremental=True)
+        assert answer.startswith("Final answer")
+        assert "the rest of the document were not analyzed" in answer
+        assert governor.refused == 1
+
+    def test_process_chunk_propagates_budget_exhaustion(self, metrics):
+        governor = BudgetGovernor(max_input_tokens=1)
+        with pytest.raises(BudgetExceeded):
+            rlm_processor.process_chunk("text", 0, 1, "query", budget=governor)
+
+    def test_aggregation_falls_back_to_raw_findings(self, metrics):
+        governor = BudgetGovernor(max_input_tokens=1)
+        answer = rlm_processor.aggregate_results([(0, "finding A")], "query", budget=governor)
+        assert "finding A" in answer
+        assert "not synthesized" in answer
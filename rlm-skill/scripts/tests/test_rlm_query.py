@@ -0,0 +1,607 @@
+"""Tests for the HTTP transport and query plumbing in rlm_query.py."""
+
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import rlm_query
+from rlm_query import ConnectionPool, RateLimiter, _parse_header_dump, llm_query
+from usage_metrics import Metrics
+
+
+class _MessagesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length))
+        self.server.client_ports.add(self.client_address[1])
+        self.server.request_count += 1
+        prompt = payload["messages"][0]["content"]
+        status, headers = 200, {}
+        if self.server.delays:
+            time.sleep(self.server.delays.pop(0))
+        if self.server.scripted:
+            status, headers = self.server.scripted.pop(0)
+        if status == 200:
+            body = json.dumps({
+                "content": [{"type": "text", "text": f"echo: {prompt}"}],
+                "usage": {"input_tokens": 3, "output_tokens": 2},
+            }).encode("utf-8")
+        else:
+            body = json.dumps({"type": "error", "error": {"type": f"status_{status}"}}).encode("utf-8")
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _MessagesHandler)
+    httpd.client_ports = set()
+    httpd.request_count = 0
+    httpd.scripted = []
+    httpd.delays = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def local_api(server, monkeypatch):
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(rlm_query, "API_BASE_URL", base_url)
+    monkeypatch.setattr(rlm_query, "HTTP_TRANSPORT", "pool")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+    monkeypatch.setattr(rlm_query, "_rate_limiter", RateLimiter())
+    monkeypatch.setattr(rlm_query, "_metrics", Metrics())
+    monkeypatch.setattr(rlm_query, "_hedging", dict(rlm_query._hedging))
+    monkeypatch.setattr(rlm_query, "RETRY_BASE_DELAY", 0.01)
+    rlm_query.close_connection_pools()
+    rlm_query.reset_usage()
+    yield server
+    rlm_query.close_connection_pools()
+
+
+class TestConnectionPool:
+    def test_reuses_connection_between_requests(self, server):
+        pool = ConnectionPool(f"http://127.0.0.1:{server.server_address[1]}")
+        body = json.dumps({"messages": [{"content": "hi"}]}).encode("utf-8")
+        for _ in range(5):
+            status, headers, data = pool.request("POST", "/v1/messages", body)
+            assert status == 200
+            assert headers["content-type"] == "application/json"
+        assert pool.connections_opened == 1
+        assert len(server.client_ports) == 1
+        pool.close()
+
+    def test_concurrent_requests_do_not_share_sockets(self, server):
+        pool = ConnectionPool(f"http://127.0.0.1:{server.server_address[1]}")
+        results, errors = [], []
+
+        def worker(n):
+            try:
+                for i in range(10):
+                    body = json.dumps({"messages": [{"content": f"{n}-{i}"}]}).encode("utf-8")
+                    _, _, data = pool.request("POST", "/v1/messages", body)
+                    results.append((f"{n}-{i}", json.loads(data)["content"][0]["text"]))
+            except Exception as e:  # pragma: no cover - surfaced by assertion
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert not errors
+        assert len(results) == 80
+        assert all(text == f"echo: {sent}" for sent, text in results)
+        assert pool.connections_opened <= 8
+        pool.close()
+
+
+class TestLlmQuery:
+    def test_returns_text_and_tracks_usage(self, local_api):
+        assert llm_query("hello") == "echo: hello"
+        assert llm_query("again") == "echo: again"
+        usage = rlm_query.get_usage()
+        assert usage["requests"] == 2
+        assert usage["input_tokens"] == 6
+        assert len(local_api.client_ports) == 1
+
+    def test_api_error_raises(self, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+        error_body = json.dumps({"type": "error", "error": {"type": "invalid_request_error"}})
+        monkeypatch.setattr(rlm_query, "_send_request",
+                            lambda *a, **k: (400, {}, error_body.encode("utf-8")))
+        with pytest.raises(Exception, match="API error"):
+            llm_query("hello")
+
+
+class TestParseHeaderDump:
+    def test_keeps_final_block(self):
+        dump = ("HTTP/1.1 100 Continue\r\n\r\n"
+                "HTTP/1.1 429 Too Many Requests\r\nRetry-After: 7\r\n"
+                "Content-Type: application/json\r\n\r\n")
+        status, headers = _parse_header_dump(dump)
+        assert status == 429
+        assert headers["retry-after"] == "7"
+        assert "content-type" in headers
+
+
+class TestAsyncQuery:
+    def test_allm_query_returns_text(self, local_api):
+        assert asyncio.run(rlm_query.allm_query("async hello")) == "echo: async hello"
+        assert rlm_query.get_usage()["requests"] == 1
+
+    def test_gather_bounded_preserves_order_and_limit(self, local_api):
+        in_flight, peak = 0, 0
+
+        async def tracked(prompt):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                return await rlm_query.allm_query(prompt)
+            finally:
+                in_flight -= 1
+
+        async def run():
+            prompts = [f"p{i}" for i in range(40)]
+            results = await rlm_query.gather_bounded((tracked(p) for p in prompts), limit=5)
+            return prompts, results, rlm_query.get_async_connection_pool().connections_opened
+
+        prompts, results, opened = asyncio.run(run())
+        assert results == [f"echo: {p}" for p in prompts]
+        assert peak <= 5
+        assert opened <= 5
+        assert rlm_query.get_usage()["requests"] == 40
+        assert rlm_query.get_usage()["input_tokens"] == 120
+
+    def test_llm_query_concurrent_from_sync_code(self, local_api):
+        results = rlm_query.llm_query_concurrent(["a", "b", "c"], concurrency=2)
+        assert results == ["echo: a", "echo: b", "echo: c"]
+
+
+class TestRateLimiter:
+    def test_unlimited_by_default(self):
+        limiter = RateLimiter()
+        assert all(limiter.reserve(100000) == 0 for _ in range(100))
+
+    def test_request_bucket_queues_excess_callers(self):
+        limiter = RateLimiter(requests_per_minute=60)
+        delays = [limiter.reserve() for _ in range(62)]
+        assert delays[:60] == [0.0] * 60
+        assert delays[60] == pytest.approx(1.0, abs=0.05)
+        assert delays[61] == pytest.approx(2.0, abs=0.05)
+
+    def test_token_bucket_limits_large_requests(self):
+        limiter = RateLimiter(input_tokens_per_minute=6000)
+        assert limiter.reserve(6000) == 0
+        assert limiter.reserve(100) == pytest.approx(1.0, abs=0.05)
+
+    def test_adopts_limits_from_headers(self):
+        limiter = RateLimiter()
+        limiter.update_from_headers({
+            "anthropic-ratelimit-requests-limit": "50",
+            "anthropic-ratelimit-requests-remaining": "0",
+            "anthropic-ratelimit-input-tokens-limit": "30000",
+        })
+        assert limiter.limits() == {"requests": 50.0, "input_tokens": 30000.0}
+        # No requests remaining: the next caller waits for one to refill
+        assert limiter.reserve() == pytest.approx(60 / 50, abs=0.05)
+
+    def test_retry_after_blocks_everyone(self):
+        limiter = RateLimiter()
+        limiter.update_from_headers({"retry-after": "3"})
+        assert limiter.reserve() == pytest.approx(3.0, abs=0.05)
+
+    def test_settle_charges_actual_usage(self):
+        limiter = RateLimiter(input_tokens_per_minute=600, output_tokens_per_minute=600)
+        limiter.reserve(100)
+        limiter.settle(100, {"input_tokens": 700, "output_tokens": 660})
+        # 700 input tokens billed against a 600/min budget -> 100 in deficit
+        assert limiter.reserve(0) == pytest.approx(10.0, abs=0.1)
+
+
+class TestRateLimitRetries:
+    def test_retries_after_429(self, local_api):
+        local_api.scripted = [(429, {"retry-after": "0"}), (429, {"retry-after": "0"})]
+        assert llm_query("persist") == "echo: persist"
+        assert local_api.request_count == 3
+        assert rlm_query.get_usage()["requests"] == 1
+
+    def test_gives_up_after_max_retries(self, local_api, monkeypatch):
+        monkeypatch.setattr(rlm_query, "MAX_RATE_LIMIT_RETRIES", 1)
+        local_api.scripted = [(429, {"retry-after": "0"})] * 2
+        with pytest.raises(Exception, match="API error"):
+            llm_query("nope")
+        assert local_api.request_count == 2
+
+    def test_async_retries_after_429(self, local_api):
+        local_api.scripted = [(429, {"retry-after": "0"})]
+        assert asyncio.run(rlm_query.allm_query("later")) == "echo: later"
+        assert local_api.request_count == 2
+
+
+class TestTransientRetries:
+    def test_retries_server_errors(self, local_api):
+        local_api.scripted = [(529, {}), (503, {})]
+        assert llm_query("overloaded") == "echo: overloaded"
+        assert local_api.request_count == 3
+        assert rlm_query.get_call_stats()["retries"] == 2
+
+    def test_does_not_retry_client_errors(self, local_api):
+        local_api.scripted = [(400, {})]
+        with pytest.raises(Exception, match="API error"):
+            llm_query("bad")
+        assert local_api.request_count == 1
+
+    def test_retries_dropped_connections(self, local_api, monkeypatch):
+        real_send = rlm_query._send_request
+        calls = []
+
+        def flaky(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionResetError("reset by peer")
+            return real_send(*args, **kwargs)
+
+        monkeypatch.setattr(rlm_query, "_send_request", flaky)
+        assert llm_query("flaky") == "echo: flaky"
+        assert len(calls) == 2
+
+    def test_does_not_retry_read_timeouts(self, local_api, monkeypatch):
+        calls = []
+
+        def hung(*args, **kwargs):
+            calls.append(1)
+            raise rlm_query.ReadTimeout("timed out")
+
+        async def hung_async(*args, **kwargs):
+            calls.append(1)
+            raise rlm_query.ReadTimeout("timed out")
+
+        monkeypatch.setattr(rlm_query, "_send_request", hung)
+        monkeypatch.setattr(rlm_query, "_send_request_async", hung_async)
+        with pytest.raises(rlm_query.ReadTimeout):
+            llm_query("slow")
+        with pytest.raises(rlm_query.ReadTimeout):
+            asyncio.run(rlm_query.allm_query("slow"))
+        assert len(calls) == 2
+        assert rlm_query.get_call_stats()["retries"] == 0
+
+    def test_retries_connect_timeouts(self, local_api, monkeypatch):
+        real_send = rlm_query._send_request
+        calls = []
+
+        def unreachable_once(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise socket.timeout("timed out")
+            return real_send(*args, **kwargs)
+
+        monkeypatch.setattr(rlm_query, "_send_request", unreachable_once)
+        assert llm_query("reachable") == "echo: reachable"
+        assert len(calls) == 2
+
+    def test_pools_raise_read_timeout_for_slow_responses(self, server):
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        body = json.dumps({"messages": [{"content": "hi"}]}).encode("utf-8")
+        server.delays = [1.0, 1.0]
+        with pytest.raises(rlm_query.ReadTimeout):
+            ConnectionPool(url, timeout=0.2).request("POST", "/v1/messages", body)
+
+        async def run():
+            await rlm_query.AsyncConnectionPool(url, timeout=0.2).request("POST", "/v1/messages", body)
+
+        with pytest.raises(rlm_query.ReadTimeout):
+            asyncio.run(run())
+
+    def test_backoff_is_jittered_and_capped(self, monkeypatch):
+        monkeypatch.setattr(rlm_query, "RETRY_BASE_DELAY", 1.0)
+        monkeypatch.setattr(rlm_query, "RETRY_MAX_DELAY", 4.0)
+        delays = [rlm_query._backoff_delay(10) for _ in range(200)]
+        assert all(0 <= d <= 4.0 for d in delays)
+        assert len(set(delays)) > 1
+        assert rlm_query._backoff_delay(0, {"retry-after": "5"}) == 5.0
+
+
+class TestHedging:
+    def test_hedge_wins_when_primary_is_slow(self, local_api):
+        rlm_query.configure_hedging(delay=0.05)
+        local_api.delays = [1.5]
+        started = time.monotonic()
+        assert llm_query("tail") == "echo: tail"
+        assert time.monotonic() - started < 1.0
+        stats = rlm_query.get_call_stats()
+        assert stats["hedges"] == 1
+        assert stats["hedge_wins"] == 1
+
+    def test_async_hedge_wins_when_primary_is_slow(self, local_api):
+        rlm_query.configure_hedging(delay=0.05)
+        local_api.delays = [1.5]
+        started = time.monotonic()
+        assert asyncio.run(rlm_query.allm_query("tail")) == "echo: tail"
+        assert time.monotonic() - started < 1.0
+        assert rlm_query.get_call_stats()["hedge_wins"] == 1
+
+    def test_no_hedge_until_enough_samples(self, local_api):
+        rlm_query.configure_hedging(min_samples=5)
+        for i in range(3):
+            llm_query(f"warmup {i}")
+        assert rlm_query._hedge_delay(rlm_query.DEFAULT_MODEL) is None
+        for i in range(2):
+            llm_query(f"more {i}")
+        assert rlm_query._hedge_delay(rlm_query.DEFAULT_MODEL) is not None
+        assert rlm_query.get_call_stats()["hedges"] == 0
+
+    def test_latency_stats_reported_per_model(self, local_api):
+        llm_query("a")
+        rlm_query.llm_query_fast("b")
+        models = rlm_query.get_call_stats()["models"]
+        assert set(models) == {rlm_query.DEFAULT_MODEL, rlm_query.FAST_MODEL}
+        assert models[rlm_query.FAST_MODEL]["count"] == 1
+        assert models[rlm_query.FAST_MODEL]["p50"] <= models[rlm_query.FAST_MODEL]["p99"]
+
+
+class TestMetrics:
+    def test_records_ttfb_and_bytes_per_model(self, local_api):
+        llm_query("a")
+        rlm_query.llm_query_fast("bb")
+        models = rlm_query.get_metrics()["models"]
+        fast = models[rlm_query.FAST_MODEL]
+        assert fast["requests"] == 1
+        assert fast["ttfb"]["count"] == 1
+        assert fast["ttfb"]["p50"] <= fast["latency"]["p50"]
+        assert fast["bytes_sent"] > 0 and fast["bytes_received"] > 0
+        assert models[rlm_query.DEFAULT_MODEL]["input_tokens"] == 3
+
+    def test_async_calls_record_ttfb(self, local_api):
+        asyncio.run(rlm_query.allm_query("x"))
+        assert rlm_query.get_metrics()["models"][rlm_query.DEFAULT_MODEL]["ttfb"]["count"] == 1
+
+    def test_failed_calls_count_as_errors(self, local_api):
+        local_api.scripted = [(400, {})]
+        with pytest.raises(Exception):
+            llm_query("bad")
+        entry = rlm_query.get_metrics()["models"][rlm_query.DEFAULT_MODEL]
+        assert entry["errors"] == 1 and entry["requests"] == 0
+
+    def test_cache_hits_counted(self, local_api, tmp_path):
+        rlm_query.configure_cache(cache_dir=str(tmp_path))
+        try:
+            llm_query("twice")
+            llm_query("twice")
+        finally:
+            rlm_query.configure_cache(enabled=False)
+        assert rlm_query.get_metrics()["response_cache"]["hits"] == 1
+        assert rlm_query.get_metrics()["response_cache"]["misses"] == 1
+
+    def test_metrics_json_option(self, local_api, tmp_path, monkeypatch):
+        import argparse
+
+        registered = []
+        monkeypatch.setattr(rlm_query.atexit, "register", lambda f, *a: registered.append((f, a)))
+        parser = argparse.ArgumentParser()
+        rlm_query.add_client_arguments(parser)
+        rlm_query.apply_client_arguments(
+            parser.parse_args(["--no-cache", "--metrics-json", str(tmp_path / "m.json")]))
+        llm_query("exported")
+        for func, args in registered:
+            func(*args)
+        data = json.loads((tmp_path / "m.json").read_text())
+        assert data["totals"]["requests"] == 1
+        assert rlm_query.DEFAULT_MODEL in data["models"]
+
+
+class TestCoalescing:
+    @pytest.fixture
+    def flights(self, local_api, monkeypatch):
+        monkeypatch.setattr(rlm_query, "_flights", rlm_query.SingleFlight())
+        monkeypatch.setattr(rlm_query, "_coalescing", dict(rlm_query._coalescing))
+        local_api.delays = [0.3]
+        return local_api
+
+    def _threads(self, n, fn):
+        results = [None] * n
+
+        def run(i):
+            try:
+                results[i] = fn()
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_concurrent_threads_share_one_request(self, flights):
+        results = self._threads(8, lambda: llm_query("same"))
+        assert results == ["echo: same"] * 8
+        assert flights.request_count == 1
+        assert rlm_query.get_metrics()["totals"]["coalesced"] == 7
+        assert rlm_query._flights.in_flight() == 0
+
+    def test_async_callers_share_one_request(self, flights):
+        async def run():
+            return await asyncio.gather(*(rlm_query.allm_query("same") for _ in range(5)))
+
+        assert asyncio.run(run()) == ["echo: same"] * 5
+        assert flights.request_count == 1
+
+    def test_threads_and_async_share_one_request(self, flights):
+        thread = threading.Thread(target=llm_query, args=("same",))
+        thread.start()
+        time.sleep(0.05)
+        assert asyncio.run(rlm_query.allm_query("same")) == "echo: same"
+        thread.join()
+        assert flights.request_count == 1
+
+    def test_errors_are_shared(self, flights):
+        flights.scripted = [(400, {})]
+        results = self._threads(4, lambda: llm_query("bad"))
+        assert all(isinstance(r, Exception) and "API error" in str(r) for r in results)
+        assert flights.request_count == 1
+
+    def test_different_or_nondeterministic_prompts_are_not_shared(self, flights):
+        self._threads(2, lambda: llm_query("warm", temperature=0.7))
+        self._threads(1, lambda: llm_query("other"))
+        assert flights.request_count == 3
+
+    def test_followers_retry_when_leader_is_cancelled(self, flights):
+        async def run():
+            leader = asyncio.ensure_future(rlm_query.allm_query("same"))
+            await asyncio.sleep(0.05)
+            follower = asyncio.ensure_future(rlm_query.allm_query("same"))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(run()) == "echo: same"
+        assert flights.request_count == 2
+
+    def test_can_be_disabled(self, flights):
+        rlm_query.configure_coalescing(enabled=False)
+        self._threads(3, lambda: llm_query("same"))
+        assert flights.request_count == 3
+
+
+class TestResponseCaching:
+    @pytest.fixture
+    def cached_api(self, local_api, tmp_path):
+        rlm_query.configure_cache(cache_dir=str(tmp_path))
+        yield local_api
+        rlm_query.configure_cache(enabled=False)
+
+    def test_repeat_call_served_from_cache(self, cached_api):
+        assert llm_query("cache me") == "echo: cache me"
+        assert llm_query("cache me") == "echo: cache me"
+        assert cached_api.request_count == 1
+        assert rlm_query.get_cache_stats()["hits"] == 1
+        assert rlm_query.get_usage()["requests"] == 1
+
+    def test_nondeterministic_calls_not_cached(self, cached_api):
+        llm_query("warm", temperature=0.7)
+        llm_query("warm", temperature=0.7)
+        assert cached_api.request_count == 2
+
+    def test_async_calls_share_cache(self, cached_api):
+        llm_query("shared")
+        assert asyncio.run(rlm_query.allm_query("shared")) == "echo: shared"
+        assert cached_api.request_count == 1
+
+    def test_disabled_cache_reports_nothing(self, local_api):
+        rlm_query.configure_cache(enabled=False)
+        llm_query("x")
+        llm_query("x")
+        assert local_api.request_count == 2
+        assert rlm_query.get_cache_stats() == {}
+
+
+class TestPromptCaching:
+    def test_cache_system_marks_prefix(self):
+        payload = rlm_query._build_payload("p", "m", 10, 0.0, "prefix", cache_system=True)
+        assert payload["system"] == [{"type": "text", "text": "prefix",
+                                      "cache_control": {"type": "ephemeral"}}]
+
+    def test_plain_system_prompt_unchanged(self):
+        payload = rlm_query._build_payload("p", "m", 10, 0.0, "prefix")
+        assert payload["system"] == "prefix"
+
+    def test_cache_tokens_tracked_separately(self):
+        rlm_query.reset_usage()
+        rlm_query.record_usage({"input_tokens": 50, "output_tokens": 5,
+                                 "cache_creation_input_tokens": 1200,
+                                 "cache_read_input_tokens": 0})
+        rlm_query.record_usage({"input_tokens": 40, "output_tokens": 5,
+                                 "cache_read_input_tokens": 1200})
+        usage = rlm_query.get_usage()
+        assert usage["input_tokens"] == 90
+        assert usage["cache_creation_input_tokens"] == 1200
+        assert usage["cache_read_input_tokens"] == 1200
+        rlm_query.reset_usage()
+        assert rlm_query.get_usage()["cache_read_input_tokens"] == 0
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    from mock_server import MockAnthropicServer
+
+    server = MockAnthropicServer(responder=lambda p: "one two three four five six")
+    server.start()
+    monkeypatch.setattr(rlm_query, "API_BASE_URL", server.url)
+    monkeypatch.setattr(rlm_query, "HTTP_TRANSPORT", "pool")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+    monkeypatch.setattr(rlm_query, "_rate_limiter", RateLimiter())
+    monkeypatch.setattr(rlm_query, "_response_cache", None)
+    rlm_query.close_connection_pools()
+    rlm_query.reset_usage()
+    yield server
+    rlm_query.close_connection_pools()
+    server.stop()
+
+
+class TestStreaming:
+    def test_yields_text_deltas(self, mock_api):
+        deltas = list(rlm_query.llm_query_stream("hi"))
+        assert len(deltas) == 6
+        assert "".join(deltas) == "one two three four five six"
+        usage = rlm_query.get_usage()
+        assert usage["requests"] == 1 and usage["output_tokens"] > 1
+        entry = rlm_query.get_metrics()["models"][rlm_query.DEFAULT_MODEL]
+        assert entry["ttfb"]["count"] == 1 and entry["bytes_received"] > 0
+
+    def test_completed_stream_reuses_connection(self, mock_api):
+        for _ in range(3):
+            "".join(rlm_query.llm_query_stream("hi"))
+        assert rlm_query.get_connection_pool().connections_opened == 1
+
+    def test_early_close_stops_the_stream(self, mock_api):
+        mock_api.responder = lambda p: "NO_RELEVANT_INFO " + "padding " * 200
+        mock_api.stream_delay = 0.01
+        started = time.monotonic()
+        text = rlm_query.collect_stream(rlm_query.llm_query_stream("hi"), stop_at="NO_RELEVANT_INFO")
+        assert text == "NO_RELEVANT_INFO "
+        assert time.monotonic() - started < 1.0
+        # The abandoned connection is not returned to the pool
+        assert rlm_query.get_connection_pool()._idle == []
+
+    def test_stream_is_cached_only_when_complete(self, mock_api, tmp_path):
+        rlm_query.configure_cache(cache_dir=str(tmp_path))
+        try:
+            rlm_query.collect_stream(rlm_query.llm_query_stream("hi"), stop_at="two")
+            assert "".join(rlm_query.llm_query_stream("hi")) == "one two three four five six"
+            mock_api.responder = lambda p: "changed"
+            assert list(rlm_query.llm_query_stream("hi")) == ["one two three four five six"]
+        finally:
+            rlm_query.configure_cache(enabled=False)
+
+    def test_api_errors_raise(self, mock_api, monkeypatch):
+        monkeypatch.delenv("ANTHROPIC_API_KEY")
+        monkeypatch.setattr(rlm_query, "load_api_key", lambda: "sk-ant-test")
+        monkeypatch.setattr(rlm_query, "_api_headers", lambda key: {"Content-Type": "application/json"})
+        with pytest.raises(Exception, match="authentication_error"):
+            list(rlm_query.llm_query_stream("hi"))
@@ -0,0 +1,133 @@
+"""Tests for structure_scan.py (single-pass structure statistics)."""
+
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add parent dir to path so we can import the scripts
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from structure_scan import scan_structure
+from rlm_processor import (
+    MARKDOWN_SPLIT,
+    auto_chunk,
+    chunk_at_lines,
+    chunk_by_regex,
+    chunk_by_separator,
+    detect_strategies,
+)
+from analyze_context import analyze_context
+
+
+SAMPLE = "\n".join([
+    "# Title",
+    "intro text",
+    "---",
+    "## Section",
+    "### Subsection",
+    "#!/usr/bin/env python",
+    "- bullet one",
+    "  * bullet two",
+    "1. first",
+    "2) second",
+    '{"id": 1}',
+    "  <item>x</item>",
+    "```python",
+    "code()",
+    "```",
+    "   ",
+    "",
+    "***",
+    "----not a rule",
+    "===",
+    "last line",
+])
+
+
+class TestScanStructure:
+    def test_line_statistics_match_split(self):
+        scan = scan_structure(SAMPLE)
+        lines = SAMPLE.split("\n")
+        assert scan.chars == len(SAMPLE)
+        assert scan.lines == len(lines)
+        assert scan.non_empty_lines == sum(1 for l in lines if l.strip())
+        assert scan.max_line_length == max(len(l) for l in lines)
+        assert scan.min_non_empty_length == min(len(l) for l in lines if l)
+
+    def test_pattern_counts(self):
+        patterns = scan_structure(SAMPLE).patterns()
+        assert patterns == {
+            "json_objects": 1,
+            "markdown_headers": 3,
+            "code_blocks": 1,
+            "xml_tags": 1,
+            "document_separators": 3,
+            "numbered_items": 2,
+            "bullet_points": 2,
+        }
+
+    @pytest.mark.parametrize("text", [
+        "<root><a>1</a><b x='2'/><c>3</c></root>",
+        "text <b>bold</b> and <i>it</i>\n<p>para</p>",
+        "inline ```code``` and\n```\nblock\n```",
+    ])
+    def test_tags_and_fences_are_counted_per_occurrence(self, text):
+        patterns = scan_structure(text).patterns()
+        assert patterns["xml_tags"] == len(re.findall(r"<[a-zA-Z][^>]*>", text))
+        assert patterns["code_blocks"] == len(re.findall(r"```", text)) // 2
+
+    def test_first_and_last_lines_are_not_separators(self):
+        assert scan_structure("---\ntext\n---").separators == 0
+
+    @pytest.mark.parametrize("text", [
+        "a\n---\n---\nb",
+        "a\n===\n----\nb",
+        "a\n---\n---\n---\nb\n---\nc",
+        "a\n***\n---\n===\nb",
+        "a\n---\n\n---\nb",
+        "---\n---\n---",
+    ])
+    def test_adjacent_separators_count_like_findall(self, text):
+        scan = scan_structure(text)
+        assert scan.separators == len(re.findall(r"\n---+\n|\n===+\n", text))
+        assert scan.rules == len(re.findall(r"\n---+\n|\n===+\n|\n\*\*\*+\n", text))
+
+    def test_adjacent_separators_do_not_change_strategy(self):
+        # Doubled rules between four documents: 3 separators as before the scan (not 6), too few to split at
+        text = "\n---\n---\n".join(["x" * 50] * 4)
+        assert scan_structure(text).separators == 3
+        assert detect_strategies(text, 200)[0] == "character_count"
+
+    @pytest.mark.parametrize("text", ["", "\n", "a\n", "\n\n# x\n", SAMPLE + "\n"])
+    def test_edge_cases_match_split(self, text):
+        scan = scan_structure(text)
+        assert scan.lines == len(text.split("\n"))
+        assert scan.markdown_headers == len(re.findall(r"^#+\s+", text, re.MULTILINE))
+
+    def test_cut_points_reproduce_chunkers(self):
+        scan = scan_structure(SAMPLE)
+        assert chunk_at_lines(SAMPLE, scan.header_starts) == chunk_by_regex(SAMPLE, MARKDOWN_SPLIT)
+        assert chunk_at_lines(SAMPLE, scan.separator_starts, 3) == chunk_by_separator(SAMPLE, "\n---")
+
+
+class TestSharedScan:
+    def test_detect_strategies_accepts_scan(self):
+        text = "\n".join(f"## Section {i}\n" + "text " * 20 for i in range(30))
+        assert detect_strategies(scan_structure(text), 2000) == detect_strategies(text, 2000)
+
+    def test_auto_chunk_separator_documents(self):
+        text = "\n---\n".join(f"Document {i}\n" + "body " * i for i in range(20))
+        chunks, strategy = auto_chunk(text, 2000)
+        assert strategy == "document_separator"
+        assert chunks == chunk_by_separator(text, "\n---")
+
+    def test_analyze_context_uses_scan(self, tmp_path):
+        path = tmp_path / "doc.md"
+        path.write_text(SAMPLE, encoding="utf-8")
+        analysis = analyze_context(str(path))
+        assert analysis["total_lines"] == len(SAMPLE.split("\n"))
+        assert analysis["patterns"]["markdown_headers"] == 3
+        assert analysis["first_lines"] == SAMPLE.split("\n")[:20]
+        assert analysis["last_lines"] == SAMPLE.split("\n")[-10:]
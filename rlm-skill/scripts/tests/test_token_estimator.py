@@ -0,0 +1,133 @@
+"""Tests for the local token estimator in token_estimator.py."""
+
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import rlm_query
+import token_estimator
+from mock_server import MockAnthropicServer
+from rlm_query import RateLimiter
+from token_estimator import (
+    DEFAULT_WEIGHTS, FEATURES, TokenEstimator, calibrate_main, samples_from_cassette, text_features
+)
+
+MIXED = (
+    "def parse(line):\n"
+    "    return {'id': 12345, \"name\": line.strip()}   # tabs\tand  spaces\n"
+    "\n"
+    "Ünïcödé text, 日本語のテキスト, and emoji 🎉!\n"
+    "   trailing line without newline"
+)
+
+PROSE = "The quick brown fox jumps over the lazy dog. " * 50
+JSON_TEXT = json.dumps([{"id": i, "score": i * 1.5, "tags": ["a", "b"]} for i in range(100)])
+
+
+@pytest.fixture
+def no_numpy(monkeypatch):
+    monkeypatch.setattr(token_estimator, "NUMPY_AVAILABLE", False)
+
+
+class TestFeatures:
+    def test_counts(self):
+        features = text_features("ab cd  12\n!é")
+        assert features == {"words": 2, "letters": 4, "digits": 2, "punctuation": 1,
+                            "newlines": 1, "extra_spaces": 1, "non_ascii": 1}
+
+    @pytest.mark.skipif(not token_estimator.NUMPY_AVAILABLE, reason="numpy not installed")
+    def test_numpy_and_regex_paths_agree(self, monkeypatch):
+        vectorized = text_features(MIXED)
+        monkeypatch.setattr(token_estimator, "NUMPY_AVAILABLE", False)
+        assert text_features(MIXED) == vectorized
+
+    def test_blocks_do_not_change_counts(self, monkeypatch):
+        text = MIXED * 20
+        whole = text_features(text)
+        monkeypatch.setattr(token_estimator, "BLOCK_CHARS", 37)
+        assert text_features(text) == whole
+
+
+class TestEstimator:
+    def test_dense_text_has_fewer_chars_per_token(self):
+        estimator = TokenEstimator()
+        assert estimator.chars_per_token(JSON_TEXT) < estimator.chars_per_token(PROSE)
+        assert estimator.chars_per_token(PROSE) == pytest.approx(4.5, rel=0.2)
+
+    @pytest.mark.parametrize("numpy_path", [True, False])
+    def test_line_counts_sum_to_total(self, numpy_path, monkeypatch):
+        if numpy_path and not token_estimator.NUMPY_AVAILABLE:
+            pytest.skip("numpy not installed")
+        monkeypatch.setattr(token_estimator, "NUMPY_AVAILABLE", numpy_path)
+        estimator = TokenEstimator()
+        for text in (MIXED, MIXED + "\n"):
+            counts = estimator.line_counts(text)
+            assert len(counts) == len(text.rstrip("\n").split("\n"))
+            assert sum(counts) == pytest.approx(estimator._apply(text_features(text)))
+
+    def test_fit_recovers_weights(self):
+        true = TokenEstimator({name: w * 1.3 for name, w in DEFAULT_WEIGHTS.items()}, overhead=5)
+        rng = random.Random(0)
+        samples = []
+        for _ in range(60):
+            text = "".join(rng.choice([PROSE[:200], JSON_TEXT[:150], MIXED]) for _ in range(3))
+            samples.append((text_features(text), true._apply(text_features(text)) + true.overhead))
+        estimator = TokenEstimator()
+        estimator.fit(samples)
+        for features, actual in samples:
+            assert estimator._apply(features) + estimator.overhead == pytest.approx(actual, rel=0.02)
+        assert estimator.samples == 60
+
+    def test_weights_stay_non_negative(self):
+        estimator = TokenEstimator()
+        estimator.fit([(text_features("aaaa bbbb"), 0)] * 5)
+        assert all(w >= 0 for w in estimator.weights.values())
+
+    def test_save_and_load(self, tmp_path):
+        estimator = TokenEstimator({"letters": 0.2}, overhead=3)
+        estimator.save(str(tmp_path / "cal.json"))
+        loaded = TokenEstimator.load(str(tmp_path / "cal.json"))
+        assert loaded.weights == estimator.weights and loaded.overhead == 3
+
+    def test_count_request_adds_overhead(self):
+        estimator = TokenEstimator(overhead=10)
+        payload = {"system": [{"type": "text", "text": "sys"}],
+                   "messages": [{"role": "user", "content": "hello"}]}
+        assert estimator.count_request(payload) == estimator.count("sys\nhello") + 10
+
+
+class TestCalibration:
+    def test_samples_from_cassette(self, tmp_path):
+        path = tmp_path / "c.json"
+        path.write_text(json.dumps({"version": 1, "interactions": {"k": {
+            "request": {"messages": [{"role": "user", "content": "hello world"}]},
+            "response": {"usage": {"input_tokens": 5, "cache_read_input_tokens": 7}},
+        }}}))
+        [(features, tokens)] = samples_from_cassette(str(path))
+        assert tokens == 12
+        assert features["words"] == 2
+
+    def test_calibrate_against_count_tokens(self, tmp_path, monkeypatch, capsys):
+        server = MockAnthropicServer().start()
+        monkeypatch.setattr(rlm_query, "API_BASE_URL", rlm_query.API_BASE_URL)
+        monkeypatch.setattr(rlm_query, "HTTP_TRANSPORT", "pool")
+        monkeypatch.setattr(rlm_query, "_rate_limiter", RateLimiter())
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+        sample = tmp_path / "sample.txt"
+        sample.write_text((PROSE + "\n" + JSON_TEXT + "\n" + MIXED + "\n") * 10)
+        output = tmp_path / "cal.json"
+        try:
+            calibrate_main([str(sample), "--base-url", server.url, "--output", str(output),
+                            "--max-samples", "30"])
+        finally:
+            rlm_query.close_connection_pools()
+            server.stop()
+        # The mock counts chars/4, so the fitted estimator should learn that
+        fitted = TokenEstimator.load(str(output))
+        assert fitted.count(JSON_TEXT) == pytest.approx(len(JSON_TEXT) / 4, rel=0.1)
+        assert "mean error" in capsys.readouterr().out
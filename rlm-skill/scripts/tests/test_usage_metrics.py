@@ -0,0 +1,94 @@
+"""Tests for the per-model call metrics in usage_metrics.py."""
+
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from usage_metrics import LatencyHistogram, Metrics, format_snapshot
+
+
+class TestLatencyHistogram:
+    def test_percentiles_within_bucket_resolution(self):
+        hist = LatencyHistogram()
+        for ms in range(1, 1001):
+            hist.record(ms / 1000.0)
+        assert hist.percentile(50) == pytest.approx(0.5, rel=0.1)
+        assert hist.percentile(95) == pytest.approx(0.95, rel=0.1)
+        assert hist.percentile(99) == pytest.approx(0.99, rel=0.1)
+        assert hist.percentile(100) == 1.0
+
+    def test_percentiles_clamped_to_observed_range(self):
+        hist = LatencyHistogram()
+        hist.record(2.0)
+        snapshot = hist.snapshot()
+        assert snapshot["p50"] == snapshot["p99"] == 2.0
+        assert snapshot["min"] == snapshot["max"] == snapshot["mean"] == 2.0
+
+    def test_empty(self):
+        hist = LatencyHistogram()
+        assert hist.percentile(50) is None
+        assert hist.snapshot() == {"count": 0}
+
+    def test_memory_is_bounded(self):
+        hist = LatencyHistogram()
+        for i in range(100000):
+            hist.record((i % 5000) / 100.0)
+        assert hist.count == 100000
+        assert len(hist.counts) < 150
+
+
+class TestMetrics:
+    def test_breaks_down_by_model(self):
+        metrics = Metrics()
+        metrics.record_usage("a", {"input_tokens": 10, "output_tokens": 2})
+        metrics.record_usage("b", {"input_tokens": 5, "cache_read_input_tokens": 100})
+        metrics.increment("a", "retries")
+        metrics.record_bytes("b", 300, 40)
+        snapshot = metrics.snapshot()
+        assert snapshot["models"]["a"]["input_tokens"] == 10
+        assert snapshot["models"]["a"]["retries"] == 1
+        assert snapshot["models"]["b"]["bytes_sent"] == 300
+        assert snapshot["totals"]["requests"] == 2
+        assert snapshot["totals"]["input_tokens"] == 15
+        assert metrics.totals() == snapshot["totals"]
+
+    def test_counters_do_not_lose_concurrent_updates(self):
+        metrics = Metrics()
+
+        def worker():
+            for _ in range(2000):
+                metrics.record_usage("m", {"input_tokens": 1})
+                metrics.record_latency("m", 0.01)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert metrics.totals()["input_tokens"] == 16000
+        assert metrics.sample_count("m") == 16000
+
+    def test_cache_hit_rate(self):
+        metrics = Metrics()
+        for hit in (True, True, False, True):
+            metrics.record_cache(hit)
+        assert metrics.snapshot()["response_cache"] == {"hits": 3, "misses": 1, "hit_rate": 0.75}
+
+    def test_write_json_and_reset(self, tmp_path):
+        metrics = Metrics()
+        metrics.record_usage("m", {"output_tokens": 7})
+        metrics.record_ttfb("m", 0.2)
+        metrics.write_json(tmp_path / "metrics.json")
+        data = json.loads((tmp_path / "metrics.json").read_text())
+        assert data["models"]["m"]["output_tokens"] == 7
+        assert data["models"]["m"]["ttfb"]["count"] == 1
+        assert "p95" in format_snapshot(data)
+
+        metrics.reset()
+        assert metrics.snapshot()["models"] == {}
+        assert metrics.percentile("m", 50) is None
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+token_estimator.py - Fast local approximation of Claude token counts.
+
+Replaces the chars/4 rule of thumb, which is off by 2x or more for code,
+JSON, numbers and non-English text. Text is reduced to a few character
+class counts (letter runs, letters, digits, punctuation, newlines,
+indentation, non-ASCII characters), and the token count is a weighted sum
+of them. With numpy the counts are taken over whole blocks of the string
+at once; without it, regular expressions are used.
+
+The default weights are a rough fit. `calibrate` refits them against real
+counts: either the API's count_tokens endpoint run over sample files, or the
+usage recorded in a mock_server.py cassette. The result is saved to
+~/.claude/rlm_token_calibration.json and used by every script afterwards.
+
+Usage:
+    python token_estimator.py document.txt                  # estimate tokens
+    python token_estimator.py calibrate src/*.py docs/*.md  # fit via count_tokens
+    python token_estimator.py calibrate --cassette run.json # fit from recorded usage
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# Estimated tokens per occurrence of each feature
+DEFAULT_WEIGHTS = {
+    'words': 0.6,          # runs of ASCII letters
+    'letters': 0.1,        # ASCII letters
+    'digits': 0.35,
+    'punctuation': 0.7,    # other ASCII characters
+    'newlines': 0.5,
+    'extra_spaces': 0.2,   # spaces/tabs following another space or tab
+    'non_ascii': 0.8,      # characters above U+007F
+}
+FEATURES = tuple(DEFAULT_WEIGHTS)
+
+# Tokens a request adds on top of its text (role markers, framing)
+DEFAULT_OVERHEAD = 8.0
+
+# Strings are processed this many characters at a time (numpy path)
+BLOCK_CHARS = 1 << 20
+
+# Calibration: samples per file and the pull toward the default weights
+SAMPLE_CHARS = 4000
+MAX_SAMPLES = 200
+RIDGE = 0.01
+
+CALIBRATION_FILE = 'rlm_token_calibration.json'
+
+_SPACE_CHARS = ' \t\r\f\v'
+_LETTER_RUN = re.compile(r'[A-Za-z]+')
+_SPACE_RUN = re.compile(r'[ \t\r\f\v]+')
+_NON_LETTER = re.compile(r'[^A-Za-z]+')
+_NON_DIGIT = re.compile(r'[^0-9]+')
+_NON_SPACE = re.compile(r'[^ \t\r\f\v]+')
+
+
+def _block_features(block: str) -> List[int]:
+    """Feature counts of one string, vectorized over its code points."""
+    cp = np.frombuffer(block.encode('utf-32-le'), dtype=np.uint32)
+    lower = cp | 0x20
+    letter = (lower >= 0x61) & (lower <= 0x7A)
+    digit = (cp >= 0x30) & (cp <= 0x39)
+    newline = cp == 0x0A
+    space = (cp == 0x20) | (cp == 0x09) | ((cp >= 0x0B) & (cp <= 0x0D))
+    non_ascii = cp > 0x7F
+    letters = int(letter.sum())
+    spaces = int(space.sum())
+    words = int(letter[0]) + int((letter[1:] & ~letter[:-1]).sum()) if len(cp) else 0
+    space_runs = int(space[0]) + int((space[1:] & ~space[:-1]).sum()) if len(cp) else 0
+    digits = int(digit.sum())
+    newlines = int(newline.sum())
+    others = int(non_ascii.sum())
+    punctuation = len(cp) - letters - digits - newlines - spaces - others
+    return [words, letters, digits, punctuation, newlines, spaces - space_runs, others]
+
+
+def _regex_features(text: str) -> List[int]:
+    """Feature counts of one string without numpy."""
+    letters = len(_NON_LETTER.sub('', text))
+    digits = len(_NON_DIGIT.sub('', text))
+    spaces = len(_NON_SPACE.sub('', text))
+    newlines = text.count('\n')
+    others = len(text) - len(text.encode('ascii', 'ignore'))
+    punctuation = len(text) - letters - digits - newlines - spaces - others
+    return [len(_LETTER_RUN.findall(text)), letters, digits, punctuation, newlines,
+            spaces - len(_SPACE_RUN.findall(text)), others]
+
+
+def _blocks(text: str) -> Iterable[str]:
+    """Split text into ~BLOCK_CHARS pieces that end just after a newline."""
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start + BLOCK_CHARS)
+        end = len(text) if end < 0 else end + 1
+        yield text[start:end]
+        start = end
+
+
+def text_features(text: str) -> Dict[str, int]:
+    """Count the features the estimate is built from."""
+    totals = [0] * len(FEATURES)
+    if NUMPY_AVAILABLE:
+        # Blocks end at newlines, so no letter or space run spans two blocks
+        for block in _blocks(text):
+            totals = [a + b for a, b in zip(totals, _block_features(block))]
+    else:
+        totals = _regex_features(text)
+    return dict(zip(FEATURES, totals))
+
+
+def prompt_text(payload: dict) -> str:
+    """All text of a Messages API request (system + messages)."""
+    parts = []
+    system = payload.get('system')
+    if isinstance(system, str):
+        parts.append(system)
+    elif system:
+        parts.extend(block.get('text', '') for block in system)
+    for message in payload.get('messages', []):
+        content = message['content']
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get('text', '') for block in content if isinstance(block, dict))
+    return '\n'.join(parts)
+
+
+class TokenEstimator:
+    """
+    Linear model from character-class counts to Claude tokens.
+
+    Args:
+        weights: Tokens per feature occurrence (defaults to DEFAULT_WEIGHTS)
+        overhead: Tokens a request adds on top of its text
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None,
+                 overhead: float = DEFAULT_OVERHEAD):
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update({k: float(v) for k, v in weights.items() if k in DEFAULT_WEIGHTS})
+        self.overhead = overhead
+        self.samples = 0
+
+    def _apply(self, features: Dict[str, int]) -> float:
+        return sum(self.weights[name] * count for name, count in features.items())
+
+    def count(self, text: str) -> int:
+        """Estimated tokens in `text`."""
+        if not text:
+            return 0
+        return max(1, round(self._apply(text_features(text))))
+
+    def count_request(self, payload: dict) -> int:
+        """Estimated input tokens of a Messages API request."""
+        return self.count(prompt_text(payload)) + round(self.overhead)
+
+    def chars_per_token(self, text: str) -> float:
+        """Average characters per token of `text` (4.0 for empty text)."""
+        tokens = self._apply(text_features(text)) if text else 0
+        return len(text) / tokens if tokens else 4.0
+
+    def line_counts(self, text: str) -> List[float]:
+        """
+        Estimated tokens of each line of `text` (including its newline).
+
+        Summing any run of lines gives that span's estimate, so chunkers can
+        pack lines up to a token target without re-scanning the text.
+        """
+        if not text:
+            return []
+        if not NUMPY_AVAILABLE:
+            lines = text.split('\n')
+            newline = self.weights['newlines']
+            counts = [self._apply(text_features(line)) + newline for line in lines]
+            counts[-1] -= newline
+            if not lines[-1]:
+                counts.pop()
+            return counts
+
+        w = self.weights
+        result: List[float] = []
+        for block in _blocks(text):
+            cp = np.frombuffer(block.encode('utf-32-le'), dtype=np.uint32)
+            lower = cp | 0x20
+            letter = (lower >= 0x61) & (lower <= 0x7A)
+            digit = (cp >= 0x30) & (cp <= 0x39)
+            newline = cp == 0x0A
+            space = (cp == 0x20) | (cp == 0x09) | ((cp >= 0x0B) & (cp <= 0x0D))
+            non_ascii = cp > 0x7F
+            punct = ~(letter | digit | newline | space | non_ascii)
+            starts = letter.copy()
+            starts[1:] &= ~letter[:-1]
+            extra = space.copy()
+            extra[0] = False
+            extra[1:] &= space[:-1]
+            weights = (letter * w['letters'] + starts * w['words'] + digit * w['digits']
+                       + punct * w['punctuation'] + newline * w['newlines']
+                       + extra * w['extra_spaces'] + non_ascii * w['non_ascii'])
+            cumulative = np.cumsum(weights)
+            ends = np.flatnonzero(newline)
+            if not len(ends) or ends[-1] != len(cp) - 1:
+                ends = np.append(ends, len(cp) - 1)
+            totals = cumulative[ends]
+            result.extend(np.diff(totals, prepend=0.0).tolist())
+        return result
+
+    # ------------------------------------------------------------------
+    # Calibration
+    # ------------------------------------------------------------------
+
+    def fit(self, samples: List[Tuple[Dict[str, int], int]], ridge: float = RIDGE):
+        """
+        Refit weights and overhead from (features, actual tokens) samples.
+
+        Ridge regression pulled toward the current weights, so features that
+        are rare in the samples keep sensible values; weights are clipped at 0.
+        """
+        if not samples:
+            return
+        names = list(FEATURES)
+        prior = [self.weights[n] for n in names] + [self.overhead]
+        rows = [[features[n] for n in names] + [1] for features, _ in samples]
+        targets = [actual for _, actual in samples]
+        k = len(prior)
+        xtx = [[sum(r[i] * r[j] for r in rows) for j in range(k)] for i in range(k)]
+        xty = [sum(r[i] * t for r, t in zip(rows, targets)) for i in range(k)]
+        scale = ridge * max(1.0, sum(xtx[i][i] for i in range(k)) / k)
+        for i in range(k):
+            xtx[i][i] += scale
+            xty[i] += scale * prior[i]
+        solution = _solve(xtx, xty)
+        for name, value in zip(names, solution):
+            self.weights[name] = max(0.0, value)
+        self.overhead = max(0.0, solution[-1])
+        self.samples += len(samples)
+
+    def to_dict(self) -> dict:
+        return {'weights': self.weights, 'overhead': self.overhead, 'samples': self.samples}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TokenEstimator':
+        estimator = cls(data.get('weights'), data.get('overhead', DEFAULT_OVERHEAD))
+        estimator.samples = data.get('samples', 0)
+        return estimator
+
+    def save(self, path: str):
+        """Write the calibration atomically as JSON."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'TokenEstimator':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def _solve(a: List[List[float]], b: List[float]) -> List[float]:
+    """Solve a small dense linear system by Gaussian elimination with pivoting."""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        m[col], m[pivot] = m[pivot], m[col]
+        if m[col][col] == 0:
+            continue
+        for r in range(col + 1, n):
+            factor = m[r][col] / m[col][col]
+            for c in range(col, n + 1):
+                m[r][c] -= factor * m[col][c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        if m[r][r]:
+            x[r] = (m[r][n] - sum(m[r][c] * x[c] for c in range(r + 1, n))) / m[r][r]
+    return x
+
+
+# ============================================================================
+# Shared estimator
+# ============================================================================
+
+_estimator: Optional[TokenEstimator] = None
+
+
+def default_calibration_path() -> Path:
+    """Calibration file location (~/.claude/rlm_token_calibration.json)."""
+    from rlm_query import get_claude_config_dir
+    return get_claude_config_dir() / CALIBRATION_FILE
+
+
+def get_estimator() -> TokenEstimator:
+    """The shared estimator, loaded from the calibration file if there is one."""
+    global _estimator
+    if _estimator is None:
+        estimator = TokenEstimator()
+        try:
+            path = default_calibration_path()
+            if path.exists():
+                estimator = TokenEstimator.load(str(path))
+        except (ImportError, OSError, ValueError):
+            pass
+        _estimator = estimator
+    return _estimator
+
+
+def set_estimator(estimator: Optional[TokenEstimator]):
+    """Replace the shared estimator (None reloads it on next use)."""
+    global _estimator
+    _estimator = estimator
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated Claude tokens in `text`, using the shared estimator."""
+    return get_estimator().count(text)
+
+
+# ============================================================================
+# Calibration sources
+# ============================================================================
+
+def samples_from_files(paths: Iterable[str], count_fn, max_samples: int = MAX_SAMPLES):
+    """
+    (features, tokens) samples from text files, counted by `count_fn(text)`.
+
+    Files are cut into SAMPLE_CHARS pieces at line boundaries.
+    """
+    samples = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+        start = 0
+        while start < len(content) and len(samples) < max_samples:
+            end = content.rfind('\n', start, start + SAMPLE_CHARS)
+            end = min(len(content), start + SAMPLE_CHARS) if end <= start else end + 1
+            piece = content[start:end]
+            if piece.strip():
+                samples.append((text_features(piece), count_fn(piece)))
+            start = end
+    return samples
+
+
+def samples_from_cassette(path: str):
+    """(features, tokens) samples from the usage recorded in a mock_server.py cassette."""
+    with open(path, 'r', encoding='utf-8') as f:
+        interactions = json.load(f).get('interactions', {})
+    samples = []
+    for entry in interactions.values():
+        usage = entry.get('response', {}).get('usage', {})
+        tokens = sum(usage.get(field) or 0 for field in (
+            'input_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'))
+        if tokens:
+            samples.append((text_features(prompt_text(entry['request'])), tokens))
+    return samples
+
+
+def _mean_error(estimator: TokenEstimator, samples) -> float:
+    errors = [abs(estimator._apply(f) + estimator.overhead - t) / t for f, t in samples]
+    return sum(errors) / len(errors)
+
+
+def calibrate_main(argv: List[str]):
+    parser = argparse.ArgumentParser(
+        prog='token_estimator.py calibrate',
+        description='Fit the token estimator to real token counts and save it'
+    )
+    parser.add_argument('files', nargs='*', help='Sample text files to count with the API')
+    parser.add_argument('--cassette', action='append', default=[],
+                        help='mock_server.py cassette with recorded usage (repeatable)')
+    parser.add_argument('--output', '-o', default=None,
+                        help=f'Calibration file (default: ~/.claude/{CALIBRATION_FILE})')
+    parser.add_argument('--max-samples', type=int, default=MAX_SAMPLES,
+                        help=f'Most count_tokens calls to make (default: {MAX_SAMPLES})')
+    from rlm_query import add_client_arguments, apply_client_arguments, count_tokens, DEFAULT_MODEL
+    parser.add_argument('--model', '-m', default=DEFAULT_MODEL, help='Model whose tokenizer to match')
+    add_client_arguments(parser)
+    args = parser.parse_args(argv)
+    apply_client_arguments(args)
+
+    if not args.files and not args.cassette:
+        parser.error('give sample files and/or --cassette')
+
+    samples = []
+    for cassette in args.cassette:
+        samples.extend(samples_from_cassette(cassette))
+    if args.files:
+        samples.extend(samples_from_files(
+            args.files, lambda text: count_tokens(text, model=args.model), args.max_samples))
+    if not samples:
+        print("Error: no samples with token counts found", file=sys.stderr)
+        sys.exit(1)
+
+    estimator = TokenEstimator()
+    before = _mean_error(estimator, samples)
+    estimator.fit(samples)
+    after = _mean_error(estimator, samples)
+    output = args.output or str(default_calibration_path())
+    estimator.save(output)
+    print(f"Fitted {len(samples)} samples: mean error {before:.1%} -> {after:.1%}")
+    for name in FEATURES:
+        print(f"  {name:<13} {estimator.weights[name]:.3f}")
+    print(f"  {'overhead':<13} {estimator.overhead:.1f}")
+    print(f"Saved to {output}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'calibrate':
+        calibrate_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description='Estimate Claude tokens in text files')
+    parser.add_argument('files', nargs='+', help='Files to estimate')
+    args = parser.parse_args()
+
+    estimator = get_estimator()
+    for path in args.files:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+        tokens = estimator.count(content)
+        print(f"{path}: ~{tokens:,} tokens ({len(content):,} chars, "
+              f"{estimator.chars_per_token(content):.2f} chars/token; chars/4 says {len(content) // 4:,})")
+
+
+if __name__ == "__main__":
+    main()
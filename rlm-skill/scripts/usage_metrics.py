@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+usage_metrics.py - Thread-safe usage and latency metrics for sub-LLM calls.
+
+rlm_query.py records every API call here: token usage, latency and
+time-to-first-byte histograms, retries, hedges, errors, calls saved by
+coalescing, and request/response bytes, all broken down by model.
+Response-cache hits and misses are counted separately. The CLIs can export
+a snapshot as JSON (--metrics-json) at the end of a run, showing where the
+time and tokens went.
+
+Usage:
+    python usage_metrics.py metrics.json     # pretty-print an exported snapshot
+"""
+
+import sys
+import json
+import math
+import argparse
+import threading
+from typing import Dict, Optional
+
+
+USAGE_FIELDS = ("input_tokens", "output_tokens",
+                "cache_creation_input_tokens", "cache_read_input_tokens")
+COUNTER_FIELDS = ("requests",) + USAGE_FIELDS + (
+    "retries", "errors", "hedges", "hedge_wins", "coalesced", "bytes_sent", "bytes_received")
+
+
+class LatencyHistogram:
+    """
+    Log-scale latency histogram with constant memory.
+
+    Buckets grow by 10% from 1 ms, so reported percentiles are within about
+    10% of the true value however many samples are recorded. Not thread-safe
+    on its own; Metrics guards it.
+    """
+
+    MIN_SECONDS = 0.001
+    GROWTH = 1.1
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self.MIN_SECONDS:
+            return 0
+        return math.ceil(math.log(seconds / self.MIN_SECONDS) / math.log(self.GROWTH))
+
+    def record(self, seconds: float):
+        index = self._bucket(seconds)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Upper bound of the bucket holding the pct-th (0-100) sample."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(pct / 100.0 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                upper = self.MIN_SECONDS * self.GROWTH ** index
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class _ModelMetrics:
+    __slots__ = COUNTER_FIELDS + ("latency", "ttfb")
+
+    def __init__(self):
+        for field in COUNTER_FIELDS:
+            setattr(self, field, 0)
+        self.latency = LatencyHistogram()
+        self.ttfb = LatencyHistogram()
+
+
+class Metrics:
+    """
+    Per-model call metrics, safe to update from any thread.
+
+    Every record_* method takes the lock for one short update, so counters
+    never lose increments under concurrent calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, _ModelMetrics] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _model(self, model: Optional[str]) -> _ModelMetrics:
+        key = model or "unknown"
+        metrics = self._models.get(key)
+        if metrics is None:
+            metrics = self._models[key] = _ModelMetrics()
+        return metrics
+
+    def record_usage(self, model: Optional[str], usage: dict):
+        """Count one completed request and its token usage."""
+        with self._lock:
+            metrics = self._model(model)
+            metrics.requests += 1
+            for field in USAGE_FIELDS:
+                setattr(metrics, field, getattr(metrics, field) + (usage.get(field) or 0))
+
+    def record_latency(self, model: Optional[str], seconds: float):
+        with self._lock:
+            self._model(model).latency.record(seconds)
+
+    def record_ttfb(self, model: Optional[str], seconds: float):
+        with self._lock:
+            self._model(model).ttfb.record(seconds)
+
+    def record_bytes(self, model: Optional[str], sent: int, received: int):
+        with self._lock:
+            metrics = self._model(model)
+            metrics.bytes_sent += sent
+            metrics.bytes_received += received
+
+    def increment(self, model: Optional[str], field: str, amount: int = 1):
+        """Add to one counter (retries, errors, hedges, hedge_wins, coalesced)."""
+        with self._lock:
+            metrics = self._model(model)
+            setattr(metrics, field, getattr(metrics, field) + amount)
+
+    def record_cache(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def percentile(self, model: str, pct: float) -> Optional[float]:
+        with self._lock:
+            metrics = self._models.get(model)
+            return metrics.latency.percentile(pct) if metrics else None
+
+    def sample_count(self, model: str) -> int:
+        with self._lock:
+            metrics = self._models.get(model)
+            return metrics.latency.count if metrics else 0
+
+    def totals(self) -> dict:
+        """Counters summed over all models."""
+        with self._lock:
+            return {field: sum(getattr(m, field) for m in self._models.values())
+                    for field in COUNTER_FIELDS}
+
+    def snapshot(self) -> dict:
+        """All metrics as a JSON-serializable dict."""
+        with self._lock:
+            models = {}
+            for name, m in self._models.items():
+                entry = {field: getattr(m, field) for field in COUNTER_FIELDS}
+                entry["latency"] = m.latency.snapshot()
+                entry["ttfb"] = m.ttfb.snapshot()
+                models[name] = entry
+            lookups = self.cache_hits + self.cache_misses
+            cache = {"hits": self.cache_hits, "misses": self.cache_misses,
+                     "hit_rate": self.cache_hits / lookups if lookups else 0.0}
+        totals = {field: sum(entry[field] for entry in models.values())
+                  for field in COUNTER_FIELDS}
+        return {"totals": totals, "response_cache": cache, "models": models}
+
+    def write_json(self, path: str):
+        """Write snapshot() to a JSON file."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._models.clear()
+            self.cache_hits = self.cache_misses = 0
+
+
+def format_snapshot(snapshot: dict) -> str:
+    """Render a snapshot as a short human-readable table."""
+    lines = []
+    totals = snapshot["totals"]
+    lines.append(f"Requests: {totals['requests']:,}  retries: {totals['retries']:,}  "
+                 f"errors: {totals['errors']:,}  hedges: {totals['hedges']:,}")
+    lines.append(f"Tokens: {totals['input_tokens']:,} in, {totals['output_tokens']:,} out, "
+                 f"{totals['cache_read_input_tokens']:,} cache read, "
+                 f"{totals['cache_creation_input_tokens']:,} cache write")
+    lines.append(f"Bytes: {totals['bytes_sent']:,} sent, {totals['bytes_received']:,} received")
+    cache = snapshot["response_cache"]
+    lines.append(f"Response cache: {cache['hits']:,} hits, {cache['misses']:,} misses; "
+                 f"{totals.get('coalesced', 0):,} calls shared an identical in-flight request")
+    for model, entry in sorted(snapshot["models"].items()):
+        lines.append(f"\n{model}: {entry['requests']:,} requests")
+        for name in ("latency", "ttfb"):
+            hist = entry[name]
+            if hist.get("count"):
+                lines.append(f"  {name:8} p50 {hist['p50']:.2f}s  p95 {hist['p95']:.2f}s  "
+                             f"p99 {hist['p99']:.2f}s  (n={hist['count']:,})")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pretty-print a --metrics-json export')
+    parser.add_argument('metrics_file', help='JSON file written with --metrics-json')
+    args = parser.parse_args()
+
+    try:
+        with open(args.metrics_file, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(format_snapshot(snapshot))
+
+
+if __name__ == "__main__":
+    main()